@@ -1,6 +1,5 @@
 from flask import Flask, request, jsonify, Response, send_from_directory
-from werkzeug.exceptions import RequestEntityTooLarge
-from backend.logger import log_event
+from backend.logger import log_event, read_log_entry
 import logging
 import os
 import time
@@ -47,9 +46,11 @@ from backend.canvas_manager import (
 )
 from backend.canvas_channel import CanvasChannelManager
 from backend.file_manager import FileManager
+from backend.upload_pipeline import UploadSink, install_upload_streaming
 from backend.agents.research import generate_research_response
 from backend.agents.chat import generate_chat_response
 from backend.task_manager import task_manager
+from backend.task_scheduler import TaskQueueFullError
 from backend.cache_system import cache_system
 from backend.version import get_version, VERSION_MAJOR, VERSION_MINOR, VERSION_PATCH
 
@@ -77,7 +78,12 @@ file_rag = FileRAG(rag_manager=rag_manager)
 # Initialize file manager with shared RAG manager
 file_manager = FileManager(rag_manager=rag_manager)
 
+# /api/upload bodies are streamed straight into file storage; oversized ones get a JSON 413
+# (backend/upload_pipeline.py)
+install_upload_streaming(app, ['/api/upload'], file_manager.new_upload_sink)
+
 task_manager.recover_tasks()
+file_manager.recover_ingestion()
 
 # Initialize canvas channel manager for per-chat locking
 import asyncio
@@ -110,15 +116,6 @@ def serve_static(path):
     return send_from_directory('static', path)
 
 
-# Error handler for 413 Request Entity Too Large
-@app.errorhandler(RequestEntityTooLarge)
-def handle_large_file_error(e):
-    """Handle files that exceed MAX_CONTENT_LENGTH."""
-    return jsonify({
-        "error": f"File too large. Maximum size is {100 * 1024 * 1024} bytes (100MB)"
-    }), 413
-
-
 @app.route('/api/chats', methods=['GET'])
 def list_chats():
     logger = logging.getLogger(__name__)
@@ -136,11 +133,33 @@ def clear_all_chats():
         research_rag.cleanup_chat(chat.get('id', ''))
     return jsonify({"success": True})
 
+def _parse_page_args(args):
+    """Validate before_id/limit query args; returns (before_id, limit) or raises ValueError."""
+    before_id = args.get('before_id')
+    before_id = int(before_id) if before_id not in (None, '') else None
+    limit = int(args.get('limit', config.MESSAGE_PAGE_SIZE))
+    if limit < 1 or (before_id is not None and before_id < 1):
+        raise ValueError("before_id and limit must be positive")
+    return before_id, min(limit, config.MESSAGE_PAGE_MAX)
+
 @app.route('/api/chats/<chat_id>', methods=['GET'])
 def get_chat_details(chat_id):
+    """Chat metadata and messages. With ?limit=N only the latest N messages are
+    returned, plus has_more_messages/messages_before_id for fetching older pages."""
     logger = logging.getLogger(__name__)
     logger.debug("[API] GET /api/chats/%s - getting chat details", chat_id)
-    chat = db.get_chat_full(chat_id)
+    if 'limit' in request.args:
+        try:
+            _, limit = _parse_page_args(request.args)
+        except ValueError:
+            return jsonify({"error": "Invalid limit"}), 400
+        chat = db.get_chat(chat_id)
+        if chat:
+            page = db.get_messages_page(chat_id, None, limit)
+            chat = {**chat, "messages": page["messages"], "has_more_messages": page["has_more"],
+                    "messages_before_id": page["before_id"]}
+    else:
+        chat = db.get_chat_full(chat_id)
     if not chat:
         logger.debug("[API] GET /api/chats/%s - chat not found", chat_id)
         return jsonify({"error": "Chat not found"}), 404
@@ -149,6 +168,19 @@ def get_chat_details(chat_id):
     logger.debug("[API] GET /api/chats/%s - completed, has_messages=%d", chat_id, len(chat.get('messages', [])))
     return jsonify(chat)
 
+@app.route('/api/chats/<chat_id>/messages', methods=['GET'])
+def get_chat_messages_page(chat_id):
+    """One page of messages, oldest first: the `limit` messages before message
+    id `before_id` (the latest when omitted). Pass the returned before_id back
+    to fetch the previous page; it is null on the first page of the chat."""
+    try:
+        before_id, limit = _parse_page_args(request.args)
+    except ValueError:
+        return jsonify({"error": "before_id and limit must be positive integers"}), 400
+    if not db.get_chat(chat_id):
+        return jsonify({"error": "Chat not found"}), 404
+    return jsonify(db.get_messages_page(chat_id, before_id, limit))
+
 @app.route('/api/chats/save', methods=['POST'])
 def save_chat_endpoint():
     data = request.json
@@ -689,7 +721,12 @@ def get_chat_folders(chat_id):
 
 @app.route('/api/upload', methods=['POST'])
 async def upload_file_endpoint():
-    """Upload a file and process it."""
+    """Store an uploaded file and queue it for processing.
+
+    The body has already been streamed into storage and hashed by the time
+    this runs (see install_upload_streaming). Extraction and embedding happen
+    in the background; poll /api/files/<file_id>/status for progress.
+    """
     logger = logging.getLogger(__name__)
     logger.info("[UPLOAD_ENDPOINT] Starting upload")
 
@@ -711,75 +748,36 @@ async def upload_file_endpoint():
         logger.error("[UPLOAD_ENDPOINT] Empty filename")
         return jsonify({"error": "No file selected"}), 400
 
-    # Validate file type - check MIME type first, then file extension
-    mime_type = file.mimetype
-    if mime_type not in config.FILE_UPLOAD_ALLOWED_TYPES:
-        # Fallback: check if it's octet-stream but has a known extension
-        ext = os.path.splitext(file.filename)[1].lower()
-        expected_mime = {
-            '.pdf': 'application/pdf',
-            '.docx': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
-            '.txt': 'text/plain',
-            '.png': 'image/png',
-            '.jpg': 'image/jpeg',
-            '.jpeg': 'image/jpeg',
-            '.gif': 'image/gif',
-            '.mp4': 'video/mp4',
-            '.mp3': 'audio/mpeg',
-            '.wav': 'audio/wav'
-        }.get(ext)
-        if expected_mime and mime_type == 'application/octet-stream':
-            mime_type = expected_mime
-        else:
-            return jsonify({"error": f"File type not allowed: {mime_type}"}), 400
-
-    # Check file size
-    file_content = file.read()
-    logger.debug(f"[UPLOAD_ENDPOINT] file.size={len(file_content)} bytes")
-    if len(file_content) > config.FILE_UPLOAD_MAX_SIZE:
-        return jsonify({"error": f"File too large. Maximum size is {config.FILE_UPLOAD_MAX_SIZE} bytes"}), 400
-
-    # Write temp file
-    import uuid
-    import os
-    temp_path = os.path.join(config.FILE_STORAGE_PATH, f"temp_{uuid.uuid4().hex}")
-    with open(temp_path, 'wb') as f:
-        f.write(file_content)
-
-    # Process file with background processing for faster response
+    sink = file.stream
+    if not isinstance(sink, UploadSink):
+        logger.error(f"[UPLOAD_ENDPOINT] Unexpected upload stream {type(sink).__name__}")
+        return jsonify({"error": "Failed to process file"}), 500
+    logger.debug(f"[UPLOAD_ENDPOINT] file.size={sink.size} bytes")
+
+    # Validate file type - check MIME type first, then file extension / PDF header
+    mime_type = file_manager.resolve_upload_mime_type(sink, file.filename, file.mimetype)
+    if not mime_type:
+        return jsonify({"error": f"File type not allowed: {file.mimetype}"}), 400
+
     try:
-        logger.info(f"[UPLOAD_ENDPOINT] Calling file_manager.upload_file_async for {file.filename}")
-        metadata = file_manager.upload_file_async(
-            file_path=temp_path,
+        metadata = file_manager.accept_upload(
+            sink=sink,
             chat_id=chat_id,
-            original_filename=file.filename
+            original_filename=file.filename,
+            mime_type=mime_type
         )
-        logger.info(f"[UPLOAD_ENDPOINT] file_manager.upload_file_async returned: {metadata is not None}")
-
-        # Clean up temp file (file has been copied to storage already)
-        if os.path.exists(temp_path):
-            os.remove(temp_path)
-
-        if metadata:
-            logger.info(f"[UPLOAD_ENDPOINT] Upload initiated, file_id={metadata.file_id}")
-            return jsonify({
-                "success": True,
-                "file_id": metadata.file_id,
-                "original_filename": metadata.original_filename,
-                "mime_type": metadata.mime_type,
-                "file_size": metadata.file_size
-            })
-        else:
-            logger.error("[UPLOAD_ENDPOINT] file_manager.upload_file_async returned None")
-            return jsonify({"error": "Failed to process file"}), 500
+        logger.info(f"[UPLOAD_ENDPOINT] Upload stored, file_id={metadata.file_id}")
+        return jsonify({
+            "success": True,
+            "file_id": metadata.file_id,
+            "original_filename": metadata.original_filename,
+            "mime_type": metadata.mime_type,
+            "file_size": metadata.file_size,
+            "sha256": sink.sha256,
+            "processing_status": "pending"
+        })
 
     except Exception as e:
-        # Clean up temp file on error
-        if os.path.exists(temp_path):
-            try:
-                os.remove(temp_path)
-            except:
-                pass
         logger.error(f"[UPLOAD_ENDPOINT] Exception: {e}", exc_info=True)
         return jsonify({"error": str(e)}), 500
 
@@ -838,11 +836,16 @@ def get_file_status_endpoint(file_id):
         logger.warning(f"[STATUS_ENDPOINT] File not found in database: {file_id}")
         return jsonify({"error": "File not found"}), 404
 
-    return jsonify({
+    response = {
         "success": True,
         "file_id": file_id,
         "processing_status": result.get('processing_status') or 'pending'
-    })
+    }
+    # Stage, queue position and timings while this process is ingesting the file
+    progress = file_manager.get_ingest_progress(file_id)
+    if progress:
+        response["progress"] = progress
+    return jsonify(response)
 
 
 @app.route('/api/files/<file_id>', methods=['DELETE'])
@@ -1191,6 +1194,7 @@ def proxy_unload_model():
 
 @app.route('/v1/chat/completions', methods=['POST'])
 def chat_completions():
+    reservation = None
     try:
         data = request.json
         raw_messages = data.get('messages', [])
@@ -1293,6 +1297,12 @@ def chat_completions():
                         yield chunk["data"]
             return Response(generate_stream(), mimetype='text/event-stream')
 
+        # === 1b. Back-pressure: hold a queue slot before persisting anything ===
+        # Raises TaskQueueFullError (-> 429) when full; the slot is consumed by
+        # start_*_task below and released in `finally` on any other exit.
+        task_mode = "research" if (research_mode and approved_plan) else "chat"
+        reservation = task_manager.reserve_task_slot(task_mode)
+
         existing_chat = db.get_chat(chat_id=chat_id)
         res_comp = existing_chat.get('research_completed', 0) if existing_chat else 0
         
@@ -1417,7 +1427,8 @@ def chat_completions():
             task_manager.start_research_task(
                 model, messages, approved_plan, chat_id, search_depth_mode, vision_model, generate_research_response,
                 model_name=last_model_name, resume_state=resume_state, rag_engine=research_rag, rag=research_rag, file_rag=file_rag, api_url=api_url, api_key=api_key,
-                topic_override=topic, vision_enabled=vision_enabled, enable_thinking=enable_thinking
+                topic_override=topic, vision_enabled=vision_enabled, enable_thinking=enable_thinking,
+                reservation=reservation
             )
         else:
             # Normal Chat Task or Research Planning phase
@@ -1520,7 +1531,8 @@ def chat_completions():
                 research_completed=res_comp,
                 initial_tool_calls=initial_tool_calls,
                 topic_override=topic_override,
-                enable_thinking=enable_thinking
+                enable_thinking=enable_thinking,
+                reservation=reservation
             )
 
         # === 4. Return Stream Subscription ===
@@ -1534,11 +1546,28 @@ def chat_completions():
                     yield chunk["data"]
         return Response(generate_stream(), mimetype='text/event-stream')
 
+    except TaskQueueFullError as e:
+        log_event("chat_completions_queue_full", {"chat_id": chat_id, "kind": e.kind, "queued": e.queued})
+        return _queue_full_response(e.retry_after)
     except Exception as e:
         import traceback
         error_trace = traceback.format_exc()
         log_event("app_general_error", {"error": str(e), "traceback": error_trace})
         return jsonify({"error": str(e)}), 500
+    finally:
+        if reservation is not None:
+            reservation.release()
+
+
+def _queue_full_response(retry_after):
+    """429 response for when the task scheduler queue is full."""
+    response = jsonify({
+        "error": f"Server is busy: too many tasks are queued. Please retry in {retry_after} seconds.",
+        "retry_after": retry_after
+    })
+    response.status_code = 429
+    response.headers["Retry-After"] = str(retry_after)
+    return response
 
 # ==================== LOG BROWSING ENDPOINTS ====================
 
@@ -1580,8 +1609,10 @@ def get_log_detail():
         return jsonify({"error": "Missing path"}), 400
         
     # Security: Ensure path is within the logs directory
+    # Batched logs are addressed as "<segment>.jsonl#<offset>"
+    file_part = rel_path.partition("#")[0]
     base_logs = os.path.abspath(os.path.join(config.DATA_DIR, "logs"))
-    target_path = os.path.abspath(os.path.join(base_logs, rel_path))
+    target_path = os.path.abspath(os.path.join(base_logs, file_part))
     
     if not target_path.startswith(base_logs + os.sep) and target_path != base_logs:
         return jsonify({"error": "Access denied"}), 403
@@ -1590,9 +1621,7 @@ def get_log_detail():
         return jsonify({"error": "File not found"}), 404
         
     try:
-        with open(target_path, "r", encoding="utf-8") as f:
-            data = json.load(f)
-        return jsonify(data)
+        return jsonify(read_log_entry(rel_path))
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
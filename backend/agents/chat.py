@@ -924,7 +924,7 @@ async def generate_chat_response(api_url, model, messages, extra_body, enable_th
                         if config.FILE_RAG_ENABLED and metadata.content_text:
                             if query:
                                 # Query mode: Use file_rag to find relevant chunks
-                                rag_results = file_rag.retrieve_for_file(file_id, query, n_results=5) if file_rag else []
+                                rag_results = await file_rag.aretrieve_for_file(file_id, query, n_results=5) if file_rag else []
 
                                 if rag_results:
                                     # Build context from chunks, respecting token limit
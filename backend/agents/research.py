@@ -69,6 +69,8 @@ from backend.agents.research_utils import (
     _strip_report_images,
     _strip_invalid_citations
 )
+from backend.agents.research_pipeline import ResearchPipeline
+from backend.task_manager import task_manager
 from backend.token_counter import count_tokens
 
 # --- Configuration ---
@@ -935,6 +937,48 @@ async def generate_research_response(api_url, model, messages, enable_thinking,
 
     content_budget = config.RESEARCH_CONTENT_BUDGET_DEEP if search_depth_mode == 'deep' else config.RESEARCH_CONTENT_BUDGET_REGULAR
 
+    async def _search_query(query_info):
+        mcp_res = await _execute_mcp_tool(tavily_client, "async_tavily_search_tool", {
+            "query": query_info["search"], "topic": query_info.get("topic", "general"),
+            "time_range": query_info.get("time_range"),
+            "start_date": query_info.get("start_date"), "end_date": query_info.get("end_date"),
+            "max_results": config.RESEARCH_TAVILY_MAX_RESULTS_INITIAL
+        }, chat_id=chat_id)
+        try:
+            res_json = json.loads(mcp_res.content[0].text)
+            return res_json.get("results", []), res_json.get("images", [])
+        except:
+            return [], []
+
+    async def _map_site(url, heading):
+        mcp_res = await _execute_mcp_tool(tavily_client, "async_tavily_map_tool", {"url_to_map": url, "instruction": f"Researching: {heading}. Find deep data pages."}, chat_id=chat_id)
+        try:
+            return json.loads(mcp_res.content[0].text).get("results", [])
+        except:
+            return []
+
+    def _extract_url(url, step_id, raw_content=None):
+        return _extract_content_for_url(
+            url, search_depth_mode, vision_model, api_url, vlm_lock, enable_thinking,
+            display_model=display_model, step_id=step_id,
+            raw_content_from_search=raw_content, api_key=api_key, chat_id=chat_id, vision_enabled=vision_enabled
+        )
+
+    def _search_images(images, step_id):
+        return _process_tavily_search_images(images, step_id, vision_model, api_url, vlm_lock, enable_thinking, display_model=display_model, api_key=api_key, chat_id=chat_id, vision_enabled=vision_enabled)
+
+    fetch_pipeline = ResearchPipeline(
+        search=_search_query,
+        select=lambda results: _select_top_urls(results, n=config.RESEARCH_SELECT_TOP_URLS_COUNT),
+        extract=_extract_url,
+        map_site=_map_site,
+        activity=lambda kind, data: f"data: {_create_activity_chunk(display_model, kind, data)}\n\n",
+        content_budget=content_budget,
+        deep=search_depth_mode == 'deep',
+        process_images=_search_images if vision_model and vision_enabled else None,
+        should_stop=lambda: chat_id in task_manager.interrupted_tasks,
+    )
+
     mode_guidance = "DEEP mode: Massive comprehensiveness required. Write extremely detailed, data-dense sections." if search_depth_mode == 'deep' else "REGULAR mode: Write comprehensive, well-structured sections with good detail."
     if structural_recommendation and structural_recommendation != "narrative":
         mode_guidance += f" Structural Recommendation: Use a '{structural_recommendation}' format for this section to best present the findings."
@@ -975,147 +1019,15 @@ async def generate_research_response(api_url, model, messages, enable_thinking,
 
             yield f"data: {_create_activity_chunk(display_model, 'phase', {'message': f'Section {section_idx+1}/{n_sections}: {heading}', 'icon': '📋', 'collapsible': True})}\n\n"
 
-            # --- INNER LOOP: Execute each query for this section ---
+            # --- Search, select, extract and store this section's queries concurrently ---
             section_content_buffer = []
             vlm_image_results = []
 
-            for q_idx, query_info in enumerate(section_queries):
-                query = query_info["search"]
-                q_topic = query_info.get("topic", "general")
-                q_time_range = query_info.get("time_range")
-                q_start_date = query_info.get("start_date")
-                q_end_date = query_info.get("end_date")
-
-                yield f"data: {_create_activity_chunk(display_model, 'search', {'query': query, 'step_id': section_idx, 'displayMessage': f'Query {q_idx+1}/{len(section_queries)}: Searching...'})}\n\n"
-
-                # --- SEARCH ---
-                mcp_res = await _execute_mcp_tool(tavily_client, "async_tavily_search_tool", {
-                    "query": query, "topic": q_topic, "time_range": q_time_range,
-                    "start_date": q_start_date, "end_date": q_end_date,
-                    "max_results": config.RESEARCH_TAVILY_MAX_RESULTS_INITIAL
-                }, chat_id=chat_id)
-                try:
-                    res_json = json.loads(mcp_res.content[0].text)
-                    results_raw = res_json.get("results", [])
-                    search_images = res_json.get("images", [])
-                except:
-                    results_raw, search_images = [], []
-
-                results = [r for r in results_raw if r.get('raw_content') or r.get('content')]
-
-                if not results:
-                    yield f"data: {_create_activity_chunk(display_model, 'status', {'message': f'No results for query: {query[:40]}...', 'icon': '⚠️'})}\n\n"
-                    continue
-
-                filtered_results = [{'title': r.get('title'), 'url': r.get('url'), 'snippet': r.get('content')} for r in results]
-                yield f"data: {_create_activity_chunk(display_model, 'search_results', {'results': filtered_results, 'step_id': section_idx})}\n\n"
-
-                # --- SELECT ---
-                selected = _select_top_urls(results, n=config.RESEARCH_SELECT_TOP_URLS_COUNT)
-                yield f"data: {_create_activity_chunk(display_model, 'status', {'message': f'Selected {len(selected)} sources from {len(results)} results.', 'step_id': section_idx, 'icon': '🎯'})}\n\n"
-
-                # --- EXTRACT with content budget ---
-                query_content_buffer = []
-                accumulated_tokens = 0
-
-                for sel_result in selected:
-                    if accumulated_tokens >= content_budget:
-                        yield f"data: {_create_activity_chunk(display_model, 'status', {'message': f'Content budget reached for this query ({content_budget} tokens).', 'icon': '📊'})}\n\n"
-                        break
-
-                    sel_url = sel_result.get('url', '')
-                    yield f"data: {_create_activity_chunk(display_model, 'visit', {'url': sel_url})}\n\n"
-
-                    extracted = None
-                    async for packet in _extract_content_for_url(
-                        sel_url, search_depth_mode, vision_model, api_url, vlm_lock, enable_thinking,
-                        display_model=display_model, step_id=section_idx,
-                        raw_content_from_search=sel_result.get('raw_content'), api_key=api_key, chat_id=chat_id, vision_enabled=vision_enabled
-                    ):
-                        if packet["type"] == "activity":
-                            yield packet["data"]
-                        else:
-                            _, extracted = packet["data"]
-
-                    if extracted and len(extracted.strip()) > config.RESEARCH_EXTRACT_MIN_TAVILY_CONTENT:
-                        content_tokens = count_tokens(extracted)
-                        # Trim if exceeding budget
-                        if accumulated_tokens + content_tokens > content_budget:
-                            # Estimate remaining chars based on average tokens per char
-                            remaining_tokens = content_budget - accumulated_tokens
-                            # Use a conservative estimate: ~4 chars per token
-                            remaining_chars = max(0, remaining_tokens * 4)
-                            if remaining_chars > 0 and len(extracted) > remaining_chars:
-                                extracted = extracted[:remaining_chars]
-                                content_tokens = count_tokens(extracted)
-                            else:
-                                break
-                        query_content_buffer.append({"url": sel_url, "title": sel_result.get('title'), "content": extracted})
-                        accumulated_tokens += content_tokens
-                        yield f"data: {_create_activity_chunk(display_model, 'visit_complete', {'url': sel_url, 'chars': len(extracted)})}\n\n"
-                    else:
-                        yield f"data: {_create_activity_chunk(display_model, 'status', {'message': f'Failed to extract content from {sel_url[:40]}...', 'icon': '⚠️'})}\n\n"
-
-                # --- PROCESS SEARCH IMAGES (VLM) ---
-                if vision_model and vision_enabled and search_images:
-                    async for packet in _process_tavily_search_images(search_images, section_idx, vision_model, api_url, vlm_lock, enable_thinking, display_model=display_model, api_key=api_key, chat_id=chat_id, vision_enabled=vision_enabled):
-                        if packet["type"] == "activity":
-                            yield packet["data"]
-                        else:
-                            vlm_image_results.extend(packet["data"])
-
-                # --- DEEP MODE: Map top URLs for sub-pages ---
-                if search_depth_mode == 'deep':
-                    for sel_result in selected:
-                        if accumulated_tokens >= content_budget:
-                            break
-                        sel_url = sel_result.get('url', '')
-                        yield f"data: {_create_activity_chunk(display_model, 'status', {'message': f'Deep mapping: {sel_url[:40]}...', 'step_id': section_idx, 'icon': '🗺️'})}\n\n"
-
-                        mcp_res = await _execute_mcp_tool(tavily_client, "async_tavily_map_tool", {"url_to_map": sel_url, "instruction": f"Researching: {heading}. Find deep data pages."}, chat_id=chat_id)
-                        try:
-                            res_json = json.loads(mcp_res.content[0].text)
-                            sub_mapped = res_json.get("results", [])
-                        except:
-                            sub_mapped = []
-
-                        if sub_mapped:
-                            for mapped_url in sub_mapped[:config.RESEARCH_DEEP_MAP_MAX_URLS]:
-                                if accumulated_tokens >= content_budget:
-                                    break
-                                if isinstance(mapped_url, dict):
-                                    mapped_url = mapped_url.get('url', '')
-                                if not mapped_url or mapped_url in [item['url'] for item in query_content_buffer]:
-                                    continue
-
-                                yield f"data: {_create_activity_chunk(display_model, 'visit', {'url': mapped_url})}\n\n"
-
-                                deep_extracted = None
-                                async for packet in _extract_content_for_url(
-                                    mapped_url, search_depth_mode, vision_model, api_url, vlm_lock, enable_thinking,
-                                    display_model=display_model, step_id=section_idx, api_key=api_key, chat_id=chat_id, vision_enabled=vision_enabled
-                                ):
-                                    if packet["type"] == "activity":
-                                        yield packet["data"]
-                                    else:
-                                        _, deep_extracted = packet["data"]
-
-                                if deep_extracted and len(deep_extracted.strip()) > config.RESEARCH_MAP_MIN_CONTENT:
-                                    content_tokens = count_tokens(deep_extracted)
-                                    if accumulated_tokens + content_tokens > content_budget:
-                                        remaining_tokens = content_budget - accumulated_tokens
-                                        remaining_chars = max(0, remaining_tokens * 4)
-                                        if remaining_chars > 0 and len(deep_extracted) > remaining_chars:
-                                            deep_extracted = deep_extracted[:remaining_chars]
-                                            content_tokens = count_tokens(deep_extracted)
-                                        else:
-                                            break
-                                    query_content_buffer.append({"url": mapped_url, "title": None, "content": deep_extracted})
-                                    accumulated_tokens += content_tokens
-                                    yield f"data: {_create_activity_chunk(display_model, 'visit_complete', {'url': mapped_url, 'chars': len(deep_extracted)})}\n\n"
-
-                section_content_buffer.extend(query_content_buffer)
-                yield f"data: {_create_activity_chunk(display_model, 'status', {'message': f'Query {q_idx+1} gathered {len(query_content_buffer)} items (~{accumulated_tokens}k tokens).', 'icon': '💾'})}\n\n"
+            async for packet in fetch_pipeline.run_section(section_idx, heading, section_queries):
+                if packet["type"] == "activity":
+                    yield packet["data"]
+                else:
+                    section_content_buffer, vlm_image_results = packet["data"]
 
             # --- Check if we got any content for this section ---
             if not section_content_buffer:
@@ -1277,6 +1189,9 @@ async def generate_research_response(api_url, model, messages, enable_thinking,
             with open(state_path, "w", encoding="utf-8") as f:
                 json.dump(state, f)
 
+    except InterruptedError:
+        # Stopped via TaskManager.stop_task; the task consumer handles cleanup
+        raise
     except Exception as e:
         import traceback
         traceback.print_exc()
@@ -0,0 +1,296 @@
+"""
+Bounded-concurrency fetch pipeline for the research agent.
+
+For every plan section the research agent searches each query, selects the
+top URLs, extracts their content and, in deep mode, maps those URLs for
+sub-pages and extracts them too. Done one after another, a deep run costs the
+sum of hundreds of network round-trips. This module runs the stages
+
+    search -> select -> extract -> (deep: map -> extract) -> store
+
+concurrently: all queries of a section are in flight at once, and each stage
+is bounded by its own semaphore (RESEARCH_SEARCH_CONCURRENCY,
+RESEARCH_EXTRACT_CONCURRENCY, RESEARCH_MAP_CONCURRENCY).
+
+Ordering is deterministic. Whatever order fetches complete in, the store stage
+appends content in plan order (query order, then selection order, then map
+order), so the source ids assigned later - and therefore the citations - are
+the same as in a sequential run. The per-query content budget is applied in
+that same order; pages fetched past the budget are discarded. Deep-mode maps
+and sub-page extractions are launched in semaphore-sized waves and stop once
+the budget is spent, so at most one wave is fetched past it.
+
+Cancellation: ``should_stop`` (wired to TaskManager.interrupted_tasks) is
+checked before each fetch and between events, raising InterruptedError like
+the task consumer does. When the generator is closed or its task is cancelled
+(TaskManager.stop_task cancels the running asyncio task), every in-flight
+fetch is cancelled before control returns.
+"""
+
+import asyncio
+
+from backend import config
+from backend.token_counter import count_tokens
+
+_QUERY_DONE = object()
+
+
+async def _cancel_all(tasks):
+    """Cancel unfinished tasks and wait for all of them, retrieving their exceptions."""
+    for task in tasks:
+        if not task.done():
+            task.cancel()
+    if tasks:
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def _gather_ordered(coros):
+    """Run coroutines concurrently; results keep input order. Siblings are cancelled on failure."""
+    tasks = [asyncio.ensure_future(c) for c in coros]
+    try:
+        return await asyncio.gather(*tasks)
+    finally:
+        await _cancel_all(tasks)
+
+
+class _QueryBuffer:
+    """Store stage for one query: content in plan order within a token budget."""
+
+    def __init__(self, budget):
+        self.budget = budget
+        self.items = []
+        self.tokens = 0
+
+    @property
+    def full(self):
+        return self.tokens >= self.budget
+
+    def urls(self):
+        return {item["url"] for item in self.items}
+
+    def add(self, url, title, content):
+        """Store content, trimmed to the remaining budget. Returns the stored text or None."""
+        content_tokens = count_tokens(content)
+        if self.tokens + content_tokens > self.budget:
+            # Use a conservative estimate: ~4 chars per token
+            remaining_chars = max(0, (self.budget - self.tokens) * 4)
+            if remaining_chars > 0 and len(content) > remaining_chars:
+                content = content[:remaining_chars]
+                content_tokens = count_tokens(content)
+            else:
+                return None
+        self.items.append({"url": url, "title": title, "content": content})
+        self.tokens += content_tokens
+        return content
+
+
+class ResearchPipeline:
+    """
+    Gathers the content for research sections with bounded concurrency.
+
+    The network stages are injected so the pipeline has no MCP dependency:
+
+        search(query_info) -> (results, images)           coroutine
+        select(results) -> selected results               plain function
+        extract(url, step_id, raw_content) -> packets      async generator
+        map_site(url, heading) -> [url or {"url": ...}]    coroutine
+        process_images(images, step_id) -> packets         async generator (optional)
+
+    ``activity(kind, data)`` formats an SSE activity chunk. One pipeline is
+    created per research run; semaphores are shared by all of its sections.
+    """
+
+    def __init__(self, search, select, extract, map_site, activity, content_budget,
+                 deep=False, process_images=None, should_stop=None,
+                 search_concurrency=None, extract_concurrency=None, map_concurrency=None):
+        self._search = search
+        self._select = select
+        self._extract = extract
+        self._map_site = map_site
+        self._activity = activity
+        self._process_images = process_images
+        self._should_stop = should_stop
+        self.content_budget = content_budget
+        self.deep = deep
+        self._extract_limit = extract_concurrency or config.RESEARCH_EXTRACT_CONCURRENCY
+        self._map_limit = map_concurrency or config.RESEARCH_MAP_CONCURRENCY
+        self._search_sem = asyncio.Semaphore(search_concurrency or config.RESEARCH_SEARCH_CONCURRENCY)
+        self._extract_sem = asyncio.Semaphore(self._extract_limit)
+        self._map_sem = asyncio.Semaphore(self._map_limit)
+        self.stats = {"searches": 0, "extractions": 0, "maps": 0, "discarded": 0}
+
+    def _check_stop(self):
+        if self._should_stop and self._should_stop():
+            raise InterruptedError("Task stopped")
+
+    async def run_section(self, section_idx, heading, queries):
+        """
+        Gather content for one section.
+
+        Yields {"type": "activity", "data": str} packets while fetching, then a
+        final {"type": "result", "data": (content_items, image_results)} with
+        items in plan order.
+        """
+        events = asyncio.Queue()
+        tasks = [
+            asyncio.ensure_future(self._run_query(events, section_idx, heading, q_idx, len(queries), query_info))
+            for q_idx, query_info in enumerate(queries)
+        ]
+        remaining = len(tasks)
+        try:
+            while remaining:
+                item = await events.get()
+                if item is _QUERY_DONE:
+                    remaining -= 1
+                    # Fail fast: the first failed query aborts the section
+                    for task in tasks:
+                        if task.done() and not task.cancelled() and task.exception():
+                            raise task.exception()
+                    continue
+                self._check_stop()
+                yield {"type": "activity", "data": item}
+
+            self._check_stop()
+            content_items, image_results = [], []
+            for task in tasks:
+                query_items, query_images = task.result()
+                content_items.extend(query_items)
+                image_results.extend(query_images)
+            yield {"type": "result", "data": (content_items, image_results)}
+        finally:
+            await _cancel_all(tasks)
+
+    async def _run_query(self, events, section_idx, heading, q_idx, n_queries, query_info):
+        try:
+            return await self._fetch_query(events.put_nowait, section_idx, heading, q_idx, n_queries, query_info)
+        finally:
+            events.put_nowait(_QUERY_DONE)
+
+    async def _fetch_query(self, emit, section_idx, heading, q_idx, n_queries, query_info):
+        query = query_info["search"]
+        emit(self._activity('search', {'query': query, 'step_id': section_idx, 'displayMessage': f'Query {q_idx+1}/{n_queries}: Searching...'}))
+
+        # --- SEARCH ---
+        self._check_stop()
+        async with self._search_sem:
+            results_raw, search_images = await self._search(query_info)
+        self.stats["searches"] += 1
+
+        results = [r for r in results_raw if r.get('raw_content') or r.get('content')]
+        if not results:
+            emit(self._activity('status', {'message': f'No results for query: {query[:40]}...', 'icon': '⚠️'}))
+            return [], []
+
+        filtered_results = [{'title': r.get('title'), 'url': r.get('url'), 'snippet': r.get('content')} for r in results]
+        emit(self._activity('search_results', {'results': filtered_results, 'step_id': section_idx}))
+
+        # --- SELECT ---
+        selected = self._select(results)
+        emit(self._activity('status', {'message': f'Selected {len(selected)} sources from {len(results)} results.', 'step_id': section_idx, 'icon': '🎯'}))
+
+        # --- EXTRACT (concurrent) then STORE (in selection order) ---
+        buffer = _QueryBuffer(self.content_budget)
+        extracted_all = await _gather_ordered(
+            self._extract_one(emit, r.get('url', ''), section_idx, r.get('raw_content')) for r in selected
+        )
+        for i, (sel_result, extracted) in enumerate(zip(selected, extracted_all)):
+            if buffer.full:
+                emit(self._activity('status', {'message': f'Content budget reached for this query ({self.content_budget} tokens).', 'icon': '📊'}))
+                self.stats["discarded"] += len(selected) - i
+                break
+            sel_url = sel_result.get('url', '')
+            if extracted and len(extracted.strip()) > config.RESEARCH_EXTRACT_MIN_TAVILY_CONTENT:
+                stored = buffer.add(sel_url, sel_result.get('title'), extracted)
+                if stored is None:
+                    self.stats["discarded"] += len(selected) - i
+                    break
+                emit(self._activity('visit_complete', {'url': sel_url, 'chars': len(stored)}))
+            else:
+                emit(self._activity('status', {'message': f'Failed to extract content from {sel_url[:40]}...', 'icon': '⚠️'}))
+
+        # --- PROCESS SEARCH IMAGES (VLM) ---
+        image_results = []
+        if self._process_images and search_images:
+            async for packet in self._process_images(search_images, section_idx):
+                if packet["type"] == "activity":
+                    emit(packet["data"])
+                else:
+                    image_results.extend(packet["data"])
+
+        # --- DEEP MODE: Map top URLs for sub-pages ---
+        if self.deep and not buffer.full:
+            await self._fetch_mapped(emit, section_idx, heading, selected, buffer)
+
+        emit(self._activity('status', {'message': f'Query {q_idx+1} gathered {len(buffer.items)} items (~{buffer.tokens}k tokens).', 'icon': '💾'}))
+        return buffer.items, image_results
+
+    async def _fetch_mapped(self, emit, section_idx, heading, selected, buffer):
+        """Map the selected pages and store their sub-pages in plan order until the budget is spent.
+
+        Sources are mapped one map-semaphore-sized wave at a time; URLs already
+        stored or listed are skipped. No further wave is mapped once the
+        buffer is full.
+        """
+        seen = buffer.urls()
+        for start in range(0, len(selected), self._map_limit):
+            if buffer.full:
+                return
+            wave = selected[start:start + self._map_limit]
+            mapped_all = await _gather_ordered(self._map_one(emit, r.get('url', ''), section_idx, heading) for r in wave)
+
+            candidates = []
+            for sub_mapped in mapped_all:
+                for mapped_url in sub_mapped[:config.RESEARCH_DEEP_MAP_MAX_URLS]:
+                    if isinstance(mapped_url, dict):
+                        mapped_url = mapped_url.get('url', '')
+                    if mapped_url and mapped_url not in seen:
+                        seen.add(mapped_url)
+                        candidates.append(mapped_url)
+            if not await self._store_mapped(emit, section_idx, candidates, buffer):
+                return
+
+    async def _store_mapped(self, emit, section_idx, urls, buffer):
+        """Extract urls in extract-semaphore-sized waves and store them in order.
+
+        Returns False once the budget is spent; the rest of the current wave is
+        cancelled and later waves are never started.
+        """
+        for start in range(0, len(urls), self._extract_limit):
+            wave = urls[start:start + self._extract_limit]
+            tasks = [asyncio.ensure_future(self._extract_one(emit, url, section_idx)) for url in wave]
+            try:
+                for i, (mapped_url, task) in enumerate(zip(wave, tasks)):
+                    deep_extracted = await task
+                    if deep_extracted and len(deep_extracted.strip()) > config.RESEARCH_MAP_MIN_CONTENT:
+                        stored = buffer.add(mapped_url, None, deep_extracted)
+                        if stored is None:
+                            self.stats["discarded"] += len(wave) - i
+                            return False
+                        emit(self._activity('visit_complete', {'url': mapped_url, 'chars': len(stored)}))
+                    if buffer.full:
+                        self.stats["discarded"] += len(wave) - i - 1
+                        return False
+            finally:
+                await _cancel_all(tasks)
+        return True
+
+    async def _map_one(self, emit, url, section_idx, heading):
+        self._check_stop()
+        async with self._map_sem:
+            emit(self._activity('status', {'message': f'Deep mapping: {url[:40]}...', 'step_id': section_idx, 'icon': '🗺️'}))
+            mapped = await self._map_site(url, heading)
+        self.stats["maps"] += 1
+        return mapped or []
+
+    async def _extract_one(self, emit, url, step_id, raw_content=None):
+        self._check_stop()
+        async with self._extract_sem:
+            emit(self._activity('visit', {'url': url}))
+            extracted = None
+            async for packet in self._extract(url, step_id, raw_content):
+                if packet["type"] == "activity":
+                    emit(packet["data"])
+                else:
+                    _, extracted = packet["data"]
+        self.stats["extractions"] += 1
+        return extracted
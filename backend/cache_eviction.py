@@ -0,0 +1,145 @@
+"""
+Eviction policies for the cache layer (backend/cache_layer.py).
+
+CachedDatabase reports every cached entry to a policy - inserted with its
+approximate size, accessed, removed - and asks it for victims whenever an
+insert leaves the cache over budget. Policies are not thread-safe on their
+own; CachedDatabase serializes calls with its policy lock.
+
+- LRUSizePolicy: least recently used first, bounded by total bytes and/or
+  entry count. The default.
+- UnboundedPolicy: never evicts (the previous behaviour); sizes are still
+  tracked so get_stats can report them.
+
+Sizes come from approx_size(), a sampled estimate: exact sizing of a 10k
+message list would cost more than the cache hit saves.
+"""
+import sys
+from collections import OrderedDict
+from typing import Any, Hashable, Optional, Tuple
+
+_SAMPLE = 32       # Elements sized per container before extrapolating
+_MAX_DEPTH = 6     # Deeper nesting counts as its shallow size
+
+
+def approx_size(obj: Any, _depth: int = 0) -> int:
+    """Approximate deep size of obj in bytes.
+
+    Containers with more than _SAMPLE elements are sized from an evenly
+    spaced sample and scaled up, so the cost is bounded regardless of length.
+    """
+    size = sys.getsizeof(obj)
+    if _depth >= _MAX_DEPTH or isinstance(obj, (str, bytes, bytearray, int, float, bool, type(None))):
+        return size
+    if isinstance(obj, dict):
+        items = list(obj.items()) if len(obj) <= _SAMPLE else _sample(list(obj.items()))
+        inner = sum(approx_size(k, _depth + 1) + approx_size(v, _depth + 1) for k, v in items)
+        return size + _scale(inner, len(items), len(obj))
+    if isinstance(obj, (list, tuple, set, frozenset)):
+        seq = obj if isinstance(obj, (list, tuple)) else list(obj)
+        items = seq if len(seq) <= _SAMPLE else _sample(seq)
+        inner = sum(approx_size(item, _depth + 1) for item in items)
+        return size + _scale(inner, len(items), len(seq))
+    return size
+
+
+def _sample(seq):
+    step = len(seq) / _SAMPLE
+    return [seq[int(i * step)] for i in range(_SAMPLE)]
+
+
+def _scale(sampled_bytes, sampled, total):
+    return sampled_bytes if sampled == total or not sampled else int(sampled_bytes * total / sampled)
+
+
+class EvictionPolicy:
+    """Interface for cache eviction policies. Keys are (table, row_id) tuples."""
+
+    name = "base"
+
+    def insert(self, key: Hashable, size: int) -> None:
+        """Record a new or replaced entry of the given size."""
+        raise NotImplementedError
+
+    def access(self, key: Hashable) -> None:
+        """Record a cache hit."""
+        raise NotImplementedError
+
+    def remove(self, key: Hashable) -> None:
+        """Forget an entry removed by the cache (invalidation, expiry)."""
+        raise NotImplementedError
+
+    def pop_victim(self) -> Optional[Tuple[Hashable, int]]:
+        """Next (key, size) to evict while over budget, or None when within budget."""
+        raise NotImplementedError
+
+    def clear(self) -> None:
+        raise NotImplementedError
+
+    def __contains__(self, key: Hashable) -> bool:
+        raise NotImplementedError
+
+    def stats(self) -> dict:
+        raise NotImplementedError
+
+
+class LRUSizePolicy(EvictionPolicy):
+    """Evict least recently used entries beyond max_bytes or max_entries (0 = no limit)."""
+
+    name = "lru"
+
+    def __init__(self, max_bytes: int = 0, max_entries: int = 0):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._sizes: "OrderedDict[Hashable, int]" = OrderedDict()
+        self.bytes = 0
+
+    def insert(self, key, size):
+        old = self._sizes.pop(key, None)
+        if old is not None:
+            self.bytes -= old
+        self._sizes[key] = size
+        self.bytes += size
+
+    def access(self, key):
+        if key in self._sizes:
+            self._sizes.move_to_end(key)
+
+    def remove(self, key):
+        size = self._sizes.pop(key, None)
+        if size is not None:
+            self.bytes -= size
+
+    def _over_budget(self):
+        return ((self.max_bytes and self.bytes > self.max_bytes)
+                or (self.max_entries and len(self._sizes) > self.max_entries))
+
+    def pop_victim(self):
+        if not self._sizes or not self._over_budget():
+            return None
+        key, size = self._sizes.popitem(last=False)
+        self.bytes -= size
+        return key, size
+
+    def clear(self):
+        self._sizes.clear()
+        self.bytes = 0
+
+    def __contains__(self, key):
+        return key in self._sizes
+
+    def stats(self):
+        return {'policy': self.name, 'entries': len(self._sizes), 'bytes': self.bytes,
+                'max_bytes': self.max_bytes, 'max_entries': self.max_entries}
+
+
+class UnboundedPolicy(LRUSizePolicy):
+    """Track sizes but never evict."""
+
+    name = "unbounded"
+
+    def __init__(self):
+        super().__init__(0, 0)
+
+    def pop_victim(self):
+        return None
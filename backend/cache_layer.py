@@ -18,11 +18,41 @@ This module implements a sophisticated caching layer with these key features:
    - Reads wait for pending writes to complete
    - Reads wait for WAL checkpoint before accessing cache
    - Prevents reading stale data after writes
+   - Waits block on the row/table condition (notified on every counter
+     change) or on the in-flight fill, never on a polling interval
 
 4. Thread Safety:
-   - Lock hierarchy: _global_lock → table_state.lock → row.lock
+   - Lock hierarchy: _global_lock → table_state.lock → row.lock → _policy_lock
+   - _deps_lock is a leaf: nothing else is acquired while holding it
    - Never acquire locks in reverse order to prevent deadlocks
 
+5. Bounded Memory:
+   - Entries are accounted to an eviction policy (backend/cache_eviction.py,
+     LRU with a byte budget by default) and evicted when over budget
+   - Expired entries are dropped when read, not kept marked
+   - A row's RowState is pinned while an operation uses it and reclaimed
+     once the row is idle and uncached, so row_locks stays bounded too
+
+6. Single-Flight Fills:
+   - The first reader to miss a row registers a _Fill and fetches; readers
+     that miss while it runs wait on its event and share its result, so a
+     hot row invalidated under load is fetched once, not once per reader
+   - Invalidating a row detaches its in-flight fill: the fill still answers
+     the readers already waiting, but its result is not cached and later
+     readers start a fresh fetch
+   - A reader that gives up waiting (max_wait) takes over the row with its
+     own fill, detaching the slow one; only a fill still current when it
+     finishes is cached
+
+7. Dependency Tracking:
+   - Derived entries name the rows they are built from (get/set depends_on),
+     e.g. chats_full:<chat_id> depends on chats:<chat_id> and
+     messages:chat:<chat_id>; invalidating a base row also invalidates its
+     dependents, transitively, and leaves every other row cached
+   - Edges are registered when a read starts, so a derived fill in flight is
+     detached like any other, and dropped when the dependent's RowState is
+     reclaimed
+
 The Cache-Aside pattern is used because:
 1. Chat messages are written frequently (high write throughput needed)
 2. Readback after every write is too expensive (30-50ms per message)
@@ -39,7 +69,11 @@ This module logs all cache operations for debugging:
 import threading
 import time
 import logging
-from typing import Optional, Dict, Any, Callable, List
+from contextlib import contextmanager
+from typing import Optional, Dict, Any, Callable, Iterable, List, Set, Tuple
+
+from backend.cache_eviction import EvictionPolicy, LRUSizePolicy, approx_size
+from backend.config import CACHE_MAX_MB, CACHE_MAX_ENTRIES
 
 # Configure cache layer logging
 logger = logging.getLogger(__name__)
@@ -95,6 +129,22 @@ def _log_wal_flush(table: str, row_id: str = None, duration_ms: float = None):
         msg += f" duration_ms={duration_ms:.2f}"
     logger.debug(msg)
 
+class _Fill:
+    """
+    One in-flight fetch of a row (a minimal future).
+
+    Attributes:
+        done: Set when the fetch finished, successfully or not
+        ok: True if fetch_fn returned (data is valid)
+        data: fetch_fn's result
+    """
+    __slots__ = ('done', 'ok', 'data')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.ok: bool = False
+        self.data: Any = None
+
 class RowState:
     """
     Per-row state for locking and caching.
@@ -108,8 +158,10 @@ class RowState:
         wal_pending: Count of pending WAL flush operations
         write_condition: Condition variable for coordinating reads/writes
         invalidated: Flag marking entry for cache invalidation
+        users: Operations currently holding this state (it is never reclaimed while > 0)
+        fill: The in-flight fetch other readers should wait on, if any
     """
-    __slots__ = ('lock', 'pending_write', 'wal_pending', 'write_condition', 'invalidated')
+    __slots__ = ('lock', 'pending_write', 'wal_pending', 'write_condition', 'invalidated', 'users', 'fill')
 
     def __init__(self):
         self.lock = threading.Lock()
@@ -117,6 +169,8 @@ class RowState:
         self.wal_pending: int = 0    # Number of pending WAL flushes
         self.write_condition = threading.Condition()  # For reader/writer coordination
         self.invalidated: bool = False  # Cache entry marked for invalidation
+        self.users: int = 0  # Pins held by in-flight operations
+        self.fill: Optional[_Fill] = None  # Fetch in progress, shared by concurrent misses
 
 class TableState:
     """
@@ -156,7 +210,11 @@ class CachedDatabase:
     Lock Hierarchy (critical for avoiding deadlocks):
         1. _global_lock (acquired first)
         2. TableState.lock
-        3. RowState.lock (acquired last)
+        3. RowState.lock
+        4. _policy_lock (acquired last; guards the eviction policy)
+        _deps_lock is a leaf lock for the dependency graph; no other lock is
+        taken while it is held, and invalidation cascades after releasing
+        the base table's lock
 
     Operations:
         - Single-row reads: Uses row-level locking for maximum concurrency
@@ -168,12 +226,25 @@ class CachedDatabase:
         cache = CachedDatabase()
         cache.register_flush_callback("chats", flush_wal_callback)
         data = cache.get("chats", "chat-123", fetch_fn)
+
+    Args:
+        policy: Eviction policy for all tables; defaults to LRU bounded by
+            CACHE_MAX_MB / CACHE_MAX_ENTRIES
     """
 
-    def __init__(self):
+    def __init__(self, policy: Optional[EvictionPolicy] = None):
         self._tables: Dict[str, TableState] = {}  # Table name -> TableState
         self._global_lock = threading.Lock()  # Protects _tables dictionary
         self._db_flush_callbacks: Dict[str, Callable] = {}  # Table -> WAL flush callback
+        self._policy = policy or LRUSizePolicy(max_bytes=int(CACHE_MAX_MB * 1024 * 1024),
+                                               max_entries=CACHE_MAX_ENTRIES)
+        self._policy_lock = threading.Lock()  # Innermost lock; guards the policy and counters
+        self._counters = {'evictions': 0, 'evicted_bytes': 0, 'expired': 0, 'row_locks_reclaimed': 0,
+                          'coalesced_reads': 0, 'cascaded_invalidations': 0}
+        # Dependency graph between (table, row_id) keys: base -> dependents, dependent -> bases
+        self._dependents: Dict[Tuple[str, str], Set[Tuple[str, str]]] = {}
+        self._bases: Dict[Tuple[str, str], Set[Tuple[str, str]]] = {}
+        self._deps_lock = threading.Lock()
 
     def _get_table(self, table: str) -> TableState:
         """
@@ -195,27 +266,137 @@ class CachedDatabase:
                 _log_cache_op("CREATE_TABLE", table)
             return self._tables[table]
 
-    def _get_row(self, table: str, row_id: str) -> RowState:
-        """
-        Get or create row state (thread-safe, upfront initialization).
+    def _peek_row(self, table: str, row_id: str) -> Optional[RowState]:
+        """Existing row state, or None - unlike _get_row, never creates one."""
+        table_state = self._get_table(table)
+        with table_state.lock:
+            return table_state.row_locks.get(row_id)
 
-        This method is called during initialization and allocates row-level
-        locks when first accessed. The row state is created once and reused.
+    @contextmanager
+    def _using_row(self, table: str, row_id: str):
+        """
+        Pin a row's state for the duration of an operation.
 
-        Args:
-            table: Table name
-            row_id: Row identifier
+        A pinned RowState cannot be reclaimed, so every thread working on the
+        row shares the same locks and conditions. On exit the state is
+        reclaimed if nothing else uses it and the row is not cached.
 
-        Returns:
-            RowState: The row state object for this row
+        Yields:
+            (TableState, RowState)
         """
-        _log_cache_op("GET_ROW", table, row_id)
         table_state = self._get_table(table)
         with table_state.lock:
-            if row_id not in table_state.row_locks:
-                table_state.row_locks[row_id] = RowState()
-                _log_cache_op("CREATE_ROW", table, row_id)
-            return table_state.row_locks[row_id]
+            row = table_state.row_locks.get(row_id)
+            if row is None:
+                row = table_state.row_locks[row_id] = RowState()
+            row.users += 1
+        try:
+            yield table_state, row
+        finally:
+            with table_state.lock:
+                row.users -= 1
+                self._reclaim_row(table_state, row_id)
+
+    def _reclaim_row(self, table_state: TableState, row_id: str) -> None:
+        """Drop an idle, uncached row's state. Caller holds table_state.lock."""
+        row = table_state.row_locks.get(row_id)
+        if (row is not None and row.users == 0 and row.pending_write == 0
+                and row.wal_pending == 0 and row_id not in table_state.cache):
+            del table_state.row_locks[row_id]
+            with self._policy_lock:
+                self._counters['row_locks_reclaimed'] += 1
+            self._drop_dependency_edges((table_state.table, row_id))
+
+    def _store(self, table_state: TableState, row_id: str, data: Any,
+               ttl: Optional[int], size: int) -> None:
+        """Insert or replace a cache entry and account for it. Caller holds table_state.lock."""
+        now = time.time()
+        table_state.cache[row_id] = {
+            'data': data,
+            'ttl': now + ttl if ttl else None,
+            'updated': now,
+            'invalidated': False
+        }
+        with self._policy_lock:
+            self._policy.insert((table_state.table, row_id), size)
+
+    def _discard(self, table_state: TableState, row_id: str) -> bool:
+        """Remove a cache entry and its accounting. Caller holds table_state.lock."""
+        removed = table_state.cache.pop(row_id, None) is not None
+        self._detach_fill(table_state, row_id)
+        with self._policy_lock:
+            self._policy.remove((table_state.table, row_id))
+        self._reclaim_row(table_state, row_id)
+        return removed
+
+    def _detach_fill(self, table_state: TableState, row_id: str) -> None:
+        """Stop an in-flight fill from being cached or joined. Caller holds table_state.lock."""
+        row = table_state.row_locks.get(row_id)
+        if row is not None:
+            row.fill = None
+
+    def _add_dependencies(self, key: Tuple[str, str], bases: Iterable[Tuple[str, str]]) -> None:
+        """Record that the entry at key is derived from each (table, row_id) in bases."""
+        with self._deps_lock:
+            for base in bases:
+                base = (base[0], str(base[1]))
+                self._dependents.setdefault(base, set()).add(key)
+                self._bases.setdefault(key, set()).add(base)
+
+    def _drop_dependency_edges(self, key: Tuple[str, str]) -> None:
+        """Forget key's own dependencies (its dependents are kept)."""
+        with self._deps_lock:
+            for base in self._bases.pop(key, ()):
+                dependents = self._dependents.get(base)
+                if dependents is not None:
+                    dependents.discard(key)
+                    if not dependents:
+                        del self._dependents[base]
+
+    def _dependency_bases(self, table: str, predicate: Optional[Callable[[str], bool]] = None):
+        """Keys of table (matching predicate) that have dependents."""
+        with self._deps_lock:
+            return [key for key in self._dependents
+                    if key[0] == table and (predicate is None or predicate(key[1]))]
+
+    def _invalidate_dependents(self, keys: Iterable[Tuple[str, str]]) -> None:
+        """Invalidate everything derived from keys, transitively. Call with no locks held."""
+        seen = set(keys)
+        with self._deps_lock:
+            pending = [dep for key in seen for dep in self._dependents.get(key, ())]
+        while pending:
+            dep = pending.pop()
+            if dep in seen:
+                continue
+            seen.add(dep)
+            table, row_id = dep
+            state = self._get_table(table)
+            with state.lock:
+                self._discard(state, row_id)
+            with self._policy_lock:
+                self._counters['cascaded_invalidations'] += 1
+            _log_cache_invalidate(table, row_id, "dependency")
+            with self._deps_lock:
+                pending.extend(self._dependents.get(dep, ()))
+
+    def _enforce_budget(self) -> None:
+        """Evict policy victims until the cache is within budget. Call with no locks held."""
+        while True:
+            with self._policy_lock:
+                victim = self._policy.pop_victim()
+            if victim is None:
+                return
+            (table, row_id), size = victim
+            table_state = self._get_table(table)
+            with table_state.lock:
+                with self._policy_lock:
+                    if (table, row_id) in self._policy:
+                        continue  # Re-inserted since it was picked; it is now most recent
+                    self._counters['evictions'] += 1
+                    self._counters['evicted_bytes'] += size
+                table_state.cache.pop(row_id, None)
+                self._reclaim_row(table_state, row_id)
+            _log_cache_op("EVICT", table, row_id, f"bytes={size}")
 
     def _is_row_write_pending(self, table: str, row_id: str) -> bool:
         """
@@ -228,8 +409,8 @@ class CachedDatabase:
         Returns:
             bool: True if write is pending, False otherwise
         """
-        row = self._get_row(table, row_id)
-        return row.pending_write > 0
+        row = self._peek_row(table, row_id)
+        return row is not None and row.pending_write > 0
 
     def _is_row_wal_pending(self, table: str, row_id: str) -> bool:
         """
@@ -242,8 +423,8 @@ class CachedDatabase:
         Returns:
             bool: True if WAL flush is pending, False otherwise
         """
-        row = self._get_row(table, row_id)
-        return row.wal_pending > 0
+        row = self._peek_row(table, row_id)
+        return row is not None and row.wal_pending > 0
 
     def _is_table_write_pending(self, table: str) -> bool:
         """
@@ -271,6 +452,42 @@ class CachedDatabase:
         state = self._get_table(table)
         return state.wal_pending > 0
 
+    def wait_for_row_wal(self, table: str, row_id: str, timeout: float) -> bool:
+        """
+        Block until no WAL flush is pending for this row.
+
+        Wakes as soon as the flush finishes (_flush_row_wal notifies the
+        row's condition) rather than on a polling interval.
+
+        Args:
+            table: Table name
+            row_id: Row identifier
+            timeout: Maximum wait in seconds
+
+        Returns:
+            bool: True if no flush is pending, False on timeout
+        """
+        row = self._peek_row(table, row_id)
+        if row is None:
+            return True
+        with row.write_condition:
+            return row.write_condition.wait_for(lambda: row.wal_pending == 0, timeout=timeout)
+
+    def wait_for_table_wal(self, table: str, timeout: float) -> bool:
+        """
+        Block until no table-level WAL flush is pending.
+
+        Args:
+            table: Table name
+            timeout: Maximum wait in seconds
+
+        Returns:
+            bool: True if no flush is pending, False on timeout
+        """
+        state = self._get_table(table)
+        with state.write_condition:
+            return state.write_condition.wait_for(lambda: state.wal_pending == 0, timeout=timeout)
+
     def register_flush_callback(self, table: str, callback: Callable[[], None]) -> None:
         """
         Register callback to flush WAL for a table.
@@ -291,7 +508,8 @@ class CachedDatabase:
     # ==================== SINGLE-ROW READ (Row-Level) ====================
 
     def get(self, table: str, row_id: str, fetch_fn: Callable[[], Any],
-            ttl: Optional[int] = None, max_wait: float = 10.0) -> Any:
+            ttl: Optional[int] = None, max_wait: float = 10.0,
+            depends_on: Optional[Iterable[Tuple[str, str]]] = None) -> Any:
         """
         Cache-aside read with two-level blocking (row-level).
 
@@ -311,6 +529,8 @@ class CachedDatabase:
             fetch_fn: Callback function to fetch data from DB on cache miss
             ttl: Optional TTL in seconds for cache entry
             max_wait: Maximum wait time in seconds for blocking operations
+            depends_on: (table, row_id) pairs this entry is derived from;
+                invalidating any of them also invalidates this entry
 
         Returns:
             Cached or fetched data, or None if fetch_fn returns None
@@ -325,14 +545,24 @@ class CachedDatabase:
         """
         _log_cache_op("GET_START", table, row_id)
         start_time = time.time()
-        row = self._get_row(table, row_id)
-        table_state = self._get_table(table)
+        with self._using_row(table, row_id) as (table_state, row):
+            if depends_on:
+                # Registered before the fetch so a base write during it detaches the fill
+                self._add_dependencies((table, row_id), depends_on)
+            data = self._get_pinned(table, row_id, fetch_fn, ttl, max_wait,
+                                    table_state, row, start_time)
+        self._enforce_budget()
+        return data
 
+    def _get_pinned(self, table: str, row_id: str, fetch_fn: Callable[[], Any],
+                    ttl: Optional[int], max_wait: float, table_state: TableState,
+                    row: RowState, start_time: float) -> Any:
+        """Body of get() while the row's state is pinned."""
         # Level 1: Wait for row writes to complete (blocks until write finishes)
         wait_start = time.time()
+        deadline = wait_start + max_wait
         with row.write_condition:
-            while row.pending_write > 0 and (time.time() - wait_start) < max_wait:
-                row.write_condition.wait(timeout=0.1)
+            row.write_condition.wait_for(lambda: row.pending_write == 0, timeout=max_wait)
         wait1_ms = (time.time() - wait_start) * 1000
         if wait1_ms > 100:
             _log_lock_wait("WRITE", table, row_id, wait1_ms, max_wait)
@@ -340,66 +570,79 @@ class CachedDatabase:
         # Level 2: Wait for WAL checkpoint (consistency) - MUST come before cache check
         # This ensures that if a write was committed, its WAL is flushed before we read
         with row.write_condition:
-            while row.wal_pending > 0 and (time.time() - wait_start) < max_wait:
-                row.write_condition.wait(timeout=0.1)
+            row.write_condition.wait_for(lambda: row.wal_pending == 0,
+                                         timeout=max(0.0, deadline - time.time()))
         wait2_ms = (time.time() - wait_start) * 1000
         total_wait_ms = wait1_ms + wait2_ms
         if total_wait_ms > 100:
             _log_lock_wait("WAL", table, row_id, total_wait_ms, max_wait)
 
-        # Check cache (safe now - WAL flushed)
-        entry = None
-        invalidated = False
-        cache_hit = False
-        with table_state.lock:
-            with row.lock:
-                if row_id in table_state.cache:
-                    entry = table_state.cache[row_id]
-                    # Check if entry was marked for invalidation
-                    if entry.get('invalidated'):
-                        invalidated = True
-                        # Clear the invalidated flag for future reads
-                        entry['invalidated'] = False
-                    else:
-                        cache_hit = True
-
-        # Check TTL and invalidation
-        if entry:
-            if invalidated:
-                _log_cache_op("CACHE_INVALIDATED", table, row_id)
-                # Entry was invalidated, fetch fresh data
-            elif entry.get('ttl') is None or time.time() < entry['ttl']:
-                # Return cached data if not expired
-                data = entry['data']
-                if data is not None:
-                    duration_ms = (time.time() - start_time) * 1000
-                    data_len = len(str(data)) if isinstance(data, (str, list, dict)) else 0
-                    _log_cache_read("HIT", table, row_id, duration_ms, data_len)
-                    return data
-            # else: entry expired, continue to fetch
+        while True:
+            # Check cache (safe now - WAL flushed); on a miss, join or start the fill
+            with table_state.lock:
+                with row.lock:
+                    entry = table_state.cache.get(row_id)
+                    if entry is not None:
+                        if entry.get('invalidated'):
+                            # Entry was invalidated, fetch fresh data
+                            _log_cache_op("CACHE_INVALIDATED", table, row_id)
+                        elif entry.get('ttl') is not None and time.time() >= entry['ttl']:
+                            # Expired: drop it rather than keeping a dead entry around
+                            self._discard(table_state, row_id)
+                            with self._policy_lock:
+                                self._counters['expired'] += 1
+                        elif entry['data'] is not None:
+                            data = entry['data']
+                            with self._policy_lock:
+                                self._policy.access((table, row_id))
+                            # str() of a long message list costs milliseconds; only pay it when debugging
+                            if logger.isEnabledFor(logging.DEBUG):
+                                duration_ms = (time.time() - start_time) * 1000
+                                data_len = len(str(data)) if isinstance(data, (str, list, dict)) else 0
+                                _log_cache_read("HIT", table, row_id, duration_ms, data_len)
+                            return data
+                    fill = row.fill
+                    if fill is None or time.time() >= deadline:
+                        # Past the deadline we stop waiting on the slow fill and take over:
+                        # it is detached like an invalidated one, so only our result is stored
+                        fill = _Fill()
+                        row.fill = fill
+                        break
+
+            # Another reader is fetching this row: wait for its result instead of fetching too
+            with self._policy_lock:
+                self._counters['coalesced_reads'] += 1
+            if fill.done.wait(max(0.0, deadline - time.time())) and fill.ok:
+                _log_cache_read("COALESCED", table, row_id, (time.time() - start_time) * 1000)
+                return fill.data
+            # The fill failed or we timed out: go round and fetch ourselves
 
         # Cache miss or invalidated - fetch from DB
         _log_cache_op("CACHE_MISS", table, row_id)
-        fetch_start = time.time()
-        data = fetch_fn()
-        fetch_duration_ms = (time.time() - fetch_start) * 1000
-        data_len = len(str(data)) if data is not None else 0
-
-        # Update cache (only if data is not None)
-        # Note: We don't set invalidated=False here because the entry might have been invalidated
-        if data is not None:
+        try:
+            data = fetch_fn()
+            fill.data, fill.ok = data, True
+        finally:
             with table_state.lock:
-                with row.lock:
-                    table_state.cache[row_id] = {
-                        'data': data,
-                        'ttl': time.time() + ttl if ttl else None,
-                        'updated': time.time(),
-                        'invalidated': False  # Fresh data is not invalidated
-                    }
+                # Invalidation detaches the fill; its result is then stale and not cached
+                current = row.fill is fill
+                if current:
+                    row.fill = None
+                if fill.ok and fill.data is not None and current:
+                    with row.lock:
+                        self._store(table_state, row_id, fill.data, ttl, approx_size(fill.data))
+                    stored = True
+                else:
+                    stored = False
+            fill.done.set()
+        data_len = len(str(data)) if data is not None and logger.isEnabledFor(logging.DEBUG) else 0
+
+        if stored:
             _log_cache_write(table, row_id)
             _log_cache_op("CACHE_POPULATED", table, row_id)
         else:
-            _log_cache_op("CACHE_SKIPPED", table, row_id, "data is None")
+            _log_cache_op("CACHE_SKIPPED", table, row_id,
+                          "data is None" if data is None else "invalidated during fetch")
 
         duration_ms = (time.time() - start_time) * 1000
         _log_cache_read("MISS", table, row_id, duration_ms, data_len)
@@ -435,16 +678,15 @@ class CachedDatabase:
         # Wait for table-level writes
         wait_start = time.time()
         with state.write_condition:
-            while state.pending_writes > 0 and (time.time() - wait_start) < max_wait:
-                state.write_condition.wait(timeout=0.1)
+            state.write_condition.wait_for(lambda: state.pending_writes == 0, timeout=max_wait)
         wait1_ms = (time.time() - wait_start) * 1000
         if wait1_ms > 100:
             _log_lock_wait("TABLE_WRITE", table, None, wait1_ms, max_wait)
 
         # Wait for WAL checkpoint (consistency)
         with state.write_condition:
-            while state.wal_pending > 0 and (time.time() - wait_start) < max_wait:
-                state.write_condition.wait(timeout=0.1)
+            state.write_condition.wait_for(lambda: state.wal_pending == 0,
+                                           timeout=max(0.0, wait_start + max_wait - time.time()))
         wait2_ms = (time.time() - wait_start) * 1000
         total_wait_ms = wait1_ms + wait2_ms
         if total_wait_ms > 100:
@@ -459,20 +701,80 @@ class CachedDatabase:
         # Update cache for each result
         for item in results:
             row_id = key_extractor(item) if key_extractor else str(id(item))
+            size = approx_size(item)
             with state.lock:
-                state.cache[row_id] = {
-                    'data': item,
-                    'ttl': time.time() + ttl if ttl else None,
-                    'updated': time.time(),
-                    'invalidated': False
-                }
+                self._store(state, row_id, item, ttl, size)
                 _log_cache_write(table, row_id)
+        self._enforce_budget()
 
         duration_ms = (time.time() - start_time) * 1000
         _log_cache_op("GET_TABLE_COMPLETE", table, f"count={result_count} duration_ms={duration_ms:.2f}")
 
         return results
 
+    # ==================== TARGETED UPDATES ====================
+
+    def set(self, table: str, row_id: str, data: Any, ttl: Optional[int] = None,
+            depends_on: Optional[Iterable[Tuple[str, str]]] = None) -> None:
+        """
+        Store a value the caller knows to be current (write-through).
+
+        Used after a write whose exact resulting row is known, so the next
+        read is a hit instead of a refetch.
+
+        Args:
+            table: Table name
+            row_id: Row identifier
+            data: The row's current value
+            ttl: Optional TTL in seconds for the entry
+            depends_on: (table, row_id) pairs this entry is derived from
+
+        Replacing a value does not invalidate its dependents; callers that
+        know the derived values patch them with update(). A fill in flight
+        for the row read the database before this write, so it is detached
+        and cannot overwrite the value stored here.
+        """
+        size = approx_size(data)
+        with self._using_row(table, row_id) as (state, row):
+            if depends_on:
+                self._add_dependencies((table, row_id), depends_on)
+            with state.lock:
+                row.fill = None
+                with row.lock:
+                    self._store(state, row_id, data, ttl, size)
+        _log_cache_write(table, row_id)
+        self._enforce_budget()
+
+    def update(self, table: str, row_id: str, update_fn: Callable[[Any], Any]) -> bool:
+        """
+        Apply update_fn to a cached row in place, keeping its TTL.
+
+        Rows that are not cached (or are invalidated/expired) are left alone;
+        the next read fetches them from the database.
+
+        Args:
+            table: Table name
+            row_id: Row identifier
+            update_fn: Function mapping the cached value to its new value
+
+        Returns:
+            bool: True if a cached entry was updated
+        """
+        state = self._get_table(table)
+        with state.lock:
+            entry = state.cache.get(row_id)
+            if (not entry or entry.get('invalidated') or entry.get('data') is None
+                    or (entry.get('ttl') is not None and time.time() >= entry['ttl'])):
+                return False
+            entry['data'] = update_fn(entry['data'])
+            entry['updated'] = time.time()
+            size = approx_size(entry['data'])
+            with self._policy_lock:
+                self._policy.insert((table, row_id), size)
+        _log_cache_write(table, row_id)
+        self._enforce_budget()
+        return True
+
     # ==================== INVALIDATION ====================
 
     def invalidate(self, table: str, row_id: Optional[str] = None) -> None:
@@ -491,15 +793,48 @@ class CachedDatabase:
         state = self._get_table(table)
         with state.lock:
             if row_id:
-                if row_id in state.cache:
-                    del state.cache[row_id]
+                if self._discard(state, row_id):
                     _log_cache_op("INVALIDATE_ROW", table, row_id)
                 else:
                     _log_cache_op("INVALIDATE_ROW_NOT_FOUND", table, row_id)
             else:
                 if state.cache:
                     _log_cache_op("INVALIDATE_TABLE", table, f"cleared={len(state.cache)} entries")
-                state.cache.clear()
+                for cached_id in list(state.cache):
+                    self._discard(state, cached_id)
+                for row in state.row_locks.values():
+                    row.fill = None
+        if row_id:
+            self._invalidate_dependents([(table, row_id)])
+        else:
+            self._invalidate_dependents(self._dependency_bases(table))
+
+    def invalidate_where(self, table: str, predicate: Callable[[str], bool]) -> int:
+        """
+        Invalidate every cached row whose row_id satisfies predicate.
+
+        For families of keys derived from one record - e.g. the page windows
+        of one chat's messages - that a single write can make stale.
+
+        Args:
+            table: Table name
+            predicate: Function of row_id; True marks the entry stale
+
+        Returns:
+            int: Number of entries removed
+        """
+        state = self._get_table(table)
+        with state.lock:
+            stale = [row_id for row_id in state.cache if predicate(row_id)]
+            for row_id in stale:
+                self._discard(state, row_id)
+            for row_id, row in state.row_locks.items():
+                if row.fill is not None and predicate(row_id):
+                    row.fill = None
+        self._invalidate_dependents(self._dependency_bases(table, predicate))
+        if stale:
+            _log_cache_invalidate(table, None, f"invalidate_where removed={len(stale)}")
+        return len(stale)
 
     def invalidate_with_ttl(self, table: str, row_id: str, ttl: int = 300) -> None:
         """
@@ -517,14 +852,18 @@ class CachedDatabase:
         _log_cache_invalidate(table, row_id, f"invalidated_with_ttl_{ttl}s")
         state = self._get_table(table)
         with state.lock:
+            self._detach_fill(state, row_id)
             if row_id in state.cache:
                 state.cache[row_id]['invalidated'] = True
                 state.cache[row_id]['data'] = None
                 # Keep the TTL to auto-clear after expiration
                 state.cache[row_id]['ttl'] = time.time() + ttl
+                with self._policy_lock:
+                    self._policy.insert((table, row_id), approx_size(state.cache[row_id]))
                 _log_cache_op("INVALIDATE_WITH_TTL_SET", table, row_id)
             else:
                 _log_cache_op("INVALIDATE_WITH_TTL_NOT_FOUND", table, row_id)
+        self._invalidate_dependents([(table, row_id)])
 
     # ==================== UTILITIES ====================
 
@@ -614,6 +953,11 @@ class CachedDatabase:
         with self._global_lock:
             old_tables = len(self._tables)
             self._tables = {}
+            with self._policy_lock:
+                self._policy.clear()
+            with self._deps_lock:
+                self._dependents.clear()
+                self._bases.clear()
         _log_cache_op("CLEAR_CACHE_DONE", None, None, f"cleared={old_tables} tables")
 
     def get_stats(self) -> Dict[str, Any]:
@@ -626,6 +970,14 @@ class CachedDatabase:
                 - total_rows: Total cached rows across all tables
                 - rows_with_pending_writes: Rows currently waiting on writes
                 - tables_with_pending_writes: Tables with pending writes
+                - row_locks: RowStates currently allocated
+                - eviction: policy name, accounted bytes/entries and limits
+                - evictions, evicted_bytes: Entries removed to stay within budget
+                - expired: Expired entries dropped on read
+                - row_locks_reclaimed: RowStates freed after their row went idle
+                - coalesced_reads: Misses served by another reader's in-flight fetch
+                - dependency_edges: Registered derived-from edges
+                - cascaded_invalidations: Entries invalidated because a base row was invalidated
         """
         _log_cache_op("GET_STATS", None, None)
         with self._global_lock:
@@ -638,8 +990,14 @@ class CachedDatabase:
                 ),
                 'tables_with_pending_writes': [
                     t for t, s in self._tables.items() if s.pending_writes > 0
-                ]
+                ],
+                'row_locks': sum(len(s.row_locks) for s in self._tables.values()),
             }
+            with self._policy_lock:
+                stats['eviction'] = self._policy.stats()
+                stats.update(self._counters)
+            with self._deps_lock:
+                stats['dependency_edges'] = sum(len(bases) for bases in self._bases.values())
             _log_cache_op("GET_STATS_RESULT", None, None, f"tables={stats['tables']} total_rows={stats['total_rows']}")
             return stats
 
@@ -7,7 +7,9 @@ This module implements a dual-layer caching system for active chat sessions:
    active conversations. Each chat has its own buffer with thread-safe locking.
 
 2. Write-Ahead Log (WAL): A durability mechanism that writes chunks to disk
-   immediately. The WAL serves two purposes:
+   through a group-commit writer (backend/wal_writer.py): one open handle
+   per active chat, chunks committed in batches every few milliseconds.
+   The WAL serves two purposes:
    - Recovery: After a server restart, incomplete chats can be recovered
    -Streaming: Multiple subscribers can read from the same chat session
 
@@ -20,7 +22,7 @@ Architecture:
 Thread Safety:
 - Global lock protects the cache dictionary
 - Per-chat locks protect individual chat buffers and subscriber lists
-- WAL writes are synchronous but non-blocking for cache operations
+- WAL writes are buffered per chat and committed outside the chat lock
 
 Usage Pattern:
 1. initialize_chat(chat_id) - Start a new chat session
@@ -40,6 +42,7 @@ import time
 from backend.logger import log_event
 from backend import config
 from backend.db_wrapper import db
+from backend.wal_writer import wal_writer
 
 # WAL Directory - Stores Write-Ahead Log files for chat recovery
 CACHE_DIR = os.path.join(config.DATA_DIR, "cache")
@@ -123,7 +126,8 @@ class ResponseCache:
                 # Handle WAL file initialization
                 wal_path = self._get_wal_path(chat_id)
                 if overwrite:
-                    # Clear old WAL if exists
+                    # Clear old WAL if exists (dropping any handle still open on it)
+                    wal_writer.discard(chat_id)
                     with open(wal_path, "w") as f:
                         f.write("")
                 elif os.path.exists(wal_path):
@@ -160,10 +164,11 @@ class ResponseCache:
                 except queue.Full:
                     pass
 
-        # Step 3: Write to WAL (durability - disk I/O)
+        # Step 3: Write to WAL (durability - buffered group commit).
+        # Terminal markers commit immediately so a finished stream is on disk.
         try:
-            with open(self._get_wal_path(chat_id), "a") as f:
-                f.write(json.dumps(entry) + "\n")
+            wal_writer.append(chat_id, self._get_wal_path(chat_id), json.dumps(entry),
+                              flush=chunk_data in ("[[DONE]]", "[[ERROR]]"))
         except Exception as e:
             log_event("wal_write_error", {"chat_id": chat_id, "error": str(e)})
 
@@ -279,12 +284,22 @@ class ResponseCache:
 
         WAL Format:
             Each line is a JSON object: {"timestamp": float, "data": chunk_data}
-            Lines are appended as chunks arrive (append_chunk)
+            Lines are appended in groups as chunks arrive (append_chunk)
+
+        A crash can leave a truncated last line. It is trimmed before replay
+        so only complete entries are recovered and further appends to a
+        resumed chat start on a fresh line.
         """
         wal_path = self._get_wal_path(chat_id)
         if not os.path.exists(wal_path):
             return
 
+        # Anything still buffered in this process belongs in the replay
+        wal_writer.flush(chat_id)
+        trimmed = wal_writer.repair_tail(wal_path)
+        if trimmed:
+            log_event("wal_tail_repaired", {"chat_id": chat_id, "bytes_trimmed": trimmed})
+
         chunks = []
         try:
             with open(wal_path, "r") as f:
@@ -409,6 +424,7 @@ class ResponseCache:
                 del self._cache[chat_id]
 
         try:
+            wal_writer.discard(chat_id)
             wal_path = self._get_wal_path(chat_id)
             if os.path.exists(wal_path):
                 os.remove(wal_path)
@@ -418,4 +434,38 @@ class ResponseCache:
     def is_active(self, chat_id):
         return chat_id in self._cache
 
+    def update_queue_status(self, chat_id, position, kind="chat"):
+        """
+        Record a chat's position in the task scheduler queue and notify subscribers.
+
+        The status is streamed as an internal SSE chunk so the UI can show
+        "queued" while waiting; mark_completed() skips it when aggregating.
+        Position 0 means the task has been picked up by a worker.
+
+        Args:
+            chat_id: The chat session waiting for a worker
+            position: 1-based queue position, or 0 once started
+            kind: Task kind ("chat" or "research")
+        """
+        if chat_id not in self._cache:
+            return
+        with self._cache[chat_id]['lock']:
+            if self._cache[chat_id].get('queue_position', 0) == position:
+                return
+            self._cache[chat_id]['queue_position'] = position
+        payload = {"__queue_status__": {"position": position, "kind": kind}, "internal": True}
+        self.append_chunk(chat_id, f"data: {json.dumps(payload)}\n\n")
+
+    def get_queue_position(self, chat_id):
+        """
+        Get a chat's last reported queue position.
+
+        Returns:
+            int: 1-based position while queued, 0 if running or unknown
+        """
+        entry = self._cache.get(chat_id)
+        if entry is None:
+            return 0
+        return entry.get('queue_position', 0)
+
 cache_system = ResponseCache()
@@ -8,9 +8,12 @@ This module provides:
 - Hybrid chunking for mixed content
 """
 import re
+import bisect
 from typing import Tuple, List, Dict, Optional
 
-from backend.token_counter import count_tokens, split_text_by_tokens
+from backend.token_counter import (
+    count_tokens, count_tokens_batch, split_text_by_tokens
+)
 from backend import config
 
 
@@ -27,6 +30,10 @@ def detect_file_type(filename: str, content: str) -> Tuple[str, dict]:
     3. Document - Natural language patterns
     4. Mixed - Both code and document patterns found
 
+    Code and document scores come from one tokenizing pass over a bounded
+    sample of the content (see _classifier_windows), so classification cost
+    does not grow with upload size.
+
     Args:
         filename: Original filename (used for extension hint)
         content: File content to analyze
@@ -43,11 +50,10 @@ def detect_file_type(filename: str, content: str) -> Tuple[str, dict]:
     if _is_spreadsheet_pattern(content):
         return 'spreadsheet', _analyze_spreadsheet(content)
 
-    # 2. Check for code patterns
-    code_score, code_info = _analyze_code_content(content)
-
-    # 3. Check for document patterns
-    doc_score = _analyze_document_content(content)
+    # 2./3. Count code and document features in a single pass
+    features = _classifier_features(content)
+    code_score, code_info = _code_score(features)
+    doc_score = _document_score(features)
 
     # 4. Determine final type based on scores (Optimized via Grid Search)
     CODE_THRESHOLD = config.CLASSIFIER_CODE_THRESHOLD
@@ -69,18 +75,30 @@ def detect_file_type(filename: str, content: str) -> Tuple[str, dict]:
 
 def _is_spreadsheet_pattern(content: str) -> bool:
     """Check if content looks like CSV/Excel data."""
-    lines = content.strip().split('\n')
+    # Only the first 20 lines are inspected; walk to them instead of
+    # stripping and splitting the whole upload
+    first = _NON_SPACE_RE.search(content)
+    if first is None:
+        return False
+    lines, pos = [], first.start()
+    while len(lines) < 20:
+        end = content.find('\n', pos)
+        if end == -1:
+            lines.append(content[pos:])
+            break
+        lines.append(content[pos:end])
+        pos = end + 1
     if len(lines) < 2:
         return False
 
     # Check for consistent column counts (CSV pattern)
     column_counts = []
-    for line in lines[:20]:  # Check first 20 lines
+    for line in lines:
         # Skip empty lines
         if not line.strip():
             continue
         # Count columns by comma
-        cols = len(line.split(','))
+        cols = line.count(',') + 1
         column_counts.append(cols)
 
     if len(column_counts) < 2:
@@ -125,128 +143,204 @@ def _analyze_spreadsheet(content: str) -> dict:
     }
 
 
-def _analyze_code_content(content: str) -> Tuple[float, dict]:
-    """Analyze text for code-like patterns.
-
-    Returns: (code_score, info_dict)
-    Uses raw weighted count without normalization for consistent scoring.
+# -----------------------------------------------------------------------------
+# Classifier engine
+#
+# Code and document features are counted together in one tokenizing pass:
+# every word and punctuation character is visited once and checked against
+# the keyword sets below. The counts equal the per-pattern regex counts this
+# replaced, for example word-boundary matching, IGNORECASE and matches that
+# consume a following keyword. Large uploads are scored on a fixed number of
+# line-aligned windows.
+# -----------------------------------------------------------------------------
+
+# (feature, weight) for the code score
+_CODE_FEATURE_WEIGHTS = {
+    'function_def': 3.0,      # def|func|function|pub fn|sub|private|public <name>
+    'type_annotation': 2.0,   # : int, : String, ...
+    'import_stmt': 2.0,       # import|include|using|require|from
+    'control_flow': 1.5,      # if|else|elif|for|while|switch|case|when
+    'syntax_markers': 1.0,    # {}()[];:=<>
+    'class_def': 2.5,         # class|struct|interface|trait|enum <name>
+    'decorator': 2.0,         # @name(
+    'arrow_func': 2.0,        # =>
+    'typed_assignment': 1.5,  # var|let|const|val <name> = / :
+    'return_stmt': 1.0,       # return
+}
+
+_FUNCTION_KEYWORDS = frozenset({'def', 'func', 'function', 'sub', 'private', 'public'})
+_CLASS_KEYWORDS = frozenset({'class', 'struct', 'interface', 'trait', 'enum'})
+_IMPORT_KEYWORDS = frozenset({'import', 'include', 'using', 'require', 'from'})
+_CONTROL_KEYWORDS = frozenset({'if', 'else', 'elif', 'for', 'while', 'switch', 'case', 'when'})
+# Matched as word suffixes: the original pattern had no leading \b
+_ASSIGNMENT_KEYWORDS = ('var', 'let', 'const', 'val')
+_SYNTAX_MARKERS = frozenset('{}()[];:=<>')
+_SENTENCE_ENDS = frozenset('.!?')
+
+# Common English words
+_COMMON_WORDS = frozenset({
+    'the', 'a', 'an', 'is', 'are', 'was', 'were', 'be', 'been',
+    'have', 'has', 'had', 'do', 'does', 'did', 'will', 'would',
+    'could', 'should', 'may', 'might', 'must', 'shall', 'can',
+    'this', 'that', 'these', 'those', 'i', 'you', 'he', 'she',
+    'it', 'we', 'they', 'what', 'which', 'who', 'whom', 'whose',
+    'where', 'when', 'why', 'how', 'all', 'each', 'every', 'both',
+    'few', 'more', 'most', 'other', 'some', 'such', 'no', 'nor',
+    'not', 'only', 'own', 'same', 'so', 'than', 'too', 'very',
+    'just', 'now', 'about', 'after', 'before', 'between',
+    'into', 'through', 'during', 'above',
+    'below', 'up', 'down', 'out', 'off', 'over', 'under', 'again',
+    'further', 'then', 'once', 'here', 'there', 'any', 'while'
+})
+
+# Group 1: a word, group 2: any other non-space character
+_CLASSIFIER_TOKEN_RE = re.compile(r'(\w+)|(\S)')
+_NON_SPACE_RE = re.compile(r'\S')
+
+
+def _classifier_windows(content: str) -> List[Tuple[int, int]]:
+    """Return the (start, end) spans of content that the classifier reads.
+
+    Content up to CLASSIFIER_SAMPLE_CHARS is read whole. Anything larger is
+    sampled as CLASSIFIER_SAMPLE_WINDOWS evenly spaced windows that share
+    that budget (head and tail included). Each window is trimmed to whole
+    lines so no word is cut in half.
     """
-    patterns = {
-        # Function/method definitions
-        'function_def': (
-            r'\b(def|func|function|pub fn|sub|private|public)\s+\w+',
-            3.0
-        ),
-        # Type annotations - more specific to avoid false positives
-        # Matches: def foo(x: int), var name: string, Class name, etc.
-        'type_annotation': (
-            r':\s*(?:[A-Z][a-zA-Z_]*|int|str|bool|float|void|string|double|long|List|Dict|Set|Tuple)\b',
-            2.0
-        ),
-        # Import statements
-        'import_stmt': (
-            r'\b(import|include|using|require|from)\b',
-            2.0
-        ),
-        # Control flow
-        'control_flow': (
-            r'\b(if|else|elif|for|while|switch|case|when)\b',
-            1.5
-        ),
-        # Syntax markers
-        'syntax_markers': (
-            r'[{}()\[\];:=><>]',
-            1.0
-        ),
-        # Class definitions
-        'class_def': (
-            r'\b(class|struct|interface|trait|enum)\s+\w+',
-            2.5
-        ),
-        # Decorators/annotations
-        'decorator': (
-            r'@\w+\s*\(',
-            2.0
-        ),
-        # Arrow functions
-        'arrow_func': (
-            r'=>',
-            2.0
-        ),
-        # Variable assignment with type
-        'typed_assignment': (
-            r'(var|let|const|val|var)\s+\w+\s*[:=]',
-            1.5
-        ),
-        # Return statements
-        'return_stmt': (
-            r'\b(return)\b',
-            1.0
-        ),
-    }
-
-    score = 0.0
-    matches = {}
-
-    for name, (pattern, weight) in patterns.items():
-        count = len(re.findall(pattern, content, re.IGNORECASE))
-        matches[name] = count
-        score += count * weight
-
-    words = re.findall(r'\b\w+\b', content)
-    num_words = max(len(words), 10)  # Floor at 10 to prevent exploding scores on tiny snippets
+    budget = config.CLASSIFIER_SAMPLE_CHARS
+    n_windows = max(config.CLASSIFIER_SAMPLE_WINDOWS, 1)
+    if len(content) <= budget:
+        return [(0, len(content))]
+
+    size = budget // n_windows
+    spans = []
+    for k in range(n_windows):
+        start = k * (len(content) - size) // max(n_windows - 1, 1)
+        end = start + size
+        if start > 0:
+            newline = content.find('\n', start, end)
+            if newline != -1:
+                start = newline + 1
+        if end < len(content):
+            newline = content.rfind('\n', start, end)
+            if newline != -1:
+                end = newline
+        spans.append((start, end))
+    return spans
+
+
+def _classifier_features(content: str) -> Dict[str, int]:
+    """Count every code and document feature in one pass over the sample.
+
+    Returns the per-feature match counts (keys of _CODE_FEATURE_WEIGHTS) plus
+    'words', 'common_words', 'sentences', 'paragraphs' and 'chars' for the
+    document score.
+    """
+    counts = dict.fromkeys(_CODE_FEATURE_WEIGHTS, 0)
+    words = common = sentences = paragraphs = chars = 0
+
+    for win_start, win_end in _classifier_windows(content):
+        chars += win_end - win_start
+        paragraphs += content.count('\n\n', win_start, win_end)
+
+        # Last three tokens as (start, end, lowered word or None, punct char);
+        # *_taken is the end of the last keyword match whose trailing name
+        # was consumed (a consumed name cannot start another match)
+        p1 = p2 = (-2, -2, None, '')
+        func_taken = class_taken = -1
+        for m in _CLASSIFIER_TOKEN_RE.finditer(content, win_start, win_end):
+            start, end = m.span()
+            word = m.group(1)
+            if word is not None:
+                low = word.lower()
+                words += 1
+                if low in _COMMON_WORDS:
+                    common += 1
+                if low in _CONTROL_KEYWORDS:
+                    counts['control_flow'] += 1
+                if low in _IMPORT_KEYWORDS:
+                    counts['import_stmt'] += 1
+                if low == 'return':
+                    counts['return_stmt'] += 1
+
+                prev_start, prev_end, prev_word, prev_char = p1
+                if prev_word is not None and prev_end < start:
+                    # <keyword> <name>
+                    if prev_end > func_taken and (
+                            prev_word in _FUNCTION_KEYWORDS
+                            or (prev_word == 'fn' and p2[2] == 'pub' and p2[1] > func_taken
+                                and content[p2[1]:prev_start] == ' ')):
+                        counts['function_def'] += 1
+                        func_taken = end
+                    if prev_word in _CLASS_KEYWORDS and prev_end > class_taken:
+                        counts['class_def'] += 1
+                        class_taken = end
+                elif prev_char == ':' and word.isascii() and word[0].isalpha() \
+                        and word.replace('_', '').isalpha():
+                    counts['type_annotation'] += 1
+                p2, p1 = p1, (start, end, low, '')
+                continue
+
+            char = m.group(2)
+            if char in _SYNTAX_MARKERS:
+                counts['syntax_markers'] += 1
+                if char == '>' and p1[3] == '=' and p1[1] == start:
+                    counts['arrow_func'] += 1
+                elif char in ':=' and p1[2] is not None and p2[2] is not None \
+                        and p2[1] < p1[0] and p2[2].endswith(_ASSIGNMENT_KEYWORDS):
+                    counts['typed_assignment'] += 1
+                elif char == '(' and p1[2] is not None and p2[3] == '@' and p2[1] == p1[0]:
+                    counts['decorator'] += 1
+            elif char in _SENTENCE_ENDS and not (p1[3] in _SENTENCE_ENDS and p1[1] == start):
+                sentences += 1
+            p2, p1 = p1, (start, end, None, char)
+
+    counts.update(words=words, common_words=common, chars=chars,
+                  sentences=sentences + 1, paragraphs=paragraphs + 1)
+    return counts
+
+
+def _code_score(features: Dict[str, int]) -> Tuple[float, dict]:
+    """Weighted code-feature density per 100 words, and the raw matches."""
+    matches = {name: features[name] for name in _CODE_FEATURE_WEIGHTS}
+    score = sum(count * _CODE_FEATURE_WEIGHTS[name] for name, count in matches.items())
+    num_words = max(features['words'], 10)  # Floor at 10 to prevent exploding scores on tiny snippets
 
     # Normalize by word count to reflect code syntax density rather than absolute volume
-    normalized_score = (score / num_words) * 100
-
-    return normalized_score, matches
-
-
-def _analyze_document_content(content: str) -> float:
-    """Analyze text for document-like (natural language) patterns."""
-    # Remove code-like patterns first
-    code_like = re.sub(r'[{}()\[\];:=<>]', ' ', content)
-
-    # Common English words
-    common_words = [
-        'the', 'a', 'an', 'is', 'are', 'was', 'were', 'be', 'been',
-        'have', 'has', 'had', 'do', 'does', 'did', 'will', 'would',
-        'could', 'should', 'may', 'might', 'must', 'shall', 'can',
-        'this', 'that', 'these', 'those', 'i', 'you', 'he', 'she',
-        'it', 'we', 'they', 'what', 'which', 'who', 'whom', 'whose',
-        'where', 'when', 'why', 'how', 'all', 'each', 'every', 'both',
-        'few', 'more', 'most', 'other', 'some', 'such', 'no', 'nor',
-        'not', 'only', 'own', 'same', 'so', 'than', 'too', 'very',
-        'can', 'just', 'now', 'about', 'after', 'before', 'between',
-        'into', 'through', 'during', 'before', 'after', 'above',
-        'below', 'up', 'down', 'out', 'off', 'over', 'under', 'again',
-        'further', 'then', 'once', 'here', 'there', 'any', 'while'
-    ]
-
-    # Count common word occurrences
-    words = re.findall(r'\b\w+\b', content.lower())
-    common_count = sum(1 for w in words if w in common_words)
+    return (score / num_words) * 100, matches
 
-    # Check for sentence-like patterns
-    sentences = re.split(r'[.!?]+', content)
-    avg_sentence_len = len(words) / max(len(sentences), 1)
 
-    # Check for paragraph structure
-    paragraphs = content.split('\n\n')
-    avg_paragraph_len = len(content) / max(len(paragraphs), 1)
+def _document_score(features: Dict[str, int]) -> float:
+    """Natural-language score in [0, 1] from the document features."""
+    words = features['words']
+    avg_sentence_len = words / features['sentences']
+    avg_paragraph_len = features['chars'] / features['paragraphs']
 
     # Score based on:
     # 1. High frequency of common words (natural language)
     # 2. Reasonable sentence length (not too short like code)
     # 3. Paragraph structure
     score = 0.0
-    score += min(common_count / max(len(words), 1), 1.0) * 0.4
+    score += min(features['common_words'] / max(words, 1), 1.0) * 0.4
     score += min(max(10, min(25, avg_sentence_len)) / 25, 1.0) * 0.3
     score += min(max(50, min(500, avg_paragraph_len)) / 500, 1.0) * 0.3
 
     return score
 
 
+def _analyze_code_content(content: str) -> Tuple[float, dict]:
+    """Analyze text for code-like patterns.
+
+    Returns: (code_score, info_dict)
+    Uses raw weighted count without normalization for consistent scoring.
+    """
+    return _code_score(_classifier_features(content))
+
+
+def _analyze_document_content(content: str) -> float:
+    """Analyze text for document-like (natural language) patterns."""
+    return _document_score(_classifier_features(content))
+
+
 def _ensure_hard_limit(chunks: List[str], max_tokens: int) -> List[str]:
     """Ensures every chunk in the list is strictly within max_tokens.
 
@@ -261,8 +355,8 @@ def _ensure_hard_limit(chunks: List[str], max_tokens: int) -> List[str]:
         List of chunks where ALL are <= max_tokens
     """
     final_chunks = []
-    for chunk in chunks:
-        if count_tokens(chunk) <= max_tokens:
+    for chunk, chunk_tokens in zip(chunks, count_tokens_batch(chunks)):
+        if chunk_tokens <= max_tokens:
             final_chunks.append(chunk)
         else:
             # Atomic split by tokens
@@ -274,7 +368,7 @@ def _ensure_hard_limit(chunks: List[str], max_tokens: int) -> List[str]:
 # Chunking Strategies
 # =============================================================================
 
-def chunk_code_text(text: str, max_tokens: int) -> List[str]:
+def chunk_code_text(text: str, max_tokens: int, language: Optional[str] = None) -> List[str]:
     """Chunk code by function/class boundaries.
 
     Guarantees that no chunk exceeds max_tokens. Structure (functions/classes)
@@ -283,6 +377,8 @@ def chunk_code_text(text: str, max_tokens: int) -> List[str]:
     Args:
         text: Code text to chunk
         max_tokens: Maximum tokens per chunk
+        language: Optional language name or file name (e.g. "python",
+            "app.ts") selecting the comment syntax; guessed when omitted
 
     Returns:
         List of code chunks, each within max_tokens limit
@@ -296,7 +392,7 @@ def chunk_code_text(text: str, max_tokens: int) -> List[str]:
 
     # Try syntax-aware chunking first (respects function/class boundaries)
     try:
-        syntax_chunks = _chunk_by_code_structure(text, max_tokens)
+        syntax_chunks = _chunk_by_code_structure(text, max_tokens, language)
         # Only use syntax chunks if they produce reasonable results
         if syntax_chunks and len(syntax_chunks) > 0:
             return syntax_chunks
@@ -312,9 +408,7 @@ def chunk_code_text(text: str, max_tokens: int) -> List[str]:
     # Split by lines
     lines = text.split('\n')
 
-    for line in lines:
-        line_tokens = count_tokens(line)
-
+    for line, line_tokens in zip(lines, count_tokens_batch(lines)):
         # Line fits as-is
         if current_tokens + line_tokens <= max_tokens:
             if current_chunk:
@@ -335,8 +429,7 @@ def chunk_code_text(text: str, max_tokens: int) -> List[str]:
                 word_chunk = ""
                 word_tokens = 0
 
-                for word in words:
-                    word_tokens_count = count_tokens(word)
+                for word, word_tokens_count in zip(words, count_tokens_batch(words)):
 
                     if word_tokens + word_tokens_count > max_tokens:
                         if word_chunk:
@@ -362,79 +455,177 @@ def chunk_code_text(text: str, max_tokens: int) -> List[str]:
     return _ensure_hard_limit(chunks, max_tokens) if chunks else [text]
 
 
-def _chunk_by_code_structure(text: str, max_tokens: int) -> List[str]:
-    """Chunk code by detecting function/class boundaries."""
-    # Patterns for function/class starts
-    patterns = [
-        # Python/Java/C#/JavaScript
-        (r'\b(def|class|function|pub fn|fun|func)\s+(\w+)', 0),
-        # C/C++/Java style
-        (r'(?:^|\n)(?:static\s+)?(?:inline\s+)?(?:const\s+)?[a-zA-Z_][a-zA-Z0-9_::*<>,\s]*\s+(\w+)\s*\([^)]*\)\s*(?:const)?\s*\{', 0),
-        # Arrow functions
-        (r'\w*\s*=\s*(?:async\s+)?\([^)]*\)\s*=>', 0),
-        # TypeScript interfaces/types
-        (r'\b(interface|type|namespace|module)\s+(\w+)', 0),
-    ]
+def _chunk_by_code_structure(text: str, max_tokens: int,
+                             language: Optional[str] = None) -> List[str]:
+    """Chunk code at structural boundaries in one pass over the file.
 
-    # Find all function/class boundaries
-    boundaries = [(0, 'start')]
-
-    for pattern, _ in patterns:
-        for match in re.finditer(pattern, text):
-            start = match.start()
-            # Find the end of this function (roughly by brace matching)
-            end = _find_function_end(text, start)
-            boundaries.append((start, 'function_start'))
-            boundaries.append((end, 'function_end'))
-
-    # Sort boundaries
-    boundaries.sort()
+    _scan_code_lines() classifies every line once; each line is token-counted
+    once (one batched call) and running totals give the size of any run of
+    lines. Each chunk then takes as many lines as fit in max_tokens and ends
+    at the shallowest boundary in range: a top-level definition/statement
+    first, then nested members, then any line. Lines inside strings and
+    block comments are never cut points, and a decorator stays with the
+    definition below it.
+    """
+    starts, levels = _scan_code_lines(text, language)
+    n = len(starts)
+    bounds = starts + [len(text)]
+    line_tokens = count_tokens_batch([text[bounds[i]:bounds[i + 1]] for i in range(n)])
+    totals = [0] * (n + 1)
+    for i, tokens in enumerate(line_tokens):
+        totals[i + 1] = totals[i] + tokens
+
+    # Candidate cut lines per nesting level; the last bucket takes all deeper ones
+    cuts_by_level: List[List[int]] = [[] for _ in range(_CODE_CUT_LEVELS + 1)]
+    any_line = []
+    for i in range(1, n):
+        level = levels[i]
+        if level is None:
+            continue
+        any_line.append(i)
+        if level >= 0:
+            cuts_by_level[min(level, _CODE_CUT_LEVELS)].append(i)
+    cuts_by_level.append(any_line)
 
-    # Try to create chunks within boundaries
     chunks = []
-    current_chunk = ""
-
-    for i, (pos, marker) in enumerate(boundaries):
-        segment = text[len(current_chunk):pos]
-
-        if current_chunk and count_tokens(current_chunk) > max_tokens:
-            # Current chunk is too large, save it and start new
-            if current_chunk.strip():
-                chunks.append(current_chunk.strip())
-            current_chunk = segment
+    first = 0
+    while first < n:
+        # Furthest line end that keeps the chunk within max_tokens
+        last = bisect.bisect_right(totals, totals[first] + max_tokens) - 1
+        if last >= n:
+            cut = n
         else:
-            current_chunk += segment
-
-        # Include the function header with its content
-        if marker == 'function_start':
-            func_end = _find_function_end(text, pos)
-            current_chunk += text[pos:func_end]
-
-    if current_chunk.strip():
-        chunks.append(current_chunk.strip())
+            cut = max(last, first + 1)  # A single oversized line goes alone
+            for candidates in cuts_by_level:
+                i = bisect.bisect_right(candidates, last) - 1
+                if i >= 0 and candidates[i] > first:
+                    cut = candidates[i]
+                    break
+        chunk = text[bounds[first]:bounds[cut]].strip()
+        if chunk:
+            chunks.append(chunk)
+        first = cut
 
     return _ensure_hard_limit(chunks, max_tokens)
 
 
-def _find_function_end(text: str, start: int) -> int:
-    """Find the end of a function starting at position start."""
-    # Find opening brace
-    brace_start = text.find('{', start)
-    if brace_start == -1:
-        # No braces, find end of line
-        return text.find('\n', start)
+# Nesting levels 0.._CODE_CUT_LEVELS-1 are preferred cut points, shallowest first
+_CODE_CUT_LEVELS = 3
+
+# Everything that can change lexical state: newlines, brackets, string
+# delimiters, comment markers and escapes (matched as a pair so an escaped
+# quote never closes a string)
+_CODE_LEXEME_RE = re.compile(r'"""|\'\'\'|//|/\*|\*/|\\.|[\n{}()\[\]"\'`#]')
+_CODE_OPEN = frozenset('{([')
+_CODE_CLOSE = frozenset('})]')
+
+# Comment syntax per language family: (line comment markers, /* */ block comments).
+# In Python `//` is floor division; in JS/TS `#` starts a private name.
+_COMMENT_SYNTAX = {
+    'python': (frozenset({'#'}), False),
+    'hash': (frozenset({'#'}), False),
+    'c': (frozenset({'//'}), True),
+    'tick': (frozenset({'//'}), True),
+}
+# Unknown languages accept both markers (see _scan_code_lines for `#`)
+_GENERIC_COMMENT_SYNTAX = (frozenset({'//', '#'}), True)
+_LANGUAGE_FAMILIES = {
+    **dict.fromkeys(('python', 'py', 'pyw', 'pyi'), 'python'),
+    **dict.fromkeys(('shell', 'sh', 'bash', 'zsh', 'ruby', 'rb', 'perl', 'pl', 'pm', 'r',
+                     'yaml', 'yml', 'toml'), 'hash'),
+    **dict.fromkeys(('c', 'h', 'cc', 'cpp', 'cxx', 'hpp', 'hh', 'c++', 'cs', 'csharp', 'java',
+                     'javascript', 'js', 'jsx', 'mjs', 'cjs', 'typescript', 'ts', 'tsx', 'go',
+                     'swift', 'kotlin', 'kt', 'kts', 'dart', 'groovy', 'css', 'scss', 'less'), 'c'),
+    # C-like, but `'name` is a Rust lifetime/label or a Scala symbol, not a char literal
+    **dict.fromkeys(('rust', 'rs', 'scala', 'sc'), 'tick'),
+}
+# A Python def/class header: `def name(...):` / `class Name(...):`
+_PYTHON_HEADER_RE = re.compile(r'^[ \t]*(?:async[ \t]+)?(?:def|class)[ \t]+\w+[^\n{;]*:[ \t]*(?:#.*)?$', re.M)
+
+
+def _code_family(text: str, language: Optional[str]) -> Optional[str]:
+    """Language family for a language name or file name, guessed from text if unknown."""
+    family = _LANGUAGE_FAMILIES.get((language or '').strip().lower().rsplit('.', 1)[-1])
+    if family is None and _PYTHON_HEADER_RE.search(text):
+        family = 'python'
+    return family
+
+
+def _scan_code_lines(text: str, language: Optional[str] = None) -> Tuple[List[int], List[Optional[int]]]:
+    """Single lexical pass over source code.
+
+    Tracks bracket depth and string/comment state across the whole file
+    (C-style, Python, shell and JS template syntax) and records, for every
+    line, where it starts and how good a cut point its start is. Comment
+    markers follow the language (see _code_family); when it is unknown,
+    `#` directly followed by a name (`#include`, JS `#field`) is code. In
+    Rust and Scala a `'` followed by a name and no closing quote right after
+    it (`'a`, `'outer:`, `'sym`) is a lifetime/label/symbol, not a string.
 
-    # Match braces
-    depth = 1
-    pos = brace_start + 1
-    while pos < len(text) and depth > 0:
-        if text[pos] == '{':
-            depth += 1
-        elif text[pos] == '}':
-            depth -= 1
-        pos += 1
-
-    return pos
+    Returns:
+        (starts, levels): starts[i] is the offset of line i. levels[i] is
+        None if line i starts inside a string or block comment or is blank,
+        -1 if it is code that should stay attached to the line above
+        (decorators' targets, closing brackets), else its nesting level:
+        max(bracket depth, indentation in 4-column units).
+    """
+    starts = [0]
+    depths = [0]          # Bracket depth at each line start (None: inside string/comment)
+    depth = 0
+    state = None          # None (code), '//' (line comment), '/*', or a string delimiter
+    family = _code_family(text, language)
+    line_comments, block_comments = _COMMENT_SYNTAX.get(family, _GENERIC_COMMENT_SYNTAX)
+    generic = family not in _COMMENT_SYNTAX
+    quoted_names = family == 'tick'
+    for m in _CODE_LEXEME_RE.finditer(text):
+        tok = m.group()
+        if tok == '\n':
+            if state in ('//', '"', "'"):
+                state = None  # Line comments end; unterminated one-line strings are abandoned
+            starts.append(m.end())
+            depths.append(depth if state is None else None)
+        elif state is None:
+            if tok in _CODE_OPEN:
+                depth += 1
+            elif tok in _CODE_CLOSE:
+                depth = max(0, depth - 1)
+            elif tok in line_comments:
+                if not (generic and tok == '#' and text[m.end():m.end() + 1].isidentifier()):
+                    state = '//'
+            elif tok == '/*' and block_comments:
+                state = '/*'
+            elif tok == "'" and quoted_names:
+                after = text[m.end():m.end() + 2]
+                if not (after[:1].isidentifier() and after[1:2] != "'"):
+                    state = tok  # A char literal such as 'a' or '\\n'
+            elif tok in ('"""', "'''", '"', "'", '`'):
+                state = tok
+        elif state == '/*':
+            if tok == '*/':
+                state = None
+        elif state != '//' and tok[0] == state[0] and (len(state) == 1 or tok == state):
+            # Closing delimiter (escapes were consumed as pairs). A triple
+            # quote also closes a one-char string, leaving an empty string.
+            state = None
+
+    levels: List[Optional[int]] = []
+    previous_decorator = False
+    for i, line_start in enumerate(starts):
+        depth = depths[i]
+        line_end = starts[i + 1] - 1 if i + 1 < len(starts) else len(text)
+        line = text[line_start:line_end]
+        stripped = line.lstrip()
+        if depth is None or not stripped:
+            levels.append(None)
+            continue
+        if previous_decorator or stripped[0] in '}])':
+            levels.append(-1)
+        else:
+            indent = len(line) - len(stripped)
+            indent += 3 * line.count('\t', 0, indent)  # A tab counts as 4 columns
+            levels.append(max(depth, indent // 4))
+        previous_decorator = stripped[0] == '@'
+    return starts, levels
 
 
 def _chunk_by_lines(text: str, max_tokens: int) -> List[str]:
@@ -448,9 +639,7 @@ def _chunk_by_lines(text: str, max_tokens: int) -> List[str]:
     current_chunk = []
     current_tokens = 0
 
-    for line in lines:
-        line_tokens = count_tokens(line)
-
+    for line, line_tokens in zip(lines, count_tokens_batch(lines)):
         # If a single line exceeds max_tokens, we need to split it further
         if line_tokens > max_tokens:
             # First, save current chunk if it has content
@@ -465,9 +654,7 @@ def _chunk_by_lines(text: str, max_tokens: int) -> List[str]:
             temp_chunk = []
             temp_tokens = 0
 
-            for word in words:
-                word_tokens = count_tokens(word)
-
+            for word, word_tokens in zip(words, count_tokens_batch(words)):
                 if temp_tokens + word_tokens > max_tokens:
                     # Save current temp_chunk and start new
                     if temp_chunk:
@@ -529,11 +716,9 @@ def chunk_spreadsheet_text(text: str, max_tokens: int) -> List[str]:
     current_chunk = [header]
     current_tokens = header_tokens
 
-    for line in data_lines:
-        if not line.strip():
-            continue
+    data_lines = [line for line in data_lines if line.strip()]
 
-        line_tokens = count_tokens(line)
+    for line, line_tokens in zip(data_lines, count_tokens_batch(data_lines)):
 
         # Line fits as-is
         if current_tokens + line_tokens <= max_tokens:
@@ -550,8 +735,7 @@ def chunk_spreadsheet_text(text: str, max_tokens: int) -> List[str]:
                 temp_chunk = [header]
                 temp_tokens = header_tokens
 
-                for field in fields:
-                    field_tokens = count_tokens(field)
+                for field, field_tokens in zip(fields, count_tokens_batch(fields)):
 
                     if temp_tokens + field_tokens > max_tokens:
                         if len(temp_chunk) > 1:  # Has data rows
@@ -612,13 +796,9 @@ def chunk_mixed_text(text: str, max_tokens: int) -> List[str]:
             chunks.extend(part_chunks)
         else:
             # For non-code parts, use paragraph-based chunking with hard limits
-            paragraphs = content.split('\n\n')
-            for para in paragraphs:
-                para_stripped = para.strip()
-                if not para_stripped:
-                    continue
-
-                para_tokens = count_tokens(para_stripped)
+            paragraphs = [para.strip() for para in content.split('\n\n')]
+            paragraphs = [para for para in paragraphs if para]
+            for para_stripped, para_tokens in zip(paragraphs, count_tokens_batch(paragraphs)):
 
                 # Paragraph fits as-is
                 if current_tokens + para_tokens <= max_tokens:
@@ -640,8 +820,7 @@ def chunk_mixed_text(text: str, max_tokens: int) -> List[str]:
                         sentence_chunk = ""
                         sentence_tokens = 0
 
-                        for sent in sentences:
-                            sent_tokens = count_tokens(sent)
+                        for sent, sent_tokens in zip(sentences, count_tokens_batch(sentences)):
 
                             if sentence_tokens + sent_tokens <= max_tokens:
                                 if sentence_chunk:
@@ -661,8 +840,7 @@ def chunk_mixed_text(text: str, max_tokens: int) -> List[str]:
                                     word_chunk = ""
                                     word_tokens = 0
 
-                                    for word in words:
-                                        word_tokens_count = count_tokens(word)
+                                    for word, word_tokens_count in zip(words, count_tokens_batch(words)):
 
                                         if word_tokens + word_tokens_count > max_tokens:
                                             if word_chunk:
@@ -751,14 +929,10 @@ def chunk_document_text(text: str, max_tokens: int) -> List[str]:
     current_tokens = 0
 
     # Split by paragraphs
-    paragraphs = text.split('\n\n')
-
-    for para in paragraphs:
-        para_stripped = para.strip()
-        if not para_stripped:
-            continue
+    paragraphs = [para.strip() for para in text.split('\n\n')]
+    paragraphs = [para for para in paragraphs if para]
 
-        para_tokens = count_tokens(para_stripped)
+    for para_stripped, para_tokens in zip(paragraphs, count_tokens_batch(paragraphs)):
 
         # Paragraph fits as-is
         if current_tokens + para_tokens <= max_tokens:
@@ -781,8 +955,7 @@ def chunk_document_text(text: str, max_tokens: int) -> List[str]:
                 sentence_chunk = ""
                 sentence_tokens = 0
 
-                for sent in sentences:
-                    sent_tokens = count_tokens(sent)
+                for sent, sent_tokens in zip(sentences, count_tokens_batch(sentences)):
 
                     # Sentence fits as-is
                     if sentence_tokens + sent_tokens <= max_tokens:
@@ -804,8 +977,7 @@ def chunk_document_text(text: str, max_tokens: int) -> List[str]:
                             word_chunk = ""
                             word_tokens = 0
 
-                            for word in words:
-                                word_tokens_count = count_tokens(word)
+                            for word, word_tokens_count in zip(words, count_tokens_batch(words)):
 
                                 if word_tokens + word_tokens_count > max_tokens:
                                     if word_chunk:
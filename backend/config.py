@@ -69,6 +69,19 @@ TIMEOUT_WEB_SCRAPE = 15            # Standard HTTP GET for markdown extraction
 TIMEOUT_IMAGE_FETCH = 15           # Base64-encoding images for VLM
 TIMEOUT_URLHAUS = 5                # URLhaus malware check
 
+# =============================================================================
+# LLM HTTP CLIENTS (see backend/http_clients.py)
+# =============================================================================
+# Shared keep-alive clients for LLM calls: one httpx.AsyncClient per event loop
+# and one requests.Session per thread. Read timeouts stay per request (above).
+LLM_HTTP_MAX_CONNECTIONS = int(os.getenv("LLM_HTTP_MAX_CONNECTIONS", 32))      # Per async client
+LLM_HTTP_MAX_KEEPALIVE = int(os.getenv("LLM_HTTP_MAX_KEEPALIVE", 16))          # Idle connections kept per async client
+LLM_HTTP_KEEPALIVE_EXPIRY = float(os.getenv("LLM_HTTP_KEEPALIVE_EXPIRY", 60))  # Seconds an idle connection is kept
+LLM_HTTP_CONNECT_TIMEOUT = float(os.getenv("LLM_HTTP_CONNECT_TIMEOUT", 5.0))   # TCP connect timeout
+LLM_HTTP_POOL_TIMEOUT = float(os.getenv("LLM_HTTP_POOL_TIMEOUT", 30.0))        # Wait for a free pooled connection
+LLM_HTTP_SYNC_POOL_SIZE = int(os.getenv("LLM_HTTP_SYNC_POOL_SIZE", 8))         # Connections per requests.Session
+LLM_HTTP2 = os.getenv("LLM_HTTP2", "false").lower() == "true"                  # Needs the optional `h2` package
+
 # =============================================================================
 # WEB EXTRACTION & PARSING
 # =============================================================================
@@ -113,10 +126,48 @@ EMBEDDING_MAX_TOKENS_RESEARCH = int(os.getenv("EMBEDDING_MAX_TOKENS_RESEARCH", 1
 EMBEDDING_MAX_TOKENS_FILE = int(os.getenv("EMBEDDING_MAX_TOKENS_FILE", 1000))       # File RAG embeddings
 EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", 1024))               # Number of chunks per request
 
+# =============================================================================
+# EMBEDDING SCHEDULER
+# Requests from all threads are coalesced into micro-batches and sent with
+# several requests in flight (see backend/embedding_scheduler.py).
+# EMBEDDING_BATCH_SIZE is the largest (and starting) batch size.
+# =============================================================================
+EMBEDDING_MAX_IN_FLIGHT = int(os.getenv("EMBEDDING_MAX_IN_FLIGHT", 4))              # Concurrent /v1/embeddings requests
+EMBEDDING_BATCH_MAX_TOKENS = int(os.getenv("EMBEDDING_BATCH_MAX_TOKENS", 65536))    # Token budget per batch (0 = no limit)
+EMBEDDING_BATCH_MAX_DELAY_MS = float(os.getenv("EMBEDDING_BATCH_MAX_DELAY_MS", 2))  # Max wait for a batch to fill
+EMBEDDING_MIN_BATCH_SIZE = int(os.getenv("EMBEDDING_MIN_BATCH_SIZE", 8))            # Floor for adaptive shrinking
+EMBEDDING_TARGET_LATENCY_MS = float(os.getenv("EMBEDDING_TARGET_LATENCY_MS", 2000)) # Batch size adapts toward this (0 = fixed size)
+
+# =============================================================================
+# TOKEN COUNTING
+# Token counts are memoized by content hash (see backend/token_counter.py).
+# The same paragraphs, chunks and chat messages are counted repeatedly by the
+# chunkers, the embedding circuit-breaker and context estimation.
+# =============================================================================
+TOKEN_COUNT_CACHE_SIZE = int(os.getenv("TOKEN_COUNT_CACHE_SIZE", 50000))          # Max memoized texts (LRU)
+TOKEN_COUNT_CACHE_MIN_CHARS = int(os.getenv("TOKEN_COUNT_CACHE_MIN_CHARS", 16))   # Shorter texts bypass the cache
+
+# =============================================================================
+# EMBEDDING CACHE
+# Persistent, content-addressed embedding cache (see backend/embedding_cache.py).
+# Keyed by (embedding model, task prefix, sha256 of text); re-ingesting known
+# content costs a disk read instead of a /v1/embeddings round trip.
+# =============================================================================
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "True").lower() == "true"
+EMBEDDING_CACHE_PATH = get_secret("EMBEDDING_CACHE_PATH", os.path.abspath(os.path.join(DATA_DIR, "embedding_cache.db")))
+EMBEDDING_CACHE_MAX_MB = float(os.getenv("EMBEDDING_CACHE_MAX_MB", 1024))          # Evict least recently used beyond this
+EMBEDDING_CACHE_EVICT_TO_RATIO = float(os.getenv("EMBEDDING_CACHE_EVICT_TO_RATIO", 0.9))  # Evict down to this fraction of max
+EMBEDDING_QUERY_CACHE_SIZE = int(os.getenv("EMBEDDING_QUERY_CACHE_SIZE", 4096))    # In-memory LRU for query embeddings
+
 # =============================================================================
 # FILE RAG ENHANCEMENTS
 # =============================================================================
 HYBRID_SEARCH_ENABLED = True          # Enable BM25 + vector fusion for File RAG
+# Vector and BM25 legs of a hybrid query run concurrently on a shared pool.
+# A leg that errors or exceeds RAG_LEG_TIMEOUT_MS is dropped and the query
+# is answered from the other leg alone.
+RAG_LEG_WORKERS = int(os.getenv("RAG_LEG_WORKERS", 8))                 # Threads shared by all retrieval legs
+RAG_LEG_TIMEOUT_MS = float(os.getenv("RAG_LEG_TIMEOUT_MS", 10000))     # Per-leg timeout (0 = wait indefinitely)
 CODE_CHUNKING_ENABLED = True          # Enable syntax-aware chunking for code files
 # =============================================================================
 # FILE TYPE CLASSIFIER
@@ -124,6 +175,10 @@ CODE_CHUNKING_ENABLED = True          # Enable syntax-aware chunking for code fi
 FILE_TYPE_DETECTION_ENABLED = True    # Enable content-based file type detection
 CLASSIFIER_CODE_THRESHOLD = float(os.getenv("CLASSIFIER_CODE_THRESHOLD", 20.0))
 CLASSIFIER_DOC_THRESHOLD = float(os.getenv("CLASSIFIER_DOC_THRESHOLD", 0.35))
+# Uploads longer than CLASSIFIER_SAMPLE_CHARS are classified from
+# CLASSIFIER_SAMPLE_WINDOWS evenly spaced windows sharing that budget
+CLASSIFIER_SAMPLE_CHARS = int(os.getenv("CLASSIFIER_SAMPLE_CHARS", 131072))     # Max characters read by detect_file_type
+CLASSIFIER_SAMPLE_WINDOWS = int(os.getenv("CLASSIFIER_SAMPLE_WINDOWS", 4))      # Windows sampled from larger uploads
 
 # =============================================================================
 # CORE MEMORY MANAGEMENT
@@ -204,6 +259,12 @@ RESEARCH_DEEP_MAP_MAX_URLS = 5             # Max sub-pages to crawl per source (
 TAVILY_MAP_MAX_DEPTH = 3                   # Crawl depth for Tavily Map
 TAVILY_MAP_MAX_BREADTH = 10                # Crawl breadth for Tavily Map
 
+# Concurrent fetch pipeline (backend/agents/research_pipeline.py): all queries of
+# a section run at once; each stage is capped per research run
+RESEARCH_SEARCH_CONCURRENCY = int(os.getenv("RESEARCH_SEARCH_CONCURRENCY", 4))    # Tavily searches in flight
+RESEARCH_EXTRACT_CONCURRENCY = int(os.getenv("RESEARCH_EXTRACT_CONCURRENCY", 6))  # Page extractions in flight
+RESEARCH_MAP_CONCURRENCY = int(os.getenv("RESEARCH_MAP_CONCURRENCY", 3))          # Deep-mode Tavily Map calls in flight
+
 # =============================================================================
 # RESEARCH: LLM TEMPERATURE & SAMPLING (Reasoning Optimized)
 # =============================================================================
@@ -262,6 +323,73 @@ DEFAULT_TTL_SECONDS = CACHE_ENTRY_TTL_SECONDS  # Alias for config_directives.md
 CACHE_CLEANUP_INTERVAL = int(os.getenv("CACHE_CLEANUP_INTERVAL", 300))         # 5 min
 CACHE_RETRY_COUNT = int(os.getenv("CACHE_RETRY_COUNT", 2))                     # Retry attempts
 
+# =============================================================================
+# CACHE LAYER MEMORY BOUNDS (see backend/cache_layer.py, backend/cache_eviction.py)
+# =============================================================================
+# Row cache entries are evicted least-recently-used first once either limit is
+# exceeded. Sizes are sampled estimates of the cached Python objects. 0 = no limit.
+CACHE_MAX_MB = float(os.getenv("CACHE_MAX_MB", 256))                           # Approximate bytes budget across all tables
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", 100000))                # Max cached rows across all tables
+
+# =============================================================================
+# RESPONSE CACHE WAL (group commit, see backend/wal_writer.py)
+# =============================================================================
+# Streamed chunks are buffered per chat and written in groups instead of one
+# open/write/close per token. [[DONE]]/[[ERROR]] markers always commit at once.
+WAL_FLUSH_INTERVAL_MS = float(os.getenv("WAL_FLUSH_INTERVAL_MS", 50))           # Max age of a buffered chunk
+WAL_FLUSH_BYTES = int(os.getenv("WAL_FLUSH_BYTES", 64 * 1024))                  # Buffered bytes that force a write
+WAL_FSYNC_POLICY = os.getenv("WAL_FSYNC_POLICY", "none").lower()                # "none", "interval" or "always"
+WAL_FSYNC_INTERVAL_SECONDS = float(os.getenv("WAL_FSYNC_INTERVAL_SECONDS", 1.0))  # Spacing of fsyncs for "interval"
+WAL_IDLE_CLOSE_SECONDS = float(os.getenv("WAL_IDLE_CLOSE_SECONDS", 60))         # Close handles of idle streams
+
+# =============================================================================
+# LOG SINK (see backend/log_sink.py)
+# =============================================================================
+# LLM/tool call logs are queued and appended in batches to JSONL segments by a
+# background thread. Under overload records are sampled/dropped (and counted)
+# rather than blocking the caller.
+LOG_SINK_ENABLED = os.getenv("LOG_SINK_ENABLED", "true").lower() == "true"     # False = write synchronously
+LOG_SINK_QUEUE_MAX = int(os.getenv("LOG_SINK_QUEUE_MAX", 2000))                # Queued records before dropping
+LOG_SINK_BATCH_SIZE = int(os.getenv("LOG_SINK_BATCH_SIZE", 200))               # Max records per write batch
+LOG_SINK_FLUSH_INTERVAL_MS = float(os.getenv("LOG_SINK_FLUSH_INTERVAL_MS", 200))  # Max wait for a batch to fill
+LOG_SINK_MAX_FIELD_CHARS = int(os.getenv("LOG_SINK_MAX_FIELD_CHARS", 0))       # Truncate long payload strings (0 = off)
+LOG_SINK_COMPRESS = os.getenv("LOG_SINK_COMPRESS", "false").lower() == "true"  # zlib-compress stored records
+LOG_SINK_OVERLOAD_POLICY = os.getenv("LOG_SINK_OVERLOAD_POLICY", "sample").lower()  # "sample" or "drop"
+LOG_SINK_SAMPLE_WATERMARK = float(os.getenv("LOG_SINK_SAMPLE_WATERMARK", 0.75))  # Queue fill ratio that starts sampling
+LOG_SINK_SAMPLE_RATE = int(os.getenv("LOG_SINK_SAMPLE_RATE", 10))              # Keep 1 in N records while sampling
+LOG_SINK_SEGMENT_MAX_MB = float(os.getenv("LOG_SINK_SEGMENT_MAX_MB", 64))      # Rotate segment files beyond this size
+
+# =============================================================================
+# TASK SCHEDULER (see backend/task_scheduler.py)
+# =============================================================================
+# Chat and research tasks run on a fixed pool of event-loop workers. Chat is
+# dispatched ahead of research; beyond TASK_QUEUE_MAX waiting tasks,
+# /v1/chat/completions answers 429 with Retry-After.
+TASK_WORKER_POOL_SIZE = int(os.getenv("TASK_WORKER_POOL_SIZE", 8))             # Worker threads (one event loop each)
+TASK_MAX_CONCURRENT_CHAT = int(os.getenv("TASK_MAX_CONCURRENT_CHAT", 8))       # Running chat tasks at once
+TASK_MAX_CONCURRENT_RESEARCH = int(os.getenv("TASK_MAX_CONCURRENT_RESEARCH", 3))  # Running research tasks at once
+TASK_QUEUE_MAX = int(os.getenv("TASK_QUEUE_MAX", 32))                          # Waiting tasks before rejecting
+TASK_QUEUE_RETRY_AFTER_SECONDS = int(os.getenv("TASK_QUEUE_RETRY_AFTER_SECONDS", 5))  # Retry-After on 429
+
+# =============================================================================
+# DATABASE CONNECTION POOL
+# =============================================================================
+# Connections kept open between DatabaseWrapper calls (see backend/db_pool.py).
+# Overflow connections absorb bursts of concurrent chat tasks and are closed on release.
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 8))                               # Idle connections retained
+DB_POOL_MAX_OVERFLOW = int(os.getenv("DB_POOL_MAX_OVERFLOW", 16))              # Extra short-lived connections
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 30))                      # Seconds to wait for a free connection
+DB_POOL_RECYCLE_SECONDS = float(os.getenv("DB_POOL_RECYCLE_SECONDS", 3600))    # Replace connections older than this
+DB_POOL_PING_AFTER_SECONDS = float(os.getenv("DB_POOL_PING_AFTER_SECONDS", 60))  # Health-check connections idle longer than this
+
+# =============================================================================
+# MESSAGE HISTORY PAGINATION
+# =============================================================================
+# Opening a chat loads only its latest page of messages; older pages are
+# fetched by cursor (GET /api/chats/<id>/messages?before_id=&limit=).
+MESSAGE_PAGE_SIZE = int(os.getenv("MESSAGE_PAGE_SIZE", 50))                    # Messages per page when no limit is given
+MESSAGE_PAGE_MAX = int(os.getenv("MESSAGE_PAGE_MAX", 500))                     # Largest limit a client may request
+
 # =============================================================================
 # ERROR HANDLING CONFIGURATION
 # =============================================================================
@@ -308,6 +436,13 @@ FILE_UPLOAD_ALLOWED_TYPES = [
 FILE_RAG_ENABLED = True
 FILE_VISION_ENABLED = True  # Maximum tool rounds per conversation
 
+# Upload ingestion pipeline (backend/upload_pipeline.py)
+# /api/upload streams the body into storage and returns once it is stored;
+# extraction and embedding run afterwards on separate worker pools.
+FILE_INGEST_EXTRACT_WORKERS = int(os.getenv("FILE_INGEST_EXTRACT_WORKERS", 2))   # Concurrent extraction (PDF/OCR/DOCX) jobs
+FILE_INGEST_EMBED_WORKERS = int(os.getenv("FILE_INGEST_EMBED_WORKERS", 2))       # Concurrent chunk + embed jobs
+FILE_INGEST_HISTORY = int(os.getenv("FILE_INGEST_HISTORY", 256))                 # Finished jobs kept for status polling
+
 # Text-only model file upload settings
 # TEXT_ONLY_MODEL_MAX_FILES: Maximum number of files per chat for text-only models
 # Set to None for no limit, or a positive integer to enforce a limit
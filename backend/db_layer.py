@@ -5,6 +5,7 @@ This module provides the low-level database access layer that wraps SQLite
 with Write-Ahead Logging (WAL) mode. It includes:
 
 1. Connection Management:
+   - Pooled, thread-affine connections (backend/db_pool.py)
    - WAL mode enabled for concurrent reads/writes
    - Foreign key support enabled
    - Timeout handling for busy connections
@@ -40,6 +41,7 @@ import logging
 from contextlib import contextmanager
 from backend.cache_layer import cache_layer
 from backend.config import DATA_DIR
+from backend.db_pool import ConnectionPool
 
 logger = logging.getLogger(__name__)
 
@@ -99,39 +101,50 @@ def _log_db_lock(action: str, table: str, row_id: str = None, lock_type: str = N
 
 DB_PATH = os.path.join(DATA_DIR, "chats.db")
 
+connection_pool = ConnectionPool(DB_PATH)
+
 def make_connection() -> sqlite3.Connection:
     """
-    Open SQLite connection with WAL mode enabled.
+    Borrow a pooled SQLite connection with WAL mode enabled.
 
-    This function creates a new database connection with the following settings:
+    Connections come from the module-level ConnectionPool (see db_pool.py),
+    which applies the following settings once per physical connection:
     - WAL mode: Allows concurrent reads while writes are happening
     - NORMAL sync: Balanced durability and performance
     - 30 second busy timeout: Waits for locks to release
     - Foreign keys: Enabled for referential integrity
 
+    Calling close() on the returned connection hands it back to the pool.
+    A thread that releases a connection gets the same one back on its next
+    call while it is still idle.
+
     Returns:
         sqlite3.Connection: Configured database connection
 
     Raises:
         sqlite3.OperationalError: If connection cannot be established
     """
-    _log_db_connection("opening")
+    _log_db_connection("acquiring")
     start_time = time.time()
     try:
-        conn = sqlite3.connect(DB_PATH, timeout=30.0, check_same_thread=False)
-        c = conn.cursor()
-        c.execute("PRAGMA journal_mode=WAL")
-        c.execute("PRAGMA synchronous=NORMAL")
-        c.execute("PRAGMA busy_timeout=30000")
-        c.execute("PRAGMA foreign_keys=ON")
+        conn = connection_pool.acquire()
         duration_ms = (time.time() - start_time) * 1000
-        _log_db_connection(f"opened (duration_ms={duration_ms:.2f})")
+        _log_db_connection(f"acquired (duration_ms={duration_ms:.2f})")
         return conn
     except sqlite3.OperationalError as e:
         _log_db_connection(f"FAILED: {e}")
         logger.error(f"Failed to create DB connection: {e}")
         raise
 
+def get_pool_stats() -> dict:
+    """
+    Get connection pool statistics for monitoring.
+
+    Returns:
+        dict: Pool occupancy and lifetime counters (see ConnectionPool.get_stats)
+    """
+    return connection_pool.get_stats()
+
 def execute_with_fk(conn, sql, params=()):
     """
     Execute SQL with foreign key support enabled.
@@ -161,7 +174,7 @@ def row_read_lock(table: str, row_id: str):
 
     This context manager provides a read lock at the row level. Before
     acquiring the lock, it waits for any pending WAL flushes to complete
-    to ensure consistency.
+    to ensure consistency; the flush notifies the waiter when it ends.
 
     The lock uses BEGIN (read transaction) which allows concurrent reads
     but blocks when a write lock is held.
@@ -181,8 +194,7 @@ def row_read_lock(table: str, row_id: str):
     max_wait = 30.0
     wait_start = time.time()
 
-    while cache_layer._is_row_wal_pending(table, row_id) and (time.time() - wait_start) < max_wait:
-        time.sleep(0.1)
+    cache_layer.wait_for_row_wal(table, row_id, max_wait)
     wait_duration_ms = (time.time() - wait_start) * 1000
     if wait_duration_ms > 100:
         _log_db_lock("WAITED", table, row_id, f"wal_pending wait_ms={wait_duration_ms:.2f}")
@@ -229,8 +241,7 @@ def table_read_lock(table: str):
     max_wait = 30.0
     wait_start = time.time()
 
-    while cache_layer._is_table_wal_pending(table) and (time.time() - wait_start) < max_wait:
-        time.sleep(0.1)
+    cache_layer.wait_for_table_wal(table, max_wait)
     wait_duration_ms = (time.time() - wait_start) * 1000
     if wait_duration_ms > 100:
         _log_db_lock("WAITED", table, None, f"table_wal_pending wait_ms={wait_duration_ms:.2f}")
@@ -287,6 +298,7 @@ def row_write_lock(table: str, row_id: str):
         conn.rollback()
         raise
     finally:
+        # Returns the connection to the pool, which rolls back anything left open
         conn.close()
         duration_ms = (time.time() - start_time) * 1000
         _log_db_lock("RELEASED", table, row_id, f"row_write duration_ms={duration_ms:.2f}")
@@ -327,6 +339,7 @@ def table_write_lock(table: str):
         conn.rollback()
         raise
     finally:
+        # Returns the connection to the pool, which rolls back anything left open
         conn.close()
         duration_ms = (time.time() - start_time) * 1000
         _log_db_lock("RELEASED", table, None, f"table_write duration_ms={duration_ms:.2f}")
@@ -0,0 +1,410 @@
+"""
+Pooled, thread-affine SQLite connection manager.
+
+This module sits underneath db_layer.make_connection() and keeps a bounded
+set of open SQLite connections alive between calls, so that DatabaseWrapper
+methods no longer pay for a fresh connect + PRAGMA round on every query.
+
+1. Connection Lifecycle:
+   - Connections are created lazily with all PRAGMAs applied exactly once
+   - conn.close() returns the connection to the pool instead of closing it
+   - Session state (open transaction, row_factory, foreign_keys) is reset
+     on release so the next borrower gets a clean connection
+
+2. Thread Affinity:
+   - Idle connections remember the thread that last used them
+   - A thread asking for a connection first gets back its own idle one,
+     which keeps SQLite page cache warm and avoids cross-thread hand-offs
+
+3. Bounds:
+   - DB_POOL_SIZE connections are kept open while idle
+   - Up to DB_POOL_MAX_OVERFLOW extra connections may be opened under
+     bursts; they are physically closed when released
+   - When both are exhausted, callers wait up to DB_POOL_TIMEOUT seconds
+
+4. Health Checks:
+   - Connections idle longer than DB_POOL_PING_AFTER_SECONDS are pinged
+     with SELECT 1 before being handed out
+   - Connections older than DB_POOL_RECYCLE_SECONDS are closed and replaced
+   - Any connection that fails to reset cleanly is discarded
+
+Logging
+-------
+This module logs pool events at debug level:
+- Connection creation, reuse, discard
+- Waits for a free connection
+"""
+import sqlite3
+import threading
+import time
+import logging
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Deque, Dict, Optional
+
+from backend import config
+
+logger = logging.getLogger(__name__)
+
+
+def _log_pool_op(op_type: str, details: str = None):
+    """
+    Internal logging helper for connection pool operations.
+
+    Args:
+        op_type: Operation type (e.g., "CREATE", "REUSE", "DISCARD")
+        details: Optional additional details string
+    """
+    msg = f"[DB POOL {op_type}]"
+    if details:
+        msg += f" | {details}"
+    logger.debug(msg)
+
+
+class PooledConnection(sqlite3.Connection):
+    """
+    sqlite3.Connection whose close() hands the connection back to its pool.
+
+    Callers keep using the familiar `conn = make_connection(); try: ...
+    finally: conn.close()` pattern; the pool decides whether the underlying
+    SQLite handle is kept or really closed.
+
+    Attributes:
+        pool: Owning ConnectionPool (None once detached)
+        owner_thread: Thread ident that last borrowed this connection
+        created_at: Epoch seconds when the physical connection was opened
+        last_used: Epoch seconds when the connection was last released
+        checked_out: True while a caller holds the connection
+        overflow: True if this connection is not retained after release
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.pool: Optional["ConnectionPool"] = None
+        self.owner_thread: Optional[int] = None
+        self.created_at: float = time.time()
+        self.last_used: float = self.created_at
+        self.checked_out: bool = False
+        self.overflow: bool = False
+
+    def close(self) -> None:
+        """Return the connection to its pool (or close it if unpooled)."""
+        if self.pool is None:
+            self.close_physical()
+            return
+        self.pool.release(self)
+
+    def close_physical(self) -> None:
+        """Really close the underlying SQLite handle."""
+        self.pool = None
+        sqlite3.Connection.close(self)
+
+
+class ConnectionPool:
+    """
+    Bounded pool of thread-affine SQLite connections.
+
+    Usage:
+        pool = ConnectionPool("/path/to/chats.db")
+        conn = pool.acquire()
+        try:
+            conn.execute("SELECT 1")
+        finally:
+            conn.close()  # returns to pool
+
+    Args:
+        db_path: SQLite database file path
+        pool_size: Maximum number of idle connections kept open
+        max_overflow: Extra connections allowed beyond pool_size under load
+        timeout: Seconds to wait for a free connection before failing
+        recycle_seconds: Max physical connection age before replacement
+        ping_after_seconds: Idle time after which a connection is pinged
+        busy_timeout_ms: SQLite busy_timeout applied to every connection
+    """
+
+    def __init__(self, db_path: str,
+                 pool_size: int = None,
+                 max_overflow: int = None,
+                 timeout: float = None,
+                 recycle_seconds: float = None,
+                 ping_after_seconds: float = None,
+                 busy_timeout_ms: int = 30000):
+        self.db_path = db_path
+        self.pool_size = pool_size if pool_size is not None else config.DB_POOL_SIZE
+        self.max_overflow = max_overflow if max_overflow is not None else config.DB_POOL_MAX_OVERFLOW
+        self.timeout = timeout if timeout is not None else config.DB_POOL_TIMEOUT
+        self.recycle_seconds = recycle_seconds if recycle_seconds is not None else config.DB_POOL_RECYCLE_SECONDS
+        self.ping_after_seconds = ping_after_seconds if ping_after_seconds is not None else config.DB_POOL_PING_AFTER_SECONDS
+        self.busy_timeout_ms = busy_timeout_ms
+
+        self._cond = threading.Condition()
+        self._idle: Deque[PooledConnection] = deque()
+        self._in_use: int = 0
+        self._closed: bool = False
+
+        # Counters for get_stats()
+        self._stats: Dict[str, int] = {
+            'created': 0,
+            'closed': 0,
+            'checkouts': 0,
+            'reused': 0,
+            'affinity_hits': 0,
+            'overflow_created': 0,
+            'waits': 0,
+            'timeouts': 0,
+            'health_check_failures': 0,
+            'recycled': 0,
+            'peak_in_use': 0,
+        }
+
+    # ==================== CONNECTION CREATION ====================
+
+    def _create(self, overflow: bool) -> PooledConnection:
+        """
+        Open a new physical connection and apply PRAGMAs once.
+
+        Args:
+            overflow: Whether this connection is closed on release
+
+        Returns:
+            PooledConnection: Freshly configured connection
+
+        Raises:
+            sqlite3.OperationalError: If the connection cannot be opened
+        """
+        start_time = time.time()
+        conn = sqlite3.connect(self.db_path, timeout=self.busy_timeout_ms / 1000.0,
+                               check_same_thread=False, factory=PooledConnection)
+        try:
+            c = conn.cursor()
+            c.execute("PRAGMA journal_mode=WAL")
+            c.execute("PRAGMA synchronous=NORMAL")
+            c.execute(f"PRAGMA busy_timeout={int(self.busy_timeout_ms)}")
+            c.execute("PRAGMA foreign_keys=ON")
+            c.close()
+        except sqlite3.Error:
+            conn.close_physical()
+            raise
+        conn.pool = self
+        conn.overflow = overflow
+        with self._cond:
+            self._stats['created'] += 1
+            if overflow:
+                self._stats['overflow_created'] += 1
+        duration_ms = (time.time() - start_time) * 1000
+        _log_pool_op("CREATE", f"overflow={overflow} duration_ms={duration_ms:.2f}")
+        return conn
+
+    def _is_healthy(self, conn: PooledConnection) -> bool:
+        """
+        Decide whether an idle connection may be handed out again.
+
+        Args:
+            conn: Idle connection taken from the pool
+
+        Returns:
+            bool: True if the connection is usable, False if it must be discarded
+        """
+        now = time.time()
+        if self.recycle_seconds and now - conn.created_at > self.recycle_seconds:
+            with self._cond:
+                self._stats['recycled'] += 1
+            return False
+        if self.ping_after_seconds is not None and now - conn.last_used > self.ping_after_seconds:
+            try:
+                conn.execute("SELECT 1").fetchone()
+            except sqlite3.Error as e:
+                _log_pool_op("HEALTH_CHECK_FAILED", f"error={e}")
+                with self._cond:
+                    self._stats['health_check_failures'] += 1
+                return False
+        return True
+
+    def _discard(self, conn: PooledConnection) -> None:
+        """Close a connection that is leaving the pool for good."""
+        try:
+            conn.close_physical()
+        except sqlite3.Error as e:
+            logger.warning(f"[DB POOL] Error closing connection: {e}")
+        with self._cond:
+            self._stats['closed'] += 1
+
+    # ==================== CHECKOUT / RELEASE ====================
+
+    def _take_idle(self, thread_id: int) -> Optional[PooledConnection]:
+        """
+        Pop an idle connection, preferring one last used by this thread.
+
+        Must be called with self._cond held.
+        """
+        if not self._idle:
+            return None
+        for conn in reversed(self._idle):
+            if conn.owner_thread == thread_id:
+                self._idle.remove(conn)
+                self._stats['affinity_hits'] += 1
+                return conn
+        # Most recently released connection is most likely to be warm
+        return self._idle.pop()
+
+    def acquire(self) -> PooledConnection:
+        """
+        Borrow a connection from the pool.
+
+        Returns:
+            PooledConnection: Connection ready for use; call close() to return it
+
+        Raises:
+            sqlite3.OperationalError: If no connection frees up within the timeout
+        """
+        thread_id = threading.get_ident()
+        deadline = time.time() + self.timeout if self.timeout is not None else None
+        waited = False
+
+        while True:
+            conn = None
+            create_overflow = None
+            with self._cond:
+                if self._closed:
+                    raise sqlite3.OperationalError("Connection pool is closed")
+                conn = self._take_idle(thread_id)
+                if conn is None:
+                    total = self._in_use + len(self._idle)
+                    if total < self.pool_size:
+                        create_overflow = False
+                    elif total < self.pool_size + self.max_overflow:
+                        create_overflow = True
+                    else:
+                        remaining = deadline - time.time() if deadline is not None else None
+                        if remaining is not None and remaining <= 0:
+                            self._stats['timeouts'] += 1
+                            _log_pool_op("TIMEOUT", f"in_use={self._in_use} idle={len(self._idle)}")
+                            raise sqlite3.OperationalError(
+                                f"Timed out after {self.timeout}s waiting for a database connection"
+                            )
+                        if not waited:
+                            self._stats['waits'] += 1
+                            waited = True
+                        self._cond.wait(timeout=remaining)
+                        continue
+                # Reserve the slot before leaving the lock
+                self._in_use += 1
+
+            try:
+                if conn is not None and not self._is_healthy(conn):
+                    self._discard(conn)
+                    conn = None
+                    create_overflow = False
+                if conn is None:
+                    conn = self._create(overflow=bool(create_overflow))
+                else:
+                    with self._cond:
+                        self._stats['reused'] += 1
+            except Exception:
+                with self._cond:
+                    self._in_use -= 1
+                    self._cond.notify()
+                raise
+
+            conn.owner_thread = thread_id
+            conn.checked_out = True
+            with self._cond:
+                self._stats['checkouts'] += 1
+                if self._in_use > self._stats['peak_in_use']:
+                    self._stats['peak_in_use'] = self._in_use
+            return conn
+
+    def _reset(self, conn: PooledConnection) -> bool:
+        """
+        Restore per-session state before a connection goes back to idle.
+
+        Args:
+            conn: Connection being released
+
+        Returns:
+            bool: True if the connection was reset cleanly
+        """
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+            conn.row_factory = None
+            # Some writers turn FK enforcement off for bulk deletes/migrations
+            conn.execute("PRAGMA foreign_keys=ON")
+            return True
+        except sqlite3.Error as e:
+            _log_pool_op("RESET_FAILED", f"error={e}")
+            return False
+
+    def release(self, conn: PooledConnection) -> None:
+        """
+        Return a borrowed connection to the pool.
+
+        Safe to call more than once; only the first call has an effect.
+
+        Args:
+            conn: Connection previously returned by acquire()
+        """
+        if not conn.checked_out:
+            return
+        conn.checked_out = False
+        conn.last_used = time.time()
+
+        keep = not conn.overflow and self._reset(conn)
+        with self._cond:
+            self._in_use -= 1
+            if keep and not self._closed and len(self._idle) < self.pool_size:
+                self._idle.append(conn)
+                keep_idle = True
+            else:
+                keep_idle = False
+            self._cond.notify()
+        if not keep_idle:
+            self._discard(conn)
+
+    @contextmanager
+    def connection(self):
+        """
+        Context manager that borrows a connection and always returns it.
+
+        Yields:
+            PooledConnection: Connection from the pool
+        """
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    # ==================== MAINTENANCE ====================
+
+    def close_all(self) -> None:
+        """
+        Close every idle connection and refuse new checkouts.
+
+        Connections still checked out are closed when they are released.
+        """
+        with self._cond:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+            self._cond.notify_all()
+        for conn in idle:
+            self._discard(conn)
+        _log_pool_op("CLOSE_ALL", f"closed_idle={len(idle)}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get pool statistics for monitoring.
+
+        Returns:
+            Dictionary with pool bounds, current occupancy and lifetime counters
+        """
+        with self._cond:
+            stats = dict(self._stats)
+            stats.update({
+                'pool_size': self.pool_size,
+                'max_overflow': self.max_overflow,
+                'in_use': self._in_use,
+                'idle': len(self._idle),
+            })
+        return stats
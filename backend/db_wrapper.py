@@ -13,6 +13,8 @@ interface to the database with the Cache-Aside pattern:
 2. Cache Invalidation:
    - After write operations, affected rows are invalidated in cache
    - This ensures reads fetch fresh data without expensive readback queries
+   - chats_full:<chat_id> is registered as depending on chats:<chat_id> and
+     messages:chat:<chat_id>, so invalidating either base drops it as well
 
 3. Layered Architecture:
    - db_wrapper.py: High-level API with cache integration
@@ -27,7 +29,7 @@ interface to the database with the Cache-Aside pattern:
 Logging
 -------
 This module logs all high-level database operations:
-- get_chat, get_chat_full, get_messages
+- get_chat, get_chat_full, get_messages, get_messages_page
 - save_chat, update_chat, delete_chat
 - add_message, save_canvas_meta
 - All cache invalidations
@@ -41,7 +43,8 @@ import re
 import time
 import logging
 from backend.cache_layer import cache_layer
-from backend.db_layer import make_connection
+from backend.db_layer import make_connection, get_pool_stats
+from backend.config import MESSAGE_PAGE_SIZE
 
 logger = logging.getLogger(__name__)
 
@@ -63,6 +66,112 @@ def _log_db_wrapper_op(op_type: str, chat_id: str = None, details: str = None):
     logger.debug(msg)
 
 
+_MESSAGE_COLUMNS = ('role', 'content', 'timestamp', 'model', 'tool_calls', 'tool_call_id', 'name')
+
+
+def _serialize_message(msg: dict) -> dict:
+    """
+    Convert an in-memory message dict to the column values stored in `messages`.
+
+    Args:
+        msg: Message dict with keys: role, content, timestamp, model,
+             tool_calls, tool_call_id, name, uploadedFiles
+
+    Returns:
+        dict: One value per column in _MESSAGE_COLUMNS
+    """
+    # Extract fields with defaults
+    role = msg.get('role', '')
+    content = msg.get('content', '')
+    timestamp = msg.get('timestamp', time.time())
+    model = msg.get('model')
+    tool_calls = msg.get('tool_calls')
+    tool_call_id = msg.get('tool_call_id')
+    name = msg.get('name', '')
+    uploaded_files = msg.get('uploadedFiles')
+
+    # Safety guard: serialize content and tool_calls if list/dict
+    if isinstance(content, (list, dict)):
+        content = json.dumps(content)
+    if isinstance(tool_calls, (list, dict)):
+        tool_calls = json.dumps(tool_calls)
+
+    # Handle None values
+    if content is None:
+        content = ""
+    if name is None:
+        name = ""
+
+    # Store uploadedFiles as JSON in content if present
+    if uploaded_files is not None:
+        # For strings: wrap in {"text": ..., "uploadedFiles": ...}
+        # For dicts (multi-part content): add uploadedFiles to the dict
+        # For other types: create {"text": ..., "uploadedFiles": ...}
+        if isinstance(content, str):
+            # Check if content is already a JSON string with uploadedFiles
+            try:
+                parsed = json.loads(content)
+                if isinstance(parsed, dict) and 'uploadedFiles' in parsed:
+                    # Content is already a JSON object with uploadedFiles
+                    # Just ensure the uploadedFiles in content matches the one we're saving
+                    content_obj = {**parsed, 'uploadedFiles': uploaded_files}
+                    content = json.dumps(content_obj)
+                else:
+                    # Regular string content
+                    content_obj = {"text": content, "uploadedFiles": uploaded_files}
+                    content = json.dumps(content_obj)
+            except (json.JSONDecodeError, TypeError, ValueError):
+                # Not valid JSON, treat as regular string
+                content_obj = {"text": content, "uploadedFiles": uploaded_files}
+                content = json.dumps(content_obj)
+        elif isinstance(content, dict) and not isinstance(content, list):
+            # Multi-part content: add uploadedFiles as a field
+            content_obj = {**content, "uploadedFiles": uploaded_files}
+            content = json.dumps(content_obj)
+        else:
+            content_obj = {"text": content if content is not None else "", "uploadedFiles": uploaded_files}
+            content = json.dumps(content_obj)
+
+    return {'role': role, 'content': content, 'timestamp': timestamp, 'model': model,
+            'tool_calls': tool_calls, 'tool_call_id': tool_call_id, 'name': name}
+
+
+def _normalize_tool_calls(tool_calls):
+    """Parse stored/incoming tool_calls so equal calls compare equal regardless of JSON formatting."""
+    if isinstance(tool_calls, str):
+        try:
+            tool_calls = json.loads(tool_calls)
+        except (json.JSONDecodeError, TypeError, ValueError):
+            return tool_calls
+    return tool_calls or None
+
+
+def _message_identity(row: dict) -> tuple:
+    """The fields that make two message rows the same message (timestamp/model excluded)."""
+    return (row.get('role'), row.get('content'), _normalize_tool_calls(row.get('tool_calls')),
+            row.get('tool_call_id') or "", row.get('name') or "")
+
+
+def _common_prefix_length(persisted: list, rows: list) -> int:
+    """Number of leading rows that are already persisted unchanged."""
+    n = 0
+    for old, new in zip(persisted, rows):
+        # Cheap exact comparison first; tool_calls are only parsed when their text differs
+        if (old['role'] != new['role'] or old['content'] != new['content']
+                or (old['tool_call_id'] or "") != (new['tool_call_id'] or "")
+                or (old['name'] or "") != (new['name'] or "")):
+            break
+        if old['tool_calls'] != new['tool_calls'] and _message_identity(old) != _message_identity(new):
+            break
+        n += 1
+    return n
+
+
+def _message_page_key(chat_id: str, before_id, limit: int) -> str:
+    """Cache key of one page window: the `limit` messages of a chat below before_id."""
+    return f"page:{chat_id}:{before_id or 'tail'}:{limit}"
+
+
 class DatabaseWrapper:
     """
     Unified database wrapper with Cache-Aside pattern.
@@ -166,7 +275,9 @@ class DatabaseWrapper:
         """
         _log_db_wrapper_op("GET_CHAT_FULL_START", chat_id)
         fetch_start = time.time()
-        result = cache_layer.get("chats_full", chat_id, lambda: self._get_chat_full_fetch(chat_id), ttl=60)
+        # Derived from the chat row and its messages; invalidating either drops it
+        result = cache_layer.get("chats_full", chat_id, lambda: self._get_chat_full_fetch(chat_id), ttl=60,
+                                 depends_on=[("chats", chat_id), ("messages", f"chat:{chat_id}")])
         duration_ms = (time.time() - fetch_start) * 1000
         _log_db_wrapper_op("GET_CHAT_FULL_END", chat_id, f"duration_ms={duration_ms:.2f}")
         return result
@@ -286,7 +397,6 @@ class DatabaseWrapper:
         _write()
         db_write_duration = (time.time() - write_start) * 1000
         cache_layer.invalidate("chats", chat_id)
-        cache_layer.invalidate("chats_full", chat_id)
         invalidate_duration = (time.time() - write_start - db_write_duration / 1000) * 1000
         _log_db_wrapper_op("SAVE_CHAT_END", chat_id, f"db_ms={db_write_duration:.2f} invalidate_ms={invalidate_duration:.2f}")
 
@@ -375,7 +485,6 @@ class DatabaseWrapper:
         _write()
         db_write_duration = (time.time() - write_start) * 1000
         cache_layer.invalidate("chats", chat_id)
-        cache_layer.invalidate("chats_full", chat_id)
         _log_db_wrapper_op("UPDATE_CHAT_END", chat_id, f"duration_ms={db_write_duration:.2f}")
 
     def delete_chat(self, chat_id: str):
@@ -401,7 +510,8 @@ class DatabaseWrapper:
         _write()
         db_write_duration = (time.time() - write_start) * 1000
         cache_layer.invalidate("chats", chat_id)
-        cache_layer.invalidate("chats_full", chat_id)
+        cache_layer.invalidate("messages", f"chat:{chat_id}")
+        self._invalidate_message_pages(chat_id)
         _log_db_wrapper_op("DELETE_CHAT_END", chat_id, f"duration_ms={db_write_duration:.2f}")
 
     # ==================== MESSAGE OPERATIONS ====================
@@ -428,8 +538,86 @@ class DatabaseWrapper:
         finally:
             conn.close()
 
+    def get_messages_page(self, chat_id: str, before_id: int = None, limit: int = MESSAGE_PAGE_SIZE):
+        """
+        Get one page of a chat's messages with keyset pagination (row-level).
+
+        Returns the `limit` messages immediately before message id `before_id`
+        (the latest messages when None), oldest first. Pass the returned
+        `before_id` back to get the previous page. Each page window is cached
+        under its own key, so opening a long chat reads only its last page.
+
+        Args:
+            chat_id: Unique chat identifier
+            before_id: Exclusive upper bound on message id, or None for the latest page
+            limit: Maximum number of messages in the page
+
+        Returns:
+            dict: {'messages': [...], 'has_more': bool, 'before_id': cursor for
+                  the previous page, or None when this is the first page}
+        """
+        _log_db_wrapper_op("GET_MESSAGES_PAGE_START", chat_id, f"before_id={before_id} limit={limit}")
+        fetch_start = time.time()
+        result = cache_layer.get("messages", _message_page_key(chat_id, before_id, limit),
+                                 lambda: self._get_messages_page_fetch(chat_id, before_id, limit))
+        duration_ms = (time.time() - fetch_start) * 1000
+        _log_db_wrapper_op("GET_MESSAGES_PAGE_END", chat_id,
+                           f"duration_ms={duration_ms:.2f} count={len(result['messages'])}")
+        return result
+
+    def _get_messages_page_fetch(self, chat_id: str, before_id, limit: int):
+        """Internal fetch function for get_messages_page."""
+        conn = make_connection()
+        try:
+            conn.row_factory = sqlite3.Row
+            c = conn.cursor()
+            # One extra row tells whether an earlier page exists
+            if before_id is None:
+                c.execute("SELECT * FROM messages WHERE chat_id = ? ORDER BY id DESC LIMIT ?",
+                          (chat_id, limit + 1))
+            else:
+                c.execute("SELECT * FROM messages WHERE chat_id = ? AND id < ? ORDER BY id DESC LIMIT ?",
+                          (chat_id, before_id, limit + 1))
+            rows = [dict(m) for m in c.fetchall()]
+        finally:
+            conn.close()
+        has_more = len(rows) > limit
+        messages = rows[:limit][::-1]
+        return {
+            'messages': messages,
+            'has_more': has_more,
+            'before_id': messages[0]['id'] if has_more else None,
+        }
+
+    def _invalidate_message_pages(self, chat_id: str, from_id: int = None):
+        """
+        Drop cached page windows of a chat's messages.
+
+        A window holds ids below its before_id, so a change to ids >= from_id
+        only affects the latest-page windows and windows with before_id above
+        from_id; older windows stay cached. Without from_id every window of
+        the chat is dropped.
+        """
+        prefix = f"page:{chat_id}:"
+
+        def _stale(row_id):
+            if not row_id.startswith(prefix):
+                return False
+            if from_id is None:
+                return True
+            before = row_id[len(prefix):].split(":", 1)[0]
+            return before == "tail" or int(before) > from_id
+
+        cache_layer.invalidate_where("messages", _stale)
+
     def update_message_content(self, message_id: int, content: str):
-        """Update message content by ID. Used for system message reconciliation."""
+        """
+        Update message content by ID. Used for system message reconciliation.
+
+        Only the owning chat's cached messages, the page windows that can hold
+        the message and (through its dependency) that chat's chats_full entry
+        are invalidated; other chats stay cached.
+        """
         _log_db_wrapper_op("UPDATE_MESSAGE_CONTENT_START", None, f"message_id={message_id}")
         write_start = time.time()
 
@@ -437,18 +625,19 @@ class DatabaseWrapper:
             conn = make_connection()
             try:
                 c = conn.cursor()
-                c.execute("UPDATE messages SET content = ? WHERE id = ?", (content, message_id))
+                c.execute("UPDATE messages SET content = ? WHERE id = ? RETURNING chat_id", (content, message_id))
+                row = c.fetchone()
                 conn.commit()
+                return row[0] if row else None
             finally:
                 conn.close()
 
-        _write()
+        chat_id = _write()
         db_write_duration = (time.time() - write_start) * 1000
-        # Invalidate all chat message caches that might contain this message
-        # (we don't know chat_id here, so do a table-level invalidate)
-        cache_layer.invalidate("messages")
-        cache_layer.invalidate("chats_full")
-        _log_db_wrapper_op("UPDATE_MESSAGE_CONTENT_END", None, f"message_id={message_id} duration_ms={db_write_duration:.2f}")
+        if chat_id is not None:
+            cache_layer.invalidate("messages", f"chat:{chat_id}")
+            self._invalidate_message_pages(chat_id, message_id)
+        _log_db_wrapper_op("UPDATE_MESSAGE_CONTENT_END", chat_id, f"message_id={message_id} duration_ms={db_write_duration:.2f}")
 
     def add_message(self, chat_id: str, role: str, content: str,
                     model: str = None, timestamp: float = None,
@@ -487,19 +676,20 @@ class DatabaseWrapper:
                 ''', (chat_id, role, content, timestamp, model,
                       tool_calls, tool_call_id, name))
                 conn.commit()
+                return c.lastrowid
             finally:
                 conn.close()
 
         # Write to DB directly, then invalidate cache
-        _write()
+        message_id = _write()
         db_write_duration = (time.time() - write_start) * 1000
         cache_layer.invalidate("messages", f"chat:{chat_id}")
-        cache_layer.invalidate("chats_full", chat_id)
+        self._invalidate_message_pages(chat_id, message_id)
         _log_db_wrapper_op("ADD_MESSAGE_END", chat_id, f"duration_ms={db_write_duration:.2f}")
 
     def add_messages_batch(self, chat_id: str, messages: list) -> bool:
         """
-        Add multiple messages in a single atomic transaction.
+        Persist a chat's full message list in a single atomic transaction.
 
         All messages are saved OR none are saved (transaction rollback on failure).
         This ensures atomicity for chat rounds with multiple components:
@@ -508,6 +698,14 @@ class DatabaseWrapper:
         - Tool call results
         - Final assistant response
 
+        Callers pass the whole history, but only the delta is written: the list
+        is diffed against the persisted rows (validated against the chat's last
+        message id inside the transaction), rows after the first difference are
+        deleted and only the new tail is inserted. An ordinary turn therefore
+        inserts just its own messages, whatever the length of the chat. The
+        messages and chats_full cache rows for this chat are updated in place
+        rather than invalidated.
+
         Args:
             chat_id: The chat identifier
             messages: List of message dicts with keys: role, content, timestamp,
@@ -519,88 +717,66 @@ class DatabaseWrapper:
         _log_db_wrapper_op("ADD_MESSAGES_BATCH_START", chat_id, f"count={len(messages)}")
         write_start = time.time()
 
+        try:
+            rows = [_serialize_message(msg) for msg in messages]
+            cached = self.get_messages(chat_id) or []
+        except Exception as e:
+            _log_db_wrapper_op("ADD_MESSAGES_BATCH_ERROR", chat_id, f"error={str(e)}")
+            return False
+
         def _write():
             conn = make_connection()
             try:
                 c = conn.cursor()
-                c.execute("BEGIN")  # Start transaction
-                c.execute('DELETE FROM messages WHERE chat_id = ?', (chat_id,))
-
-                for msg in messages:
-                    # Extract fields with defaults
-                    role = msg.get('role', '')
-                    content = msg.get('content', '')
-                    timestamp = msg.get('timestamp', time.time())
-                    model = msg.get('model')
-                    tool_calls = msg.get('tool_calls')
-                    tool_call_id = msg.get('tool_call_id')
-                    name = msg.get('name', '')
-                    uploaded_files = msg.get('uploadedFiles')
-
-                    # Safety guard: serialize content and tool_calls if list/dict
-                    if isinstance(content, (list, dict)):
-                        content = json.dumps(content)
-                    if isinstance(tool_calls, (list, dict)):
-                        tool_calls = json.dumps(tool_calls)
-
-                    # Handle None values
-                    if content is None:
-                        content = ""
-                    if name is None:
-                        name = ""
-
-                    # Store uploadedFiles as JSON in content if present
-                    if uploaded_files is not None:
-                        # For strings: wrap in {"text": ..., "uploadedFiles": ...}
-                        # For dicts (multi-part content): add uploadedFiles to the dict
-                        # For other types: create {"text": ..., "uploadedFiles": ...}
-                        if isinstance(content, str):
-                            # Check if content is already a JSON string with uploadedFiles
-                            try:
-                                parsed = json.loads(content)
-                                if isinstance(parsed, dict) and 'uploadedFiles' in parsed:
-                                    # Content is already a JSON object with uploadedFiles
-                                    # Just ensure the uploadedFiles in content matches the one we're saving
-                                    content_obj = {**parsed, 'uploadedFiles': uploaded_files}
-                                    content = json.dumps(content_obj)
-                                else:
-                                    # Regular string content
-                                    content_obj = {"text": content, "uploadedFiles": uploaded_files}
-                                    content = json.dumps(content_obj)
-                            except (json.JSONDecodeError, TypeError, ValueError):
-                                # Not valid JSON, treat as regular string
-                                content_obj = {"text": content, "uploadedFiles": uploaded_files}
-                                content = json.dumps(content_obj)
-                        elif isinstance(content, dict) and not isinstance(content, list):
-                            # Multi-part content: add uploadedFiles as a field
-                            content_obj = {**content, "uploadedFiles": uploaded_files}
-                            content = json.dumps(content_obj)
-                        else:
-                            content_obj = {"text": content if content is not None else "", "uploadedFiles": uploaded_files}
-                            content = json.dumps(content_obj)
-
-                    c.execute('''
-                        INSERT INTO messages (chat_id, role, content, timestamp, model,
-                                              tool_calls, tool_call_id, name)
-                        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                    ''', (chat_id, role, content, timestamp, model,
-                          tool_calls, tool_call_id, name))
-
-                c.execute("COMMIT")  # Commit all at once
-                return True
-            except Exception as e:
-                c.execute("ROLLBACK")  # Rollback on error
-                raise e
+                c.execute("BEGIN IMMEDIATE")  # Start transaction, holding the write lock for the diff
+                try:
+                    # The cached list is only trusted if it still ends at the last persisted id
+                    c.execute("SELECT COUNT(*), MAX(id) FROM messages WHERE chat_id = ?", (chat_id,))
+                    count, last_id = c.fetchone()
+                    persisted = cached
+                    if count != len(cached) or (last_id or 0) != (cached[-1]['id'] if cached else 0):
+                        c.row_factory = sqlite3.Row
+                        c.execute("SELECT * FROM messages WHERE chat_id = ? ORDER BY id ASC", (chat_id,))
+                        persisted = [dict(m) for m in c.fetchall()]
+                        c.row_factory = None
+
+                    keep = _common_prefix_length(persisted, rows)
+                    if keep < len(persisted):
+                        c.execute("DELETE FROM messages WHERE chat_id = ? AND id >= ?",
+                                  (chat_id, persisted[keep]['id']))
+
+                    inserted = []
+                    for row in rows[keep:]:
+                        c.execute('''
+                            INSERT INTO messages (chat_id, role, content, timestamp, model,
+                                                  tool_calls, tool_call_id, name)
+                            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                        ''', (chat_id, *(row[col] for col in _MESSAGE_COLUMNS)))
+                        inserted.append({'id': c.lastrowid, 'chat_id': chat_id, **row})
+
+                    c.execute("COMMIT")  # Commit all at once
+                    first_changed = (persisted[keep] if keep < len(persisted)
+                                     else inserted[0] if inserted else None)
+                    return (persisted[:keep] + inserted, len(persisted) - keep, len(inserted),
+                            first_changed['id'] if first_changed else None)
+                except Exception:
+                    c.execute("ROLLBACK")  # Rollback on error
+                    raise
             finally:
                 conn.close()
 
         try:
-            _write()
+            current, deleted, inserted, first_changed_id = _write()
             db_write_duration = (time.time() - write_start) * 1000
-            # Invalidate cache for all affected rows
-            cache_layer.invalidate("messages", f"chat:{chat_id}")
-            cache_layer.invalidate("chats_full", chat_id)
-            _log_db_wrapper_op("ADD_MESSAGES_BATCH_END", chat_id, f"duration_ms={db_write_duration:.2f}")
+            # Update only this chat's cache rows with the exact persisted state
+            cache_layer.set("messages", f"chat:{chat_id}", current)
+            if not cache_layer.update("chats_full", chat_id, lambda chat: {**chat, 'messages': list(current)}):
+                # Not cached, or a fill is in flight with the old history: detach it
+                cache_layer.invalidate("chats_full", chat_id)
+            if first_changed_id is not None:
+                self._invalidate_message_pages(chat_id, first_changed_id)
+            _log_db_wrapper_op("ADD_MESSAGES_BATCH_END", chat_id,
+                               f"duration_ms={db_write_duration:.2f} inserted={inserted} deleted={deleted}")
             return True
         except Exception as e:
             db_write_duration = (time.time() - write_start) * 1000
@@ -944,7 +1120,7 @@ class DatabaseWrapper:
         _write()
         db_write_duration = (time.time() - write_start) * 1000
         cache_layer.invalidate("messages", f"chat:{chat_id}")
-        cache_layer.invalidate("chats_full", chat_id)
+        self._invalidate_message_pages(chat_id, from_id)
         _log_db_wrapper_op("DELETE_MESSAGES_FROM_END", chat_id, f"duration_ms={db_write_duration:.2f}")
 
     def truncate_messages(self, chat_id: str, keep_up_to_index: int):
@@ -981,7 +1157,7 @@ class DatabaseWrapper:
         _write()
         db_write_duration = (time.time() - write_start) * 1000
         cache_layer.invalidate("messages", f"chat:{chat_id}")
-        cache_layer.invalidate("chats_full", chat_id)
+        self._invalidate_message_pages(chat_id)
         _log_db_wrapper_op("TRUNCATE_MESSAGES_END", chat_id, f"duration_ms={db_write_duration:.2f}")
         return True
 
@@ -1015,7 +1191,7 @@ class DatabaseWrapper:
         _write()
         db_write_duration = (time.time() - write_start) * 1000
         cache_layer.invalidate("messages", f"chat:{chat_id}")
-        cache_layer.invalidate("chats_full", chat_id)
+        self._invalidate_message_pages(chat_id)
         _log_db_wrapper_op("EDIT_MESSAGE_BY_INDEX_END", chat_id, f"duration_ms={db_write_duration:.2f}")
         return True
 
@@ -1040,7 +1216,7 @@ class DatabaseWrapper:
         _write()
         db_write_duration = (time.time() - write_start) * 1000
         cache_layer.invalidate("messages", f"chat:{chat_id}")
-        cache_layer.invalidate("chats_full", chat_id)
+        self._invalidate_message_pages(chat_id)
         _log_db_wrapper_op("CLEAR_MESSAGES_END", chat_id, f"duration_ms={db_write_duration:.2f}")
 
     def delete_all_chats(self):
@@ -1241,7 +1417,6 @@ class DatabaseWrapper:
         _write()
         db_write_duration = (time.time() - write_start) * 1000
         cache_layer.invalidate("chats", chat_id)
-        cache_layer.invalidate("chats_full", chat_id)
         _log_db_wrapper_op("RENAME_CHAT_END", chat_id, f"duration_ms={db_write_duration:.2f}")
 
     # ==================== UPDATE METHODS ====================
@@ -1310,7 +1485,7 @@ class DatabaseWrapper:
             _write()
             db_write_duration = (time.time() - write_start) * 1000
             cache_layer.invalidate("messages", f"chat:{chat_id}")
-            cache_layer.invalidate("chats_full", chat_id)
+            self._invalidate_message_pages(chat_id, last_id)
             _log_db_wrapper_op("DELETE_LAST_TURN_END", chat_id, f"last_id={last_id} fetch_ms={fetch_duration:.2f} write_ms={db_write_duration:.2f}")
         else:
             _log_db_wrapper_op("DELETE_LAST_TURN_NOT_FOUND", chat_id, f"fetch_ms={fetch_duration:.2f}")
@@ -1584,13 +1759,21 @@ class DatabaseWrapper:
         """Get cache statistics."""
         return cache_layer.get_stats()
 
+    def get_pool_stats(self):
+        """Get SQLite connection pool statistics."""
+        return get_pool_stats()
+
     # ==================== FILE OPERATIONS ====================
 
     def save_file(self, file_id: str, chat_id: str, original_filename: str,
                   stored_filename: str, mime_type: str, file_size: int,
-                  content_text: str = None):
+                  content_text: str = None, content_sha256: str = None):
         """Save file metadata to database.
 
+        With content_sha256 the file references a content-addressed blob:
+        the file_blobs row is created (ref_count 1) or its ref_count is
+        incremented in the same transaction as the insert.
+
         Args:
             file_id: Unique file identifier
             chat_id: Chat session ID
@@ -1599,6 +1782,10 @@ class DatabaseWrapper:
             mime_type: MIME type of the file
             file_size: File size in bytes
             content_text: Extracted text content for RAG (optional)
+            content_sha256: sha256 of the stored bytes (optional)
+
+        Returns:
+            The blob's ref_count after this save, or None without content_sha256
         """
         logger = logging.getLogger(__name__)
         logger.info(f"[DB_SAVE_FILE_START] file_id={file_id}, chat_id={chat_id}, original_filename={original_filename}")
@@ -1611,14 +1798,25 @@ class DatabaseWrapper:
             try:
                 c = conn.cursor()
                 logger.debug(f"[DB_INSERT] Executing INSERT with params: file_id={file_id}, chat_id={chat_id}, original_filename={original_filename}, stored_filename={stored_filename}, mime_type={mime_type}, file_size={file_size}")
+                now = time.time()
                 c.execute('''
                     INSERT INTO files (id, chat_id, original_filename, stored_filename,
-                                      mime_type, file_size, content_text, created_at)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                                      mime_type, file_size, content_text, created_at, content_sha256)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
                 ''', (file_id, chat_id, original_filename, stored_filename,
-                      mime_type, file_size, content_text, time.time()))
+                      mime_type, file_size, content_text, now, content_sha256))
+                ref_count = None
+                if content_sha256:
+                    c.execute('''
+                        INSERT INTO file_blobs (sha256, stored_filename, file_size, ref_count, created_at)
+                        VALUES (?, ?, ?, 1, ?)
+                        ON CONFLICT(sha256) DO UPDATE SET ref_count = ref_count + 1
+                    ''', (content_sha256, stored_filename, file_size, now))
+                    c.execute("SELECT ref_count FROM file_blobs WHERE sha256 = ?", (content_sha256,))
+                    ref_count = c.fetchone()[0]
                 conn.commit()
                 logger.debug(f"[DB_INSERT] Success, rows affected: {c.rowcount}")
+                return ref_count
             except sqlite3.IntegrityError as e:
                 logger.error(f"[DB_INSERT_ERROR] Integrity error: {e}")
                 logger.error(f"[DB_INSERT_ERROR] Params: file_id={file_id}, chat_id={chat_id}, original_filename={original_filename}, stored_filename={stored_filename}, mime_type={mime_type}, file_size={file_size}")
@@ -1630,11 +1828,12 @@ class DatabaseWrapper:
             finally:
                 conn.close()
 
-        _write()
+        ref_count = _write()
         db_write_duration = (time.time() - write_start) * 1000
         cache_layer.invalidate("files", f"chat:{chat_id}")
         _log_db_wrapper_op("SAVE_FILE_END", chat_id, f"file_id={file_id} duration_ms={db_write_duration:.2f}")
         logger.info(f"[DB_SAVE_FILE_END] file_id={file_id} duration_ms={db_write_duration:.2f}")
+        return ref_count
 
     def get_file(self, file_id: str) -> dict:
         """Get file metadata by ID.
@@ -1696,11 +1895,51 @@ class DatabaseWrapper:
                           f"duration_ms={duration_ms:.2f} count={file_count}")
         return result
 
+    def get_files_by_processing_status(self, statuses: list) -> list:
+        """Get all files whose processing_status is one of statuses.
+
+        Args:
+            statuses: e.g. ['pending', 'processing']
+
+        Returns:
+            List of file metadata dicts, oldest first
+        """
+        _log_db_wrapper_op("GET_FILES_BY_STATUS_START", None, f"statuses={statuses}")
+        fetch_start = time.time()
+
+        def _fetch():
+            conn = make_connection()
+            try:
+                conn.row_factory = sqlite3.Row
+                c = conn.cursor()
+                placeholders = ",".join("?" for _ in statuses)
+                c.execute(
+                    f"SELECT * FROM files WHERE processing_status IN ({placeholders}) ORDER BY created_at",
+                    tuple(statuses)
+                )
+                return [dict(row) for row in c.fetchall()]
+            finally:
+                conn.close()
+
+        result = _fetch() if statuses else []
+        duration_ms = (time.time() - fetch_start) * 1000
+        _log_db_wrapper_op("GET_FILES_BY_STATUS_END", None,
+                          f"duration_ms={duration_ms:.2f} count={len(result)}")
+        return result
+
     def delete_file(self, file_id: str):
         """Delete a file from database and storage.
 
+        If the file references a content-addressed blob, the blob's ref_count
+        is decremented in the same transaction and the blob row is dropped
+        once nothing references it.
+
         Args:
             file_id: Unique file identifier
+
+        Returns:
+            The blob's remaining ref_count (0 means the stored copy may be
+            removed), or None if the file had no blob
         """
         _log_db_wrapper_op("DELETE_FILE_START", None, f"file_id={file_id}")
         write_start = time.time()
@@ -1709,18 +1948,93 @@ class DatabaseWrapper:
             conn = make_connection()
             try:
                 c = conn.cursor()
+                c.execute("SELECT chat_id, content_sha256 FROM files WHERE id = ?", (file_id,))
+                row = c.fetchone()
                 c.execute("DELETE FROM files WHERE id = ?", (file_id,))
+                remaining = None
+                if row and row[1] and c.rowcount:
+                    c.execute("UPDATE file_blobs SET ref_count = ref_count - 1 WHERE sha256 = ?", (row[1],))
+                    c.execute("SELECT ref_count FROM file_blobs WHERE sha256 = ?", (row[1],))
+                    blob = c.fetchone()
+                    remaining = max(blob[0], 0) if blob else 0
+                    if remaining == 0:
+                        c.execute("DELETE FROM file_blobs WHERE sha256 = ?", (row[1],))
                 conn.commit()
+                return (row[0] if row else None), remaining
             finally:
                 conn.close()
 
-        _write()
+        chat_id, remaining = _write()
         db_write_duration = (time.time() - write_start) * 1000
-        # Get chat_id for cache invalidation
-        file_meta = self.get_file(file_id)
-        if file_meta:
-            cache_layer.invalidate("files", f"chat:{file_meta.get('chat_id')}")
-        _log_db_wrapper_op("DELETE_FILE_END", None, f"file_id={file_id} duration_ms={db_write_duration:.2f}")
+        if chat_id:
+            cache_layer.invalidate("files", f"chat:{chat_id}")
+        _log_db_wrapper_op("DELETE_FILE_END", chat_id, f"file_id={file_id} duration_ms={db_write_duration:.2f}")
+        return remaining
+
+    def get_file_blob(self, content_sha256: str) -> dict:
+        """Get the content-addressed blob row for a sha256.
+
+        Args:
+            content_sha256: sha256 of the file bytes
+
+        Returns:
+            {sha256, stored_filename, file_size, ref_count, created_at} or None
+        """
+        _log_db_wrapper_op("GET_FILE_BLOB_START", None, f"sha256={content_sha256[:12]}")
+        fetch_start = time.time()
+
+        def _fetch():
+            conn = make_connection()
+            try:
+                conn.row_factory = sqlite3.Row
+                c = conn.cursor()
+                c.execute("SELECT * FROM file_blobs WHERE sha256 = ?", (content_sha256,))
+                row = c.fetchone()
+                return dict(row) if row else None
+            finally:
+                conn.close()
+
+        result = _fetch()
+        duration_ms = (time.time() - fetch_start) * 1000
+        _log_db_wrapper_op("GET_FILE_BLOB_END", None, f"duration_ms={duration_ms:.2f}")
+        return result
+
+    def find_processed_duplicate(self, content_sha256: str, mime_type: str,
+                                 exclude_file_id: str = None) -> dict:
+        """Find a completed file with identical bytes whose extracted text can be reused.
+
+        Args:
+            content_sha256: sha256 of the file bytes
+            mime_type: MIME type the text must have been extracted as
+            exclude_file_id: File to skip (usually the one being ingested)
+
+        Returns:
+            The oldest matching file metadata dict, or None
+        """
+        _log_db_wrapper_op("FIND_DUPLICATE_START", None, f"sha256={content_sha256[:12]}")
+        fetch_start = time.time()
+
+        def _fetch():
+            conn = make_connection()
+            try:
+                conn.row_factory = sqlite3.Row
+                c = conn.cursor()
+                c.execute(
+                    "SELECT * FROM files WHERE content_sha256 = ? AND mime_type = ? AND id != ? "
+                    "AND processing_status = 'completed' AND content_text IS NOT NULL "
+                    "ORDER BY created_at LIMIT 1",
+                    (content_sha256, mime_type, exclude_file_id or "")
+                )
+                row = c.fetchone()
+                return dict(row) if row else None
+            finally:
+                conn.close()
+
+        result = _fetch()
+        duration_ms = (time.time() - fetch_start) * 1000
+        _log_db_wrapper_op("FIND_DUPLICATE_END", None,
+                          f"duration_ms={duration_ms:.2f} found={result is not None}")
+        return result
 
     def update_file_content(self, file_id: str, content_text: str) -> bool:
         """Update file metadata with extracted content.
@@ -0,0 +1,281 @@
+"""
+Persistent, content-addressed embedding cache.
+
+Embeddings are a pure function of (embedding model, task prefix, text), so a
+vector computed once can be reused whenever the same text is embedded again:
+a file is re-uploaded, a research page is revisited, or a collection is
+migrated. RAGManager.embed_texts() looks texts up here in one batch and only
+sends the misses to AIEmbeddingFunction.
+
+1. Keying:
+   - (model, task prefix, sha256 of the text before prefixing)
+   - The prefix is the literal string prepended for the task (e.g.
+     "title: none | text: "), so changing the prompt format invalidates
+     old entries instead of silently reusing them
+
+2. Storage:
+   - A dedicated SQLite file (EMBEDDING_CACHE_PATH), separate from chats.db
+   - Vectors are stored as packed float32 blobs, the precision ChromaDB
+     keeps them at anyway
+
+3. Eviction:
+   - Total vector bytes are bounded by EMBEDDING_CACHE_MAX_MB
+   - When exceeded, least recently used entries are deleted until the cache
+     is back under EMBEDDING_CACHE_EVICT_TO_RATIO of the bound
+
+4. Failure Mode:
+   - The cache is an optimization only; any SQLite error is logged and the
+     affected texts are treated as misses
+"""
+import hashlib
+import sqlite3
+import threading
+import time
+from array import array
+from typing import Any, Dict, List, Optional, Sequence
+
+from backend import config
+from backend.db_pool import ConnectionPool
+from backend.logger import log_event
+
+# SQLite limits the number of bound parameters per statement
+_LOOKUP_BATCH = 500
+_EVICT_BATCH = 500
+
+
+def content_hash(text: str) -> str:
+    """Return the sha256 hex digest used as the cache key for text."""
+    return hashlib.sha256(text.encode("utf-8", "surrogatepass")).hexdigest()
+
+
+def _pack(vector: Sequence[float]) -> bytes:
+    return array("f", vector).tobytes()
+
+
+def _unpack(blob: bytes) -> List[float]:
+    values = array("f")
+    values.frombytes(blob)
+    return values.tolist()
+
+
+class EmbeddingCache:
+    """
+    Size-bounded SQLite store of embedding vectors.
+
+    Usage:
+        cache = EmbeddingCache()
+        vectors = cache.get_many(model, prefix, texts)   # None for misses
+        cache.put_many(model, prefix, miss_texts, miss_vectors)
+
+    Args:
+        db_path: SQLite file for the cache
+        max_bytes: Upper bound on stored vector bytes
+        evict_to_ratio: Fraction of max_bytes to evict down to when full
+    """
+
+    def __init__(self, db_path: str = None, max_bytes: int = None, evict_to_ratio: float = None):
+        self.db_path = db_path or config.EMBEDDING_CACHE_PATH
+        self.max_bytes = int(max_bytes if max_bytes is not None else config.EMBEDDING_CACHE_MAX_MB * 1024 * 1024)
+        self.evict_to_ratio = evict_to_ratio if evict_to_ratio is not None else config.EMBEDDING_CACHE_EVICT_TO_RATIO
+
+        self._pool = ConnectionPool(self.db_path, pool_size=2, max_overflow=2)
+        self._lock = threading.Lock()
+        self._stats: Dict[str, int] = {
+            'hits': 0,
+            'misses': 0,
+            'writes': 0,
+            'evictions': 0,
+            'errors': 0,
+        }
+        self._total_bytes = 0
+        self._entries = 0
+        self._init_schema()
+
+    def _init_schema(self) -> None:
+        with self._pool.connection() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS embeddings (
+                    model TEXT NOT NULL,
+                    task_prefix TEXT NOT NULL,
+                    content_hash TEXT NOT NULL,
+                    dim INTEGER NOT NULL,
+                    vector BLOB NOT NULL,
+                    size_bytes INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_access REAL NOT NULL,
+                    PRIMARY KEY (model, task_prefix, content_hash)
+                ) WITHOUT ROWID
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_access ON embeddings(last_access)")
+            conn.commit()
+            row = conn.execute("SELECT COUNT(*), COALESCE(SUM(size_bytes), 0) FROM embeddings").fetchone()
+        self._entries, self._total_bytes = row[0], row[1]
+
+    def _record_error(self, op: str, error: Exception) -> None:
+        with self._lock:
+            self._stats['errors'] += 1
+        log_event("embedding_cache_error", {"op": op, "error": str(error), "path": self.db_path})
+
+    # ==================== LOOKUP / STORE ====================
+
+    def get_many(self, model: str, task_prefix: str, texts: List[str]) -> List[Optional[List[float]]]:
+        """
+        Look up embeddings for several texts in one pass.
+
+        Args:
+            model: Embedding model id
+            task_prefix: Prefix the embedding function prepends for this task
+            texts: Texts to look up (unprefixed)
+
+        Returns:
+            List aligned with texts: the cached vector, or None on a miss
+        """
+        hashes = [content_hash(t) for t in texts]
+        found: Dict[str, List[float]] = {}
+        try:
+            with self._pool.connection() as conn:
+                unique = list(dict.fromkeys(hashes))
+                for i in range(0, len(unique), _LOOKUP_BATCH):
+                    batch = unique[i:i + _LOOKUP_BATCH]
+                    placeholders = ",".join("?" * len(batch))
+                    rows = conn.execute(
+                        f"SELECT content_hash, vector FROM embeddings "
+                        f"WHERE model = ? AND task_prefix = ? AND content_hash IN ({placeholders})",
+                        [model, task_prefix, *batch]
+                    ).fetchall()
+                    for h, blob in rows:
+                        found[h] = _unpack(blob)
+                if found:
+                    now = time.time()
+                    conn.executemany(
+                        "UPDATE embeddings SET last_access = ? "
+                        "WHERE model = ? AND task_prefix = ? AND content_hash = ?",
+                        [(now, model, task_prefix, h) for h in found]
+                    )
+                    conn.commit()
+        except sqlite3.Error as e:
+            self._record_error("get_many", e)
+            found = {}
+
+        results = [found.get(h) for h in hashes]
+        hits = sum(1 for r in results if r is not None)
+        with self._lock:
+            self._stats['hits'] += hits
+            self._stats['misses'] += len(results) - hits
+        return results
+
+    def put_many(self, model: str, task_prefix: str, texts: List[str], vectors: List[List[float]]) -> None:
+        """
+        Store freshly computed embeddings, then evict if over the size bound.
+
+        Empty vectors (failed or malformed responses) are never cached.
+
+        Args:
+            model: Embedding model id
+            task_prefix: Prefix the embedding function prepends for this task
+            texts: Texts that were embedded (unprefixed)
+            vectors: Embeddings aligned with texts
+        """
+        now = time.time()
+        added_bytes = 0
+        added_entries = 0
+        try:
+            with self._pool.connection() as conn:
+                for text, vector in zip(texts, vectors):
+                    if vector is None or len(vector) == 0:
+                        continue
+                    blob = _pack(vector)
+                    cur = conn.execute(
+                        "INSERT OR IGNORE INTO embeddings "
+                        "(model, task_prefix, content_hash, dim, vector, size_bytes, created_at, last_access) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                        (model, task_prefix, content_hash(text), len(vector), blob, len(blob), now, now)
+                    )
+                    if cur.rowcount > 0:
+                        added_bytes += len(blob)
+                        added_entries += 1
+                conn.commit()
+        except sqlite3.Error as e:
+            self._record_error("put_many", e)
+            return
+
+        with self._lock:
+            self._stats['writes'] += added_entries
+            self._entries += added_entries
+            self._total_bytes += added_bytes
+            over = self._total_bytes > self.max_bytes
+        if over:
+            self._evict()
+
+    # ==================== EVICTION ====================
+
+    def _evict(self) -> None:
+        """Delete least recently used entries until under the low-water mark."""
+        target = int(self.max_bytes * self.evict_to_ratio)
+        evicted = 0
+        try:
+            with self._pool.connection() as conn:
+                while True:
+                    with self._lock:
+                        if self._total_bytes <= target:
+                            break
+                    rows = conn.execute(
+                        "SELECT model, task_prefix, content_hash, size_bytes FROM embeddings "
+                        "ORDER BY last_access LIMIT ?", (_EVICT_BATCH,)
+                    ).fetchall()
+                    if not rows:
+                        break
+                    conn.executemany(
+                        "DELETE FROM embeddings WHERE model = ? AND task_prefix = ? AND content_hash = ?",
+                        [(m, p, h) for m, p, h, _ in rows]
+                    )
+                    conn.commit()
+                    freed = sum(r[3] for r in rows)
+                    evicted += len(rows)
+                    with self._lock:
+                        self._total_bytes -= freed
+                        self._entries -= len(rows)
+                        self._stats['evictions'] += len(rows)
+        except sqlite3.Error as e:
+            self._record_error("evict", e)
+        if evicted:
+            log_event("embedding_cache_evicted", {"entries": evicted, "bytes": self._total_bytes})
+
+    # ==================== MAINTENANCE ====================
+
+    def clear(self) -> None:
+        """Delete every cached embedding and reset counters."""
+        try:
+            with self._pool.connection() as conn:
+                conn.execute("DELETE FROM embeddings")
+                conn.commit()
+        except sqlite3.Error as e:
+            self._record_error("clear", e)
+            return
+        with self._lock:
+            self._total_bytes = 0
+            self._entries = 0
+            for key in self._stats:
+                self._stats[key] = 0
+
+    def close(self) -> None:
+        """Close all pooled connections to the cache file."""
+        self._pool.close_all()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get cache statistics for monitoring.
+
+        Returns:
+            Dictionary with hit/miss counters, hit_rate, size and eviction counts
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            lookups = stats['hits'] + stats['misses']
+            stats.update({
+                'hit_rate': (stats['hits'] / lookups) if lookups else 0.0,
+                'entries': self._entries,
+                'bytes': self._total_bytes,
+                'max_bytes': self.max_bytes,
+            })
+        return stats
@@ -0,0 +1,357 @@
+"""
+Micro-batching scheduler for /v1/embeddings requests.
+
+AIEmbeddingFunction used to send each caller's inputs as sequential
+EMBEDDING_BATCH_SIZE slices with a bare requests.post(), so concurrent callers
+(research stages storing chunks, file ingestion, query embedding) each paid
+their own round trips and never shared a request. The scheduler sits between
+them and the embedding server:
+
+1. Coalescing:
+   - Callers enqueue texts (with token counts) and block on per-item futures
+   - A dispatcher thread cuts the queue into micro-batches, closing a batch
+     when it reaches the current batch size, when it reaches the token budget
+     (EMBEDDING_BATCH_MAX_TOKENS), or when its oldest item has waited
+     EMBEDDING_BATCH_MAX_DELAY_MS
+   - Items from different callers share a batch; each caller gets its own
+     embeddings back in order
+
+2. Concurrency:
+   - Up to EMBEDDING_MAX_IN_FLIGHT requests run at once. The dispatcher only
+     cuts a batch once a slot is free, so under load the queue fills up and
+     batches grow instead of queuing many small requests
+   - Each sender thread posts through its pooled keep-alive requests.Session
+     (backend/http_clients.py)
+
+3. Adaptive Batch Size:
+   - Starts at EMBEDDING_BATCH_SIZE. A full batch slower than
+     EMBEDDING_TARGET_LATENCY_MS shrinks the size by a quarter, a full batch
+     under half the target grows it by a quarter, and a failed request
+     halves it. The size stays within [EMBEDDING_MIN_BATCH_SIZE,
+     EMBEDDING_BATCH_SIZE]
+
+Schedulers are shared per (url, model, api key) via get_scheduler(), so
+every AIEmbeddingFunction talking to the same server coalesces together.
+"""
+import atexit
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Deque, Dict, List, Optional, Sequence, Tuple
+
+from backend import config
+from backend.http_clients import get_sync_session
+from backend.logger import log_event, log_llm_call
+
+
+class _Item:
+    """One text waiting to be embedded."""
+    __slots__ = ('text', 'tokens', 'future', 'enqueued')
+
+    def __init__(self, text: str, tokens: int):
+        self.text = text
+        self.tokens = tokens
+        self.future: Future = Future()
+        self.enqueued = time.monotonic()
+
+
+class EmbeddingScheduler:
+    """
+    Coalesce embedding requests from many threads into concurrent micro-batches.
+
+    Usage:
+        scheduler = get_scheduler(url, model)
+        vectors = scheduler.embed(["title: none | text: ..."], token_counts=[12])
+
+    Args:
+        url: Full /v1/embeddings endpoint URL
+        model: Embedding model name sent in each request
+        api_key: Optional bearer token
+        max_batch_size: Largest batch (and the starting size)
+        min_batch_size: Smallest size adaptation may shrink to
+        max_batch_tokens: Token budget per batch (0 = no limit)
+        max_delay_ms: Longest an item waits for a batch to fill
+        max_in_flight: Concurrent requests
+        target_latency_ms: Request latency the batch size adapts toward
+            (0 disables adaptation)
+        timeout: Per-request HTTP timeout in seconds
+    """
+
+    def __init__(self, url: str, model: str, api_key: Optional[str] = None,
+                 max_batch_size: Optional[int] = None, min_batch_size: Optional[int] = None,
+                 max_batch_tokens: Optional[int] = None, max_delay_ms: Optional[float] = None,
+                 max_in_flight: Optional[int] = None, target_latency_ms: Optional[float] = None,
+                 timeout: Optional[float] = None):
+        self.url = url
+        self.model = model
+        self.api_key = api_key
+        self.max_batch_size = max(1, max_batch_size or config.EMBEDDING_BATCH_SIZE)
+        self.min_batch_size = max(1, min(min_batch_size or config.EMBEDDING_MIN_BATCH_SIZE, self.max_batch_size))
+        self.max_batch_tokens = config.EMBEDDING_BATCH_MAX_TOKENS if max_batch_tokens is None else max_batch_tokens
+        delay_ms = config.EMBEDDING_BATCH_MAX_DELAY_MS if max_delay_ms is None else max_delay_ms
+        self.max_delay = delay_ms / 1000.0
+        self.max_in_flight = max(1, max_in_flight or config.EMBEDDING_MAX_IN_FLIGHT)
+        target_ms = config.EMBEDDING_TARGET_LATENCY_MS if target_latency_ms is None else target_latency_ms
+        self.target_latency = target_ms / 1000.0
+        self.timeout = timeout or max(config.TIMEOUT_LLM_BLOCKING or 60, 120)  # Ensure at least 120s for embedding
+
+        self.batch_size = self.max_batch_size
+        self._queue: Deque[_Item] = deque()
+        self._queued_tokens = 0
+        self._cond = threading.Condition()
+        self._slots = threading.Semaphore(self.max_in_flight)
+        self._closed = False
+        self._executor = ThreadPoolExecutor(max_workers=self.max_in_flight, thread_name_prefix="embed-send")
+        self._dispatcher = threading.Thread(target=self._dispatch_loop, name="embed-dispatch", daemon=True)
+        self._stats_lock = threading.Lock()
+        self._stats: Dict[str, Any] = {
+            'items': 0, 'batches': 0, 'errors': 0, 'in_flight': 0, 'peak_in_flight': 0,
+            'batch_size_grown': 0, 'batch_size_shrunk': 0, 'last_latency_ms': 0.0,
+        }
+        self._dispatcher.start()
+
+    # ==================== CALLER API ====================
+
+    def submit(self, texts: Sequence[str], token_counts: Optional[Sequence[int]] = None) -> List[Future]:
+        """
+        Enqueue texts and return one Future per text (resolving to its embedding).
+
+        Args:
+            texts: Already formatted inputs (task prefix applied)
+            token_counts: Token count per text, for the batch token budget;
+                estimated from length when omitted
+
+        Raises:
+            RuntimeError: If the scheduler has been closed
+        """
+        if token_counts is None:
+            token_counts = [len(t) // 4 + 1 for t in texts]
+        items = [_Item(text, tokens) for text, tokens in zip(texts, token_counts)]
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("EmbeddingScheduler is closed")
+            self._queue.extend(items)
+            self._queued_tokens += sum(item.tokens for item in items)
+            self._cond.notify_all()
+        return [item.future for item in items]
+
+    def embed(self, texts: Sequence[str], token_counts: Optional[Sequence[int]] = None) -> List[List[float]]:
+        """
+        Embed texts, blocking until every embedding is back.
+
+        Returns:
+            List of embedding vectors in input order
+
+        Raises:
+            Exception: The error of the first failed request among these texts
+        """
+        if not texts:
+            return []
+        return [future.result() for future in self.submit(texts, token_counts)]
+
+    def close(self) -> None:
+        """Send everything still queued, then stop the dispatcher and senders."""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        self._dispatcher.join()
+        self._executor.shutdown(wait=True)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get scheduler statistics for monitoring.
+
+        Returns:
+            Dictionary with item/batch/error counters, in-flight counts, the
+            current adaptive batch size and queue depth
+        """
+        with self._stats_lock:
+            stats = dict(self._stats)
+        with self._cond:
+            stats['queued'] = len(self._queue)
+            stats['batch_size'] = self.batch_size
+        stats['avg_batch_items'] = stats['items'] / stats['batches'] if stats['batches'] else 0.0
+        stats['max_in_flight'] = self.max_in_flight
+        return stats
+
+    # ==================== DISPATCH ====================
+
+    def _batch_ready(self) -> bool:
+        """Caller holds _cond."""
+        return (len(self._queue) >= self.batch_size
+                or (self.max_batch_tokens and self._queued_tokens >= self.max_batch_tokens))
+
+    def _take_batch(self) -> List[_Item]:
+        """Pop the next batch within the size and token limits (at least one item). Caller holds _cond."""
+        batch: List[_Item] = []
+        tokens = 0
+        while self._queue and len(batch) < self.batch_size:
+            item = self._queue[0]
+            if batch and self.max_batch_tokens and tokens + item.tokens > self.max_batch_tokens:
+                break
+            self._queue.popleft()
+            tokens += item.tokens
+            batch.append(item)
+        self._queued_tokens -= tokens
+        return batch
+
+    def _dispatch_loop(self) -> None:
+        while True:
+            # Cut a batch only once a request slot is free; meanwhile the queue keeps filling
+            self._slots.acquire()
+            with self._cond:
+                while not self._queue and not self._closed:
+                    self._cond.wait()
+                if not self._queue:
+                    self._slots.release()
+                    return
+                deadline = self._queue[0].enqueued + self.max_delay
+                while not self._batch_ready() and not self._closed:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch = self._take_batch()
+            with self._stats_lock:
+                self._stats['in_flight'] += 1
+                self._stats['peak_in_flight'] = max(self._stats['peak_in_flight'], self._stats['in_flight'])
+            self._executor.submit(self._send, batch)
+
+    def _send(self, batch: List[_Item]) -> None:
+        start = time.monotonic()
+        try:
+            embeddings = self._post([item.text for item in batch])
+        except Exception as e:
+            self._adapt(None, len(batch))
+            with self._stats_lock:
+                self._stats['errors'] += 1
+            log_event("rag_embedding_exception", {"url": self.url, "error": str(e), "items": len(batch)})
+            for item in batch:
+                item.future.set_exception(e)
+            return
+        finally:
+            with self._stats_lock:
+                self._stats['in_flight'] -= 1
+            self._slots.release()
+        latency = time.monotonic() - start
+        self._adapt(latency, len(batch))
+        with self._stats_lock:
+            self._stats['items'] += len(batch)
+            self._stats['batches'] += 1
+            self._stats['last_latency_ms'] = latency * 1000
+        for item, embedding in zip(batch, embeddings):
+            item.future.set_result(embedding)
+
+    def _post(self, inputs: List[str]) -> List[List[float]]:
+        """POST one batch and return its embeddings in input order."""
+        payload = {"model": self.model, "input": inputs}
+        headers = {"Content-Type": "application/json"}
+        api_key = self.api_key or config.EMBEDDING_API_KEY
+        if api_key:
+            headers["Authorization"] = f"Bearer {api_key}"
+        log_event("rag_embedding_batch_start", {
+            "items": len(inputs),
+            "max_chars": max(len(s) for s in inputs),
+            "batch_size": self.batch_size,
+            "url": self.url,
+        })
+
+        start_time = time.time()
+        response = get_sync_session().post(self.url, json=payload, headers=headers, timeout=self.timeout)
+        if response.status_code != 200:
+            log_event("rag_embedding_error", {
+                "url": self.url,
+                "status_code": response.status_code,
+                "response": response.text[:500],
+                "items": len(inputs),
+            })
+        response.raise_for_status()
+        data = response.json()
+
+        # Handle potential variations in response format
+        if isinstance(data, dict) and "data" in data:
+            # Standard OpenAI format; servers may answer out of order
+            rows = sorted(data["data"], key=lambda row: row.get("index", 0))
+            embeddings = [row["embedding"] for row in rows]
+        elif isinstance(data, list):
+            # Simple list format
+            embeddings = data
+        else:
+            log_event("rag_embedding_unexpected_response",
+                      {"keys": list(data.keys()) if isinstance(data, dict) else type(data).__name__})
+            embeddings = [[] for _ in inputs]
+        if len(embeddings) != len(inputs):
+            raise ValueError(f"Embedding server returned {len(embeddings)} embeddings for {len(inputs)} inputs")
+
+        log_llm_call(payload, f"Successfully embedded batch ({len(inputs)} items).", self.model,
+                     duration_s=time.time() - start_time, call_type="embedding")
+        return embeddings
+
+    def _adapt(self, latency: Optional[float], items: int) -> None:
+        """Adjust the batch size from one request's outcome (latency None = failed)."""
+        if not self.target_latency:
+            return
+        with self._cond:
+            size = self.batch_size
+            if latency is None:
+                new_size = max(self.min_batch_size, size // 2)
+            elif items < size:
+                return  # A partial batch says nothing about how a full one performs
+            elif latency > self.target_latency:
+                new_size = max(self.min_batch_size, size * 3 // 4)
+            elif latency < self.target_latency / 2:
+                new_size = min(self.max_batch_size, size + max(1, size // 4))
+            else:
+                return
+            self.batch_size = new_size
+        if new_size != size:
+            with self._stats_lock:
+                self._stats['batch_size_grown' if new_size > size else 'batch_size_shrunk'] += 1
+            log_event("rag_embedding_batch_size", {"from": size, "to": new_size,
+                                                   "latency_ms": None if latency is None else latency * 1000})
+
+
+_registry_lock = threading.Lock()
+_schedulers: Dict[Tuple[str, str, Optional[str]], EmbeddingScheduler] = {}
+
+
+def get_scheduler(url: str, model: str, api_key: Optional[str] = None) -> EmbeddingScheduler:
+    """
+    Get the shared scheduler for an embedding endpoint.
+
+    Args:
+        url: Full /v1/embeddings endpoint URL
+        model: Embedding model name
+        api_key: Optional bearer token
+
+    Returns:
+        EmbeddingScheduler: Created on first use, reused afterwards
+    """
+    key = (url, model, api_key)
+    with _registry_lock:
+        scheduler = _schedulers.get(key)
+        if scheduler is None:
+            scheduler = _schedulers[key] = EmbeddingScheduler(url, model, api_key)
+        return scheduler
+
+
+def shutdown_all() -> None:
+    """Close every shared scheduler (runs at interpreter exit)."""
+    with _registry_lock:
+        schedulers = list(_schedulers.values())
+        _schedulers.clear()
+    for scheduler in schedulers:
+        scheduler.close()
+
+
+def get_stats() -> Dict[str, Dict[str, Any]]:
+    """Stats of every shared scheduler, keyed by 'model@url'."""
+    with _registry_lock:
+        schedulers = dict(_schedulers)
+    return {f"{model}@{url}": s.get_stats() for (url, model, _), s in schedulers.items()}
+
+
+atexit.register(shutdown_all)
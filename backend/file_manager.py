@@ -16,7 +16,6 @@ from dataclasses import dataclass
 from backend import config
 from backend.config import (
     DATA_DIR,
-    FILE_UPLOAD_MAX_SIZE,
     FILE_STORAGE_PATH,
     PDF_EXTRACTOR_ENABLED,
     PDF_OCR_ENABLED,
@@ -33,6 +32,7 @@ from backend.rag import FileRAG
 from backend.providers import RAGProvider
 from backend.rag import RAGManager
 from backend.pdf_extractor import PDFExtractor
+from backend.upload_pipeline import IngestJob, IngestionQueue, UploadSink, cleanup_partial_uploads
 
 logger = logging.getLogger(__name__)
 
@@ -103,6 +103,15 @@ class FileManager:
         # Initialize PDF extractor
         self.pdf_extractor = PDFExtractor(ocr_languages=PDF_OCR_LANGUAGES)
 
+        # Background extraction/embedding for streamed uploads (workers start on first submit)
+        self.ingest_queue = IngestionQueue(
+            extract=self._ingest_extract,
+            embed=self._ingest_embed,
+            set_status=self.update_file_processing_status
+        )
+        # Serializes blob reuse against last-reference removal (accept_upload/delete_file)
+        self._blob_lock = threading.Lock()
+
     def _generate_file_id(self) -> str:
         """Generate a unique file ID."""
         return f"file_{uuid.uuid4().hex[:16]}"
@@ -125,10 +134,14 @@ class FileManager:
         """Get file extension for a MIME type."""
         return SUPPORTED_MIME_TYPES.get(mime_type, '')
 
+    def _get_blob_filename(self, content_sha256: str, mime_type: str) -> str:
+        """Content-addressed storage name (the extension keeps MIME guessing working)."""
+        return f"{content_sha256}{self._get_extension_for_mime(mime_type)}"
+
     def save_file_metadata(self, file_id: str, chat_id: str, original_filename: str,
                           stored_filename: str, mime_type: str, file_size: int,
-                          content_text: str = None) -> FileMetadata:
-        """Save file metadata to database."""
+                          content_text: str = None, content_sha256: str = None) -> FileMetadata:
+        """Save file metadata to database (content_sha256 adds a blob reference)."""
         db.save_file(
             file_id=file_id,
             chat_id=chat_id,
@@ -136,7 +149,8 @@ class FileManager:
             stored_filename=stored_filename,
             mime_type=mime_type,
             file_size=file_size,
-            content_text=content_text
+            content_text=content_text,
+            content_sha256=content_sha256
         )
 
         return FileMetadata(
@@ -255,290 +269,140 @@ class FileManager:
             logger.error(f"Error encoding file for vision: {e}")
             return "", mime_type
 
-    def upload_file(self, file_path: str, chat_id: str, original_filename: str) -> Optional[FileMetadata]:
+    # ==================== STREAMED UPLOADS ====================
+
+    def new_upload_sink(self) -> UploadSink:
+        """Create the sink a multipart file part is streamed into (see app.py)."""
+        return UploadSink(self.storage_path)
+
+    def resolve_upload_mime_type(self, sink: UploadSink, original_filename: str,
+                                 mime_type: Optional[str]) -> Optional[str]:
+        """Validate the client's MIME type, falling back to the extension, then a PDF header."""
+        def _allowed(candidate):
+            return candidate in config.FILE_UPLOAD_ALLOWED_TYPES and self._validate_file_type(candidate)
+
+        if _allowed(mime_type):
+            return mime_type
+        if not mime_type or mime_type == 'application/octet-stream':
+            ext = os.path.splitext(original_filename)[1].lower()
+            mime_type = EXTENSION_MIME_MAP.get(ext)
+            if not mime_type and sink.head(8).startswith(b'%PDF-'):
+                mime_type = 'application/pdf'
+        return mime_type if _allowed(mime_type) else None
+
+    def accept_upload(self, sink: UploadSink, chat_id: str, original_filename: str,
+                      mime_type: str) -> FileMetadata:
         """
-        Upload and process a file.
-
-        Args:
-            file_path: Path to the file to upload
-            chat_id: Chat session ID
-            original_filename: Original filename
-
-        Returns:
-            FileMetadata if successful, None otherwise
-        """
-        try:
-            logger.info(f"[UPLOAD_START] file_path={file_path}, chat_id={chat_id}, original_filename={original_filename}")
-
-            # Validate file exists
-            if not os.path.exists(file_path):
-                logger.error(f"File not found: {file_path}")
-                return None
-            logger.debug(f"[UPLOAD] File exists, size: {os.path.getsize(file_path)} bytes")
-
-            # Get file info
-            file_size = os.path.getsize(file_path)
-            logger.debug(f"[UPLOAD] File size: {file_size} bytes")
-
-            # Check size limit
-            if file_size > FILE_UPLOAD_MAX_SIZE:
-                logger.error(f"File too large: {file_size} > {FILE_UPLOAD_MAX_SIZE}")
-                return None
-
-            # Determine MIME type
-            mime_type, _ = mimetypes.guess_type(file_path)
-            logger.debug(f"[UPLOAD] MIME type (guessed): {mime_type}")
-
-            # Handle unknown/unrecognized MIME types (None or octet-stream)
-            if not mime_type or mime_type == 'application/octet-stream':
-                # Try to determine from extension
-                ext = os.path.splitext(file_path)[1].lower()
-                mime_type = EXTENSION_MIME_MAP.get(ext, None)
-                logger.debug(f"[UPLOAD] MIME type (from extension): {mime_type}")
-
-            # Fallback: if still no valid MIME type, try to detect from file content
-            if not mime_type or mime_type == 'application/octet-stream':
-                # Try to detect PDF by checking for PDF header
-                try:
-                    with open(file_path, 'rb') as f:
-                        header = f.read(8)
-                        if header.startswith(b'%PDF-'):
-                            mime_type = 'application/pdf'
-                            logger.debug("[UPLOAD] MIME type (from PDF header): application/pdf")
-                except Exception:
-                    pass
-
-            # Final validation
-            if not self._validate_file_type(mime_type):
-                logger.error(f"Unsupported file type: {mime_type}")
-                return None
-            logger.info(f"[UPLOAD] Valid MIME type: {mime_type}")
-
-            # Generate safe filename
-            safe_filename = self._get_safe_filename(original_filename)
-            stored_path = os.path.join(self.storage_path, safe_filename)
-            logger.debug(f"[UPLOAD] Stored path: {stored_path}")
-
-            # Copy file to storage
-            import shutil
-            shutil.copy2(file_path, stored_path)
-            logger.debug(f"[UPLOAD] File copied to storage")
-
-            # Generate file ID
-            file_id = self._generate_file_id()
-            logger.debug(f"[UPLOAD] File ID: {file_id}")
-
-            # Extract content for RAG (in background for faster response)
-            content_text = self.extract_file_content(stored_path, mime_type)
-            logger.debug(f"[UPLOAD] Content extracted, length: {len(content_text) if content_text else 0} chars")
-
-            # Save metadata to DB
-            logger.info(f"[UPLOAD] Saving metadata to DB...")
-            metadata = self.save_file_metadata(
-                file_id=file_id,
-                chat_id=chat_id,
-                original_filename=original_filename,
-                stored_filename=safe_filename,
-                mime_type=mime_type,
-                file_size=file_size,
-                content_text=content_text
-            )
-            logger.info(f"[UPLOAD] Metadata saved: file_id={file_id}")
-
-            # Store in FileRAG for chunked embeddings (in background for faster response)
-            if self.file_rag and content_text and len(content_text.strip()) > 50:
-                try:
-                    self.file_rag.store_file(file_id, chat_id, content_text, original_filename)
-                    logger.debug(f"[UPLOAD] Added to FileRAG with chunked embeddings")
-                except Exception as e:
-                    logger.warning(f"Failed to add file to FileRAG: {e}")
+        Store a streamed upload and queue it for extraction and embedding.
 
-            logger.info(f"[UPLOAD_SUCCESS] file_id={file_id}")
-            return metadata
-
-        except Exception as e:
-            logger.error(f"[UPLOAD_ERROR] Error uploading file: {e}")
-            import traceback
-            logger.error(f"[UPLOAD_ERROR] Traceback: {traceback.format_exc()}")
-            return None
-
-    def upload_file_async(self, file_path: str, chat_id: str, original_filename: str) -> Optional[FileMetadata]:
-        """
-        Upload a file. For the current chat, processing is synchronous for immediate
-        availability. For other chats (background), processing is async.
+        Storage is content-addressed: the bytes are kept once per sha256 and
+        every upload of them references that blob. A repeat upload discards
+        its part file instead of committing it, and ingestion reuses the
+        earlier file's extracted text and embeddings. Metadata is saved with
+        processing_status 'pending' and the file handed to the ingestion
+        queue; poll get_ingest_progress() or the DB status for completion.
 
         Args:
-            file_path: Path to the file to upload
+            sink: Fully received UploadSink (not yet committed)
             chat_id: Chat session ID
             original_filename: Original filename
+            mime_type: Validated MIME type (see resolve_upload_mime_type)
 
         Returns:
-            FileMetadata if successful, None otherwise
+            FileMetadata for the stored file (content_text not yet extracted)
         """
-        try:
-            logger.info(f"[UPLOAD_ASYNC_START] file_path={file_path}, chat_id={chat_id}, original_filename={original_filename}")
-
-            # Validate file exists
-            if not os.path.exists(file_path):
-                logger.error(f"File not found: {file_path}")
-                return None
-
-            # Get file info
-            file_size = os.path.getsize(file_path)
-            logger.debug(f"[UPLOAD_ASYNC] File size: {file_size} bytes")
-
-            # Check size limit
-            if file_size > FILE_UPLOAD_MAX_SIZE:
-                logger.error(f"File too large: {file_size} > {FILE_UPLOAD_MAX_SIZE}")
-                return None
-
-            # Determine MIME type
-            mime_type, _ = mimetypes.guess_type(file_path)
-            logger.debug(f"[UPLOAD_ASYNC] MIME type (guessed): {mime_type}")
-
-            # Handle unknown/unrecognized MIME types
-            if not mime_type or mime_type == 'application/octet-stream':
-                ext = os.path.splitext(file_path)[1].lower()
-                mime_type = EXTENSION_MIME_MAP.get(ext, None)
-                logger.debug(f"[UPLOAD_ASYNC] MIME type (from extension): {mime_type}")
-
-            # Fallback: check PDF header
-            if not mime_type or mime_type == 'application/octet-stream':
-                try:
-                    with open(file_path, 'rb') as f:
-                        header = f.read(8)
-                        if header.startswith(b'%PDF-'):
-                            mime_type = 'application/pdf'
-                except Exception:
-                    pass
-
-            # Final validation
-            if not self._validate_file_type(mime_type):
-                logger.error(f"Unsupported file type: {mime_type}")
-                return None
-
-            # Generate safe filename
-            safe_filename = self._get_safe_filename(original_filename)
-            stored_path = os.path.join(self.storage_path, safe_filename)
-
-            # Copy file to storage
-            import shutil
-            shutil.copy2(file_path, stored_path)
-
-            # Generate file ID
-            file_id = self._generate_file_id()
-
-            # Save file metadata to database
-            self.save_file_metadata(file_id, chat_id, original_filename, safe_filename, mime_type, file_size)
-
-            # Extract content and store in FileRAG (synchronous for current chat)
+        content_sha256 = sink.sha256
+        file_id = self._generate_file_id()
+        with self._blob_lock:
+            blob = db.get_file_blob(content_sha256)
+            stored_filename = blob['stored_filename'] if blob else self._get_blob_filename(content_sha256, mime_type)
+            stored_path = os.path.join(self.storage_path, stored_filename)
+            duplicate = blob is not None and os.path.exists(stored_path)
+            if duplicate:
+                sink.discard()
+            else:
+                sink.commit(stored_filename)
             try:
-                logger.info(f"[UPLOAD_ASYNC] Extracting content from {stored_path}")
-                content_text = self.extract_file_content(stored_path, mime_type)
-                logger.info(f"[UPLOAD_ASYNC] Content extracted: {len(content_text) if content_text else 0} chars")
-
-                # Update file content in database
-                self.update_file_content(file_id, content_text)
-
-                # Store in FileRAG (synchronous - for current chat immediate availability)
-                if self.file_rag and content_text and len(content_text.strip()) > 50:
-                    try:
-                        logger.info(f"[UPLOAD_ASYNC] Storing in FileRAG")
-                        self.file_rag.store_file(file_id, chat_id, content_text, original_filename)
-                        logger.info(f"[UPLOAD_ASYNC] Added to FileRAG")
-                    except Exception as e:
-                        logger.warning(f"[UPLOAD_ASYNC] Failed to add to FileRAG: {e}")
-                else:
-                    logger.info(f"[UPLOAD_ASYNC] Skipping FileRAG - file_rag={self.file_rag is not None}, content={len(content_text) if content_text else 0} chars")
-
-                # Update status to completed
-                self.update_file_processing_status(file_id, 'completed')
-                logger.info(f"[UPLOAD_ASYNC] Completed for {file_id}")
-
-            except Exception as e:
-                logger.error(f"[UPLOAD_ASYNC_PROCESS_ERROR] Error: {e}", exc_info=True)
-                try:
-                    self.update_file_processing_status(file_id, 'failed')
-                except:
-                    pass
-
-            # Return metadata (after processing for current chat)
-            metadata = FileMetadata(
-                file_id=file_id,
-                chat_id=chat_id,
-                original_filename=original_filename,
-                stored_filename=safe_filename,
-                mime_type=mime_type,
-                file_size=file_size,
-                content_text=content_text if content_text else "",
-                created_at=time.time()
-            )
-            logger.info(f"[UPLOAD_ASYNC] Processing complete for {file_id}")
-
-            return metadata
-
-        except Exception as e:
-            logger.error(f"[UPLOAD_ASYNC_ERROR] Error uploading file: {e}")
-            import traceback
-            logger.error(f"[UPLOAD_ASYNC_ERROR] Traceback: {traceback.format_exc()}")
-            return None
-
-    def _process_file_background(self, file_id: str, chat_id: str, stored_path: str, mime_type: str, original_filename: str = None):
-        """
-        Process file in background - extract content and add to RAG.
-        Updates processing_status in database when complete.
-        This is used for background processing of files (e.g., historical files,
-        or when upload_file_async is called for non-current chats).
+                metadata = self.save_file_metadata(file_id, chat_id, original_filename, stored_filename,
+                                                   mime_type, sink.size, content_sha256=content_sha256)
+            except Exception:
+                if blob is None and os.path.exists(stored_path):
+                    os.remove(stored_path)
+                raise
+
+        position = self.ingest_queue.submit(IngestJob(
+            file_id=file_id, chat_id=chat_id, path=stored_path, mime_type=mime_type,
+            original_filename=original_filename, size=sink.size, sha256=content_sha256
+        ))
+        logger.info(f"[UPLOAD_STREAM] Stored {file_id} ({sink.size} bytes, sha256={content_sha256[:12]}, "
+                    f"duplicate={duplicate}), queue position {position}")
+        return metadata
+
+    def _ingest_extract(self, job: IngestJob) -> Optional[str]:
+        """Extraction stage: store the text, return it if it should be embedded.
+
+        Identical bytes already processed as the same MIME type reuse that
+        file's text (and, in the embed stage, its chunk embeddings).
         """
+        donor = db.find_processed_duplicate(job.sha256, job.mime_type, exclude_file_id=job.file_id) \
+            if job.sha256 else None
+        if donor:
+            job.source_file_id = donor['id']
+            content_text = donor['content_text']
+            logger.info(f"[INGEST] Reusing text of {donor['id']} for {job.file_id}")
+        else:
+            content_text = self.extract_file_content(job.path, job.mime_type)
+            logger.info(f"[INGEST] Content extracted for {job.file_id}: {len(content_text) if content_text else 0} chars")
+        self.update_file_content(job.file_id, content_text)
+        if self.file_rag and content_text and len(content_text.strip()) > 50:
+            return content_text
+        return None
+
+    def _ingest_embed(self, job: IngestJob, content_text: str) -> None:
+        """Embedding stage: chunk and embed into FileRAG (failures keep the extracted text usable)."""
         try:
-            logger.info(f"[BG_PROCESS] Starting background processing for {file_id}")
-
-            # Check if file is already processed (to prevent double embedding)
-            # If the file has content in DB, it was likely already processed
-            existing_file = db.get_file(file_id)
-            if existing_file and existing_file.get('content_text'):
-                logger.info(f"[BG_PROCESS] File {file_id} already has content, skipping FileRAG storage")
-                self.update_file_processing_status(file_id, 'completed')
+            if job.source_file_id and self.file_rag.copy_file_chunks(job.source_file_id, job.file_id, job.chat_id):
+                logger.info(f"[INGEST] Copied FileRAG chunks of {job.source_file_id} to {job.file_id}")
                 return
+            self.file_rag.store_file(job.file_id, job.chat_id, content_text, job.original_filename)
+            logger.info(f"[INGEST] Added {job.file_id} to FileRAG")
+        except Exception as e:
+            logger.warning(f"[INGEST] Failed to add {job.file_id} to FileRAG: {e}")
 
-            # Update status to processing
-            logger.info(f"[BG_PROCESS] About to set status to 'processing'")
-            self.update_file_processing_status(file_id, 'processing')
-            logger.info(f"[BG_PROCESS] Status set to 'processing'")
-
-            # Extract content
-            logger.info(f"[BG_PROCESS] About to extract content from {stored_path}")
-            content_text = self.extract_file_content(stored_path, mime_type)
-            logger.info(f"[BG_PROCESS] Content extracted: {len(content_text) if content_text else 0} chars")
-
-            # Update metadata with content
-            logger.info(f"[BG_PROCESS] About to update file content")
-            self.update_file_content(file_id, content_text)
-            logger.info(f"[BG_PROCESS] File content updated")
+    def get_ingest_progress(self, file_id: str) -> Optional[dict]:
+        """Progress of a file in this process's ingestion queue, or None if not tracked."""
+        return self.ingest_queue.progress(file_id)
 
-            # Store in FileRAG
-            if self.file_rag and content_text and len(content_text.strip()) > 50:
-                try:
-                    logger.info(f"[BG_PROCESS] About to store in FileRAG")
-                    self.file_rag.store_file(file_id, chat_id, content_text, original_filename)
-                    logger.info(f"[BG_PROCESS] Added to FileRAG")
-                except Exception as e:
-                    logger.warning(f"[BG_PROCESS] Failed to add to FileRAG: {e}")
-            else:
-                logger.info(f"[BG_PROCESS] Skipping FileRAG - file_rag={self.file_rag is not None}, content={len(content_text) if content_text else 0} chars")
+    def recover_ingestion(self) -> int:
+        """
+        Re-queue uploads interrupted by a restart. Call once at startup.
 
-            # Update status to complete
-            logger.info(f"[BG_PROCESS] About to set status to 'completed'")
-            self.update_file_processing_status(file_id, 'completed')
-            logger.info(f"[BG_PROCESS] Completed for {file_id}")
+        Files left 'processing', or 'pending' without extracted text, are
+        queued again (chunk IDs are deterministic, so re-embedding replaces
+        rather than duplicates). Files whose stored copy is gone are marked
+        'failed'. Stale part files from interrupted receives are removed.
 
-        except Exception as e:
-            logger.error(f"[BG_PROCESS_ERROR] Error: {e}", exc_info=True)
-            # Update status to failed on error
-            try:
-                self.update_file_processing_status(file_id, 'failed')
-            except:
-                pass
+        Returns:
+            int: Number of files re-queued
+        """
+        cleanup_partial_uploads(self.storage_path)
+        requeued = 0
+        for row in db.get_files_by_processing_status(['pending', 'processing']):
+            if row.get('processing_status') == 'pending' and row.get('content_text') is not None:
+                continue
+            stored_path = os.path.join(self.storage_path, row['stored_filename'])
+            if not os.path.exists(stored_path):
+                self.update_file_processing_status(row['id'], 'failed')
+                continue
+            self.ingest_queue.submit(IngestJob(
+                file_id=row['id'], chat_id=row['chat_id'], path=stored_path,
+                mime_type=row['mime_type'], original_filename=row['original_filename'],
+                size=row.get('file_size') or 0, sha256=row.get('content_sha256')
+            ))
+            requeued += 1
+        if requeued:
+            logger.info(f"[INGEST] Re-queued {requeued} interrupted uploads")
+        return requeued
 
     def update_file_content(self, file_id: str, content_text: str) -> bool:
         """
@@ -605,13 +469,12 @@ class FileManager:
             if not metadata:
                 return False
 
-            # Delete from database
-            db.delete_file(file_id)
-
-            # Delete from storage
-            stored_path = os.path.join(self.storage_path, metadata.stored_filename)
-            if os.path.exists(stored_path):
-                os.remove(stored_path)
+            # Delete from database; shared blobs are only removed with their last reference
+            with self._blob_lock:
+                remaining_refs = db.delete_file(file_id)
+                stored_path = os.path.join(self.storage_path, metadata.stored_filename)
+                if not remaining_refs and os.path.exists(stored_path):
+                    os.remove(stored_path)
 
             logger.info(f"File deleted: {file_id}")
             return True
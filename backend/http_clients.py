@@ -0,0 +1,189 @@
+"""
+Shared, pooled HTTP clients for LLM calls.
+
+stream_chat_completion() and async_chat_completion() used to build a new
+httpx.AsyncClient per call, and chat_completion() used a bare requests.post(),
+so every agent round and tool loop paid a fresh TCP handshake to the local
+inference server. This module hands out long-lived clients instead.
+
+1. Async Clients (get_async_client):
+   - One httpx.AsyncClient per event loop. httpx clients are bound to the
+     loop that first used them, and task workers each own a long-lived loop
+     (see backend/task_scheduler.py), so one client per loop keeps
+     connections alive across every task that worker runs
+   - Connection limits and keep-alive come from LLM_HTTP_* config
+   - TCP_NODELAY is set: on a reused connection, httpx writes request
+     headers and body separately, and Nagle's algorithm would otherwise hold
+     the body back until the server's delayed ACK (~40 ms per request)
+   - HTTP/2 is used when LLM_HTTP2 is set and the optional `h2` package is
+     installed; otherwise clients fall back to HTTP/1.1 keep-alive
+
+2. Sync Sessions (get_sync_session):
+   - One requests.Session per thread (Session is not thread-safe), each with
+     a pooled HTTPAdapter
+
+3. Cleanup:
+   - close_loop_client(loop) closes a loop's client before the loop is
+     closed; the task scheduler calls it when a worker exits
+   - Clients of loops that were closed without cleanup are dropped on the
+     next lookup; close_all() runs at interpreter exit
+
+Timeouts are still chosen per request by the callers; the client defaults
+only bound connecting and waiting for a pooled connection.
+"""
+import asyncio
+import atexit
+import socket
+import threading
+import weakref
+from typing import Any, Dict
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+from backend import config
+from backend.logger import log_event
+
+try:
+    import h2  # noqa: F401  (optional, enables HTTP/2 in httpx)
+    _H2_AVAILABLE = True
+except ImportError:
+    _H2_AVAILABLE = False
+
+_lock = threading.Lock()
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+_sync_local = threading.local()
+_sync_sessions: "weakref.WeakSet[requests.Session]" = weakref.WeakSet()
+
+_stats: Dict[str, int] = {
+    'async_clients_created': 0,
+    'async_clients_closed': 0,
+    'async_clients_reused': 0,
+    'sync_sessions_created': 0,
+    'sync_sessions_reused': 0,
+}
+
+
+def _http2_enabled() -> bool:
+    return config.LLM_HTTP2 and _H2_AVAILABLE
+
+
+def _new_async_client() -> httpx.AsyncClient:
+    limits = httpx.Limits(
+        max_connections=config.LLM_HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=config.LLM_HTTP_MAX_KEEPALIVE,
+        keepalive_expiry=config.LLM_HTTP_KEEPALIVE_EXPIRY,
+    )
+    timeout = httpx.Timeout(None, connect=config.LLM_HTTP_CONNECT_TIMEOUT,
+                            pool=config.LLM_HTTP_POOL_TIMEOUT)
+    transport = httpx.AsyncHTTPTransport(
+        limits=limits,
+        http2=_http2_enabled(),
+        socket_options=[(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)],
+    )
+    return httpx.AsyncClient(transport=transport, timeout=timeout)
+
+
+def get_async_client() -> httpx.AsyncClient:
+    """
+    Get the shared AsyncClient for the running event loop.
+
+    Must be called from a coroutine. Do not close the returned client or use
+    it as a context manager; it is reused by later calls on the same loop.
+
+    Returns:
+        httpx.AsyncClient: Keep-alive client bound to the current loop
+    """
+    loop = asyncio.get_running_loop()
+    with _lock:
+        # Loops closed without close_loop_client() leave dead clients behind
+        for stale in [l for l in _async_clients if l.is_closed()]:
+            del _async_clients[stale]
+        client = _async_clients.get(loop)
+        if client is not None and not client.is_closed:
+            _stats['async_clients_reused'] += 1
+            return client
+        client = _new_async_client()
+        _async_clients[loop] = client
+        _stats['async_clients_created'] += 1
+    return client
+
+
+def close_loop_client(loop: asyncio.AbstractEventLoop) -> None:
+    """
+    Close the shared client of an event loop that is about to shut down.
+
+    Call from the loop's own thread while the loop is not running.
+
+    Args:
+        loop: Event loop whose client should be closed
+    """
+    with _lock:
+        client = _async_clients.pop(loop, None)
+    if client is None or client.is_closed:
+        return
+    try:
+        if loop.is_closed() or loop.is_running():
+            return
+        loop.run_until_complete(client.aclose())
+        with _lock:
+            _stats['async_clients_closed'] += 1
+    except Exception as e:
+        log_event("http_client_close_error", {"error": str(e)})
+
+
+def get_sync_session() -> requests.Session:
+    """
+    Get this thread's pooled requests.Session.
+
+    Returns:
+        requests.Session: Keep-alive session reused by later calls on the same thread
+    """
+    session = getattr(_sync_local, 'session', None)
+    if session is not None:
+        with _lock:
+            _stats['sync_sessions_reused'] += 1
+        return session
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=config.LLM_HTTP_SYNC_POOL_SIZE,
+                          pool_maxsize=config.LLM_HTTP_SYNC_POOL_SIZE)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    _sync_local.session = session
+    with _lock:
+        _sync_sessions.add(session)
+        _stats['sync_sessions_created'] += 1
+    return session
+
+
+def close_all() -> None:
+    """Close every sync session and every async client whose loop can still run it."""
+    with _lock:
+        sessions = list(_sync_sessions)
+        loops = list(_async_clients.keys())
+    for session in sessions:
+        try:
+            session.close()
+        except Exception:
+            pass
+    for loop in loops:
+        close_loop_client(loop)
+
+
+def get_stats() -> Dict[str, Any]:
+    """
+    Get client registry statistics for monitoring.
+
+    Returns:
+        Dictionary with created/reused counters and live client counts
+    """
+    with _lock:
+        stats = dict(_stats)
+        stats['async_clients_live'] = len(_async_clients)
+        stats['sync_sessions_live'] = len(_sync_sessions)
+    stats['http2'] = _http2_enabled()
+    return stats
+
+
+atexit.register(close_all)
@@ -1,8 +1,8 @@
-import requests
 import json
 import time
 from backend.logger import log_llm_call, log_event
 from backend import config
+from backend.http_clients import get_async_client, get_sync_session
 
 import httpx
 
@@ -107,42 +107,47 @@ async def stream_chat_completion(url, payload, chat_id=None, chat_template_kwarg
     try:
         # Use custom timeout if provided, otherwise use config or default to 5 seconds
         timeout_value = timeout or config.TIMEOUT_LLM_ASYNC or 5.0
-        async with httpx.AsyncClient(timeout=httpx.Timeout(timeout_value, read=None), headers=headers) as client:
-            async with client.stream("POST", endpoint, json=request_payload) as response:
-                response.raise_for_status()
-                async for line in response.aiter_lines():
-                    if not line: continue
-                    
-                    if not line.startswith('data: '): continue
-                    if line == 'data: [DONE]':
-                        break
-                    
-                    try:
-                        data_json = json.loads(line[6:])
-                        if 'timings' in data_json:
-                            timings = data_json['timings']
-                        choices = data_json.get('choices', [])
-                        if choices:
-                            delta = choices[0].get('delta', {})
-                            if 'content' in delta: full_response += delta['content'] or ''
-                            if 'reasoning_content' in delta: full_reasoning += delta.get('reasoning_content', '')
-                            elif 'reasoning' in delta: full_reasoning += delta.get('reasoning', '')
-                            
-                            if 'tool_calls' in delta:
-                                for tc_delta in delta['tool_calls']:
-                                    idx = tc_delta.get('index', 0)
-                                    if idx not in tool_calls:
-                                        tool_calls[idx] = tc_delta
-                                    else:
-                                        # Merge arguments
-                                        if 'function' in tc_delta and 'arguments' in tc_delta['function']:
-                                            if 'function' not in tool_calls[idx]: tool_calls[idx]['function'] = {'arguments': ''}
-                                            tool_calls[idx]['function']['arguments'] += tc_delta['function']['arguments']
-                    except:
-                        pass
+        client = get_async_client()
+        async with client.stream("POST", endpoint, json=request_payload, headers=headers,
+                                 timeout=httpx.Timeout(timeout_value, read=None)) as response:
+            response.raise_for_status()
+            stream_done = False
+            async for line in response.aiter_lines():
+                # After [DONE], drain the rest of the body instead of breaking out:
+                # an unread response cannot go back to the keep-alive pool
+                if stream_done or not line: continue
+
+                if not line.startswith('data: '): continue
+                if line == 'data: [DONE]':
+                    stream_done = True
+                    continue
+                
+                try:
+                    data_json = json.loads(line[6:])
+                    if 'timings' in data_json:
+                        timings = data_json['timings']
+                    choices = data_json.get('choices', [])
+                    if choices:
+                        delta = choices[0].get('delta', {})
+                        if 'content' in delta: full_response += delta['content'] or ''
+                        if 'reasoning_content' in delta: full_reasoning += delta.get('reasoning_content', '')
+                        elif 'reasoning' in delta: full_reasoning += delta.get('reasoning', '')
                         
-                    yield line
+                        if 'tool_calls' in delta:
+                            for tc_delta in delta['tool_calls']:
+                                idx = tc_delta.get('index', 0)
+                                if idx not in tool_calls:
+                                    tool_calls[idx] = tc_delta
+                                else:
+                                    # Merge arguments
+                                    if 'function' in tc_delta and 'arguments' in tc_delta['function']:
+                                        if 'function' not in tool_calls[idx]: tool_calls[idx]['function'] = {'arguments': ''}
+                                        tool_calls[idx]['function']['arguments'] += tc_delta['function']['arguments']
+                except:
+                    pass
                     
+                yield line
+                
     except Exception as e:
         log_event("llm_stream_error", {"error": str(e), "url": endpoint, "chat_id": chat_id})
         yield f"data: {json.dumps({'error': str(e)})}"
@@ -202,7 +207,7 @@ def chat_completion(url, payload, chat_id=None, chat_template_kwargs=None):
         elif config.AI_API_KEY:
             headers["Authorization"] = f"Bearer {config.AI_API_KEY}"
 
-        response = requests.post(
+        response = get_sync_session().post(
             endpoint,
             json=request_payload,
             headers=headers,
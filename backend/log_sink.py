@@ -0,0 +1,420 @@
+"""
+Background, batched sink for LLM and tool call logs.
+
+log_llm_call() and log_tool_call() used to write one pretty-printed JSON file
+per call plus an index line, inline on the hot path (every agent round and
+every embedding batch). They now hand a compact record to this sink and
+return; a single writer thread persists records in batches.
+
+1. Storage:
+   - Records are appended as compact JSON lines to segment files inside the
+     category directory (llm_calls/, tool_calls/), rotated at
+     LOG_SINK_SEGMENT_MAX_MB
+   - Each record gets a network_index.jsonl line whose log_file is
+     "<category>/<segment>.jsonl#<byte offset>"; read_record() resolves
+     these as well as legacy one-file-per-call paths
+   - One write() per segment and one for the index per batch
+
+2. Size Controls (optional):
+   - LOG_SINK_MAX_FIELD_CHARS truncates long strings inside payloads
+   - LOG_SINK_COMPRESS stores each record zlib-compressed ("z:" + base64)
+
+3. Overload:
+   - The queue is bounded (LOG_SINK_QUEUE_MAX); producers never block
+   - With the "sample" policy, once the queue passes
+     LOG_SINK_SAMPLE_WATERMARK only 1 in LOG_SINK_SAMPLE_RATE records is kept
+   - Records that do not fit are dropped; both cases are counted in get_stats()
+
+4. Shutdown:
+   - flush() waits until everything queued so far is on disk; shutdown()
+     (registered with atexit) drains the queue and closes the files
+
+This module must not import backend.logger (the logger depends on it).
+"""
+import base64
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+import zlib
+from typing import Any, Dict, List, Optional, Tuple
+
+from backend import config
+
+INDEX_FILENAME = "network_index.jsonl"
+_COMPRESSED_PREFIX = "z:"
+
+
+def snapshot(obj: Any, max_chars: int = 0) -> Any:
+    """
+    Copy the containers of a JSON-like structure, sharing its (immutable) leaves.
+
+    This is proportional to the number of nodes, not the payload size, so it
+    is cheap enough for the hot path while still freezing what gets logged.
+
+    Args:
+        obj: Payload to copy
+        max_chars: If > 0, strings longer than this are shortened
+    """
+    if isinstance(obj, str):
+        if max_chars and len(obj) > max_chars:
+            return obj[:max_chars] + f"... [truncated {len(obj) - max_chars} chars]"
+        return obj
+    if isinstance(obj, dict):
+        return {k: snapshot(v, max_chars) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [snapshot(v, max_chars) for v in obj]
+    return obj
+
+
+def read_record(base_dir: str, rel_path: str) -> Dict[str, Any]:
+    """
+    Load one logged record by its index path.
+
+    Args:
+        base_dir: Log base directory
+        rel_path: "<dir>/<segment>.jsonl#<offset>" or a legacy "<dir>/<file>.json"
+
+    Returns:
+        The logged entry as a dict
+
+    Raises:
+        FileNotFoundError: If the file does not exist
+        ValueError: If the offset does not point at a record
+    """
+    path, _, offset = rel_path.partition("#")
+    full_path = os.path.join(base_dir, path)
+    if not offset:
+        with open(full_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    with open(full_path, "rb") as f:
+        f.seek(int(offset))
+        line = f.readline().decode("utf-8").rstrip("\n")
+    if not line:
+        raise ValueError(f"No log record at {rel_path}")
+    if line.startswith(_COMPRESSED_PREFIX):
+        line = zlib.decompress(base64.b64decode(line[len(_COMPRESSED_PREFIX):])).decode("utf-8")
+    return json.loads(line)
+
+
+class _FlushMarker:
+    __slots__ = ('event',)
+
+    def __init__(self):
+        self.event = threading.Event()
+
+
+class _Segment:
+    """Open segment file of one category. Guarded by LogSink._write_lock."""
+
+    __slots__ = ('name', 'file', 'size')
+
+    def __init__(self, name: str, file, size: int):
+        self.name = name
+        self.file = file
+        self.size = size
+
+
+class LogSink:
+    """
+    Bounded queue plus writer thread for call logs.
+
+    Usage:
+        sink = LogSink(base_dir)
+        sink.submit("llm_calls", "", entry, index_entry)
+        sink.flush()
+
+    Args:
+        base_dir: Directory holding the category directories and the index
+        enabled: If False, submit() writes synchronously (same file format)
+        queue_max: Max queued records before dropping
+        batch_size: Max records written per batch
+        flush_interval_ms: Max time a record waits for its batch to fill
+        max_field_chars: Truncate payload strings longer than this (0 = off)
+        compress: Store records zlib-compressed
+        overload_policy: "drop" or "sample"
+        sample_watermark: Queue fill ratio at which sampling starts
+        sample_rate: Keep 1 in N records while sampling
+        segment_max_bytes: Rotate segment files beyond this size
+    """
+
+    OVERLOAD_POLICIES = ("drop", "sample")
+
+    def __init__(self, base_dir: str,
+                 enabled: bool = None,
+                 queue_max: int = None,
+                 batch_size: int = None,
+                 flush_interval_ms: float = None,
+                 max_field_chars: int = None,
+                 compress: bool = None,
+                 overload_policy: str = None,
+                 sample_watermark: float = None,
+                 sample_rate: int = None,
+                 segment_max_bytes: int = None):
+        self.base_dir = base_dir
+        self.enabled = config.LOG_SINK_ENABLED if enabled is None else enabled
+        self.queue_max = queue_max if queue_max is not None else config.LOG_SINK_QUEUE_MAX
+        self.batch_size = batch_size if batch_size is not None else config.LOG_SINK_BATCH_SIZE
+        self.flush_interval = (flush_interval_ms if flush_interval_ms is not None
+                               else config.LOG_SINK_FLUSH_INTERVAL_MS) / 1000.0
+        self.max_field_chars = (max_field_chars if max_field_chars is not None
+                                else config.LOG_SINK_MAX_FIELD_CHARS)
+        self.compress = config.LOG_SINK_COMPRESS if compress is None else compress
+        self.overload_policy = overload_policy or config.LOG_SINK_OVERLOAD_POLICY
+        if self.overload_policy not in self.OVERLOAD_POLICIES:
+            raise ValueError(f"Unknown log sink overload policy: {self.overload_policy}")
+        self.sample_watermark = (sample_watermark if sample_watermark is not None
+                                 else config.LOG_SINK_SAMPLE_WATERMARK)
+        self.sample_rate = max(1, sample_rate if sample_rate is not None else config.LOG_SINK_SAMPLE_RATE)
+        self.segment_max_bytes = int(segment_max_bytes if segment_max_bytes is not None
+                                     else config.LOG_SINK_SEGMENT_MAX_MB * 1024 * 1024)
+
+        self._queue: "queue.Queue" = queue.Queue(maxsize=self.queue_max)
+        self._segments: Dict[str, _Segment] = {}
+        self._index_file = None
+        self._write_lock = threading.Lock()  # Serializes sync writes with the thread
+        self._thread: Optional[threading.Thread] = None
+        self._thread_lock = threading.Lock()
+        self._stopped = False
+        self._sample_counter = 0
+
+        self._stats: Dict[str, int] = {
+            'submitted': 0,
+            'written': 0,
+            'dropped': 0,
+            'sampled_out': 0,
+            'batches': 0,
+            'bytes_written': 0,
+            'write_errors': 0,
+            'segments_opened': 0,
+            'max_queue_depth': 0,
+        }
+        self._stats_lock = threading.Lock()
+
+    # ==================== PRODUCER SIDE ====================
+
+    def submit(self, category_dir: str, prefix: str, entry: Dict[str, Any],
+               index_entry: Dict[str, Any]) -> bool:
+        """
+        Queue one log record without blocking.
+
+        The entry is snapshotted here so later mutation of the caller's
+        payload (e.g. an agent appending to its message list) cannot change
+        what was logged; JSON encoding happens on the writer thread.
+
+        Args:
+            category_dir: Directory under base_dir ("llm_calls", "tool_calls")
+            prefix: Segment filename prefix (e.g. the tool name)
+            entry: Full record
+            index_entry: network_index.jsonl fields; log_file is filled in on write
+
+        Returns:
+            bool: True if queued (or written), False if dropped or sampled out
+        """
+        depth = self._queue.qsize()
+        if self.enabled and self.overload_policy == "sample" and depth >= self.queue_max * self.sample_watermark:
+            with self._stats_lock:
+                self._sample_counter += 1
+                keep = self._sample_counter % self.sample_rate == 0
+                if not keep:
+                    self._stats['sampled_out'] += 1
+            if not keep:
+                return False
+
+        record = (category_dir, prefix, snapshot(entry, self.max_field_chars), index_entry)
+
+        if not self.enabled or self._stopped:
+            with self._write_lock:
+                self._write_batch([record])
+            with self._stats_lock:
+                self._stats['submitted'] += 1
+            return True
+
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            with self._stats_lock:
+                self._stats['dropped'] += 1
+            return False
+        with self._stats_lock:
+            self._stats['submitted'] += 1
+            if depth + 1 > self._stats['max_queue_depth']:
+                self._stats['max_queue_depth'] = depth + 1
+        self._ensure_thread()
+        return True
+
+    def _ensure_thread(self) -> None:
+        if self._thread is not None:
+            return
+        with self._thread_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="log-sink", daemon=True)
+                self._thread.start()
+
+    # ==================== WRITER THREAD ====================
+
+    def _run(self) -> None:
+        """Collect records into batches and write them until shut down."""
+        while True:
+            try:
+                item = self._queue.get(timeout=1.0)
+            except queue.Empty:
+                if self._stopped:
+                    return
+                continue
+            batch: List[Tuple] = []
+            markers: List[_FlushMarker] = []
+            stop = False
+            deadline = time.monotonic() + self.flush_interval
+            while True:
+                if item is None:
+                    stop = True
+                elif isinstance(item, _FlushMarker):
+                    markers.append(item)
+                else:
+                    batch.append(item)
+                if stop or markers or len(batch) >= self.batch_size:
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+            if batch:
+                with self._write_lock:
+                    self._write_batch(batch)
+            for marker in markers:
+                marker.event.set()
+            if stop:
+                return
+
+    def _segment_for(self, category_dir: str, prefix: str) -> _Segment:
+        """Open (or rotate) the current segment of a category. Must hold _write_lock."""
+        key = f"{category_dir}/{prefix}"
+        seg = self._segments.get(key)
+        if seg is not None and seg.size < self.segment_max_bytes:
+            return seg
+        if seg is not None:
+            seg.file.close()
+        directory = os.path.join(self.base_dir, category_dir)
+        os.makedirs(directory, exist_ok=True)
+        name = f"{prefix}{time.strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}.jsonl"
+        f = open(os.path.join(directory, name), "ab")
+        seg = self._segments[key] = _Segment(name, f, f.tell())
+        with self._stats_lock:
+            self._stats['segments_opened'] += 1
+        return seg
+
+    def _encode(self, entry: Dict[str, Any]) -> bytes:
+        data = json.dumps(entry, default=str).encode("utf-8")
+        if self.compress:
+            data = (_COMPRESSED_PREFIX + base64.b64encode(zlib.compress(data, 1)).decode("ascii")).encode("ascii")
+        return data + b"\n"
+
+    def _write_batch(self, batch: List[Tuple]) -> None:
+        """Append a batch: one write per segment, then one index write. Must hold _write_lock."""
+        index_lines: List[str] = []
+        pending: Dict[str, List[bytes]] = {}
+        total = 0
+        try:
+            for category_dir, prefix, entry, index_entry in batch:
+                try:
+                    data = self._encode(entry)
+                except (TypeError, ValueError):
+                    with self._stats_lock:
+                        self._stats['write_errors'] += 1
+                    continue
+                seg = self._segment_for(category_dir, prefix)
+                offset = seg.size
+                seg.size += len(data)
+                pending.setdefault(f"{category_dir}/{prefix}", []).append(data)
+                index_entry = dict(index_entry)
+                index_entry["log_file"] = f"{category_dir}/{seg.name}#{offset}"
+                index_lines.append(json.dumps(index_entry))
+                # Rotation is only checked before a record, so write out what this
+                # segment has buffered before a later record can open a new one
+                if seg.size >= self.segment_max_bytes:
+                    payload = b"".join(pending.pop(f"{category_dir}/{prefix}"))
+                    seg.file.write(payload)
+                    total += len(payload)
+            for key, chunks in pending.items():
+                payload = b"".join(chunks)
+                self._segments[key].file.write(payload)
+                self._segments[key].file.flush()
+                total += len(payload)
+            if not index_lines:
+                return
+            if self._index_file is None:
+                os.makedirs(self.base_dir, exist_ok=True)
+                self._index_file = open(os.path.join(self.base_dir, INDEX_FILENAME), "a", encoding="utf-8")
+            self._index_file.write("\n".join(index_lines) + "\n")
+            self._index_file.flush()
+        except Exception:
+            with self._stats_lock:
+                self._stats['write_errors'] += 1
+            return
+        with self._stats_lock:
+            self._stats['written'] += len(index_lines)
+            self._stats['batches'] += 1
+            self._stats['bytes_written'] += total
+
+    # ==================== LIFECYCLE ====================
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """
+        Wait until every record queued before this call has been written.
+
+        Returns:
+            bool: True if flushed within the timeout
+        """
+        if self._thread is None or not self._thread.is_alive():
+            return self._queue.empty()
+        marker = _FlushMarker()
+        try:
+            self._queue.put(marker, timeout=timeout)
+        except queue.Full:
+            return False
+        return marker.event.wait(timeout)
+
+    def shutdown(self, timeout: float = 5.0) -> None:
+        """Drain queued records, stop the writer thread and close all files."""
+        # Records submitted from here on are written synchronously
+        self._stopped = True
+        if self._thread is not None and self._thread.is_alive():
+            try:
+                self._queue.put(None, timeout=timeout)
+            except queue.Full:
+                pass
+            self._thread.join(timeout=timeout)
+        with self._write_lock:
+            for seg in self._segments.values():
+                try:
+                    seg.file.close()
+                except Exception:
+                    pass
+            self._segments.clear()
+            if self._index_file is not None:
+                try:
+                    self._index_file.close()
+                except Exception:
+                    pass
+                self._index_file = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get sink statistics for monitoring.
+
+        Returns:
+            Dictionary with submitted/written/dropped/sampled_out counters and queue depth
+        """
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats['queue_depth'] = self._queue.qsize()
+        stats['queue_max'] = self.queue_max
+        stats['overload_policy'] = self.overload_policy
+        stats['compress'] = self.compress
+        return stats
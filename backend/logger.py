@@ -1,10 +1,11 @@
 import os
 import json
+import atexit
 import datetime
-import uuid
 import logging
 import logging.handlers
 from backend.config import DATA_DIR
+from backend.log_sink import LogSink, read_record
 
 # Define log paths
 LOG_BASE_DIR = os.path.join(DATA_DIR, "logs")
@@ -28,19 +29,16 @@ logging.basicConfig(
     ]
 )
 
+# LLM/tool call logs are written in batches by a background thread (see backend/log_sink.py)
+log_sink = LogSink(LOG_BASE_DIR)
+atexit.register(log_sink.shutdown)
+
 def _get_timestamp():
     return datetime.datetime.now()
 
-def _save_log(directory, entry, prefix=""):
-    timestamp = _get_timestamp()
-    transaction_id = uuid.uuid4().hex
-    safe_ts = timestamp.strftime("%Y%m%d_%H%M%S")
-    filename = f"{prefix}{safe_ts}_{transaction_id[:8]}.json"
-    filepath = os.path.join(directory, filename)
-    
-    with open(filepath, "w", encoding="utf-8") as f:
-        json.dump(entry, f, indent=2, ensure_ascii=False)
-    return filename
+def read_log_entry(rel_path):
+    """Loads an LLM/tool call log entry by its network_index.jsonl log_file path."""
+    return read_record(LOG_BASE_DIR, rel_path)
 
 def log_llm_call(payload, response_text, model, chat_id=None, duration_s=0, call_type="stream", timings=None, tool_calls=None):
     """Logs an LLM transaction (request and final accumulated response)."""
@@ -56,20 +54,16 @@ def log_llm_call(payload, response_text, model, chat_id=None, duration_s=0, call
     }
     if timings:
         entry["timings"] = timings
-    filename = _save_log(LLM_LOG_DIR, entry)
-    
-    # Update index
-    index_path = os.path.join(LOG_BASE_DIR, "network_index.jsonl")
+
+    # Index line is written with the entry; log_file is filled in by the sink
     index_entry = {
         "timestamp": entry["timestamp"],
         "category": "llm",
         "chat_id": chat_id,
         "model_tool": model,
-        "type": call_type,
-        "log_file": os.path.join("llm_calls", filename)
+        "type": call_type
     }
-    with open(index_path, "a", encoding="utf-8") as f:
-        f.write(json.dumps(index_entry) + "\n")
+    log_sink.submit("llm_calls", "", entry, index_entry)
 
 def log_tool_call(tool_name, payload, response_data, duration_s=0, chat_id=None):
     """Logs a tool/API call (e.g., Tavily search)."""
@@ -81,20 +75,16 @@ def log_tool_call(tool_name, payload, response_data, duration_s=0, chat_id=None)
         "request": payload,
         "response": response_data
     }
-    filename = _save_log(TOOL_LOG_DIR, entry, prefix=f"{tool_name}_")
-    
-    # Update index
-    index_path = os.path.join(LOG_BASE_DIR, "network_index.jsonl")
+
+    # Index line is written with the entry; log_file is filled in by the sink
     index_entry = {
         "timestamp": entry["timestamp"],
         "category": "tool",
         "chat_id": chat_id,
         "model_tool": tool_name,
-        "type": "blocking",
-        "log_file": os.path.join("tool_calls", filename)
+        "type": "blocking"
     }
-    with open(index_path, "a", encoding="utf-8") as f:
-        f.write(json.dumps(index_entry) + "\n")
+    log_sink.submit("tool_calls", f"{tool_name}_", entry, index_entry)
 
 def log_event(event_type, data):
     """Logs general system events."""
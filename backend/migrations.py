@@ -0,0 +1,167 @@
+"""
+Versioned schema migrations.
+
+init_db() still creates the base tables and applies the older defensive
+ALTER TABLE steps; anything added to the schema after that lives here as a
+numbered migration. Applied versions are recorded in the ``schema_version``
+table so each migration runs once per database:
+
+- Migrations run in ascending version order, each in its own transaction
+  together with its ``schema_version`` row - a failed migration leaves no
+  partial state and is retried on the next start.
+- Statements are written to be idempotent (``IF NOT EXISTS``), so a database
+  that already has the object - e.g. created by hand - migrates cleanly.
+- ``plan_migrations`` is a dry run: it lists what ``apply_migrations`` would
+  do without writing anything, including creating ``schema_version``.
+
+Dry run against the live database:
+    python -m backend.migrations --dry-run
+"""
+import sqlite3
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class Migration:
+    """One schema change: a version number, a short name and its SQL statements."""
+
+    __slots__ = ("version", "name", "statements")
+
+    def __init__(self, version, name, statements):
+        self.version = version
+        self.name = name
+        self.statements = tuple(statements)
+
+    def __repr__(self):
+        return f"Migration({self.version}, {self.name!r})"
+
+
+MIGRATIONS = [
+    # Hot per-chat message reads (get_messages, get_chat_full, delete_last_turn,
+    # the delta-append COUNT/MAX check) filter by chat_id and order by id. A
+    # (chat_id, timestamp) index would still need a sort for ORDER BY id; the
+    # rowid is the tail of every index, so (chat_id) serves both.
+    Migration(1, "messages_chat_id_index", [
+        "CREATE INDEX IF NOT EXISTS idx_messages_chat_id ON messages(chat_id)",
+    ]),
+    # get_chat_files: WHERE chat_id = ? ORDER BY created_at DESC
+    Migration(2, "files_chat_id_created_at_index", [
+        "CREATE INDEX IF NOT EXISTS idx_files_chat_id_created_at ON files(chat_id, created_at)",
+    ]),
+    # Content-addressed uploads: files.content_sha256 points at one stored copy
+    # per distinct upload; file_blobs.ref_count tracks how many files rows use
+    # it (db.save_file/delete_file). Older files keep NULL and their own copy.
+    # SQLite has no ADD COLUMN IF NOT EXISTS; the version row guards the ALTER.
+    Migration(3, "file_blobs_content_addressing", [
+        "ALTER TABLE files ADD COLUMN content_sha256 TEXT",
+        "CREATE INDEX IF NOT EXISTS idx_files_content_sha256 ON files(content_sha256)",
+        """CREATE TABLE IF NOT EXISTS file_blobs (
+            sha256 TEXT PRIMARY KEY,
+            stored_filename TEXT NOT NULL,
+            file_size INTEGER NOT NULL,
+            ref_count INTEGER NOT NULL DEFAULT 0,
+            created_at REAL DEFAULT (strftime('%s', 'now'))
+        )""",
+    ]),
+]
+
+
+def _check_order(migrations):
+    versions = [m.version for m in migrations]
+    if versions != sorted(set(versions)):
+        raise ValueError(f"Migration versions must be unique and ascending: {versions}")
+
+
+def _has_version_table(conn):
+    row = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'schema_version'"
+    ).fetchone()
+    return row is not None
+
+
+def applied_versions(conn):
+    """Set of migration versions already applied to this database."""
+    if not _has_version_table(conn):
+        return set()
+    return {row[0] for row in conn.execute("SELECT version FROM schema_version")}
+
+
+def current_version(conn):
+    """Highest applied migration version (0 for a database never migrated)."""
+    return max(applied_versions(conn), default=0)
+
+
+def plan_migrations(conn, migrations=MIGRATIONS):
+    """Dry run: the migrations apply_migrations would run, in order. Writes nothing."""
+    _check_order(migrations)
+    done = applied_versions(conn)
+    return [m for m in migrations if m.version not in done]
+
+
+def apply_migrations(conn, migrations=MIGRATIONS, dry_run=False):
+    """Apply pending migrations in version order; returns the ones applied.
+
+    With dry_run=True nothing is written and the pending list is returned,
+    same as plan_migrations.
+    """
+    pending = plan_migrations(conn, migrations)
+    if dry_run or not pending:
+        return pending
+
+    if conn.in_transaction:
+        conn.commit()
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at REAL NOT NULL
+        )
+    ''')
+    conn.commit()
+
+    applied = []
+    for migration in pending:
+        c = conn.cursor()
+        c.execute("BEGIN IMMEDIATE")
+        try:
+            # Another process may have applied it since we planned
+            if c.execute("SELECT 1 FROM schema_version WHERE version = ?", (migration.version,)).fetchone():
+                c.execute("COMMIT")
+                continue
+            for statement in migration.statements:
+                c.execute(statement)
+            c.execute(
+                "INSERT INTO schema_version (version, name, applied_at) VALUES (?, ?, ?)",
+                (migration.version, migration.name, time.time())
+            )
+            c.execute("COMMIT")
+        except sqlite3.Error:
+            c.execute("ROLLBACK")
+            logger.exception(f"Migration {migration.version} ({migration.name}) failed")
+            raise
+        logger.info(f"Applied migration {migration.version} ({migration.name})")
+        applied.append(migration)
+    return applied
+
+
+if __name__ == "__main__":
+    import sys
+    from backend.db_layer import make_connection
+
+    dry_run = "--dry-run" in sys.argv[1:]
+    conn = make_connection()
+    try:
+        print(f"Schema version: {current_version(conn)}")
+        result = apply_migrations(conn, dry_run=dry_run)
+        verb = "Would apply" if dry_run else "Applied"
+        for migration in result:
+            print(f"{verb} {migration.version}: {migration.name}")
+            if dry_run:
+                for statement in migration.statements:
+                    print(f"    {statement}")
+        if not result:
+            print("Up to date")
+    finally:
+        conn.close()
@@ -3,16 +3,22 @@ import json
 from chromadb.utils import embedding_functions
 import uuid
 import os
-import requests
 import hashlib
 import time
-import math
 import logging
 import re
-from backend.logger import log_event, log_llm_call
+import asyncio
+import bisect
+import threading
+import numpy as np
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
+from backend.logger import log_event
 from backend import config
 from backend.model_loader import get_embedding_model
-from backend.token_counter import count_tokens, split_text_by_tokens, truncate_text_by_tokens
+from backend.embedding_cache import EmbeddingCache
+from backend.embedding_scheduler import get_scheduler
+from backend.token_counter import count_tokens, count_tokens_batch, encode_offsets, split_text_by_tokens, truncate_text_by_tokens
 
 
 def _cosine_similarity(v1, v2):
@@ -25,6 +31,141 @@ def _cosine_similarity(v1, v2):
     return dot_product / (norm_a * norm_b)
 
 
+def _unit_rows(embeddings):
+    """Stack embeddings into a row-normalized matrix.
+
+    Rows for missing (None) embeddings and zero vectors are all zeros, so
+    their cosine similarity with anything is 0.0 — matching
+    _cosine_similarity(). Returns None if the embeddings cannot be stacked
+    (e.g. mixed dimensions), in which case callers fall back to pairwise.
+    """
+    present = [i for i, e in enumerate(embeddings) if e is not None]
+    if not present:
+        return None
+    try:
+        stacked = np.asarray([embeddings[i] for i in present], dtype=np.float64)
+    except (ValueError, TypeError):
+        return None
+    if stacked.ndim != 2:
+        return None
+    if len(present) == len(embeddings):
+        matrix = stacked
+    else:
+        matrix = np.zeros((len(embeddings), stacked.shape[1]), dtype=np.float64)
+        matrix[present] = stacked
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+# =============================================================================
+# Hybrid Retrieval Legs - concurrent execution and latency metrics
+# =============================================================================
+
+class _LatencyHistogram:
+    """Thread-safe latency histogram with fixed log-spaced buckets (ms)."""
+
+    BOUNDS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 30000)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = [0] * (len(self.BOUNDS_MS) + 1)  # Last bucket: above every bound
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.errors = 0
+        self.timeouts = 0
+
+    def observe(self, ms: float):
+        with self._lock:
+            self._counts[bisect.bisect_left(self.BOUNDS_MS, ms)] += 1
+            self.count += 1
+            self.total_ms += ms
+            self.max_ms = max(self.max_ms, ms)
+
+    def record_error(self):
+        with self._lock:
+            self.errors += 1
+
+    def record_timeout(self):
+        with self._lock:
+            self.timeouts += 1
+
+    def percentile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-th quantile (max_ms for the overflow bucket)."""
+        with self._lock:
+            if not self.count:
+                return 0.0
+            rank = q * self.count
+            seen = 0
+            for i, n in enumerate(self._counts):
+                seen += n
+                if seen >= rank and n:
+                    return float(self.BOUNDS_MS[i]) if i < len(self.BOUNDS_MS) else self.max_ms
+            return self.max_ms
+
+    def snapshot(self) -> dict:
+        p50, p95, p99 = self.percentile(0.50), self.percentile(0.95), self.percentile(0.99)
+        with self._lock:
+            labels = [f"<={b}" for b in self.BOUNDS_MS] + [f">{self.BOUNDS_MS[-1]}"]
+            return {
+                "count": self.count,
+                "avg_ms": round(self.total_ms / self.count, 2) if self.count else 0.0,
+                "max_ms": round(self.max_ms, 2),
+                "p50_ms": p50,
+                "p95_ms": p95,
+                "p99_ms": p99,
+                "errors": self.errors,
+                "timeouts": self.timeouts,
+                "buckets": dict(zip(labels, self._counts)),
+            }
+
+
+_LEG_HISTOGRAMS = {"vector": _LatencyHistogram(), "bm25": _LatencyHistogram()}
+_leg_executor = None
+_leg_executor_lock = threading.Lock()
+
+
+def _get_leg_executor() -> ThreadPoolExecutor:
+    """Shared pool for retrieval legs (ChromaDB's client is synchronous)."""
+    global _leg_executor
+    if _leg_executor is None:
+        with _leg_executor_lock:
+            if _leg_executor is None:
+                _leg_executor = ThreadPoolExecutor(
+                    max_workers=max(2, config.RAG_LEG_WORKERS), thread_name_prefix="rag-leg"
+                )
+    return _leg_executor
+
+
+def _timed_leg(leg: str, fn, *args):
+    """Run one retrieval leg, recording its latency (and failures) in the leg's histogram."""
+    hist = _LEG_HISTOGRAMS[leg]
+    start = time.perf_counter()
+    try:
+        return fn(*args)
+    except Exception:
+        hist.record_error()
+        raise
+    finally:
+        hist.observe((time.perf_counter() - start) * 1000)
+
+
+def _leg_timeout():
+    return config.RAG_LEG_TIMEOUT_MS / 1000.0 if config.RAG_LEG_TIMEOUT_MS > 0 else None
+
+
+def get_retrieval_stats() -> dict:
+    """Per-leg latency histograms for hybrid retrieval: {"vector": {...}, "bm25": {...}}."""
+    return {leg: hist.snapshot() for leg, hist in _LEG_HISTOGRAMS.items()}
+
+
+def reset_retrieval_stats():
+    """Clear the per-leg latency histograms."""
+    for leg in _LEG_HISTOGRAMS:
+        _LEG_HISTOGRAMS[leg] = _LatencyHistogram()
+
+
 # =============================================================================
 # RAG Manager - Centralized RAG Infrastructure
 # =============================================================================
@@ -92,9 +233,17 @@ class RAGManager:
         # Get embedding dimension AFTER embedding_fn is initialized
         self.embedding_dimension = self._get_embedding_dimension()
 
-        # In-memory cache for query embeddings — same query text = same embedding,
-        # so we embed each unique query text only once per RAGManager lifetime.
-        self._query_embedding_cache: dict = {}
+        # In-memory LRU for query embeddings — same query text = same embedding,
+        # so repeated queries skip even the disk cache lookup.
+        self._query_embedding_cache: OrderedDict = OrderedDict()
+
+        # Persistent content-addressed cache for all embeddings (see embedding_cache.py)
+        self.embedding_cache = None
+        if config.EMBEDDING_CACHE_ENABLED:
+            try:
+                self.embedding_cache = EmbeddingCache()
+            except Exception as e:
+                log_event("embedding_cache_init_error", {"error": str(e)})
 
         self._initialized = True
         log_event("rag_manager_initialized", {
@@ -441,6 +590,95 @@ class RAGManager:
         if not text or len(text.strip()) == 0:
             return [text] if text else []
 
+        offsets = encode_offsets(text)
+        if offsets is None:
+            # Slow tokenizer: no offset mapping, count piece by piece
+            return self._chunk_by_token_counts(text, max_tokens)
+
+        # Single chunk fits
+        if len(offsets) <= max_tokens:
+            return [text]
+
+        final_chunks = self._fit_chunks(self._cut_chunks(text, offsets, max_tokens), max_tokens)
+        return final_chunks if final_chunks else [text]
+
+    def _cut_chunks(self, text: str, offsets: list, max_tokens: int) -> list:
+        chunks = [text[a:b].strip() for a, b in self._token_cuts(text, offsets, max_tokens)]
+        return [c for c in chunks if c]
+
+    def _fit_chunks(self, chunks: list, max_tokens: int, recut: bool = True) -> list:
+        """Hard-limit guarantee for chunks cut from token offsets.
+
+        Stripping a chunk's edges can change how its first and last words
+        tokenize, so every chunk is re-counted (one batched call). A chunk
+        over the limit is cut again from its own encoding, keeping
+        paragraph/sentence/word boundaries; if that still does not fit it is
+        split by tokens.
+        """
+        final_chunks = []
+        for chunk, chunk_tokens in zip(chunks, count_tokens_batch(chunks)):
+            if chunk_tokens <= max_tokens:
+                final_chunks.append(chunk)
+            elif recut:
+                pieces = self._cut_chunks(chunk, encode_offsets(chunk), max_tokens)
+                final_chunks.extend(self._fit_chunks(pieces, max_tokens, recut=False))
+            else:
+                final_chunks.extend(split_text_by_tokens(chunk, max_tokens))
+        return final_chunks
+
+    # Preferred cut points, strongest first
+    _PARAGRAPH_BREAK_RE = re.compile(r'\n\n')
+    _SENTENCE_BREAK_RE = re.compile(r'(?<=[.!?])\s+')
+    _WORD_BREAK_RE = re.compile(r'\s+')
+
+    def _token_cuts(self, text: str, offsets: list, max_tokens: int) -> list:
+        """Pick chunk boundaries from a single encoding of the whole text.
+
+        Every paragraph, sentence and word break is mapped to the index of
+        the first token starting at or after it. Chunks are then cut
+        greedily: each takes up to max_tokens tokens and ends at the last
+        paragraph break in range, else the last sentence break, else the
+        last word break, else exactly at max_tokens.
+
+        Returns:
+            List of (start_char, end_char) spans covering the whole text.
+        """
+        starts = [start for start, _ in offsets]
+        n = len(starts)
+        patterns = (self._PARAGRAPH_BREAK_RE, self._SENTENCE_BREAK_RE, self._WORD_BREAK_RE)
+        levels = [None] * len(patterns)
+
+        def _breaks(level):
+            # Token index of every break, ascending; finer levels are only
+            # scanned once a chunk actually needs them
+            if levels[level] is None:
+                levels[level] = [bisect.bisect_left(starts, m.start()) for m in patterns[level].finditer(text)]
+            return levels[level]
+
+        spans = []
+        first = 0
+        char_start = 0
+        while n - first > max_tokens:
+            limit = first + max_tokens
+            cut = limit
+            for level in range(len(patterns)):
+                breaks = _breaks(level)
+                i = bisect.bisect_right(breaks, limit) - 1
+                if i >= 0 and breaks[i] > first:
+                    cut = breaks[i]
+                    break
+            spans.append((char_start, starts[cut]))
+            char_start = starts[cut]
+            first = cut
+        spans.append((char_start, len(text)))
+        return spans
+
+    def _chunk_by_token_counts(self, text: str, max_tokens: int) -> list:
+        """chunk_text() for tokenizers without offset mapping.
+
+        Greedily packs paragraphs, then sentences, then words, counting each
+        piece separately.
+        """
         # Single chunk fits
         if count_tokens(text) <= max_tokens:
             return [text]
@@ -452,8 +690,7 @@ class RAGManager:
         # Split by paragraphs first
         paragraphs = text.split('\n\n')
 
-        for para in paragraphs:
-            para_tokens = count_tokens(para)
+        for para, para_tokens in zip(paragraphs, count_tokens_batch(paragraphs)):
             para_stripped = para.strip()
 
             # Paragraph fits as-is
@@ -477,8 +714,7 @@ class RAGManager:
                     sentence_chunk = ""
                     sentence_tokens = 0
 
-                    for sent in sentences:
-                        sent_tokens = count_tokens(sent)
+                    for sent, sent_tokens in zip(sentences, count_tokens_batch(sentences)):
 
                         # Sentence fits as-is
                         if sentence_tokens + sent_tokens <= max_tokens:
@@ -500,8 +736,7 @@ class RAGManager:
                                 word_chunk = ""
                                 word_tokens = 0
 
-                                for word in words:
-                                    word_tokens_count = count_tokens(word)
+                                for word, word_tokens_count in zip(words, count_tokens_batch(words)):
 
                                     if word_tokens + word_tokens_count > max_tokens:
                                         if word_chunk:
@@ -535,8 +770,8 @@ class RAGManager:
 
         # Final hard-limit guarantee - split any monolithic units recursively by tokens
         final_chunks = []
-        for chunk in chunks:
-            if count_tokens(chunk) <= max_tokens:
+        for chunk, chunk_tokens in zip(chunks, count_tokens_batch(chunks)):
+            if chunk_tokens <= max_tokens:
                 final_chunks.append(chunk)
             else:
                 final_chunks.extend(split_text_by_tokens(chunk, max_tokens))
@@ -626,6 +861,10 @@ class RAGManager:
     def embed_texts(self, texts: list, task: str = "document") -> list:
         """Embed a list of texts.
 
+        Lookups go through the in-memory query LRU (queries only), then the
+        persistent embedding cache; only the remaining unique texts are sent
+        to the embedding function, in one batch.
+
         Args:
             texts: List of text strings to embed
             task: Task type ("document" or "query")
@@ -633,60 +872,77 @@ class RAGManager:
         Returns:
             List of embeddings
         """
-        # Query embeddings are cached in memory: the same query text always
-        # produces the same embedding. During a grid search, identical queries
-        # are embedded 512 times — caching eliminates all but the first call.
-        # Document embeddings are NOT cached to avoid unbounded memory growth.
-        if task == "query":
-            results = []
-            uncached_indices = []
-            uncached_texts = []
+        validated = [t if t and len(t.strip()) > 0 else "" for t in texts]
+        results = [None] * len(validated)
+        pending = []
 
-            for i, text in enumerate(texts):
-                key = text.strip() if text else ""
+        for i, text in enumerate(validated):
+            if task == "query":
+                key = text.strip()
                 cached = self._query_embedding_cache.get(key)
                 if cached is not None:
-                    results.append(cached)
+                    self._query_embedding_cache.move_to_end(key)
+                    results[i] = cached
+                    continue
+            pending.append(i)
+
+        prefix = self.embedding_fn.task_prefix(task) if hasattr(self.embedding_fn, 'task_prefix') else task
+        cacheable = [i for i in pending if validated[i]]
+        if cacheable and self.embedding_cache is not None:
+            cached = self.embedding_cache.get_many(
+                self.embedding_model, prefix, [validated[i] for i in cacheable]
+            )
+            hit_indices = set()
+            for i, emb in zip(cacheable, cached):
+                if emb is not None:
+                    results[i] = emb
+                    hit_indices.add(i)
+            pending = [i for i in pending if i not in hit_indices]
+
+        if pending:
+            # Identical texts within one call are embedded once
+            unique_texts = list(dict.fromkeys(validated[i] for i in pending))
+            try:
+                if hasattr(self.embedding_fn, '_embed_with_task'):
+                    new_embeddings = self.embedding_fn._embed_with_task(unique_texts, task=task)
                 else:
-                    results.append(None)  # placeholder
-                    uncached_indices.append(i)
-                    uncached_texts.append(text)
-
-            if uncached_texts:
-                validated = [t if t and len(t.strip()) > 0 else "" for t in uncached_texts]
-                try:
-                    if hasattr(self.embedding_fn, '_embed_with_task'):
-                        new_embeddings = self.embedding_fn._embed_with_task(validated, task=task)
-                    else:
-                        new_embeddings = self.embedding_fn(validated)
-                except Exception as e:
-                    log_event("rag_embedding_error", {"error": str(e), "task": task})
-                    raise
-
-                for idx, emb in zip(uncached_indices, new_embeddings):
-                    key = texts[idx].strip() if texts[idx] else ""
-                    self._query_embedding_cache[key] = emb
-                    results[idx] = emb
+                    new_embeddings = self.embedding_fn(unique_texts)
+            except Exception as e:
+                log_event("rag_embedding_error", {"error": str(e), "task": task})
+                raise
 
-            return results
+            by_text = dict(zip(unique_texts, new_embeddings))
+            for i in pending:
+                results[i] = by_text.get(validated[i], [])
 
-        # Document embeddings — no cache, send directly
-        validated = []
-        for text in texts:
-            if text and len(text.strip()) > 0:
-                validated.append(text)
-            else:
-                validated.append("")
+            if self.embedding_cache is not None:
+                to_store = [t for t in unique_texts if t]
+                self.embedding_cache.put_many(
+                    self.embedding_model, prefix, to_store, [by_text.get(t) for t in to_store]
+                )
 
-        try:
-            if hasattr(self.embedding_fn, '_embed_with_task'):
-                embeddings = self.embedding_fn._embed_with_task(validated, task=task)
-            else:
-                embeddings = self.embedding_fn(validated)
-            return embeddings
-        except Exception as e:
-            log_event("rag_embedding_error", {"error": str(e), "task": task})
-            raise
+        if task == "query":
+            for i in range(len(validated)):
+                key = validated[i].strip()
+                if key not in self._query_embedding_cache:
+                    self._query_embedding_cache[key] = results[i]
+            while len(self._query_embedding_cache) > config.EMBEDDING_QUERY_CACHE_SIZE:
+                self._query_embedding_cache.popitem(last=False)
+
+        return results
+
+    def get_embedding_cache_stats(self) -> dict:
+        """Get persistent embedding cache statistics (hit rate, size, evictions).
+
+        Returns:
+            Stats dict, or {"enabled": False} when the cache is disabled
+        """
+        if self.embedding_cache is None:
+            return {"enabled": False}
+        stats = self.embedding_cache.get_stats()
+        stats["enabled"] = True
+        stats["query_lru_entries"] = len(self._query_embedding_cache)
+        return stats
 
     def get_collection(self, name: str) -> chromadb.Collection:
         """Get an existing collection by name."""
@@ -774,6 +1030,11 @@ class RAGStore:
         - Vector search uses custom 768-dim embeddings (embeddinggemma)
         - BM25 search uses ChromaDB's 384-dim all-MiniLM embeddings
 
+        For hybrid queries both legs run concurrently on the shared leg pool.
+        A leg that fails or exceeds config.RAG_LEG_TIMEOUT_MS is dropped and
+        the other leg's results are used alone; if both fail the vector leg's
+        error is raised.
+
         Args:
             query: Search query text
             n_results: Number of results to return
@@ -783,32 +1044,103 @@ class RAGStore:
         Returns:
             List of {text, metadata, score, rank_fusion} dicts
         """
-        query_emb = self.rag_manager.embed_texts([query], task="query")[0]
+        start_time = time.time()
+        use_bm25, legs = self._plan_legs(query, n_results, where, hybrid, fetch_multiplier)
+        if not use_bm25:
+            # Single leg: nothing to overlap, run it on the calling thread
+            name, fn, args = legs[0]
+            return self._finish_retrieval(query, n_results, hybrid, {name: _timed_leg(name, fn, *args)}, {}, start_time)
+
+        executor = _get_leg_executor()
+        futures = {name: executor.submit(_timed_leg, name, fn, *args) for name, fn, args in legs}
+        timeout = _leg_timeout()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        results, errors = {}, {}
+        for name, future in futures.items():
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                results[name] = future.result(timeout=remaining)
+            except FuturesTimeoutError:
+                _LEG_HISTOGRAMS[name].record_timeout()
+                errors[name] = TimeoutError(f"{name} leg exceeded {config.RAG_LEG_TIMEOUT_MS:g} ms")
+            except Exception as e:
+                errors[name] = e
+        return self._finish_retrieval(query, n_results, hybrid, results, errors, start_time)
 
+    async def aretrieve_by_query(self, query: str, n_results: int = 5, where: dict = None,
+                                 hybrid: bool = True, fetch_multiplier: int = None) -> list:
+        """Async retrieve_by_query() for event-loop callers.
+
+        Legs run on the shared leg pool and are awaited with the same
+        per-leg timeout and single-leg fallback, so the loop is never
+        blocked on ChromaDB or the embedding server.
+        """
+        start_time = time.time()
+        _, legs = self._plan_legs(query, n_results, where, hybrid, fetch_multiplier)
+        loop = asyncio.get_running_loop()
+        executor = _get_leg_executor()
+        tasks = {name: loop.run_in_executor(executor, _timed_leg, name, fn, *args) for name, fn, args in legs}
+        await asyncio.wait(tasks.values(), timeout=_leg_timeout())
+        results, errors = {}, {}
+        for name, task in tasks.items():
+            if not task.done():
+                # The leg keeps running on its worker; its result is discarded
+                task.cancel()
+                _LEG_HISTOGRAMS[name].record_timeout()
+                errors[name] = TimeoutError(f"{name} leg exceeded {config.RAG_LEG_TIMEOUT_MS:g} ms")
+            elif task.exception() is not None:
+                errors[name] = task.exception()
+            else:
+                results[name] = task.result()
+        return self._finish_retrieval(query, n_results, hybrid, results, errors, start_time)
+
+    def _plan_legs(self, query, n_results, where, hybrid, fetch_multiplier):
+        """Build the (name, fn, args) legs for a query; BM25 only when hybrid is on."""
         # Use fetch_multiplier to control how many candidates are retrieved
         # before re-ranking and deduplication; default is from config.
         multiplier = fetch_multiplier if fetch_multiplier is not None else config.RAG_FETCH_MULTIPLIER
         fetch_k = n_results * multiplier
-
-        # Vector search using our custom 768-dim embeddings
-        vector_results = self.vector_collection.query(
+        use_bm25 = hybrid and config.HYBRID_SEARCH_ENABLED
+        legs = [("vector", self._vector_leg, (query, fetch_k, where))]
+        if use_bm25:
+            legs.append(("bm25", self._bm25_leg, (query, fetch_k, where)))
+        return use_bm25, legs
+
+    def _vector_leg(self, query, fetch_k, where):
+        """Vector search using our custom 768-dim embeddings."""
+        query_emb = self.rag_manager.embed_texts([query], task="query")[0]
+        return self.vector_collection.query(
             query_embeddings=[query_emb],
             n_results=fetch_k,
             where=where,
             include=["documents", "metadatas", "embeddings", "distances"]
         )
 
-        # BM25 search using ChromaDB's internal 384-dim all-MiniLM embeddings
-        bm25_results = self.bm25_collection.query(
+    def _bm25_leg(self, query, fetch_k, where):
+        """BM25 search using ChromaDB's internal 384-dim all-MiniLM embeddings."""
+        return self.bm25_collection.query(
             query_texts=[query],
             n_results=fetch_k,
             where=where,
             include=["documents", "metadatas", "distances"]
         )
 
+    def _finish_retrieval(self, query, n_results, hybrid, results, errors, start_time):
+        """Fuse whatever legs completed into the final ranked results."""
+        if errors:
+            if not results:
+                raise errors.get("vector") or next(iter(errors.values()))
+            for leg, error in errors.items():
+                log_event("rag_leg_degraded", {
+                    "collection": self.collection_name,
+                    "leg": leg,
+                    "error": str(error),
+                    "timeout": isinstance(error, TimeoutError)
+                })
+
         # Convert results to doc dicts
-        vector_docs = self._results_to_docs(vector_results, source="vector")
-        bm25_docs = self._results_to_docs(bm25_results, source="bm25")
+        vector_docs = self._results_to_docs(results.get("vector"), source="vector")
+        bm25_docs = self._results_to_docs(results.get("bm25"), source="bm25")
 
         # Apply a very loose pre-filter to eliminate outright noise (score < 0.05).
         # The real quality gate (config.RAG_MIN_SEMANTIC_SCORE) is applied AFTER
@@ -817,7 +1149,7 @@ class RAGStore:
         vector_docs = [d for d in vector_docs if d.get('score', 0) >= NOISE_FLOOR]
 
         # If hybrid search is disabled, apply semantic filter and return vector-only results
-        if not hybrid or not config.HYBRID_SEARCH_ENABLED:
+        if "bm25" not in results and "bm25" not in errors:
             if config.RAG_MIN_SEMANTIC_SCORE:
                 vector_docs = [d for d in vector_docs if d.get('score', 0) >= config.RAG_MIN_SEMANTIC_SCORE]
             results = self._score_only_results(vector_docs, n_results * 2)
@@ -827,15 +1159,15 @@ class RAGStore:
                 "collection": self.collection_name,
                 "n_results": n_results,
                 "hybrid": hybrid,
-                "latency_ms": None,
+                "latency_ms": round((time.time() - start_time) * 1000, 2),
                 "vector_results": len(vector_docs),
                 "bm25_results": 0,
                 "fused_results": len(results)
             })
             return results
 
-        # Fuse results using Reciprocal Rank Fusion (RRF), then deduplicate
-        start_time = time.time()
+        # Fuse results using Reciprocal Rank Fusion (RRF), then deduplicate.
+        # A degraded query fuses a single ranking, which keeps its order.
         fused = self._rrf_fuse_results(vector_docs, bm25_docs, n_results)
 
         # Post-fusion semantic filter: drop results whose vector cosine similarity
@@ -859,7 +1191,8 @@ class RAGStore:
             "latency_ms": round((time.time() - start_time) * 1000, 2),
             "vector_results": len(vector_docs),
             "bm25_results": len(bm25_docs),
-            "fused_results": len(fused)
+            "fused_results": len(fused),
+            "degraded_legs": sorted(errors)
         })
 
         return fused
@@ -867,6 +1200,9 @@ class RAGStore:
     def _results_to_docs(self, results: dict, source: str) -> list:
         """Convert ChromaDB query results to doc dicts.
 
+        ChromaDB returns ids, documents, metadatas, distances and embeddings
+        as parallel lists, so every field is joined by index.
+
         Args:
             results: ChromaDB query result dict
             source: "vector" or "bm25" (for scoring)
@@ -874,45 +1210,43 @@ class RAGStore:
         Returns:
             List of doc dicts with text, metadata, score
         """
-        docs = []
-        if results and results.get('documents') and results['documents'][0]:
-                for id, doc, meta, dist in zip(
-                    results['ids'][0],
-                    results['documents'][0],
-                    results['metadatas'][0],
-                    results['distances'][0]
-                ):
-                    # BM25 distance: normalize using 1/(1+dist) — distance is not L2
-                    if source == "bm25":
-                        score = 1.0 / (1.0 + dist)
-                    else:
-                        # Vector distance is L2 on unit-normalized embeddings.
-                        # For unit vectors: cos_sim = 1 - L2²/2
-                        # This maps to a proper [0, 1] cosine similarity score.
-                        score = max(0.0, 1.0 - (dist * dist) / 2.0)
-
-                    doc_dict = {
-                        "id": id,  # Unique ChromaDB ID (e.g. file_id_chunk_N)
-                        "file_id": meta.get("file_id", ""), # Parent file ID for evaluation
-                        "text": doc,
-                        "metadata": meta,
-                        "score": score,
-                        "source": source
-                    }
+        if not results or not results.get('documents') or not results['documents'][0]:
+            return []
+
+        ids = results['ids'][0]
+        documents = results['documents'][0]
+        metadatas = results['metadatas'][0]
+        dists = np.asarray(results['distances'][0], dtype=np.float64)
+
+        if source == "bm25":
+            # BM25 distance: normalize using 1/(1+dist) — distance is not L2
+            scores = 1.0 / (1.0 + dists)
+        else:
+            # Vector distance is L2 on unit-normalized embeddings.
+            # For unit vectors: cos_sim = 1 - L2²/2
+            # This maps to a proper [0, 1] cosine similarity score.
+            scores = np.maximum(0.0, 1.0 - (dists * dists) / 2.0)
+
+        # Only include embeddings for vector results (row i belongs to document i)
+        embeddings_list = None
+        if source == "vector" and results.get('embeddings') is not None:
+            embeddings_list = results['embeddings'][0] if isinstance(results['embeddings'], list) else results['embeddings']
+            if embeddings_list is not None and len(embeddings_list) == 0:
+                embeddings_list = None
 
-                    # Only include embedding for vector results
-                    if source == "vector" and results.get('embeddings'):
-                        embeddings_list = results['embeddings'][0] if isinstance(results['embeddings'], list) else results['embeddings']
-                        if embeddings_list is not None and len(embeddings_list) > 0:
-                            # Use enumerate to find the index (works with numpy arrays too)
-                            emb_idx = 0
-                            for i, d in enumerate(results['documents'][0]):
-                                if d == doc:
-                                    emb_idx = i
-                                    break
-                            doc_dict["embedding"] = embeddings_list[emb_idx]
-
-                    docs.append(doc_dict)
+        docs = []
+        for i, (doc_id, doc, meta) in enumerate(zip(ids, documents, metadatas)):
+            doc_dict = {
+                "id": doc_id,  # Unique ChromaDB ID (e.g. file_id_chunk_N)
+                "file_id": meta.get("file_id", ""), # Parent file ID for evaluation
+                "text": doc,
+                "metadata": meta,
+                "score": float(scores[i]),
+                "source": source
+            }
+            if embeddings_list is not None:
+                doc_dict["embedding"] = embeddings_list[i]
+            docs.append(doc_dict)
         return docs
 
     # Standard RRF smoothing constant — must be separate from `n_results`.
@@ -941,88 +1275,76 @@ class RAGStore:
         rrf_k = self._RRF_K  # Smoothing constant — do NOT conflate with n_results
         all_docs = {}
 
-        # Add vector search results with rank
-        for i, doc in enumerate(vector_docs):
-            # Use full content with truncation for hashing to avoid collisions
-            doc_content = doc['text'].encode('utf-8')[:1000]
-            doc_hash = int(hashlib.sha256(doc_content).hexdigest(), 16)
-            # Preserve id from original doc
-            doc_id = doc.get('id', '')
-            if doc_hash not in all_docs:
-                all_docs[doc_hash] = {
-                    "id": doc_id,
-                    "file_id": doc.get("file_id"),
-                    "text": doc['text'],
-                    "metadata": doc['metadata'],
-                    "embedding": doc.get('embedding'),
-                    "vector_rank": i + 1,
-                    "bm25_rank": None,
-                    "vector_score": doc.get('score', 0),
-                    "bm25_score": None
-                }
-            else:
-                all_docs[doc_hash]["vector_rank"] = i + 1
-                all_docs[doc_hash]["vector_score"] = doc.get('score', 0)
-
-        # Add BM25 results with rank
-        for i, doc in enumerate(bm25_docs):
-            # Use full content with truncation for hashing to avoid collisions
-            doc_content = doc['text'].encode('utf-8')[:1000]
-            doc_hash = int(hashlib.sha256(doc_content).hexdigest(), 16)
-            # Preserve id from original doc
-            doc_id = doc.get('id', '')
-            if doc_hash not in all_docs:
-                all_docs[doc_hash] = {
-                    "id": doc_id,
-                    "file_id": doc.get("file_id"),
-                    "text": doc['text'],
-                    "metadata": doc['metadata'],
-                    "embedding": doc.get('embedding'),
-                    "vector_rank": None,
-                    "bm25_rank": i + 1,
-                    "vector_score": None,
-                    "bm25_score": doc.get('score', 0)
-                }
-            else:
-                all_docs[doc_hash]["bm25_rank"] = i + 1
-                all_docs[doc_hash]["bm25_score"] = doc.get('score', 0)
+        # Both collections are written with the same ids, so the ChromaDB id
+        # identifies a chunk across the two rankings. Docs without an id fall
+        # back to a text key.
+        def _fusion_key(doc):
+            return doc.get('id') or ('text', doc['text'][:1000])
+
+        for rank_field, score_field, ranked in (("vector_rank", "vector_score", vector_docs),
+                                                ("bm25_rank", "bm25_score", bm25_docs)):
+            for i, doc in enumerate(ranked):
+                key = _fusion_key(doc)
+                entry = all_docs.get(key)
+                if entry is None:
+                    entry = all_docs[key] = {
+                        "id": doc.get('id', ''),
+                        "file_id": doc.get("file_id"),
+                        "text": doc['text'],
+                        "metadata": doc['metadata'],
+                        "embedding": doc.get('embedding'),
+                        "vector_rank": None,
+                        "bm25_rank": None,
+                        "vector_score": None,
+                        "bm25_score": None
+                    }
+                elif entry["embedding"] is None and doc.get('embedding') is not None:
+                    entry["embedding"] = doc['embedding']
+                entry[rank_field] = i + 1
+                entry[score_field] = doc.get('score', 0)
 
-        # Compute RRF score for each document
-        fused = []
-        for doc_id, doc in all_docs.items():
-            vector_rank = doc.get("vector_rank") or float('inf')
-            bm25_rank = doc.get("bm25_rank") or float('inf')
-
-            # Pure RRF formula: score = 1/(K + rank_vector) + 1/(K + rank_bm25)
-            # Using pure rank-based fusion avoids mixing incomparable BM25 and
-            # vector distance scores, which live on completely different scales.
-            rrf_score = 1.0 / (rrf_k + vector_rank) + 1.0 / (rrf_k + bm25_rank)
-            final_score = rrf_score
-
-            # Apply time decay to final score.
-            # RAG_DECAY_RATE is expressed as decay-per-DAY (e.g. 0.10 means
-            # a document loses ~10 % of its score per day).  Dividing the raw
-            # age in seconds by 86 400 keeps the exponent in a sensible range:
-            #   rate=0.10, age=10 days → exp(-1.0) ≈ 0.37  (noticeable decay)
-            #   rate=0.10, age=1  day  → exp(-0.1) ≈ 0.90  (very fresh)
-            # With the old per-second formula even rate=0.01 over 1 day gave
-            # exp(−864) ≈ 0, making all non-freshly-stored results collapse.
-            timestamp = doc.get("metadata", {}).get("timestamp", 0)
-            if timestamp > 0:
-                current_time = time.time()
-                age_days = (current_time - timestamp) / 86400.0
-                time_decay = math.exp(-config.RAG_DECAY_RATE * age_days)
-                final_score *= time_decay
+        if not all_docs:
+            return []
+
+        entries = list(all_docs.values())
+        vector_ranks = np.array([e["vector_rank"] or np.inf for e in entries], dtype=np.float64)
+        bm25_ranks = np.array([e["bm25_rank"] or np.inf for e in entries], dtype=np.float64)
+
+        # Pure RRF formula: score = 1/(K + rank_vector) + 1/(K + rank_bm25)
+        # Using pure rank-based fusion avoids mixing incomparable BM25 and
+        # vector distance scores, which live on completely different scales.
+        rrf_scores = 1.0 / (rrf_k + vector_ranks) + 1.0 / (rrf_k + bm25_ranks)
+
+        # Apply time decay to final score.
+        # RAG_DECAY_RATE is expressed as decay-per-DAY (e.g. 0.10 means
+        # a document loses ~10 % of its score per day).  Dividing the raw
+        # age in seconds by 86 400 keeps the exponent in a sensible range:
+        #   rate=0.10, age=10 days → exp(-1.0) ≈ 0.37  (noticeable decay)
+        #   rate=0.10, age=1  day  → exp(-0.1) ≈ 0.90  (very fresh)
+        # With the old per-second formula even rate=0.01 over 1 day gave
+        # exp(−864) ≈ 0, making all non-freshly-stored results collapse.
+        timestamps = np.array([(e.get("metadata") or {}).get("timestamp", 0) or 0 for e in entries],
+                              dtype=np.float64)
+        age_days = (time.time() - timestamps) / 86400.0
+        time_decay = np.where(timestamps > 0, np.exp(-config.RAG_DECAY_RATE * age_days), 1.0)
+        final_scores = rrf_scores * time_decay
+
+        # Sort by score and return top n_results (dedup happens in the caller).
+        # Stable sort keeps vector-first insertion order among equal scores.
+        order = np.argsort(-final_scores, kind="stable")[:n_results]
 
+        fused = []
+        for idx in order:
+            doc = entries[idx]
             fused.append({
                 "id": doc.get("id", ""),
                 "file_id": doc.get("file_id"),
                 "text": doc["text"],
                 "metadata": doc["metadata"],
-                "score": final_score,
+                "score": float(final_scores[idx]),
                 "embedding": doc.get("embedding"),
                 "rank_fusion": {
-                    "rrf_score": rrf_score,
+                    "rrf_score": float(rrf_scores[idx]),
                     "vector_rank": doc.get("vector_rank"),
                     "bm25_rank": doc.get("bm25_rank"),
                     # Preserve individual scores for post-fusion semantic filter
@@ -1030,10 +1352,7 @@ class RAGStore:
                     "bm25_score": doc.get("bm25_score"),
                 }
             })
-
-        # Sort by score and return top n_results (dedup happens in the caller)
-        fused.sort(key=lambda x: x['score'], reverse=True)
-        return fused[:n_results]
+        return fused
 
     def _dedup_results(self, docs: list, n_results: int) -> list:
         """Remove near-duplicate chunks using cosine similarity on stored embeddings.
@@ -1051,34 +1370,35 @@ class RAGStore:
             Deduplicated list of result dicts (length <= n_results)
         """
         threshold = config.RAG_DEDUP_THRESHOLD
+        if threshold >= 1.0:
+            # Dedup disabled — keep everything
+            return docs[:n_results]
+
+        unit = _unit_rows([doc.get("embedding") for doc in docs])
         kept = []
-        kept_embeddings = []
         kept_text_fingerprints = set()
+        # Unit embeddings of kept docs; similarity to all of them is one matmul
+        kept_matrix = None
+        n_kept_embeddings = 0
 
-        for doc in docs:
-            emb = doc.get("embedding")
+        for i, doc in enumerate(docs):
+            if doc.get("embedding") is not None:
+                # Embedding-based dedup (cosine similarity)
+                if unit is not None:
+                    row = unit[i]
+                    if n_kept_embeddings and float(np.max(kept_matrix[:n_kept_embeddings] @ row)) >= threshold:
+                        continue
+                    if kept_matrix is None:
+                        kept_matrix = np.empty((max(1, min(n_results, len(docs))), unit.shape[1]), dtype=unit.dtype)
+                    kept_matrix[n_kept_embeddings] = row
+                    n_kept_embeddings += 1
+                elif any(_cosine_similarity(doc["embedding"], d["embedding"]) >= threshold
+                         for d in kept if d.get("embedding") is not None):
+                    continue
 
-            if threshold >= 1.0:
-                # Dedup disabled — keep everything
                 kept.append(doc)
-                if len(kept) >= n_results:
-                    break
-                continue
-
-            if emb is not None:
-                # Embedding-based dedup (cosine similarity)
-                is_duplicate = False
-                for kept_emb in kept_embeddings:
-                    sim = _cosine_similarity(emb, kept_emb)
-                    if sim >= threshold:
-                        is_duplicate = True
-                        break
-
-                if not is_duplicate:
-                    kept.append(doc)
-                    kept_embeddings.append(emb)
-                    # Also track text fingerprint for cross-check
-                    kept_text_fingerprints.add(doc['text'][:200])
+                # Also track text fingerprint for cross-check
+                kept_text_fingerprints.add(doc['text'][:200])
 
             else:
                 # Text-fingerprint dedup for BM25-only results (no embedding available)
@@ -1201,6 +1521,12 @@ class RAGStore:
 # =============================================================================
 
 class AIEmbeddingFunction(embedding_functions.EmbeddingFunction):
+    # Task-specific prefixes for embeddinggemma-300m
+    TASK_PREFIXES = {
+        "query": "task: search result | query: ",
+        "document": "title: none | text: ",
+    }
+
     def __init__(self, api_url=None, model_name=None, default_task="document", api_key=None):
         self.api_url = api_url or config.EMBEDDING_URL
         log_event("ai_embedding_fn_init", {"api_url": self.api_url, "model_name": model_name})
@@ -1215,6 +1541,10 @@ class AIEmbeddingFunction(embedding_functions.EmbeddingFunction):
         # Standard fallback for ChromaDB internal loops
         return self._embed_with_task(input, task=self.default_task)
 
+    def task_prefix(self, task: str = None) -> str:
+        """Return the literal prefix prepended to inputs for this task."""
+        return self.TASK_PREFIXES["query" if task == "query" else "document"]
+
     def _embed_with_task(self, input: list, task: str = None) -> list:
         """Embed text with task-specific formatting.
 
@@ -1246,10 +1576,11 @@ class AIEmbeddingFunction(embedding_functions.EmbeddingFunction):
 
         # Process input - chunks should already respect token limits
         processed_input = []
-        for item in input:
+        # Chunks were usually counted at chunking time, so this is mostly cache hits
+        token_counts = count_tokens_batch([item if item and item.strip() else "" for item in input])
+        for item, token_count in zip(input, token_counts):
             if item and len(item.strip()) > 0:
                 # Check token count - chunks should already be within limits
-                token_count = count_tokens(item)
                 if token_count > max_tokens:
                     # Final circuit-breaker: Truncate to avoid server rejection
                     # This logs as a critical error but allows the process to continue
@@ -1260,96 +1591,15 @@ class AIEmbeddingFunction(embedding_functions.EmbeddingFunction):
                 processed_input.append(item)
 
         # Format input with task-specific prefixes for embeddinggemma-300m
-        formatted_input = []
-        for item in processed_input:
-            if task == "query":
-                formatted_input.append(f"task: search result | query: {item}")
-            else:
-                formatted_input.append(f"title: none | text: {item}")
-
-        # Embedding logic with batching support
-        # Uses configurable batch size for hardware-specific tuning
-        batch_size = config.EMBEDDING_BATCH_SIZE
-        all_embeddings = []
-
-        for i in range(0, len(formatted_input), batch_size):
-            batch = formatted_input[i:i + batch_size]
-            batch_num = (i // batch_size) + 1
-            total_batches = (len(formatted_input) + batch_size - 1) // batch_size
-
-            # Log batch progress and stats
-            batch_max_chars = max(len(s) for s in batch)
-            log_event("rag_embedding_batch_start", {
-                "batch": batch_num,
-                "total_batches": total_batches,
-                "items": len(batch),
-                "max_chars": batch_max_chars,
-                "url": url
-            })
-
-            payload = {
-                "model": self.model_name,
-                "input": batch
-            }
-
-            headers = {"Content-Type": "application/json"}
-            api_key = self.api_key or config.EMBEDDING_API_KEY
-            if api_key:
-                headers["Authorization"] = f"Bearer {api_key}"
-
-            print(f"    Embedding batch {batch_num}/{total_batches} ({len(batch)} items) to {url}...")
-            
-            try:
-                start_time = time.time()
-                response = requests.post(
-                    url,
-                    json=payload,
-                    headers=headers,
-                    timeout=max(config.TIMEOUT_LLM_BLOCKING or 60, 120)  # Ensure at least 120s for embedding
-                )
-                
-                elapsed = time.time() - start_time
-                if response.status_code != 200:
-                    log_event("rag_embedding_error", {
-                        "url": url,
-                        "status_code": response.status_code,
-                        "response": response.text[:500],
-                        "batch": batch_num
-                    })
-                    print(f"    [ERROR] Embedding failed with status {response.status_code} ({elapsed:.2f}s)")
-                
-                response.raise_for_status()
-                data = response.json()
-                
-                # Handle potential variations in response format
-                if "data" in data:
-                    # Standard OpenAI format
-                    batch_embeddings = [item["embedding"] for item in data["data"]]
-                    all_embeddings.extend(batch_embeddings)
-                elif isinstance(data, list):
-                    # Simple list format
-                    all_embeddings.extend(data)
-                else:
-                    # Unexpected format
-                    log_event("rag_embedding_unexpected_response", {"keys": list(data.keys())})
-                    all_embeddings.extend([[] for _ in batch])
-                
-                duration = time.time() - start_time
-                log_llm_call(payload, f"Successfully embedded batch {batch_num} ({len(batch)} items).", self.model_name, duration_s=duration, call_type="embedding")
-                
-            except Exception as e:
-                print(f"    [EXCEPTION] Embedding failed for batch {batch_num}: {e}")
-                log_event("rag_embedding_exception", {
-                    "url": url,
-                    "error": str(e),
-                    "batch": batch_num
-                })
-                raise e
+        prefix = self.task_prefix(task)
+        formatted_input = [f"{prefix}{item}" for item in processed_input]
 
-        if len(all_embeddings) > 0:
-            print(f"    [OK] Successfully embedded all {len(all_embeddings)} items.")
-            
-        return all_embeddings
+        # The shared scheduler batches these inputs (together with other threads'
+        # requests) and keeps several requests in flight
+        embeddings = get_scheduler(url, self.model_name, self.api_key).embed(
+            formatted_input, [min(count, max_tokens) for count in token_counts])
+        log_event("rag_embedding_complete", {"items": len(embeddings), "url": url})
+        return embeddings
 
 
 # =============================================================================
@@ -1376,9 +1626,20 @@ class ResearchRAG(RAGStore):
         self.rag_manager = rag_manager
         super().__init__(self.rag_manager, "research_store")
 
+    # Markdown links keep their text; bare URLs are dropped before hashing/embedding
+    _MD_LINK_RE = re.compile(r'\[([^\]]+)\]\([^\)]+\)')
+    _URL_RE = re.compile(r'https?://\S+')
+
+    @staticmethod
+    def chunk_id(chat_id, url, clean_text):
+        """Deterministic chunk id; citations refer to chunks by this id."""
+        return hashlib.sha256((chat_id + url + clean_text).encode('utf-8')).hexdigest()
+
     def store_chunk(self, chat_id, step_index, url, full_text, published_date=None):
         """Store a research chunk with deduplication.
 
+        Thin wrapper over store_chunks() for a single source.
+
         Args:
             chat_id: The research session ID
             step_index: Step index for filtering
@@ -1389,69 +1650,80 @@ class ResearchRAG(RAGStore):
         Returns:
             Tuple of (success, token_count)
         """
-        if not full_text or len(full_text.strip()) < 10:
-            return False, 0
+        result = self.store_chunks(chat_id, step_index, [(url, full_text, published_date)])
+        return result["stored"] > 0, result["tokens"]
 
-        import re
-        import hashlib
-        import time
+    def store_chunks(self, chat_id, step_index, sources):
+        """Store the chunks of many sources with one existence check and one upsert.
 
-        text_chunks = self.rag_manager.chunk_text(full_text, max_tokens=config.EMBEDDING_MAX_TOKENS_RESEARCH)
-        total_tokens = 0
-        any_success = False
+        Each source is chunked and cleaned exactly as store_chunk always did
+        and gets the same content-hash id, so ids (and citations) do not
+        depend on which path stored a chunk. Chunks already in the store or
+        repeated within the batch are skipped; only new chunks are embedded
+        (in one embed_texts call, which batches the requests) and upserted
+        into both collections.
 
-        for i, chunk_text in enumerate(text_chunks):
-            clean_text = re.sub(r'\[([^\]]+)\]\([^\)]+\)', r'\1', chunk_text)
-            clean_text = re.sub(r'https?://\S+', '', clean_text)
-            clean_text = clean_text.strip()
+        Args:
+            chat_id: The research session ID
+            step_index: Step index for filtering
+            sources: Iterable of (url, full_text) or (url, full_text, published_date)
 
-            if len(clean_text) < 10:
+        Returns:
+            dict with:
+                - ids: Chunk ids of every usable chunk, in source order (new and existing)
+                - stored: Number of newly stored chunks
+                - tokens: Token count of the newly stored chunks
+        """
+        ids, texts, metas = [], [], []
+        seen = set()
+        timestamp = time.time()
+        for source in sources:
+            url, full_text = source[0], source[1]
+            published_date = source[2] if len(source) > 2 else None
+            if not full_text or len(full_text.strip()) < 10:
                 continue
-
-            doc_id = hashlib.sha256((chat_id + url + clean_text).encode('utf-8')).hexdigest()
-
-            try:
-                # Check if exists in vector collection (authoritative)
-                existing = self.vector_collection.get(ids=[doc_id])
-                if existing and existing.get('ids'):
-                    # Handle numpy array case
-                    existing_ids = existing['ids'][0] if isinstance(existing['ids'], list) else existing['ids']
-                    if len(existing_ids) > 0:
-                        continue
-
-                query_embedding = self.rag_manager.embed_texts([clean_text], task="document")[0]
-
-                meta = {
+            for chunk_text in self.rag_manager.chunk_text(full_text, max_tokens=config.EMBEDDING_MAX_TOKENS_RESEARCH):
+                clean_text = self._URL_RE.sub('', self._MD_LINK_RE.sub(r'\1', chunk_text)).strip()
+                if len(clean_text) < 10:
+                    continue
+                doc_id = self.chunk_id(chat_id, url, clean_text)
+                if doc_id in seen:
+                    continue
+                seen.add(doc_id)
+                ids.append(doc_id)
+                texts.append(clean_text)
+                metas.append({
                     "chat_id": chat_id,
                     "step_index": step_index,
                     "url": url,
-                    "timestamp": time.time(),
+                    "timestamp": timestamp,
                     "published_date": published_date or ""
-                }
-
-                # Store to vector collection with our embeddings
-                self.vector_collection.upsert(
-                    documents=[clean_text],
-                    metadatas=[meta],
-                    ids=[doc_id],
-                    embeddings=[query_embedding]
-                )
-
-                # Store to BM25 collection (ChromaDB computes embeddings internally)
-                self.bm25_collection.upsert(
-                    documents=[clean_text],
-                    metadatas=[meta],
-                    ids=[doc_id]
-                )
-
-                total_tokens += count_tokens(clean_text)
-                any_success = True
+                })
 
-            except Exception as e:
-                log_event("research_rag_store_error", {"error": str(e)})
-                continue
+        result = {"ids": ids, "stored": 0, "tokens": 0}
+        if not ids:
+            return result
 
-        return any_success, total_tokens
+        try:
+            # One existence check for the whole batch (vector collection is authoritative)
+            existing = self.vector_collection.get(ids=ids, include=[])
+            existing_ids = set(existing.get('ids') or []) if existing else set()
+            new = [i for i, doc_id in enumerate(ids) if doc_id not in existing_ids]
+            if not new:
+                return result
+
+            new_texts = [texts[i] for i in new]
+            new_metas = [metas[i] for i in new]
+            token_counts = count_tokens_batch(new_texts)
+            for meta, tokens in zip(new_metas, token_counts):
+                # Cached so retrieve_for_report can budget without re-tokenizing
+                meta["token_count"] = tokens
+            self.store(new_texts, new_metas, [ids[i] for i in new])
+            result["stored"] = len(new)
+            result["tokens"] = sum(token_counts)
+        except Exception as e:
+            log_event("research_rag_store_error", {"error": str(e), "chunks": len(ids)})
+        return result
 
     def get_all_chunks(self, chat_id, limit=None):
         """Retrieve all stored chunks for a session.
@@ -1523,9 +1795,18 @@ class ResearchRAG(RAGStore):
             log_event("research_rag_step_error", {"error": str(e)})
             return []
 
+    # Candidates fetched per query before token budgeting
+    REPORT_QUERY_CANDIDATES = 200
+
     def retrieve_for_report(self, chat_id, queries, max_tokens=None):
         """Multi-query semantic retrieval with dynamic token budgeting.
 
+        All queries are embedded in one call and sent to the vector
+        collection as a single multi-query request per distinct step
+        filter. Candidates are shared across queries: each distinct
+        document is hashed and token-counted once, using the token_count
+        cached in its metadata when store_chunks() wrote one.
+
         Args:
             chat_id: The research session ID
             queries: List of {"query": str, "step_filter": int|None}
@@ -1541,78 +1822,114 @@ class ResearchRAG(RAGStore):
             return self.get_all_chunks(chat_id)
 
         per_query_budget = max_tokens // len(queries)
+        candidates = self._query_report_candidates(chat_id, queries)
+
         all_chunks = []
         seen_doc_ids = set()
         total_tokens = 0
 
-        for q_info in queries:
-            query_text = q_info["query"]
-            step_filter = q_info.get("step_filter")
-
-            try:
-                query_emb = self.rag_manager.embed_texts([query_text], task="query")[0]
-
-                if step_filter is not None:
-                    where_clause = {"$and": [
-                        {"chat_id": chat_id},
-                        {"step_index": step_filter}
-                    ]}
-                else:
-                    where_clause = {"chat_id": chat_id}
+        # Budgets are applied in plan order, exactly as one query at a time would
+        for hits in candidates:
+            query_tokens = 0
+            for doc, meta, dist, doc_hash, chunk_tokens in hits:
+                if doc_hash in seen_doc_ids:
+                    continue
 
-                # Vector search using custom embeddings
-                results = self.vector_collection.query(
-                    query_embeddings=[query_emb],
-                    n_results=200,
-                    where=where_clause,
-                    include=["documents", "metadatas", "embeddings", "distances"]
-                )
+                if query_tokens + chunk_tokens > per_query_budget:
+                    break
+                if total_tokens + chunk_tokens > max_tokens:
+                    return all_chunks
 
-                if not results or not results.get('documents'):
-                    continue
+                similarity = 1.0 / (1.0 + dist)
 
-                # Handle both list and numpy array formats
-                docs = results['documents'][0] if isinstance(results['documents'], list) else results['documents']
-                metas = results['metadatas'][0] if isinstance(results['metadatas'], list) else results['metadatas']
-                embs = results['embeddings'][0] if isinstance(results['embeddings'], list) else results['embeddings']
-                dists = results['distances'][0] if isinstance(results['distances'], list) else results['distances']
+                all_chunks.append({
+                    "text": doc,
+                    "url": meta.get("url", ""),
+                    "step_index": meta.get("step_index", 0),
+                    "relevance": similarity,
+                    "timestamp": meta.get("timestamp", 0),
+                    "published_date": meta.get("published_date", "")
+                })
+                seen_doc_ids.add(doc_hash)
+                query_tokens += chunk_tokens
+                total_tokens += chunk_tokens
 
-                if not docs or len(docs) == 0:
-                    continue
+        all_chunks.sort(key=lambda x: x.get("relevance", 0), reverse=True)
+        return all_chunks
 
-                query_tokens = 0
-                for doc, meta, emb, dist in zip(docs, metas, embs, dists):
-                    doc_content = doc[:200] + doc[-200:] if len(doc) > 400 else doc
-                    doc_hash = hashlib.sha256(doc_content.encode('utf-8')).hexdigest()
-                    if doc_hash in seen_doc_ids:
-                        continue
+    def _query_report_candidates(self, chat_id, queries):
+        """Run every report query in batched ChromaDB requests.
 
-                    chunk_tokens = count_tokens(doc)
-                    if query_tokens + chunk_tokens > per_query_budget:
-                        break
-                    if total_tokens + chunk_tokens > max_tokens:
-                        return all_chunks
-
-                    similarity = 1.0 / (1.0 + dist)
-
-                    all_chunks.append({
-                        "text": doc,
-                        "url": meta.get("url", ""),
-                        "step_index": meta.get("step_index", 0),
-                        "relevance": similarity,
-                        "timestamp": meta.get("timestamp", 0),
-                        "published_date": meta.get("published_date", "")
-                    })
-                    seen_doc_ids.add(doc_hash)
-                    query_tokens += chunk_tokens
-                    total_tokens += chunk_tokens
+        Returns:
+            One list per query (in input order) of
+            (doc, meta, distance, doc_hash, token_count) tuples, nearest first.
+            A query whose request failed gets an empty list.
+        """
+        candidates = [[] for _ in queries]
+        try:
+            query_embs = self.rag_manager.embed_texts([q["query"] for q in queries], task="query")
+        except Exception as e:
+            log_event("research_rag_query_error", {"error": str(e), "queries": len(queries)})
+            return candidates
+
+        # ChromaDB applies one where clause per request, so group queries by step filter
+        groups = {}
+        for i, q_info in enumerate(queries):
+            groups.setdefault(q_info.get("step_filter"), []).append(i)
+
+        # Distinct documents across all queries: doc -> (doc_hash, token_count)
+        doc_info = {}
+        uncounted = []
+        raw = []
+        for step_filter, indices in groups.items():
+            if step_filter is not None:
+                where_clause = {"$and": [
+                    {"chat_id": chat_id},
+                    {"step_index": step_filter}
+                ]}
+            else:
+                where_clause = {"chat_id": chat_id}
 
+            try:
+                results = self.vector_collection.query(
+                    query_embeddings=[query_embs[i] for i in indices],
+                    n_results=self.REPORT_QUERY_CANDIDATES,
+                    where=where_clause,
+                    include=["documents", "metadatas", "distances"]
+                )
             except Exception as e:
-                log_event("research_rag_query_error", {"error": str(e)})
+                log_event("research_rag_query_error", {"error": str(e), "queries": len(indices)})
+                continue
+            if not results or not results.get('documents'):
                 continue
 
-        all_chunks.sort(key=lambda x: x.get("relevance", 0), reverse=True)
-        return all_chunks
+            for row, i in enumerate(indices):
+                docs = results['documents'][row]
+                metas = results['metadatas'][row]
+                dists = results['distances'][row]
+                if not docs or len(docs) == 0:
+                    continue
+                raw.append((i, docs, metas, dists))
+                for doc, meta in zip(docs, metas):
+                    if doc in doc_info:
+                        continue
+                    doc_content = doc[:200] + doc[-200:] if len(doc) > 400 else doc
+                    tokens = (meta or {}).get("token_count")
+                    doc_info[doc] = [hashlib.sha256(doc_content.encode('utf-8')).hexdigest(), tokens]
+                    if tokens is None:
+                        uncounted.append(doc)
+
+        # Chunks stored before token counts were cached are counted in one batch
+        if uncounted:
+            for doc, tokens in zip(uncounted, count_tokens_batch(uncounted)):
+                doc_info[doc][1] = tokens
+
+        for i, docs, metas, dists in raw:
+            candidates[i] = [
+                (doc, meta or {}, dist, doc_info[doc][0], doc_info[doc][1])
+                for doc, meta, dist in zip(docs, metas, dists)
+            ]
+        return candidates
 
     def cleanup_chat(self, chat_id):
         """Delete all stored chunks for a given chat_id.
@@ -1716,7 +2033,7 @@ class FileRAG(RAGStore):
             chunks = chunk_spreadsheet_text(content_text, config.EMBEDDING_MAX_TOKENS_FILE)
             chunk_strategy = 'row-based'
         elif file_type == 'code':
-            chunks = chunk_code_text(content_text, config.EMBEDDING_MAX_TOKENS_FILE)
+            chunks = chunk_code_text(content_text, config.EMBEDDING_MAX_TOKENS_FILE, language=filename)
             chunk_strategy = 'syntax-aware'
         elif file_type == 'mixed':
             chunks = chunk_mixed_text(content_text, config.EMBEDDING_MAX_TOKENS_FILE)
@@ -1847,7 +2164,7 @@ class FileRAG(RAGStore):
                 chunks = chunk_spreadsheet_text(content_text, config.EMBEDDING_MAX_TOKENS_FILE)
                 chunk_strategy = 'row-based'
             elif file_type == 'code':
-                chunks = chunk_code_text(content_text, config.EMBEDDING_MAX_TOKENS_FILE)
+                chunks = chunk_code_text(content_text, config.EMBEDDING_MAX_TOKENS_FILE, language=filename)
                 chunk_strategy = 'syntax-aware'
             elif file_type == 'mixed':
                 chunks = chunk_mixed_text(content_text, config.EMBEDDING_MAX_TOKENS_FILE)
@@ -1929,6 +2246,76 @@ class FileRAG(RAGStore):
 
         return all_stored_ids
 
+    def copy_file_chunks(self, source_file_id, file_id, chat_id, timestamp=None):
+        """Re-use another file's chunks and embeddings for identical content.
+
+        Chunk texts, type-specific metadata and the stored vectors of both
+        collections are copied under file_id/chat_id, so nothing is chunked,
+        classified or embedded again.
+
+        Args:
+            source_file_id: Already-embedded file with the same bytes
+            file_id: File identifier to store the copies under
+            chat_id: Chat session ID of the new file
+            timestamp: Optional Unix timestamp for the chunk metadata (default now)
+
+        Returns:
+            List of stored document IDs (empty if the source has no chunks)
+        """
+        if not self._initialized:
+            log_event("file_rag_not_initialized", {"file_id": file_id})
+            return []
+
+        try:
+            source = self.vector_collection.get(where={"file_id": source_file_id},
+                                                include=["documents", "metadatas", "embeddings"])
+            if not source or not source.get('ids'):
+                return []
+            bm25_source = self.bm25_collection.get(ids=source['ids'], include=["embeddings"])
+            bm25_vectors = dict(zip(bm25_source['ids'], bm25_source['embeddings']))
+        except Exception as e:
+            log_event("rag_file_copy_error", {
+                "file_id": file_id,
+                "source_file_id": source_file_id,
+                "error": str(e)
+            })
+            return []
+
+        stamp = timestamp if timestamp is not None else time.time()
+        ids, documents, metadatas, embeddings, bm25_embeddings = [], [], [], [], []
+        for i, source_id in enumerate(source['ids']):
+            metadata = dict(source['metadatas'][i])
+            metadata.update({"file_id": file_id, "chat_id": chat_id, "timestamp": stamp})
+            ids.append(f"{file_id}_chunk_{metadata.get('chunk_index', i)}")
+            documents.append(source['documents'][i])
+            metadatas.append(metadata)
+            embeddings.append(source['embeddings'][i])
+            bm25_embeddings.append(bm25_vectors.get(source_id))
+
+        try:
+            self.vector_collection.upsert(ids=ids, documents=documents, metadatas=metadatas,
+                                          embeddings=embeddings)
+            if all(v is not None for v in bm25_embeddings):
+                self.bm25_collection.upsert(ids=ids, documents=documents, metadatas=metadatas,
+                                            embeddings=bm25_embeddings)
+            else:
+                # Missing BM25 rows: let the collection embed the texts itself
+                self.bm25_collection.upsert(ids=ids, documents=documents, metadatas=metadatas)
+        except Exception as e:
+            log_event("rag_file_copy_error", {
+                "file_id": file_id,
+                "source_file_id": source_file_id,
+                "error": str(e)
+            })
+            return []
+
+        log_event("rag_file_copied", {
+            "file_id": file_id,
+            "source_file_id": source_file_id,
+            "num_chunks": len(ids)
+        })
+        return ids
+
     def retrieve_for_file(self, file_id, query, n_results=5, hybrid=True):
         """Retrieve relevant chunks for a specific file.
 
@@ -1945,7 +2332,20 @@ class FileRAG(RAGStore):
         try:
             results = self.retrieve_by_query(query, n_results=n_results, where=where, hybrid=hybrid)
             return results
-        except RuntimeError as e:
+        except Exception as e:
+            return self._retrieval_failed(file_id, e)
+
+    async def aretrieve_for_file(self, file_id, query, n_results=5, hybrid=True):
+        """Async retrieve_for_file() for event-loop callers (see aretrieve_by_query)."""
+        where = {"file_id": file_id}
+        try:
+            return await self.aretrieve_by_query(query, n_results=n_results, where=where, hybrid=hybrid)
+        except Exception as e:
+            return self._retrieval_failed(file_id, e)
+
+    def _retrieval_failed(self, file_id, e):
+        """Log a failed file retrieval and return the empty fallback result."""
+        if isinstance(e, RuntimeError):
             # BM25 not supported with cosine distance - return empty results
             # The error is already logged in retrieve_by_query
             log_event("rag_retrieval_fallback", {
@@ -1954,15 +2354,14 @@ class FileRAG(RAGStore):
                 "retrieval_mode": "vector_only"
             })
             return []
-        except Exception as e:
-            # Log full error with traceback
-            import traceback
-            log_event("rag_retrieval_error", {
-                "file_id": file_id,
-                "error": str(e),
-                "traceback": traceback.format_exc()
-            })
-            return []
+        # Log full error with traceback
+        import traceback
+        log_event("rag_retrieval_error", {
+            "file_id": file_id,
+            "error": str(e),
+            "traceback": "".join(traceback.format_exception(type(e), e, e.__traceback__))
+        })
+        return []
 
     def get_file_chunks(self, file_id):
         """Get all chunks for a specific file.
@@ -11,6 +11,7 @@ from contextlib import contextmanager
 
 # Import new unified DB layer
 from backend.db_wrapper import db
+from backend.migrations import apply_migrations
 
 DB_PATH = os.path.join(DATA_DIR, "chats.db")
 
@@ -625,6 +626,9 @@ def init_db():
         c.execute('CREATE INDEX IF NOT EXISTS idx_memories_tag ON memories(tag)')
 
         conn.commit()
+
+        # Versioned migrations (backend/migrations.py) for everything newer
+        apply_migrations(conn)
         conn.close()
     
     # We use a global write lock for schema init to be safe
@@ -11,9 +11,10 @@ Tasks in this system represent long-running operations (chat conversations, deep
 that need to be executed asynchronously without blocking the main thread. The architecture
 follows these principles:
 
-1. Thread Isolation: Each task runs in its own daemon thread with a dedicated asyncio
-   event loop. This prevents tasks from interfering with each other and allows proper
-   cancellation.
+1. Bounded Workers: Tasks run on a fixed pool of long-lived worker threads, each with
+   its own asyncio event loop (see backend/task_scheduler.py). Chat tasks are dispatched
+   ahead of research tasks, each kind has its own concurrency limit, and a full queue
+   raises TaskQueueFullError so the API can answer 429.
 
 2. State Persistence: Task state is written to disk (JSON files) on every significant
    state change. This enables recovery after server crashes or restarts.
@@ -26,7 +27,7 @@ follows these principles:
    database transaction. If the transaction fails, UI content is redacted.
 
 Key features:
-- Task execution in isolated threads with their own asyncio event loops
+- Task execution on a bounded pool of event-loop workers with a priority queue
 - Task interruption and cancellation support
 - Disk persistence of task state for recovery
 - Chunk-based streaming responses from execution functions
@@ -36,7 +37,8 @@ Key features:
 Usage Pattern
 -------------
 1. Call start_chat_task() or start_research_task() to begin execution
-2. Task runs in background thread with consume() processing chunks
+2. Task waits for a worker (queue position is streamed via cache_system), then
+   runs with consume() processing chunks
 3. User can interrupt task via stop_task() - sets interruption flag
 4. On completion/failure, task state is persisted to disk
 5. On server restart, recover_tasks() marks orphaned tasks as interrupted
@@ -53,6 +55,8 @@ from backend.db_wrapper import db
 from backend.logger import log_event
 from backend import config
 from backend.cache_system import cache_system
+from backend.task_scheduler import TaskScheduler, TaskQueueFullError
+from backend.http_clients import close_loop_client
 from backend.utils import strip_images_from_messages
 from backend.model_loader import (
     get_research_main_model,
@@ -92,11 +96,14 @@ class TaskManager:
     Attributes:
         interrupted_tasks: Set of chat_ids that have been marked for interruption.
         active_tasks: Dict mapping chat_ids to their running asyncio.Task objects.
+        scheduler: Worker pool and priority queue that runs the tasks.
     """
 
     def __init__(self):
         self.interrupted_tasks = set()
         self.active_tasks = {}  # chat_id -> asyncio.Task
+        self.scheduler = TaskScheduler(on_position=cache_system.update_queue_status,
+                                       on_worker_exit=close_loop_client)
 
     def __repr__(self):
         """String representation for debugging."""
@@ -116,6 +123,12 @@ class TaskManager:
         """
         self.interrupted_tasks.add(chat_id)
 
+        # A task still waiting for a worker never started: drop it from the queue
+        # and close its stream so subscribers are released
+        if self.scheduler.cancel(chat_id):
+            cache_system.mark_completed(chat_id, cleanup=True)
+            log_event("task_dequeued", {"chat_id": chat_id})
+
         # Proper asyncio cancellation using thread-safe loop methods
         task = self.active_tasks.get(chat_id)
         if task:
@@ -138,23 +151,51 @@ class TaskManager:
             except:
                 pass
 
-    def start_chat_task(self, chat_id, execute_fn, **kwargs):
+    def reserve_task_slot(self, mode=None):
+        """
+        Holds a scheduler queue slot before the caller persists anything.
+
+        Pass the result to start_chat_task()/start_research_task() as
+        reservation=..., and release() it if the request ends without
+        starting a task (release is a no-op once the task was submitted).
+
+        Args:
+            mode: Task mode ("research" or anything else for chat).
+
+        Raises:
+            TaskQueueFullError: If the queue has no room.
+        """
+        return self.scheduler.reserve(self._task_kind(mode))
+
+    @staticmethod
+    def _task_kind(mode):
+        """Maps a task mode to its scheduler kind."""
+        return "research" if mode == "research" else "chat"
+
+    def start_chat_task(self, chat_id, execute_fn, reservation=None, **kwargs):
         """
-        Starts a new chat or research task in a background thread with its own event loop.
+        Starts a new chat or research task on the scheduler's worker pool.
 
         This method:
         1. Initializes the cache system for the chat
         2. Clears any prior interruption state
         3. Serializes essential task info to disk (with images stripped from messages)
-        4. Launches the task in a daemon thread with its own asyncio event loop
+        4. Submits the task to the scheduler; it runs on a worker's event loop
+           immediately or after waiting its turn in the priority queue
 
         Args:
             chat_id: Unique identifier for this chat session.
             execute_fn: The async or sync generator function to execute.
+            reservation: Optional slot from reserve_task_slot(); a submit that
+                brings one is never rejected.
             **kwargs: Task parameters (model, messages, etc.) to pass to execute_fn.
 
         The function creates a persistent record on disk for task recovery after crashes.
         Complex objects (like RAG engines) are passed at runtime but not persisted.
+
+        Raises:
+            TaskQueueFullError: If the scheduler queue is full. The cache entry and
+                task file are removed before re-raising.
         """
         # If we are resuming, we want to preserve the existing WAL for re-subscription
         is_resume = 'resume_state' in kwargs and kwargs['resume_state'] is not None
@@ -185,8 +226,21 @@ class TaskManager:
         # Combine persistent data with runtime objects for thread execution
         runtime_info = {**persistent_info, **kwargs}
 
-        # Start task in daemon thread (won't block program exit)
-        threading.Thread(target=self._run_task, args=(runtime_info, execute_fn), daemon=True).start()
+        # Queue the task on the worker pool (chat ahead of research)
+        kind = self._task_kind(kwargs.get('mode'))
+        try:
+            self.scheduler.submit(
+                chat_id, kind,
+                lambda loop: self._run_task(runtime_info, execute_fn, loop=loop),
+                reservation=reservation
+            )
+        except TaskQueueFullError:
+            cache_system.cleanup_chat(chat_id)
+            try:
+                os.remove(os.path.join(TASKS_DIR, f"{chat_id}.json"))
+            except OSError:
+                pass
+            raise
 
     def start_research_task(self, model, messages, approved_plan, chat_id, search_depth_mode, vision_model, execute_fn, vision_enabled=True, **kwargs):
         """
@@ -219,12 +273,12 @@ class TaskManager:
             **kwargs
         )
         
-    def _run_task(self, task_info, execute_fn):
+    def _run_task(self, task_info, execute_fn, loop=None):
         """
-        Main execution function that runs in a background thread with its own event loop.
+        Main execution function that runs on a worker thread's event loop.
 
         This method:
-        1. Creates a new asyncio event loop (required for thread execution)
+        1. Uses the worker's long-lived event loop (or creates one if none is given)
         2. Builds the kwargs dictionary for the execution function
         3. Dynamically determines which parameters the function accepts
         4. Runs the consume() async function to process the task
@@ -232,11 +286,19 @@ class TaskManager:
         Args:
             task_info: Dictionary containing all task data (from start_chat_task).
             execute_fn: The async/sync generator function to execute.
+            loop: Event loop owned by the calling worker. It is left open for the
+                worker's next task; a loop created here is closed on exit.
         """
         chat_id = task_info["chat_id"]
 
-        # Each thread must have its own event loop
-        loop = asyncio.new_event_loop()
+        # Stopped while waiting in the queue: nothing to run
+        if chat_id in self.interrupted_tasks:
+            cache_system.mark_completed(chat_id, cleanup=True)
+            return
+
+        owns_loop = loop is None
+        if owns_loop:
+            loop = asyncio.new_event_loop()
         asyncio.set_event_loop(loop)
 
         ai_url = config.AI_URL
@@ -461,7 +523,9 @@ class TaskManager:
                     loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
             except Exception:
                 pass
-            loop.close()
+            if owns_loop:
+                close_loop_client(loop)
+                loop.close()
 
     def is_task_running(self, chat_id):
         """
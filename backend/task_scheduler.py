@@ -0,0 +1,379 @@
+"""
+Bounded worker-pool scheduler for chat and research tasks.
+
+TaskManager used to start a new daemon thread with a fresh asyncio event
+loop for every task, with no upper bound. This module replaces that with a
+fixed pool of long-lived worker threads, each owning one event loop that is
+reused across tasks, fed from a priority queue.
+
+1. Priority:
+   - Interactive chat tasks are dispatched ahead of deep research tasks
+   - Within a kind, tasks run in submission order (FIFO)
+
+2. Per-Kind Limits:
+   - At most TASK_MAX_CONCURRENT_CHAT chat tasks and
+     TASK_MAX_CONCURRENT_RESEARCH research tasks run at once, within
+     TASK_WORKER_POOL_SIZE workers in total
+   - A queued research task never blocks a chat task behind it
+
+3. Admission Control:
+   - At most TASK_QUEUE_MAX tasks wait in the queue; submit() raises
+     TaskQueueFullError beyond that so callers can answer HTTP 429
+   - reserve() holds a queue slot ahead of submit(), so a caller can be
+     rejected before it has written anything; a submit() that brings the
+     reservation cannot be rejected
+   - Queue positions are reported through a callback whenever they change
+
+4. Cancellation:
+   - cancel() removes a task that has not started yet; running tasks are
+     stopped by TaskManager as before
+"""
+import asyncio
+import heapq
+import itertools
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from backend import config
+from backend.logger import log_event
+
+# Lower value = dispatched first
+KIND_PRIORITY = {
+    "chat": 0,
+    "research": 1,
+}
+
+
+class TaskQueueFullError(Exception):
+    """Raised when a task cannot be admitted because the queue is full."""
+
+    def __init__(self, kind: str, queued: int, retry_after: int):
+        super().__init__(f"Task queue is full ({queued} waiting); retry in {retry_after}s")
+        self.kind = kind
+        self.queued = queued
+        self.retry_after = retry_after
+
+
+class TaskReservation:
+    """A queue slot held between TaskScheduler.reserve() and submit().
+
+    Pass it to submit(), which consumes it; release() (idempotent) returns
+    an unused slot, e.g. when the request fails before submitting.
+    """
+
+    __slots__ = ('_scheduler', 'kind', 'active')
+
+    def __init__(self, scheduler: "TaskScheduler", kind: str):
+        self._scheduler = scheduler
+        self.kind = kind
+        self.active = True
+
+    def release(self) -> None:
+        with self._scheduler._cond:
+            self._scheduler._consume(self)
+
+
+class _Job:
+    __slots__ = ('job_id', 'kind', 'run', 'priority', 'seq', 'submitted_at', 'cancelled')
+
+    def __init__(self, job_id: str, kind: str, run: Callable, seq: int):
+        self.job_id = job_id
+        self.kind = kind
+        self.run = run
+        self.priority = KIND_PRIORITY.get(kind, max(KIND_PRIORITY.values()) + 1)
+        self.seq = seq
+        self.submitted_at = time.time()
+        self.cancelled = False
+
+    def __lt__(self, other: "_Job") -> bool:
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class TaskScheduler:
+    """
+    Fixed pool of event-loop workers fed from a priority queue.
+
+    Usage:
+        scheduler = TaskScheduler(on_position=report)
+        scheduler.submit("chat-123", "chat", lambda loop: run_task(loop))
+
+    Jobs are callables taking the worker's event loop; they run to
+    completion on the worker thread before it picks the next job.
+
+    Args:
+        workers: Number of worker threads (each with its own event loop)
+        limits: Max concurrently running jobs per kind
+        queue_max: Max jobs waiting for a worker
+        on_position: Callback(job_id, position, kind) when a queued job's
+            1-based position changes; position 0 means the job has started
+        on_worker_exit: Callback(loop) run on a worker's thread before its
+            event loop is closed, to release loop-bound resources
+    """
+
+    def __init__(self, workers: int = None, limits: Dict[str, int] = None,
+                 queue_max: int = None,
+                 on_position: Optional[Callable[[str, int, str], None]] = None,
+                 on_worker_exit: Optional[Callable[[asyncio.AbstractEventLoop], None]] = None):
+        self.workers = workers if workers is not None else config.TASK_WORKER_POOL_SIZE
+        self.limits = limits if limits is not None else {
+            "chat": config.TASK_MAX_CONCURRENT_CHAT,
+            "research": config.TASK_MAX_CONCURRENT_RESEARCH,
+        }
+        self.queue_max = queue_max if queue_max is not None else config.TASK_QUEUE_MAX
+        self.on_position = on_position
+        self.on_worker_exit = on_worker_exit
+
+        self._cond = threading.Condition()
+        self._heap: List[_Job] = []
+        self._queued: Dict[str, _Job] = {}
+        self._running: Dict[str, int] = {}
+        self._reserved = 0
+        self._seq = itertools.count()
+        self._threads: List[threading.Thread] = []
+        self._loops: List[asyncio.AbstractEventLoop] = []
+        self._stopped = False
+
+        self._stats: Dict[str, Any] = {
+            'submitted': 0,
+            'started': 0,
+            'completed': 0,
+            'rejected': 0,
+            'cancelled': 0,
+            'max_wait_seconds': 0.0,
+        }
+
+    # ==================== WORKERS ====================
+
+    def _ensure_workers(self) -> None:
+        """Start the worker threads on first use. Must hold self._cond."""
+        if self._threads:
+            return
+        for i in range(self.workers):
+            t = threading.Thread(target=self._worker, name=f"task-worker-{i}", daemon=True)
+            self._threads.append(t)
+            t.start()
+
+    def _worker(self) -> None:
+        """Worker thread: own one event loop and run jobs on it until stopped."""
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        with self._cond:
+            self._loops.append(loop)
+        try:
+            while True:
+                job = self._next_job()
+                if job is None:
+                    return
+                self._notify_position(job.job_id, 0, job.kind)
+                try:
+                    job.run(loop)
+                except Exception as e:
+                    log_event("task_worker_error", {"job_id": job.job_id, "kind": job.kind, "error": str(e)})
+                finally:
+                    with self._cond:
+                        self._running[job.kind] -= 1
+                        self._stats['completed'] += 1
+                        self._cond.notify_all()
+        finally:
+            with self._cond:
+                if loop in self._loops:
+                    self._loops.remove(loop)
+            if self.on_worker_exit is not None:
+                try:
+                    self.on_worker_exit(loop)
+                except Exception as e:
+                    log_event("task_worker_exit_error", {"error": str(e)})
+            loop.close()
+
+    def _limit(self, kind: str) -> int:
+        return self.limits.get(kind, self.workers)
+
+    def _eligible(self, kind: str) -> bool:
+        return self._running.get(kind, 0) < self._limit(kind)
+
+    def _next_job(self) -> Optional[_Job]:
+        """Block until a job can run under its kind's limit, then claim it."""
+        with self._cond:
+            while True:
+                if self._stopped:
+                    return None
+                job = None
+                for candidate in sorted(self._heap):
+                    if self._eligible(candidate.kind):
+                        job = candidate
+                        break
+                if job is not None:
+                    self._heap.remove(job)
+                    heapq.heapify(self._heap)
+                    del self._queued[job.job_id]
+                    self._running[job.kind] = self._running.get(job.kind, 0) + 1
+                    self._stats['started'] += 1
+                    wait = time.time() - job.submitted_at
+                    if wait > self._stats['max_wait_seconds']:
+                        self._stats['max_wait_seconds'] = wait
+                    positions = self._positions()
+                    break
+                self._cond.wait()
+        for job_id, (position, kind) in positions.items():
+            self._notify_position(job_id, position, kind)
+        return job
+
+    # ==================== QUEUE ====================
+
+    def _positions(self) -> Dict[str, tuple]:
+        """1-based position of every queued job in dispatch order. Must hold self._cond."""
+        return {job.job_id: (i + 1, job.kind) for i, job in enumerate(sorted(self._heap))}
+
+    def _notify_position(self, job_id: str, position: int, kind: str) -> None:
+        if self.on_position is None:
+            return
+        try:
+            self.on_position(job_id, position, kind)
+        except Exception as e:
+            log_event("task_queue_position_error", {"job_id": job_id, "error": str(e)})
+
+    def _busy(self, kind: str) -> bool:
+        """True if a newly submitted job of this kind would have to wait. Must hold self._cond."""
+        running_total = sum(self._running.values())
+        return bool(self._heap) or running_total >= self.workers or not self._eligible(kind)
+
+    def can_accept(self) -> bool:
+        """Whether reserve()/submit() would currently admit a job (it may still queue).
+
+        Admission is queue-wide: TASK_QUEUE_MAX counts waiting jobs of every
+        kind plus reservations. Per-kind limits only decide when a job starts.
+        """
+        with self._cond:
+            return not self._stopped and self._has_room()
+
+    def _has_room(self) -> bool:
+        """Whether waiting jobs plus reservations are below queue_max. Must hold self._cond."""
+        return len(self._heap) + self._reserved < self.queue_max
+
+    def _reject(self, job_id: Optional[str], kind: str) -> TaskQueueFullError:
+        """Count and log a rejection. Must hold self._cond."""
+        self._stats['rejected'] += 1
+        log_event("task_queue_rejected", {"job_id": job_id, "kind": kind, "queued": len(self._heap),
+                                          "reserved": self._reserved})
+        return TaskQueueFullError(kind, len(self._heap), config.TASK_QUEUE_RETRY_AFTER_SECONDS)
+
+    def _consume(self, reservation: TaskReservation) -> bool:
+        """Return a reservation's slot; False if it was already used. Must hold self._cond."""
+        if not reservation.active:
+            return False
+        reservation.active = False
+        self._reserved -= 1
+        return True
+
+    def reserve(self, kind: str) -> TaskReservation:
+        """
+        Hold a queue slot for a job that will be submitted shortly.
+
+        Returns:
+            TaskReservation to pass to submit() (or release())
+
+        Raises:
+            TaskQueueFullError: If waiting jobs plus reservations reach TASK_QUEUE_MAX
+        """
+        with self._cond:
+            if self._stopped:
+                raise RuntimeError("Task scheduler is shut down")
+            if not self._has_room():
+                raise self._reject(None, kind)
+            self._reserved += 1
+            return TaskReservation(self, kind)
+
+    def submit(self, job_id: str, kind: str, run: Callable[[asyncio.AbstractEventLoop], Any],
+               reservation: Optional[TaskReservation] = None) -> int:
+        """
+        Queue a job for execution on a worker.
+
+        Args:
+            job_id: Unique id (the chat_id); used for positions and cancel()
+            kind: "chat" or "research"
+            run: Callable invoked with the worker's event loop
+            reservation: Slot from reserve(); consumed, and the job is admitted
+
+        Returns:
+            int: 0 if a worker is free to start it now, else its 1-based queue position
+
+        Raises:
+            TaskQueueFullError: If TASK_QUEUE_MAX jobs are already waiting
+        """
+        with self._cond:
+            if self._stopped:
+                raise RuntimeError("Task scheduler is shut down")
+            reserved = reservation is not None and self._consume(reservation)
+            if not reserved and not self._has_room():
+                raise self._reject(job_id, kind)
+            must_wait = self._busy(kind)
+            job = _Job(job_id, kind, run, next(self._seq))
+            heapq.heappush(self._heap, job)
+            self._queued[job_id] = job
+            self._stats['submitted'] += 1
+            self._ensure_workers()
+            positions = self._positions() if must_wait else {}
+            self._cond.notify_all()
+        for queued_id, (position, queued_kind) in positions.items():
+            self._notify_position(queued_id, position, queued_kind)
+        return positions.get(job_id, (0,))[0]
+
+    def cancel(self, job_id: str) -> bool:
+        """
+        Remove a job that has not started yet.
+
+        Returns:
+            bool: True if the job was still queued and is now removed
+        """
+        with self._cond:
+            job = self._queued.pop(job_id, None)
+            if job is None:
+                return False
+            self._heap.remove(job)
+            heapq.heapify(self._heap)
+            job.cancelled = True
+            self._stats['cancelled'] += 1
+            positions = self._positions()
+        for queued_id, (position, kind) in positions.items():
+            self._notify_position(queued_id, position, kind)
+        return True
+
+    def queue_position(self, job_id: str) -> Optional[int]:
+        """1-based queue position of a waiting job, or None if not queued."""
+        with self._cond:
+            if job_id not in self._queued:
+                return None
+            return self._positions()[job_id][0]
+
+    def shutdown(self, timeout: float = 2.0) -> None:
+        """Stop accepting work and let idle workers exit."""
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+            threads = list(self._threads)
+        for t in threads:
+            t.join(timeout=timeout)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get scheduler statistics for monitoring.
+
+        Returns:
+            Dictionary with pool size, per-kind running/queued counts and lifetime counters
+        """
+        with self._cond:
+            stats = dict(self._stats)
+            queued: Dict[str, int] = {}
+            for job in self._heap:
+                queued[job.kind] = queued.get(job.kind, 0) + 1
+            stats.update({
+                'workers': self.workers,
+                'limits': dict(self.limits),
+                'queue_max': self.queue_max,
+                'running': dict(self._running),
+                'queued': queued,
+                'queue_length': len(self._heap),
+                'reserved': self._reserved,
+            })
+        return stats
@@ -3,11 +3,25 @@
 This module provides accurate token counting for embedding models using the
 actual tokenizer from HuggingFace. It loads the HuggingFace token from
 secrets/HF_TOKEN (with fallback to HF_TOKEN environment variable).
+
+Counts are memoized in a bounded LRU keyed by a hash of the text, so the
+chunkers, the embedding circuit-breaker and context estimation do not
+re-encode the same paragraphs and messages over and over. Use
+count_tokens_batch() when many texts need counting at once (one call into
+the fast tokenizer for all cache misses), IncrementalTokenCounter for
+buffers that only ever grow, and encode_offsets() when a chunker needs the
+token boundaries of a whole document.
 """
 import os
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
 from transformers import AutoTokenizer
 import logging
 
+from backend import config
+
 # Suppress noisy sequence length warnings from transformers tokenizer
 # since we handle explicit truncation/chunking in our own pipeline.
 import transformers
@@ -73,6 +87,82 @@ def get_tokenizer():
     return _tokenizer
 
 
+class _TokenCountCache:
+    """Thread-safe LRU of token counts keyed by a content hash.
+
+    Keys are 16-byte BLAKE2b digests rather than the texts themselves, so the
+    cache holds a bounded amount of memory even for large chunks.
+    """
+
+    def __init__(self, max_entries: int, min_chars: int):
+        self.max_entries = max_entries
+        self.min_chars = min_chars
+        self._entries: "OrderedDict[bytes, int]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(text: str) -> bytes:
+        return hashlib.blake2b(text.encode("utf-8", "surrogatepass"), digest_size=16).digest()
+
+    def cacheable(self, text: str) -> bool:
+        return self.max_entries > 0 and len(text) >= self.min_chars
+
+    def get(self, key: bytes) -> Optional[int]:
+        with self._lock:
+            count = self._entries.get(key)
+            if count is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return count
+
+    def put(self, key: bytes, count: int) -> None:
+        with self._lock:
+            self._entries[key] = count
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits / lookups) if lookups else 0.0,
+            }
+
+
+_count_cache = _TokenCountCache(config.TOKEN_COUNT_CACHE_SIZE, config.TOKEN_COUNT_CACHE_MIN_CHARS)
+
+
+def _encode_lengths(texts: List[str]) -> List[int]:
+    """Encode several texts in one tokenizer call and return their lengths."""
+    tokenizer = get_tokenizer()
+    if getattr(tokenizer, "is_fast", False):
+        # Straight to the Rust tokenizer: skips converting every encoding to Python lists
+        encodings = tokenizer.backend_tokenizer.encode_batch(texts, add_special_tokens=False)
+        return [len(encoding) for encoding in encodings]
+    encoded = tokenizer(
+        texts,
+        add_special_tokens=False,
+        return_attention_mask=False,
+        return_token_type_ids=False,
+    )["input_ids"]
+    return [len(ids) for ids in encoded]
+
+
 def count_tokens(text: str) -> int:
     """Count tokens in text using the embedding model's tokenizer.
 
@@ -82,8 +172,233 @@ def count_tokens(text: str) -> int:
     Returns:
         int: The number of tokens in the text.
     """
+    if not text:
+        return 0
+    if not _count_cache.cacheable(text):
+        tokenizer = get_tokenizer()
+        return len(tokenizer.encode(text, add_special_tokens=False))
+
+    key = _count_cache.key(text)
+    count = _count_cache.get(key)
+    if count is None:
+        tokenizer = get_tokenizer()
+        count = len(tokenizer.encode(text, add_special_tokens=False))
+        _count_cache.put(key, count)
+    return count
+
+
+def count_tokens_batch(texts: List[str]) -> List[int]:
+    """Count tokens for many texts at once.
+
+    Cached counts are reused; the remaining unique texts are encoded in a
+    single batch call, which the fast (Rust) tokenizer parallelizes.
+
+    Args:
+        texts: The texts to count tokens for.
+
+    Returns:
+        List[int]: Token counts, in the same order as texts.
+    """
+    counts: List[Optional[int]] = [None] * len(texts)
+    pending: Dict[str, List[int]] = {}
+    keys: Dict[str, bytes] = {}
+
+    for i, text in enumerate(texts):
+        if not text:
+            counts[i] = 0
+            continue
+        if text in pending:
+            pending[text].append(i)
+            continue
+        if _count_cache.cacheable(text):
+            key = _count_cache.key(text)
+            cached = _count_cache.get(key)
+            if cached is not None:
+                counts[i] = cached
+                continue
+            keys[text] = key
+        pending[text] = [i]
+
+    if pending:
+        unique = list(pending.keys())
+        for text, count in zip(unique, _encode_lengths(unique)):
+            for i in pending[text]:
+                counts[i] = count
+            key = keys.get(text)
+            if key is not None:
+                _count_cache.put(key, count)
+
+    return counts
+
+
+# encode_offsets() splits long documents into blocks of about this many
+# characters, at paragraph breaks, and encodes the blocks in parallel.
+OFFSET_BLOCK_CHARS = 32768
+
+
+def _paragraph_blocks(text: str) -> List[Tuple[int, str]]:
+    """Split text at paragraph breaks into (start, block) pieces of ~OFFSET_BLOCK_CHARS."""
+    blocks = []
+    start = 0
+    while len(text) - start > OFFSET_BLOCK_CHARS:
+        cut = text.find("\n\n", start + OFFSET_BLOCK_CHARS)
+        if cut < 0:
+            break
+        blocks.append((start, text[start:cut]))
+        start = cut
+    blocks.append((start, text[start:]))
+    return blocks
+
+
+def encode_offsets(text: str) -> Optional[List[Tuple[int, int]]]:
+    """Encode text once and return each token's (start, end) character offsets.
+
+    Long texts are encoded as paragraph-aligned blocks in one parallel batch;
+    a paragraph break almost never has a token spanning it, and callers that
+    need exact counts validate their final pieces anyway. The count of a
+    single-block text is memoized like count_tokens(). Returns None with a
+    slow (pure Python) tokenizer, which provides no offset mapping.
+
+    Args:
+        text: The text to encode.
+
+    Returns:
+        List of (start, end) offsets, one per token, or None.
+    """
     tokenizer = get_tokenizer()
-    return len(tokenizer.encode(text, add_special_tokens=False))
+    if not getattr(tokenizer, "is_fast", False):
+        return None
+    if not text:
+        return []
+    blocks = _paragraph_blocks(text)
+    encodings = tokenizer.backend_tokenizer.encode_batch([block for _, block in blocks], add_special_tokens=False)
+    if len(blocks) == 1:
+        offsets = encodings[0].offsets
+        if _count_cache.cacheable(text):
+            _count_cache.put(_count_cache.key(text), len(offsets))
+        return offsets
+    offsets = []
+    for (base, _), encoding in zip(blocks, encodings):
+        offsets.extend([(base + a, base + b) for a, b in encoding.offsets])
+    return offsets
+
+
+def get_token_cache_stats() -> Dict[str, float]:
+    """Get token count cache statistics for monitoring.
+
+    Returns:
+        Dict with entries, max_entries, hits, misses and hit_rate.
+    """
+    return _count_cache.stats()
+
+
+def clear_token_cache() -> None:
+    """Drop all memoized token counts and reset the hit/miss counters."""
+    _count_cache.clear()
+
+
+class IncrementalTokenCounter:
+    """Token counter for an append-only text buffer.
+
+    Re-counting a growing buffer from scratch after every append is
+    quadratic in its length. This counter freezes a prefix that ends on a
+    line boundary far enough behind the end of the buffer, and only
+    re-encodes the unfrozen tail plus the appended text. Tokens never merge
+    across the frozen boundary, so the running count matches a full encode
+    of the buffer for the line-oriented text it is used on. Callers that
+    need a hard guarantee still validate the final chunks with count_tokens().
+
+    With a slow (pure Python) tokenizer, which provides no offset mapping,
+    every append falls back to a full (memoized) count.
+
+    Usage:
+        counter = IncrementalTokenCounter()
+        counter.append(segment)
+        if counter.count > max_tokens:
+            ...
+        counter.reset(next_segment)
+    """
+
+    # Keep at least this many characters re-encodable behind the end of the
+    # buffer, so appends cannot change how the frozen prefix was tokenized.
+    TAIL_MARGIN_CHARS = 256
+
+    def __init__(self, text: str = ""):
+        self.reset(text)
+
+    def reset(self, text: str = "") -> int:
+        """Start over with a new buffer.
+
+        Args:
+            text: Initial buffer contents.
+
+        Returns:
+            int: Token count of the new buffer.
+        """
+        self._parts: List[str] = []
+        self._frozen_tokens = 0
+        self._tail = ""
+        self._count = 0
+        return self.append(text)
+
+    @property
+    def count(self) -> int:
+        """Token count of the whole buffer."""
+        return self._count
+
+    @property
+    def text(self) -> str:
+        """The whole buffer."""
+        return "".join(self._parts)
+
+    def append(self, text: str) -> int:
+        """Append text to the buffer.
+
+        Args:
+            text: Text to append.
+
+        Returns:
+            int: Token count of the whole buffer after the append.
+        """
+        if not text:
+            return self._count
+        self._parts.append(text)
+        tokenizer = get_tokenizer()
+        if not getattr(tokenizer, "is_fast", False):
+            self._count = count_tokens(self.text)
+            return self._count
+
+        tail = self._tail + text
+        encoding = tokenizer(
+            tail,
+            add_special_tokens=False,
+            return_attention_mask=False,
+            return_token_type_ids=False,
+            return_offsets_mapping=True,
+        )
+        offsets = encoding["offset_mapping"]
+        self._count = self._frozen_tokens + len(offsets)
+        self._freeze(tail, offsets)
+        return self._count
+
+    def _freeze(self, tail: str, offsets: list) -> None:
+        """Move the frozen boundary to the last safe line start in the tail."""
+        limit = len(tail) - self.TAIL_MARGIN_CHARS
+        if limit <= 0:
+            self._tail = tail
+            return
+        for k in range(len(offsets) - 1, 0, -1):
+            start = offsets[k][0]
+            if start > limit:
+                continue
+            # Token k must start right after a newline, on a non-space char,
+            # and the previous token must end exactly there (no merge across).
+            if (tail[start - 1] == "\n" and not tail[start].isspace()
+                    and offsets[k - 1][1] == start):
+                self._frozen_tokens += k
+                self._tail = tail[start:]
+                return
+        self._tail = tail
 
 
 def truncate_text_by_tokens(text: str, max_tokens: int, model_max_tokens: int = None) -> str:
@@ -0,0 +1,426 @@
+"""
+Streaming upload receive and background ingestion for /api/upload.
+
+The upload endpoint used to read the whole body into memory, write it to a
+temp file, shutil.copy2 that into storage and then extract and embed the file
+inside the request. This module splits that into two parts:
+
+1. Streaming Receive:
+   - UploadSink is handed to werkzeug's multipart parser as the file stream,
+     so the body is written chunk by chunk straight into the storage
+     directory as a hidden .part file
+   - Every chunk updates a running sha256 and byte count; crossing
+     FILE_UPLOAD_MAX_SIZE aborts the request with 413 and removes the part
+   - commit() fsyncs and atomically renames the part to its final stored
+     name; discard() removes it. The upload is never held in memory whole
+   - install_upload_streaming() wires this into a Flask app: a Request
+     subclass hands out sinks for the upload routes and a teardown hook
+     discards any sink the view did not commit (rejected or interrupted)
+
+2. Background Ingestion:
+   - IngestionQueue runs extraction and embedding as two stages, each with
+     its own worker pool (FILE_INGEST_EXTRACT_WORKERS,
+     FILE_INGEST_EMBED_WORKERS), so a slow OCR job does not hold back
+     embedding of files that are already extracted, and vice versa
+   - Stages drive the file's processing_status in the database:
+     pending -> processing -> completed | failed
+   - progress() reports stage, queue position and timings for the
+     /api/files/<file_id>/status endpoint
+"""
+import hashlib
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+from flask import Flask, Request, jsonify, request
+from werkzeug.exceptions import RequestEntityTooLarge
+
+from backend import config
+from backend.logger import log_event
+
+PART_PREFIX = '.upload-'
+PART_SUFFIX = '.part'
+
+
+class UploadSink:
+    """
+    Writable file that one multipart upload is streamed into.
+
+    Usage:
+        sink = UploadSink(storage_path)
+        # ... werkzeug writes the part body into sink ...
+        stored_path = sink.commit(safe_filename)
+
+    Args:
+        directory: Storage directory; the part file lives next to its final
+            name so commit() is a same-filesystem rename
+        max_size: Byte limit (defaults to FILE_UPLOAD_MAX_SIZE)
+    """
+
+    def __init__(self, directory: str, max_size: int = None):
+        self.directory = directory
+        self.max_size = max_size if max_size is not None else config.FILE_UPLOAD_MAX_SIZE
+        self.part_path = os.path.join(directory, f"{PART_PREFIX}{uuid.uuid4().hex}{PART_SUFFIX}")
+        self.final_path: Optional[str] = None
+        self.size = 0
+        self._hash = hashlib.sha256()
+        self._file = open(self.part_path, 'x+b')
+
+    def write(self, data: bytes) -> int:
+        self.size += len(data)
+        if self.size > self.max_size:
+            self.discard()
+            raise RequestEntityTooLarge(f"File too large. Maximum size is {self.max_size} bytes")
+        self._hash.update(data)
+        return self._file.write(data)
+
+    def __getattr__(self, name):
+        # read/readline/seek/tell/flush for werkzeug's FileStorage
+        return getattr(self._file, name)
+
+    @property
+    def sha256(self) -> str:
+        return self._hash.hexdigest()
+
+    @property
+    def committed(self) -> bool:
+        return self.final_path is not None
+
+    def head(self, n: int = 8) -> bytes:
+        """First n bytes of the upload, e.g. to sniff a PDF header."""
+        pos = self._file.tell()
+        try:
+            self._file.seek(0)
+            return self._file.read(n)
+        finally:
+            self._file.seek(pos)
+
+    def commit(self, stored_filename: str) -> str:
+        """Make the upload durable under stored_filename and return its path."""
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        final_path = os.path.join(self.directory, stored_filename)
+        os.replace(self.part_path, final_path)
+        self.final_path = final_path
+        return final_path
+
+    def discard(self) -> None:
+        """Drop an uncommitted upload. Safe to call more than once."""
+        if self.committed:
+            return
+        try:
+            self._file.close()
+        except Exception:
+            pass
+        try:
+            os.remove(self.part_path)
+        except FileNotFoundError:
+            pass
+
+
+def cleanup_partial_uploads(directory: str, older_than_seconds: float = 3600) -> int:
+    """Remove part files left behind by interrupted uploads.
+
+    Only parts older than older_than_seconds are removed so uploads still in
+    flight in another worker process are left alone.
+
+    Returns:
+        int: Number of part files removed
+    """
+    removed = 0
+    cutoff = time.time() - older_than_seconds
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return 0
+    for name in names:
+        if not (name.startswith(PART_PREFIX) and name.endswith(PART_SUFFIX)):
+            continue
+        path = os.path.join(directory, name)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+                removed += 1
+        except OSError:
+            pass
+    if removed:
+        log_event("upload_parts_cleaned", {"directory": directory, "removed": removed})
+    return removed
+
+
+def install_upload_streaming(app: Flask, paths, sink_factory: Callable[[], UploadSink]) -> None:
+    """Stream multipart file parts posted to paths into sink_factory() sinks.
+
+    Views read the sink back as request.files[...].stream and commit() it;
+    whatever is left uncommitted when the request ends is discarded. A body
+    over the sink's max_size (or MAX_CONTENT_LENGTH) is answered with a JSON
+    413 {"error": ...}, which the upload UI shows.
+    """
+    upload_paths = frozenset(paths)
+
+    class UploadRequest(app.request_class):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.upload_sinks: List[UploadSink] = []
+
+        def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+            if self.path not in upload_paths:
+                return super()._get_file_stream(total_content_length, content_type, filename, content_length)
+            sink = sink_factory()
+            self.upload_sinks.append(sink)
+            return sink
+
+    app.request_class = UploadRequest
+
+    @app.teardown_request
+    def _discard_uncommitted_uploads(exc):
+        for sink in getattr(request, 'upload_sinks', ()):
+            sink.discard()
+
+    @app.errorhandler(RequestEntityTooLarge)
+    def _upload_too_large(e):
+        message = e.description
+        if message == RequestEntityTooLarge.description:
+            # Raised by werkzeug for MAX_CONTENT_LENGTH rather than by a sink
+            message = f"File too large. Maximum size is {app.config.get('MAX_CONTENT_LENGTH')} bytes"
+        return jsonify({"error": message}), 413
+
+
+class IngestJob:
+    """One stored upload waiting to be extracted and embedded.
+
+    stage: queued -> extracting -> embed_queued -> embedding -> completed | failed
+    (files with nothing to embed complete straight after extracting).
+    """
+    __slots__ = ('file_id', 'chat_id', 'path', 'mime_type', 'original_filename', 'size', 'sha256',
+                 'stage', 'queued_at', 'started_at', 'finished_at', 'error', 'content_text',
+                 'source_file_id')
+
+    def __init__(self, file_id: str, chat_id: str, path: str, mime_type: str,
+                 original_filename: str, size: int = 0, sha256: str = None):
+        self.file_id = file_id
+        self.chat_id = chat_id
+        self.path = path
+        self.mime_type = mime_type
+        self.original_filename = original_filename
+        self.size = size
+        self.sha256 = sha256
+        self.stage = 'queued'
+        self.queued_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.error: Optional[str] = None
+        # Extracted text handed from the extract stage to the embed stage
+        self.content_text: Optional[str] = None
+        # Earlier file with identical bytes whose text/embeddings were reused
+        self.source_file_id: Optional[str] = None
+
+
+class IngestionQueue:
+    """
+    Two-stage worker pool that extracts and embeds stored uploads.
+
+    Usage:
+        queue = IngestionQueue(extract=fm._ingest_extract, embed=fm._ingest_embed,
+                               set_status=fm.update_file_processing_status)
+        queue.submit(IngestJob(file_id, chat_id, path, mime_type, filename))
+
+    Args:
+        extract: Callable(job) -> text to embed, or None when there is
+            nothing to embed (the job completes after extraction)
+        embed: Callable(job, text) storing the text's chunk embeddings
+        set_status: Callable(file_id, status) persisting processing_status
+        extract_workers: Concurrent extraction jobs
+        embed_workers: Concurrent embedding jobs
+        history: Finished jobs kept for progress() lookups
+    """
+
+    def __init__(self, extract: Callable[[IngestJob], Optional[str]],
+                 embed: Callable[[IngestJob, str], Any],
+                 set_status: Callable[[str, str], Any],
+                 extract_workers: int = None, embed_workers: int = None,
+                 history: int = None):
+        self.extract = extract
+        self.embed = embed
+        self.set_status = set_status
+        self.workers = {
+            'extract': extract_workers if extract_workers is not None else config.FILE_INGEST_EXTRACT_WORKERS,
+            'embed': embed_workers if embed_workers is not None else config.FILE_INGEST_EMBED_WORKERS,
+        }
+        self.history = history if history is not None else config.FILE_INGEST_HISTORY
+
+        self._cond = threading.Condition()
+        self._waiting: Dict[str, Deque[IngestJob]] = {'extract': deque(), 'embed': deque()}
+        self._running: Dict[str, int] = {'extract': 0, 'embed': 0}
+        self._jobs: Dict[str, IngestJob] = {}
+        self._finished: "OrderedDict[str, IngestJob]" = OrderedDict()
+        self._threads: List[threading.Thread] = []
+        self._stopped = False
+        self._stats: Dict[str, int] = {'submitted': 0, 'completed': 0, 'failed': 0}
+
+    # ==================== WORKERS ====================
+
+    def _ensure_workers(self) -> None:
+        """Start the worker threads on first use. Must hold self._cond."""
+        if self._threads:
+            return
+        for stage, count in self.workers.items():
+            for i in range(max(count, 1)):
+                t = threading.Thread(target=self._worker, args=(stage,),
+                                     name=f"ingest-{stage}-{i}", daemon=True)
+                self._threads.append(t)
+                t.start()
+
+    def _worker(self, stage: str) -> None:
+        while True:
+            with self._cond:
+                while not self._waiting[stage] and not self._stopped:
+                    self._cond.wait()
+                if self._stopped:
+                    return
+                job = self._waiting[stage].popleft()
+                self._running[stage] += 1
+            try:
+                if stage == 'extract':
+                    self._run_extract(job)
+                else:
+                    self._run_embed(job)
+            except Exception as e:
+                self._finish(job, error=e)
+            finally:
+                with self._cond:
+                    self._running[stage] -= 1
+
+    def _run_extract(self, job: IngestJob) -> None:
+        self._set_stage(job, 'extracting')
+        job.started_at = time.time()
+        self.set_status(job.file_id, 'processing')
+        text = self.extract(job)
+        if not text:
+            self._finish(job)
+            return
+        job.content_text = text
+        with self._cond:
+            job.stage = 'embed_queued'
+            self._waiting['embed'].append(job)
+            self._cond.notify_all()
+
+    def _run_embed(self, job: IngestJob) -> None:
+        self._set_stage(job, 'embedding')
+        try:
+            self.embed(job, job.content_text)
+        finally:
+            job.content_text = None
+        self._finish(job)
+
+    def _set_stage(self, job: IngestJob, stage: str) -> None:
+        with self._cond:
+            job.stage = stage
+
+    def _finish(self, job: IngestJob, error: Exception = None) -> None:
+        job.finished_at = time.time()
+        job.content_text = None
+        status = 'failed' if error is not None else 'completed'
+        if error is not None:
+            job.error = str(error)
+            log_event("file_ingest_error", {"file_id": job.file_id, "stage": job.stage, "error": job.error})
+        try:
+            self.set_status(job.file_id, status)
+        except Exception as e:
+            log_event("file_ingest_status_error", {"file_id": job.file_id, "error": str(e)})
+        with self._cond:
+            job.stage = status
+            self._stats[status] += 1
+            self._jobs.pop(job.file_id, None)
+            self._finished[job.file_id] = job
+            while len(self._finished) > self.history:
+                self._finished.popitem(last=False)
+        log_event("file_ingest_done", {
+            "file_id": job.file_id,
+            "status": status,
+            "bytes": job.size,
+            "wait_ms": round(((job.started_at or job.finished_at) - job.queued_at) * 1000, 1),
+            "duration_ms": round((job.finished_at - (job.started_at or job.finished_at)) * 1000, 1),
+        })
+
+    # ==================== QUEUE ====================
+
+    def submit(self, job: IngestJob) -> int:
+        """
+        Queue a stored upload for extraction.
+
+        Returns:
+            int: 0 if an extraction worker is free to start it now, else its
+            1-based position in the extraction queue
+        """
+        with self._cond:
+            if self._stopped:
+                raise RuntimeError("Ingestion queue is shut down")
+            self._finished.pop(job.file_id, None)
+            self._jobs[job.file_id] = job
+            self._waiting['extract'].append(job)
+            self._stats['submitted'] += 1
+            self._ensure_workers()
+            ahead = len(self._waiting['extract']) + self._running['extract']
+            self._cond.notify_all()
+        return max(ahead - self.workers['extract'], 0)
+
+    def progress(self, file_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Progress of a queued, running or recently finished job.
+
+        Returns:
+            Dict with stage, queue_position (1-based while waiting for a
+            stage, else None), bytes, sha256, reused_from (file whose text
+            and embeddings were reused, if any), wait/elapsed seconds and
+            error; None if the file is unknown to this queue
+        """
+        with self._cond:
+            job = self._jobs.get(file_id) or self._finished.get(file_id)
+            if job is None:
+                return None
+            position = None
+            if job.stage in ('queued', 'embed_queued'):
+                waiting = self._waiting['extract' if job.stage == 'queued' else 'embed']
+                position = next((i + 1 for i, j in enumerate(waiting) if j is job), None)
+            now = time.time()
+            return {
+                'stage': job.stage,
+                'queue_position': position,
+                'bytes': job.size,
+                'sha256': job.sha256,
+                'reused_from': job.source_file_id,
+                'wait_seconds': round((job.started_at or now) - job.queued_at, 3),
+                'elapsed_seconds': round((job.finished_at or now) - job.queued_at, 3),
+                'error': job.error,
+            }
+
+    def shutdown(self, timeout: float = 2.0) -> None:
+        """Stop the workers once their current job ends; queued jobs are dropped."""
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+            threads = list(self._threads)
+        for t in threads:
+            t.join(timeout=timeout)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get queue statistics for monitoring.
+
+        Returns:
+            Dictionary with per-stage worker counts, running and queued jobs
+            and lifetime counters
+        """
+        with self._cond:
+            stats = dict(self._stats)
+            stats.update({
+                'workers': dict(self.workers),
+                'running': dict(self._running),
+                'queued': {stage: len(q) for stage, q in self._waiting.items()},
+            })
+        return stats
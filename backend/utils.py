@@ -7,7 +7,8 @@ import datetime
 from urllib.parse import urlparse
 from backend import config
 from backend.logger import log_tool_call, log_llm_call, log_event
-from backend.token_counter import count_tokens
+from backend.token_counter import count_tokens_batch
+from backend.http_clients import get_async_client
 
 def get_current_time():
     """Returns the current local date and time as a formatted string."""
@@ -50,7 +51,6 @@ USER_AGENTS = [
     'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/92.0.4515.107 Safari/537.36'
 ]
 
-import httpx
 import asyncio
 import re
 from urllib.parse import urljoin
@@ -86,55 +86,57 @@ async def async_chat_completion(url, payload, chat_id=None):
     base_url = url.rstrip("/")
     endpoint = f"{base_url}/v1/chat/completions"
         
-    async with httpx.AsyncClient(timeout=config.TIMEOUT_LLM_ASYNC) as client:
-        try:
-            resp = await client.post(endpoint, json=payload)
-            resp.raise_for_status()
-            data = resp.json()
-            
-            content = ""
-            reasoning = ""
-            if "choices" in data and len(data["choices"]) > 0:
-                msg = data["choices"][0]["message"]
-                content = msg.get("content", "")
-                reasoning = msg.get("reasoning_content", "")
-                
-            # docs/llama_cpp_integration.md compliance:
-            # For structured output (json_schema or json_object), treat 'content' as the sole source of truth.
-            # reasoning_content is strictly for internal thinking.
+    client = get_async_client()
+    try:
+        resp = await client.post(endpoint, json=payload, timeout=config.TIMEOUT_LLM_ASYNC)
+        resp.raise_for_status()
+        data = resp.json()
+        
+        content = ""
+        reasoning = ""
+        if "choices" in data and len(data["choices"]) > 0:
+            msg = data["choices"][0]["message"]
+            content = msg.get("content", "")
+            reasoning = msg.get("reasoning_content", "")
             
-            is_json_requested = "response_format" in payload
-            final_output = ""
+        # docs/llama_cpp_integration.md compliance:
+        # For structured output (json_schema or json_object), treat 'content' as the sole source of truth.
+        # reasoning_content is strictly for internal thinking.
+        
+        is_json_requested = "response_format" in payload
+        final_output = ""
+        
+        if is_json_requested:
+            # docs/llama_cpp_integration.md: Treat 'content' as the ONLY source of truth for JSON.
+            final_output = content
+        else:
+            # Standard chat: Preserving reasoning in history via <think> tags, 
+            # but functional logic in research.py will ignore it.
+            if reasoning:
+                final_output += f"<think>\n{reasoning}\n</think>\n"
+            if content:
+                final_output += content
             
-            if is_json_requested:
-                # docs/llama_cpp_integration.md: Treat 'content' as the ONLY source of truth for JSON.
-                final_output = content
-            else:
-                # Standard chat: Preserving reasoning in history via <think> tags, 
-                # but functional logic in research.py will ignore it.
-                if reasoning:
-                    final_output += f"<think>\n{reasoning}\n</think>\n"
-                if content:
-                    final_output += content
-                
-            log_llm_call(payload, final_output, model, chat_id=chat_id, duration_s=time.time()-start_time, call_type="async_blocking")
-            return final_output
-        except Exception as e:
-            log_llm_call(payload, f"Error: {str(e)}", model, chat_id=chat_id, duration_s=time.time()-start_time, call_type="async_blocking_error")
-            return ""
+        log_llm_call(payload, final_output, model, chat_id=chat_id, duration_s=time.time()-start_time, call_type="async_blocking")
+        return final_output
+    except Exception as e:
+        log_llm_call(payload, f"Error: {str(e)}", model, chat_id=chat_id, duration_s=time.time()-start_time, call_type="async_blocking_error")
+        return ""
 
 def estimate_tokens(msgs):
     """Estimate token count using the actual tokenizer."""
-    total = 0
+    texts = []
     for m in msgs:
         content = m.get('content', '')
         if isinstance(content, str) and content.strip():
-            total += count_tokens(content)
+            texts.append(content)
         elif isinstance(content, list):
             for part in content:
                 if isinstance(part, dict) and part.get('type') == 'text' and part.get('text', '').strip():
-                    total += count_tokens(part.get('text', ''))
-        total += 4  # overhead per message (role, formatting tokens)
+                    texts.append(part.get('text', ''))
+    # History is re-estimated every turn; earlier messages come from the cache
+    total = sum(count_tokens_batch(texts)) if texts else 0
+    total += 4 * len(msgs)  # overhead per message (role, formatting tokens)
     return total
 
 def create_chunk(model, content=None, reasoning=None, finish_reason=None, **kwargs):
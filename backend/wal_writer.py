@@ -0,0 +1,351 @@
+"""
+Group-commit WAL writer for streaming chat responses.
+
+ResponseCache used to open the chat's WAL file, write one JSON line and
+close it again for every streamed token. With many concurrent chats at high
+token rates that is three syscalls per token. This module keeps one open
+file handle per active stream and commits buffered lines in groups.
+
+1. Group Commit:
+   - append() buffers the encoded line for its stream
+   - A stream is written with a single write() once it buffers
+     WAL_FLUSH_BYTES, or once its oldest buffered line is
+     WAL_FLUSH_INTERVAL_MS old (a background flusher thread handles this)
+   - Callers may force an immediate commit (e.g. [[DONE]]/[[ERROR]] markers)
+
+2. Fsync Policy (WAL_FSYNC_POLICY):
+   - "none":     rely on the OS page cache (survives process crashes)
+   - "interval": fsync a stream at most every WAL_FSYNC_INTERVAL_SECONDS
+   - "always":   fsync after every group commit
+
+3. Handle Lifecycle:
+   - Handles are opened lazily on first append and closed by close(),
+     discard(), or after WAL_IDLE_CLOSE_SECONDS without appends
+   - Closing an idle stream also drops it from the registry, so the
+     registry only holds streams that are still active
+
+4. Crash Safety:
+   - Lines are only ever written whole, in order, so a crash can at most
+     leave one truncated line at the end of the file
+   - repair_tail() trims such a line so recovery replays only complete
+     entries and later appends start on a fresh line
+
+Thread Safety:
+- self._lock protects the stream registry
+- Each stream has its own lock; writes to different chats never contend
+"""
+import atexit
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from backend import config
+from backend.logger import log_event
+
+
+class _WALStream:
+    """Buffered state for one WAL file."""
+
+    __slots__ = ('path', 'file', 'pending', 'pending_bytes', 'first_pending_at',
+                 'last_append_at', 'last_fsync_at', 'lock', 'retired')
+
+    def __init__(self, path: str):
+        self.path = path
+        self.file = None
+        self.pending: List[bytes] = []
+        self.pending_bytes = 0
+        self.first_pending_at: Optional[float] = None
+        self.last_append_at = time.time()
+        self.last_fsync_at = time.time()
+        self.lock = threading.Lock()
+        # Set (under lock) once the stream has left the registry; appenders
+        # that raced with the removal retry on a fresh stream
+        self.retired = False
+
+
+class WALWriter:
+    """
+    Per-stream buffered, group-committing writer for JSON-lines WAL files.
+
+    Usage:
+        writer = WALWriter()
+        writer.append("chat-123", "/data/cache/chat-123.wal", json.dumps(entry))
+        writer.flush("chat-123")   # force pending lines to disk
+        writer.discard("chat-123") # drop handle (file is deleted by caller)
+
+    Args:
+        flush_interval_ms: Max age of a buffered line before it is written
+        flush_bytes: Buffered bytes per stream that trigger an immediate write
+        fsync_policy: "none", "interval" or "always"
+        fsync_interval_seconds: Minimum spacing of fsyncs for "interval"
+        idle_close_seconds: Close handles of streams idle this long
+    """
+
+    FSYNC_POLICIES = ("none", "interval", "always")
+
+    def __init__(self,
+                 flush_interval_ms: float = None,
+                 flush_bytes: int = None,
+                 fsync_policy: str = None,
+                 fsync_interval_seconds: float = None,
+                 idle_close_seconds: float = None):
+        self.flush_interval = (flush_interval_ms if flush_interval_ms is not None
+                               else config.WAL_FLUSH_INTERVAL_MS) / 1000.0
+        self.flush_bytes = flush_bytes if flush_bytes is not None else config.WAL_FLUSH_BYTES
+        self.fsync_policy = fsync_policy or config.WAL_FSYNC_POLICY
+        if self.fsync_policy not in self.FSYNC_POLICIES:
+            raise ValueError(f"Unknown WAL fsync policy: {self.fsync_policy}")
+        self.fsync_interval = (fsync_interval_seconds if fsync_interval_seconds is not None
+                               else config.WAL_FSYNC_INTERVAL_SECONDS)
+        self.idle_close = (idle_close_seconds if idle_close_seconds is not None
+                           else config.WAL_IDLE_CLOSE_SECONDS)
+
+        self._streams: Dict[str, _WALStream] = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = False
+        self._flusher: Optional[threading.Thread] = None
+
+        self._stats: Dict[str, int] = {
+            'appends': 0,
+            'commits': 0,
+            'bytes_written': 0,
+            'fsyncs': 0,
+            'write_errors': 0,
+            'handles_opened': 0,
+            'handles_closed': 0,
+        }
+        self._stats_lock = threading.Lock()
+
+    # ==================== APPEND / COMMIT ====================
+
+    def append(self, stream_id: str, path: str, line: str, flush: bool = False) -> None:
+        """
+        Buffer one WAL line for a stream.
+
+        Args:
+            stream_id: Stream key (the chat_id)
+            path: WAL file path for the stream
+            line: Encoded entry, without trailing newline
+            flush: Commit this stream's buffer immediately
+        """
+        data = (line + "\n").encode("utf-8")
+        while True:
+            with self._lock:
+                stream = self._streams.get(stream_id)
+                if stream is None:
+                    stream = self._streams[stream_id] = _WALStream(path)
+            now = time.time()
+            with stream.lock:
+                if stream.retired:
+                    continue
+                stream.pending.append(data)
+                stream.pending_bytes += len(data)
+                stream.last_append_at = now
+                if stream.first_pending_at is None:
+                    stream.first_pending_at = now
+                if flush or stream.pending_bytes >= self.flush_bytes or self.flush_interval <= 0:
+                    self._commit(stream)
+            break
+        with self._stats_lock:
+            self._stats['appends'] += 1
+        self._ensure_flusher()
+
+    def _commit(self, stream: _WALStream) -> None:
+        """
+        Write all buffered lines of a stream in one write() call.
+
+        Must be called with stream.lock held.
+        """
+        if not stream.pending:
+            return
+        payload = b"".join(stream.pending)
+        stream.pending.clear()
+        stream.pending_bytes = 0
+        stream.first_pending_at = None
+        fsynced = False
+        try:
+            if stream.file is None:
+                stream.file = open(stream.path, "ab", buffering=0)
+                with self._stats_lock:
+                    self._stats['handles_opened'] += 1
+            stream.file.write(payload)
+            now = time.time()
+            if self.fsync_policy == "always" or (
+                    self.fsync_policy == "interval" and now - stream.last_fsync_at >= self.fsync_interval):
+                os.fsync(stream.file.fileno())
+                stream.last_fsync_at = now
+                fsynced = True
+        except Exception as e:
+            log_event("wal_write_error", {"path": stream.path, "error": str(e)})
+            with self._stats_lock:
+                self._stats['write_errors'] += 1
+            self._close_file(stream)
+            return
+        with self._stats_lock:
+            self._stats['commits'] += 1
+            self._stats['bytes_written'] += len(payload)
+            if fsynced:
+                self._stats['fsyncs'] += 1
+
+    def _close_file(self, stream: _WALStream) -> None:
+        """Close a stream's handle. Must be called with stream.lock held."""
+        if stream.file is None:
+            return
+        try:
+            if self.fsync_policy != "none":
+                os.fsync(stream.file.fileno())
+            stream.file.close()
+        except Exception as e:
+            log_event("wal_close_error", {"path": stream.path, "error": str(e)})
+        stream.file = None
+        with self._stats_lock:
+            self._stats['handles_closed'] += 1
+
+    def flush(self, stream_id: str) -> None:
+        """Commit any buffered lines for one stream."""
+        with self._lock:
+            stream = self._streams.get(stream_id)
+        if stream is None:
+            return
+        with stream.lock:
+            self._commit(stream)
+
+    def flush_all(self) -> None:
+        """Commit buffered lines for every stream."""
+        with self._lock:
+            streams = list(self._streams.values())
+        for stream in streams:
+            with stream.lock:
+                self._commit(stream)
+
+    def close(self, stream_id: str) -> None:
+        """Commit pending lines and close the stream's file handle."""
+        with self._lock:
+            stream = self._streams.pop(stream_id, None)
+        if stream is None:
+            return
+        with stream.lock:
+            stream.retired = True
+            self._commit(stream)
+            self._close_file(stream)
+
+    def discard(self, stream_id: str) -> None:
+        """Drop pending lines and close the handle (the WAL is being deleted or truncated)."""
+        with self._lock:
+            stream = self._streams.pop(stream_id, None)
+        if stream is None:
+            return
+        with stream.lock:
+            stream.retired = True
+            stream.pending.clear()
+            stream.pending_bytes = 0
+            stream.first_pending_at = None
+            self._close_file(stream)
+
+    # ==================== BACKGROUND FLUSHER ====================
+
+    def _ensure_flusher(self) -> None:
+        if self._flusher is not None or self._stopped:
+            return
+        with self._lock:
+            if self._flusher is not None:
+                return
+            self._flusher = threading.Thread(target=self._flush_loop, name="wal-flusher", daemon=True)
+            self._flusher.start()
+
+    def _flush_loop(self) -> None:
+        """Commit streams whose oldest buffered line is due; close and drop idle streams."""
+        tick = max(self.flush_interval / 2.0, 0.005)
+        while not self._stopped:
+            self._wakeup.wait(timeout=tick)
+            self._wakeup.clear()
+            now = time.time()
+            with self._lock:
+                streams = list(self._streams.items())
+            for stream_id, stream in streams:
+                with stream.lock:
+                    if stream.first_pending_at is not None and now - stream.first_pending_at >= self.flush_interval:
+                        self._commit(stream)
+                    idle = not stream.pending and now - stream.last_append_at >= self.idle_close
+                    if idle and not stream.retired:
+                        self._close_file(stream)
+                        self._retire(stream_id, stream)
+
+    def _retire(self, stream_id: str, stream: _WALStream) -> None:
+        """Remove an idle stream from the registry. Must be called with stream.lock held."""
+        stream.retired = True
+        with self._lock:
+            if self._streams.get(stream_id) is stream:
+                del self._streams[stream_id]
+
+    def shutdown(self) -> None:
+        """Flush everything, close all handles and stop the flusher thread."""
+        self._stopped = True
+        self._wakeup.set()
+        with self._lock:
+            stream_ids = list(self._streams.keys())
+        for stream_id in stream_ids:
+            self.close(stream_id)
+        if self._flusher is not None:
+            self._flusher.join(timeout=1.0)
+
+    # ==================== RECOVERY SUPPORT ====================
+
+    @staticmethod
+    def repair_tail(path: str) -> int:
+        """
+        Trim a trailing partial line left behind by a crash mid-write.
+
+        Args:
+            path: WAL file path
+
+        Returns:
+            int: Number of bytes removed (0 if the file ended cleanly)
+        """
+        try:
+            with open(path, "rb+") as f:
+                f.seek(0, os.SEEK_END)
+                size = f.tell()
+                if size == 0:
+                    return 0
+                # Scan backwards in blocks for the last newline
+                block = 64 * 1024
+                pos = size
+                while pos > 0:
+                    start = max(0, pos - block)
+                    f.seek(start)
+                    chunk = f.read(pos - start)
+                    idx = chunk.rfind(b"\n")
+                    if idx != -1:
+                        keep = start + idx + 1
+                        break
+                    pos = start
+                else:
+                    keep = 0
+                if keep < size:
+                    f.truncate(keep)
+                return size - keep
+        except FileNotFoundError:
+            return 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get writer statistics for monitoring.
+
+        Returns:
+            Dictionary with append/commit counters and open stream counts
+        """
+        with self._stats_lock:
+            stats = dict(self._stats)
+        with self._lock:
+            stats['streams'] = len(self._streams)
+            stats['open_handles'] = sum(1 for s in self._streams.values() if s.file is not None)
+        stats['lines_per_commit'] = (stats['appends'] / stats['commits']) if stats['commits'] else 0.0
+        stats['fsync_policy'] = self.fsync_policy
+        return stats
+
+
+wal_writer = WALWriter()
+atexit.register(wal_writer.shutdown)
@@ -0,0 +1,314 @@
+"""
+Long-lived Chromium with a pool of reusable browser contexts.
+
+Launching Chromium costs far more than loading most pages, so the server keeps
+one browser running and hands out pages from a small pool of contexts:
+
+- At most ``max_concurrent`` pages are open at once; further visits wait.
+- Contexts are reused, but cookies and permissions are cleared between visits
+  and every origin the visit navigated to has its storage (localStorage,
+  IndexedDB, caches, service workers) cleared, so one task never sees
+  another's state. A context is closed after ``context_max_pages`` visits,
+  after any visit that failed, or when clearing fails.
+- The browser is recycled after ``browser_max_pages`` visits or when the
+  browser process tree exceeds ``memory_limit_mb``: new visits wait while the
+  visits in flight finish, then the browser is closed and relaunched. The
+  memory check scans /proc, so it runs at most every ``memory_check_every``
+  releases or ``memory_check_seconds``, whichever comes first.
+- A crashed or disconnected browser is relaunched on the next visit.
+
+``wait_for_settle`` replaces fixed post-load sleeps with network-idle and
+DOM-stability detection; both share one deadline equal to the old sleep.
+"""
+
+import asyncio
+import logging
+import os
+import random
+import time
+from contextlib import asynccontextmanager
+from urllib.parse import urlsplit
+
+from playwright.async_api import async_playwright, Error as PlaywrightError
+
+logger = logging.getLogger("playwright_mcp_server")
+
+LAUNCH_ARGS = ['--no-sandbox', '--disable-setuid-sandbox']
+VIEWPORT = {'width': 1920, 'height': 1080}
+
+# Resolves once no DOM mutation has been seen for quietMs, or after maxMs
+_DOM_STABLE_JS = """
+([quietMs, maxMs]) => new Promise((resolve) => {
+    const start = performance.now();
+    let last = performance.now();
+    const observer = new MutationObserver(() => { last = performance.now(); });
+    observer.observe(document.documentElement || document, {
+        childList: true, subtree: true, attributes: true, characterData: true
+    });
+    const timer = setInterval(() => {
+        const now = performance.now();
+        if (now - last >= quietMs || now - start >= maxMs) {
+            clearInterval(timer);
+            observer.disconnect();
+            resolve(now - start);
+        }
+    }, 50);
+})
+"""
+
+# (network idle timeout ms, DOM quiet period ms, max settle ms) per detail level
+SETTLE_PROFILES = {
+    "basic": None,
+    "standard": (2000, 400, 2000),
+    "deep": (5000, 800, 5000),
+}
+
+
+async def wait_for_settle(page, detail_level="standard"):
+    """Wait until the page stops loading and mutating, capped per detail level.
+
+    Both phases (network idle, then DOM quiet) share one deadline of max
+    settle ms, so the total wait never exceeds the old fixed sleep.
+
+    Returns the milliseconds spent waiting for DOM stability (0 for basic,
+    or when network idle used up the whole budget).
+    """
+    profile = SETTLE_PROFILES.get(detail_level, SETTLE_PROFILES["standard"])
+    if not profile:
+        return 0
+    idle_ms, quiet_ms, max_ms = profile
+    deadline = time.monotonic() + max_ms / 1000
+    try:
+        await page.wait_for_load_state("networkidle", timeout=min(idle_ms, max_ms))
+    except PlaywrightError:
+        # Long-polling or streaming pages never go idle; fall through to the DOM check
+        pass
+    remaining_ms = (deadline - time.monotonic()) * 1000
+    if remaining_ms <= 0:
+        return 0
+    try:
+        return await page.evaluate(_DOM_STABLE_JS, [quiet_ms, remaining_ms])
+    except PlaywrightError:
+        return 0
+
+
+def _process_tree_rss_mb(root_pid):
+    """Resident memory of root_pid's descendants in MB (Linux /proc; 0 elsewhere)."""
+    try:
+        children = {}
+        rss_pages = {}
+        for entry in os.listdir("/proc"):
+            if not entry.isdigit():
+                continue
+            try:
+                with open(f"/proc/{entry}/stat", "rb") as f:
+                    # Fields after the parenthesised command name: state ppid ... rss is field 24
+                    fields = f.read().rsplit(b")", 1)[1].split()
+            except OSError:
+                continue
+            pid = int(entry)
+            children.setdefault(int(fields[1]), []).append(pid)
+            rss_pages[pid] = int(fields[21])
+        total, stack = 0, list(children.get(root_pid, []))
+        while stack:
+            pid = stack.pop()
+            total += rss_pages.get(pid, 0)
+            stack.extend(children.get(pid, []))
+        return total * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+def _record_origin(origins, url):
+    """Add url's origin to origins (http/https only; about:blank etc. hold no storage)."""
+    parts = urlsplit(url)
+    if parts.scheme in ("http", "https") and parts.netloc:
+        origins.add(f"{parts.scheme}://{parts.netloc}")
+
+
+class _PooledContext:
+    __slots__ = ("context", "pages")
+
+    def __init__(self, context):
+        self.context = context
+        self.pages = 0
+
+
+class BrowserPool:
+    """One Chromium instance and a bounded pool of reusable contexts."""
+
+    def __init__(self, max_concurrent=4, context_max_pages=50, browser_max_pages=500,
+                 memory_limit_mb=0, user_agents=None, launch_args=None,
+                 memory_check_every=20, memory_check_seconds=10.0):
+        self.max_concurrent = max_concurrent
+        self.context_max_pages = context_max_pages
+        self.browser_max_pages = browser_max_pages
+        self.memory_limit_mb = memory_limit_mb
+        self.memory_check_every = memory_check_every
+        self.memory_check_seconds = memory_check_seconds
+        self.user_agents = user_agents or [None]
+        self.launch_args = launch_args or LAUNCH_ARGS
+
+        self._playwright = None
+        self._browser = None
+        self._idle = []
+        self._in_flight = 0
+        self._browser_pages = 0
+        self._recycling = False
+        self._releases_since_memory_check = 0
+        self._last_memory_check = float("-inf")
+        self._slots = asyncio.Semaphore(max_concurrent)
+        self._cond = asyncio.Condition()
+        self._stats = {"launches": 0, "recycles": 0, "contexts_created": 0,
+                       "contexts_closed": 0, "pages": 0, "peak_in_flight": 0,
+                       "storage_clears": 0, "memory_checks": 0}
+
+    @asynccontextmanager
+    async def page(self):
+        """Yield a fresh page in a pooled context; the page is closed on exit."""
+        async with self._slots:
+            entry = await self._acquire_context()
+            page = None
+            healthy = False
+            origins = set()
+            try:
+                page = await entry.context.new_page()
+                page.on("framenavigated", lambda frame: _record_origin(origins, frame.url))
+                yield page
+                healthy = True
+            finally:
+                if page is not None:
+                    if healthy:
+                        _record_origin(origins, page.url)
+                        healthy = await self._clear_origin_storage(page, origins)
+                    try:
+                        await page.close()
+                    except PlaywrightError:
+                        healthy = False
+                await self._release_context(entry, healthy)
+
+    async def _clear_origin_storage(self, page, origins):
+        """Clear all storage of the visited origins; False if the context must not be reused."""
+        if not origins:
+            return True
+        try:
+            cdp = await page.context.new_cdp_session(page)
+            try:
+                for origin in origins:
+                    await cdp.send("Storage.clearDataForOrigin", {"origin": origin, "storageTypes": "all"})
+            finally:
+                await cdp.detach()
+        except PlaywrightError as e:
+            logger.warning(f"Could not clear storage for {len(origins)} origins; dropping context: {e}")
+            return False
+        self._stats["storage_clears"] += len(origins)
+        return True
+
+    async def _acquire_context(self):
+        async with self._cond:
+            # A pending recycle drains in-flight visits before anything new starts
+            await self._cond.wait_for(lambda: not self._recycling or self._in_flight == 0)
+            if self._recycling:
+                await self._close_browser()
+                self._recycling = False
+                self._stats["recycles"] += 1
+            if self._browser is None or not self._browser.is_connected():
+                await self._launch()
+            entry = self._idle.pop() if self._idle else await self._new_context()
+            self._in_flight += 1
+            self._stats["peak_in_flight"] = max(self._stats["peak_in_flight"], self._in_flight)
+            return entry
+
+    async def _release_context(self, entry, healthy):
+        entry.pages += 1
+        keep = healthy and entry.pages < self.context_max_pages
+        if keep:
+            try:
+                # Isolation between visits that share a context
+                await entry.context.clear_cookies()
+                await entry.context.clear_permissions()
+            except PlaywrightError:
+                keep = False
+        if not keep:
+            await self._close_context(entry)
+
+        async with self._cond:
+            self._in_flight -= 1
+            self._browser_pages += 1
+            self._stats["pages"] += 1
+            if keep and self._browser is not None and self._browser.is_connected():
+                self._idle.append(entry)
+            elif keep:
+                await self._close_context(entry)
+            if not self._recycling and self._needs_recycle():
+                self._recycling = True
+            self._cond.notify_all()
+
+    def _needs_recycle(self):
+        if self.browser_max_pages and self._browser_pages >= self.browser_max_pages:
+            logger.info(f"Recycling browser after {self._browser_pages} pages")
+            return True
+        if self.memory_limit_mb and self._memory_check_due():
+            rss = _process_tree_rss_mb(os.getpid())
+            if rss > self.memory_limit_mb:
+                logger.info(f"Recycling browser at {rss:.0f} MB (limit {self.memory_limit_mb} MB)")
+                return True
+        return False
+
+    def _memory_check_due(self):
+        """Throttle the /proc scan to every memory_check_every releases or memory_check_seconds."""
+        self._releases_since_memory_check += 1
+        now = time.monotonic()
+        if (self._releases_since_memory_check < self.memory_check_every
+                and now - self._last_memory_check < self.memory_check_seconds):
+            return False
+        self._releases_since_memory_check = 0
+        self._last_memory_check = now
+        self._stats["memory_checks"] += 1
+        return True
+
+    async def _launch(self):
+        await self._close_browser()
+        if self._playwright is None:
+            self._playwright = await async_playwright().start()
+        self._browser = await self._playwright.chromium.launch(headless=True, args=self.launch_args)
+        self._browser_pages = 0
+        self._stats["launches"] += 1
+
+    async def _new_context(self):
+        context = await self._browser.new_context(
+            user_agent=random.choice(self.user_agents),
+            viewport=VIEWPORT
+        )
+        self._stats["contexts_created"] += 1
+        return _PooledContext(context)
+
+    async def _close_context(self, entry):
+        try:
+            await entry.context.close()
+        except PlaywrightError:
+            pass
+        self._stats["contexts_closed"] += 1
+
+    async def _close_browser(self):
+        for entry in self._idle:
+            await self._close_context(entry)
+        self._idle = []
+        if self._browser is not None:
+            try:
+                await self._browser.close()
+            except PlaywrightError:
+                pass
+            self._browser = None
+
+    async def close(self):
+        """Close the browser and the Playwright driver."""
+        async with self._cond:
+            await self._close_browser()
+            if self._playwright is not None:
+                await self._playwright.stop()
+                self._playwright = None
+
+    def get_stats(self):
+        return dict(self._stats, in_flight=self._in_flight, idle_contexts=len(self._idle),
+                    browser_pages=self._browser_pages)
@@ -3,18 +3,19 @@ import os
 import json
 import logging
 import base64
-import random
 import re
 import urllib.parse
 from urllib.parse import urlparse, urljoin
 import socket
 import ipaddress
 import io
+import time
 
 import httpx
 from selectolax.lexbor import LexborHTMLParser
 import pypdf
-from playwright.async_api import async_playwright
+
+from playwright_mcp.browser_pool import BrowserPool, wait_for_settle
 
 from mcp.server.fastmcp import FastMCP
 import uvicorn
@@ -40,6 +41,18 @@ TIMEOUT_IMAGE_FETCH = 10.0
 URL_FETCH_RETRIES = 3
 RESEARCH_IMAGE_FETCH_RETRIES = 3
 
+# Browser pool: one long-lived Chromium, reusable contexts, bounded concurrency
+BROWSER_MAX_CONCURRENT_PAGES = int(os.getenv("BROWSER_MAX_CONCURRENT_PAGES", 4))
+BROWSER_CONTEXT_MAX_PAGES = int(os.getenv("BROWSER_CONTEXT_MAX_PAGES", 50))   # Recycle a context after N visits
+BROWSER_MAX_PAGES = int(os.getenv("BROWSER_MAX_PAGES", 500))                  # Relaunch the browser after N visits
+BROWSER_MEMORY_LIMIT_MB = int(os.getenv("BROWSER_MEMORY_LIMIT_MB", 1536))     # Relaunch above this RSS (0 = off)
+BROWSER_MEMORY_CHECK_EVERY = int(os.getenv("BROWSER_MEMORY_CHECK_EVERY", 20))          # Scan RSS every N visits...
+BROWSER_MEMORY_CHECK_SECONDS = float(os.getenv("BROWSER_MEMORY_CHECK_SECONDS", 10))   # ...or every T seconds
+
+# Connectivity check results are reused for this long (failures are re-checked sooner)
+CONNECTIVITY_TTL_SECONDS = 60
+CONNECTIVITY_FAILURE_TTL_SECONDS = 5
+
 USER_AGENTS = [
     "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
     "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.2.1 Safari/605.1.15",
@@ -156,7 +169,10 @@ def sanitize_output(text: str) -> str:
     text = re.sub(r'(?i)eval\(|document\.cookie|window\.', '', text)
     return text
 
-async def check_internet_connectivity():
+_connectivity = {"ok": None, "checked_at": 0.0}
+_connectivity_lock = asyncio.Lock()
+
+async def _probe_internet_connectivity():
     """Ping a reliable host to check for general internet connectivity."""
     try:
         async with httpx.AsyncClient(timeout=3.0) as client:
@@ -165,27 +181,44 @@ async def check_internet_connectivity():
     except Exception:
         return False
 
+async def check_internet_connectivity():
+    """Cached connectivity check; concurrent callers share one probe."""
+    def _fresh():
+        ttl = CONNECTIVITY_TTL_SECONDS if _connectivity["ok"] else CONNECTIVITY_FAILURE_TTL_SECONDS
+        return _connectivity["ok"] is not None and time.monotonic() - _connectivity["checked_at"] < ttl
+
+    if _fresh():
+        return _connectivity["ok"]
+    async with _connectivity_lock:
+        if not _fresh():
+            _connectivity["ok"] = await _probe_internet_connectivity()
+            _connectivity["checked_at"] = time.monotonic()
+        return _connectivity["ok"]
+
 # =====================================================================
 # Playwright & Fetching Logic
 # =====================================================================
 
-async def fetch_with_playwright(url: str, max_chars: int = 40000, detail_level: str = "standard") -> str:
-    """Site visit using Playwright with level-specific strategies."""
+browser_pool = BrowserPool(
+    max_concurrent=BROWSER_MAX_CONCURRENT_PAGES,
+    context_max_pages=BROWSER_CONTEXT_MAX_PAGES,
+    browser_max_pages=BROWSER_MAX_PAGES,
+    memory_limit_mb=BROWSER_MEMORY_LIMIT_MB,
+    memory_check_every=BROWSER_MEMORY_CHECK_EVERY,
+    memory_check_seconds=BROWSER_MEMORY_CHECK_SECONDS,
+    user_agents=USER_AGENTS
+)
+
+async def fetch_with_playwright(url: str, max_chars: int = 40000, detail_level: str = "standard", pool: BrowserPool = None) -> str:
+    """Site visit using a pooled Playwright page with level-specific strategies."""
     try:
-        async with async_playwright() as p:
-            browser = await p.chromium.launch(headless=True, args=['--no-sandbox', '--disable-setuid-sandbox'])
-            page = await browser.new_page(
-                user_agent=random.choice(USER_AGENTS),
-                viewport={'width': 1920, 'height': 1080}
-            )
-
+        async with (pool or browser_pool).page() as page:
             # Navigation Strategy
             wait_until = "load" if detail_level == "basic" else "domcontentloaded"
             logger.info(f"Navigating to {url} (level: {detail_level})...")
             response = await page.goto(url, timeout=TIMEOUT_WEB_SCRAPE * 1000, wait_until=wait_until)
 
             if not response:
-                await browser.close()
                 return "Error: Playwright could not load the page."
 
             # Overlay Hiding Strategy
@@ -219,21 +252,17 @@ async def fetch_with_playwright(url: str, max_chars: int = 40000, detail_level:
                     }}
                 """)
 
-            # Settle period Strategy
-            if detail_level == "deep":
-                await asyncio.sleep(5)
-            elif detail_level == "standard":
-                await asyncio.sleep(2)
+            # Settle Strategy: network idle + DOM stability, capped at the old fixed sleeps
+            await wait_for_settle(page, detail_level)
 
             # Extract raw HTML
             html_content = await page.content()
-            await browser.close()
 
-            text = clean_html_to_markdown(html_content, url, detail_level)
-            if not text:
-                 return "Error: Playwright visited the page but could not find any valid text content."
+        text = clean_html_to_markdown(html_content, url, detail_level)
+        if not text:
+             return "Error: Playwright visited the page but could not find any valid text content."
 
-            return text[:max_chars]
+        return text[:max_chars]
     except Exception as e:
         logger.error(f"Playwright error: {str(e)}")
         return f"Error visiting page with Playwright: {str(e)}"
@@ -173,6 +173,11 @@ document.addEventListener('DOMContentLoaded', () => {
     let chatHistory = [];
     let systemPrompt = '';
 
+    // Chats open on their latest page of messages; older pages are backfilled
+    const MESSAGE_PAGE_SIZE = 50;
+    const MESSAGE_PAGE_MAX = 500;
+    let historyBackfill = null; // Promise while older pages of the open chat are loading
+
     // New State for Chat Management
     let savedChats = [];
     let currentChatId = null;
@@ -390,6 +395,7 @@ document.addEventListener('DOMContentLoaded', () => {
         resetGenerationState();
         isTemporaryChat = temporary;
         chatHistory = [];
+        historyBackfill = null;
         currentResearchPlan = null;
         messagesContainer.innerHTML = '';
         currentChatId = generateId(); // Always assign an ID for backend task routing (temporary chats are still prevented from persisting by the isTemporaryChat flag)
@@ -461,7 +467,7 @@ document.addEventListener('DOMContentLoaded', () => {
         resetGenerationState();
         pendingEditIndex = null;
         try {
-            const response = await fetch(`/api/chats/${id}`);
+            const response = await fetch(`/api/chats/${id}?limit=${MESSAGE_PAGE_SIZE}`);
             if (!response.ok) {
                 console.error('Failed to load chat details');
                 return;
@@ -473,33 +479,7 @@ document.addEventListener('DOMContentLoaded', () => {
             isTemporaryChat = false;
             if (tempChatBanner) tempChatBanner.classList.add('hidden');
             if (tempChatBtn) tempChatBtn.classList.remove('active');
-            chatHistory = (chat.messages || []).map(msg => {
-                let parsedContent = msg.content;
-                let uploadedFiles = null;
-
-                try {
-                    if (typeof msg.content === 'string' && (msg.content.startsWith('[') || msg.content.startsWith('{'))) {
-                        parsedContent = JSON.parse(msg.content);
-                    }
-                } catch (e) {}
-
-                // Extract uploadedFiles from content
-                if (typeof parsedContent === 'object' && parsedContent !== null && !Array.isArray(parsedContent)) {
-                    uploadedFiles = parsedContent.uploadedFiles || null;
-                    // If content has uploadedFiles embedded with text, extract the text part
-                    // This handles the case where content was stored as {"text": "...", "uploadedFiles": [...]}
-                    if (parsedContent.text !== undefined && parsedContent.uploadedFiles !== undefined) {
-                        parsedContent = parsedContent.text;
-                    }
-                }
-
-                // Fallback: check for uploadedFiles in original msg (for backward compatibility)
-                if (!uploadedFiles && msg.uploadedFiles) {
-                    uploadedFiles = msg.uploadedFiles;
-                }
-
-                return { ...msg, content: parsedContent, uploadedFiles };
-            });
+            chatHistory = (chat.messages || []).map(parseStoredMessage);
             currentResearchPlan = null;
             isMemoryMode = !!chat.memory_mode;
             isResearchMode = !!chat.research_mode;
@@ -628,266 +608,361 @@ document.addEventListener('DOMContentLoaded', () => {
                 }
             });
 
-            const messageGroups = getLogicalMessageGroups(chatHistory);
+            renderMessageGroups(chat);
 
-            messageGroups.forEach(group => {
-                if (group.role === 'user') {
-                    const msg = group.messages[0];
-                    let text = "";
-                    let img = null;
-                    let fileData = msg.uploadedFiles || null;
+            // Older pages load in the background; sending/editing waits for them
+            historyBackfill = chat.has_more_messages ? startHistoryBackfill(id, chat) : null;
 
-                    if (Array.isArray(msg.content)) {
-                        msg.content.forEach(part => {
-                            if (part.type === 'text') text = part.text;
-                            if (part.type === 'image_url') img = part.image_url.url;
-                        });
-                    } else {
-                        text = msg.content;
-                    }
+            if (memoryToggleSwitch) {
+                if (isMemoryMode) {
+                    memoryToggleSwitch.classList.add('active');
+                } else {
+                    memoryToggleSwitch.classList.remove('active');
+                }
+            }
 
-                    appendMessage('User', text, 'user', img, fileData, null, msg._originalIndex);
-                } else if (group.role === 'bot') {
-                    // Group Bot messages (Assistant + Tool)
-                    let combinedThoughts = "";
-                    let combinedCleaned = "";
-                    let finalPlan = null;
-                    let finalReport = null;
-                    let combinedActivityObjs = [];
-                    let combinedActivityStrs = [];
-                    let lastModel = null;
-                    let planIndex = -1;
-
-                    group.messages.forEach(msg => {
-                        if (msg.role === 'assistant') {
-                            const { thoughts, cleaned, plan, report } = parseContent(msg.content || "");
-                            if (thoughts) combinedThoughts += (combinedThoughts ? '\n' : '') + thoughts;
-                            if (cleaned) combinedCleaned += (combinedCleaned ? '\n\n' : '') + cleaned;
-                            if (plan) {
-                                finalPlan = plan;
-                                planIndex = msg._originalIndex;
-                            }
-                            if (report) finalReport = report;
-                            if (msg.model) lastModel = msg.model;
-                            // Handle tool calls in history (tool call info displayed via __assistant_tool_calls__ SSE)
-
-                            // Handle JSON Activities
-                            if (isResearchMode && thoughts && thoughts.includes('__research_activity__')) {
-                                // Extract JSON activities from thoughts
-                                let str = thoughts;
-                                let inString = false;
-                                let escape = false;
-                                let depth = 0;
-                                let start = -1;
-
-                                for (let i = 0; i < str.length; i++) {
-                                    let char = str[i];
-                                    if (escape) { escape = false; continue; }
-                                    if (char === '\\') { escape = true; continue; }
-                                    if (char === '"') { inString = !inString; continue; }
-
-                                    if (!inString) {
-                                        if (char === '{') {
-                                            if (depth === 0) start = i;
-                                            depth++;
-                                        } else if (char === '}') {
-                                            depth--;
-                                            if (depth === 0 && start !== -1) {
-                                                try {
-                                                    let jsonStr = str.substring(start, i + 1);
-                                                    let parsed = JSON.parse(jsonStr);
-                                                    if (parsed.__research_activity__) {
-                                                        combinedActivityObjs.push(parsed);
-                                                        combinedActivityStrs.push(jsonStr);
-                                                    }
-                                                } catch (e) { }
-                                                start = -1;
-                                            }
+            renderChatList();
+
+            // Auto-Resume Logic
+            if (chat.is_research_running) {
+                // If running, we resume stream.
+                // We pass 'true' to indicate resume, preventing duplication of user message.
+                // We also pass 'section_execution' as resumeState to ensure the backend 
+                // preserves the WAL history if a restart occurred.
+                sendMessage(null, null, true, 'section_execution');
+            }
+
+            if (pushState && window.location.pathname !== `/chat/${id}`) {
+                history.pushState({ chatId: id }, '', `/chat/${id}`);
+            }
+
+            // Mobile sidebar auto-close
+            if (window.innerWidth <= 768) {
+                sidebar.classList.remove('sidebar-expanded');
+                sidebar.classList.add('sidebar-collapsed');
+                toggleIconPath.setAttribute('d', 'M9 6l6 6-6 6');
+            }
+        } catch (e) {
+            console.error("Error loading chat:", e);
+        }
+    }
+
+    // Stored message row -> chatHistory entry (JSON content parsed, uploadedFiles extracted)
+    function parseStoredMessage(msg) {
+        let parsedContent = msg.content;
+        let uploadedFiles = null;
+
+        try {
+            if (typeof msg.content === 'string' && (msg.content.startsWith('[') || msg.content.startsWith('{'))) {
+                parsedContent = JSON.parse(msg.content);
+            }
+        } catch (e) {}
+
+        // Extract uploadedFiles from content
+        if (typeof parsedContent === 'object' && parsedContent !== null && !Array.isArray(parsedContent)) {
+            uploadedFiles = parsedContent.uploadedFiles || null;
+            // If content has uploadedFiles embedded with text, extract the text part
+            // This handles the case where content was stored as {"text": "...", "uploadedFiles": [...]}
+            if (parsedContent.text !== undefined && parsedContent.uploadedFiles !== undefined) {
+                parsedContent = parsedContent.text;
+            }
+        }
+
+        // Fallback: check for uploadedFiles in original msg (for backward compatibility)
+        if (!uploadedFiles && msg.uploadedFiles) {
+            uploadedFiles = msg.uploadedFiles;
+        }
+
+        return { ...msg, content: parsedContent, uploadedFiles };
+    }
+
+    // Render chatHistory into messagesContainer (which the caller has cleared)
+    function renderMessageGroups(chat) {
+        const messageGroups = getLogicalMessageGroups(chatHistory);
+
+        messageGroups.forEach(group => {
+            if (group.role === 'user') {
+                const msg = group.messages[0];
+                let text = "";
+                let img = null;
+                let fileData = msg.uploadedFiles || null;
+
+                if (Array.isArray(msg.content)) {
+                    msg.content.forEach(part => {
+                        if (part.type === 'text') text = part.text;
+                        if (part.type === 'image_url') img = part.image_url.url;
+                    });
+                } else {
+                    text = msg.content;
+                }
+
+                appendMessage('User', text, 'user', img, fileData, null, msg._originalIndex);
+            } else if (group.role === 'bot') {
+                // Group Bot messages (Assistant + Tool)
+                let combinedThoughts = "";
+                let combinedCleaned = "";
+                let finalPlan = null;
+                let finalReport = null;
+                let combinedActivityObjs = [];
+                let combinedActivityStrs = [];
+                let lastModel = null;
+                let planIndex = -1;
+
+                group.messages.forEach(msg => {
+                    if (msg.role === 'assistant') {
+                        const { thoughts, cleaned, plan, report } = parseContent(msg.content || "");
+                        if (thoughts) combinedThoughts += (combinedThoughts ? '\n' : '') + thoughts;
+                        if (cleaned) combinedCleaned += (combinedCleaned ? '\n\n' : '') + cleaned;
+                        if (plan) {
+                            finalPlan = plan;
+                            planIndex = msg._originalIndex;
+                        }
+                        if (report) finalReport = report;
+                        if (msg.model) lastModel = msg.model;
+                        // Handle tool calls in history (tool call info displayed via __assistant_tool_calls__ SSE)
+
+                        // Handle JSON Activities
+                        if (isResearchMode && thoughts && thoughts.includes('__research_activity__')) {
+                            // Extract JSON activities from thoughts
+                            let str = thoughts;
+                            let inString = false;
+                            let escape = false;
+                            let depth = 0;
+                            let start = -1;
+
+                            for (let i = 0; i < str.length; i++) {
+                                let char = str[i];
+                                if (escape) { escape = false; continue; }
+                                if (char === '\\') { escape = true; continue; }
+                                if (char === '"') { inString = !inString; continue; }
+
+                                if (!inString) {
+                                    if (char === '{') {
+                                        if (depth === 0) start = i;
+                                        depth++;
+                                    } else if (char === '}') {
+                                        depth--;
+                                        if (depth === 0 && start !== -1) {
+                                            try {
+                                                let jsonStr = str.substring(start, i + 1);
+                                                let parsed = JSON.parse(jsonStr);
+                                                if (parsed.__research_activity__) {
+                                                    combinedActivityObjs.push(parsed);
+                                                    combinedActivityStrs.push(jsonStr);
+                                                }
+                                            } catch (e) { }
+                                            start = -1;
                                         }
                                     }
                                 }
                             }
-                        } else if (msg.role === 'tool') {
-                            // Tool result is handled via __tool_result__ SSE, not in combined thoughts
                         }
-                    });
+                    } else if (msg.role === 'tool') {
+                        // Tool result is handled via __tool_result__ SSE, not in combined thoughts
+                    }
+                });
 
-                    if (combinedCleaned === "" && combinedActivityObjs.length === 0 && !combinedThoughts && !finalPlan && !finalReport) return;
+                if (combinedCleaned === "" && combinedActivityObjs.length === 0 && !combinedThoughts && !finalPlan && !finalReport) return;
 
-                    // Persistence Fix check for Plan
-                    let isApproved = false;
-                    let isSuperseded = false;
+                // Persistence Fix check for Plan
+                let isApproved = false;
+                let isSuperseded = false;
 
-                    if (finalPlan && planIndex !== -1) {
-                        for (let i = planIndex + 1; i < chatHistory.length; i++) {
-                            const m = chatHistory[i];
-                            if (m.role === 'user' && (m.content === "Plan Approved. Proceed with research." || m.content === "Proceed with research.")) {
-                                isApproved = true;
+                if (finalPlan && planIndex !== -1) {
+                    for (let i = planIndex + 1; i < chatHistory.length; i++) {
+                        const m = chatHistory[i];
+                        if (m.role === 'user' && (m.content === "Plan Approved. Proceed with research." || m.content === "Proceed with research.")) {
+                            isApproved = true;
+                            break;
+                        }
+                        if (m.role === 'assistant') {
+                            const { plan: laterPlan } = parseContent(m.content || "");
+                            if (laterPlan) {
+                                isSuperseded = true;
                                 break;
                             }
-                            if (m.role === 'assistant') {
-                                const { plan: laterPlan } = parseContent(m.content || "");
-                                if (laterPlan) {
-                                    isSuperseded = true;
-                                    break;
-                                }
-                            }
                         }
                     }
-                    const planDisabled = isApproved || isSuperseded;
+                }
+                const planDisabled = isApproved || isSuperseded;
 
-                    const row = appendMessage('Assistant', '', 'bot', null, null, lastModel, group.messages[0]._originalIndex);
-                    const contentDiv = row.querySelector('.message-content');
-                    
-                    let isJsonActivities = combinedActivityObjs.length > 0;
-                    let contentHtml = '';
-                    
-                    if (isJsonActivities) {
-                        contentHtml += `
-                            <details class="research-activity-wrapper" open>
-                                <summary class="research-activity-summary">
-                                    <svg width="18" height="18" viewBox="0 0 24 24" fill="none" stroke="currentColor" stroke-width="2.5"><circle cx="12" cy="12" r="10"></circle><polyline points="12 16 16 12 12 8"></polyline><line x1="8" y1="12" x2="16" y2="12"></line></svg>
-                                    <span class="summary-text">Research Activity (Completed)</span>
-                                </summary>
-                                <div class="research-activity-feed"></div>
-                            </details>
-                            <div class="research-status-bars"></div>
-                        `;
-                    }
+                const row = appendMessage('Assistant', '', 'bot', null, null, lastModel, group.messages[0]._originalIndex);
+                const contentDiv = row.querySelector('.message-content');
+            
+                let isJsonActivities = combinedActivityObjs.length > 0;
+                let contentHtml = '';
+            
+                if (isJsonActivities) {
+                    contentHtml += `
+                        <details class="research-activity-wrapper" open>
+                            <summary class="research-activity-summary">
+                                <svg width="18" height="18" viewBox="0 0 24 24" fill="none" stroke="currentColor" stroke-width="2.5"><circle cx="12" cy="12" r="10"></circle><polyline points="12 16 16 12 12 8"></polyline><line x1="8" y1="12" x2="16" y2="12"></line></svg>
+                                <span class="summary-text">Research Activity (Completed)</span>
+                            </summary>
+                            <div class="research-activity-feed"></div>
+                        </details>
+                        <div class="research-status-bars"></div>
+                    `;
+                }
 
-                    let plainThoughts = combinedThoughts || '';
-                    if (isJsonActivities) {
-                        combinedActivityStrs.forEach(s => {
-                            plainThoughts = plainThoughts.replace(s, '');
-                        });
-                        plainThoughts = plainThoughts.replace(/<think>|<\/think>/g, '').trim();
-
-                        if (!plainThoughts) {
-                            const planningMessages = combinedActivityObjs
-                                .filter(o => o.type === 'planning' && o.data && o.data.message)
-                                .map(o => o.data.message);
-                            if (planningMessages.length > 0) {
-                                plainThoughts = planningMessages.join('\n');
-                            }
+                let plainThoughts = combinedThoughts || '';
+                if (isJsonActivities) {
+                    combinedActivityStrs.forEach(s => {
+                        plainThoughts = plainThoughts.replace(s, '');
+                    });
+                    plainThoughts = plainThoughts.replace(/<think>|<\/think>/g, '').trim();
+
+                    if (!plainThoughts) {
+                        const planningMessages = combinedActivityObjs
+                            .filter(o => o.type === 'planning' && o.data && o.data.message)
+                            .map(o => o.data.message);
+                        if (planningMessages.length > 0) {
+                            plainThoughts = planningMessages.join('\n');
                         }
-                    } else {
-                        plainThoughts = plainThoughts.replace(/<think>|<\/think>/g, '').trim();
                     }
+                } else {
+                    plainThoughts = plainThoughts.replace(/<think>|<\/think>/g, '').trim();
+                }
 
-                    if (plainThoughts) {
-                        contentHtml += `
-                            <div class="thought-container-wrapper">
-                                <div class="thought-container">
-                                    <div class="thought-header">
-                                        <div class="thought-header-title">
-                                            <svg class="thought-main-icon" width="27" height="27" viewBox="0 0 24 24" fill="none" stroke="currentColor" stroke-width="1.8" stroke-linecap="round" stroke-linejoin="round"><circle cx="6" cy="12" r="2"/><circle cx="18" cy="6" r="2"/><circle cx="18" cy="18" r="2"/><line x1="7.9" y1="11.1" x2="16.1" y2="6.9"/><line x1="7.9" y1="12.9" x2="16.1" y2="17.1"/><circle cx="12" cy="9" r="1" fill="currentColor" stroke="none" opacity="0.4"/><circle cx="12" cy="15" r="1" fill="currentColor" stroke="none" opacity="0.4"/></svg>
-                                            <span class="thought-title-text">Thought Process</span>
-                                        </div>
-                                        <svg class="thought-chevron" width="27" height="27" viewBox="0 0 24 24" fill="none" stroke="currentColor" stroke-width="2.5"><path d="M6 9l6 6 6-6" stroke-linecap="round" stroke-linejoin="round"/></svg>
+                if (plainThoughts) {
+                    contentHtml += `
+                        <div class="thought-container-wrapper">
+                            <div class="thought-container">
+                                <div class="thought-header">
+                                    <div class="thought-header-title">
+                                        <svg class="thought-main-icon" width="27" height="27" viewBox="0 0 24 24" fill="none" stroke="currentColor" stroke-width="1.8" stroke-linecap="round" stroke-linejoin="round"><circle cx="6" cy="12" r="2"/><circle cx="18" cy="6" r="2"/><circle cx="18" cy="18" r="2"/><line x1="7.9" y1="11.1" x2="16.1" y2="6.9"/><line x1="7.9" y1="12.9" x2="16.1" y2="17.1"/><circle cx="12" cy="9" r="1" fill="currentColor" stroke="none" opacity="0.4"/><circle cx="12" cy="15" r="1" fill="currentColor" stroke="none" opacity="0.4"/></svg>
+                                        <span class="thought-title-text">Thought Process</span>
                                     </div>
-                                    <div class="thought-body"><div class="thought-body-inner"><div class="thought-body-content"></div></div></div>
+                                    <svg class="thought-chevron" width="27" height="27" viewBox="0 0 24 24" fill="none" stroke="currentColor" stroke-width="2.5"><path d="M6 9l6 6 6-6" stroke-linecap="round" stroke-linejoin="round"/></svg>
                                 </div>
-                            </div>`;
-                    }
-
-                    const isRetryVisible = combinedActivityObjs.some(obj => obj.type === 'needs_retry');
-                    if (isResearchMode && finalReport && !finalPlan) {
-                        contentHtml += `
-                            <div class="research-report-card">
-                                <div class="report-card-icon">
-                                    <svg width="24" height="24" viewBox="0 0 24 24" fill="none" stroke="currentColor" stroke-width="2">
-                                        <path d="M14 2H6a2 2 0 0 0-2 2v16a2 2 0 0 0 2 2h12a2 2 0 0 0 2-2V8z"></path>
-                                        <polyline points="14 2 14 8 20 8"></polyline>
-                                        <line x1="16" y1="13" x2="8" y2="13"></line>
-                                        <line x1="16" y1="17" x2="8" y2="17"></line>
-                                        <polyline points="10 9 9 9 8 9"></polyline>
-                                    </svg>
-                                </div>
-                                <div class="report-card-text">
-                                    <span class="report-card-title">Research Report Generated</span>
-                                    <span class="report-card-desc">The agent has finished compiling its findings.</span>
-                                </div>
-                                <button class="btn-primary view-report-btn" data-report-content="${encodeURIComponent(finalReport)}">
-                                    Open Canvas
-                                </button>
+                                <div class="thought-body"><div class="thought-body-inner"><div class="thought-body-content"></div></div></div>
                             </div>
-                        `;
-                    } else {
-                        contentHtml += `<div class="actual-content-wrapper">${formatMarkdown(combinedCleaned)}</div>`;
-                    }
-                    contentDiv.innerHTML = contentHtml;
+                        </div>`;
+                }
 
-                    if (finalPlan) {
-                        const mainWrapper = contentDiv.querySelector('.actual-content-wrapper');
-                        renderResearchPlan(finalPlan, mainWrapper, planDisabled);
-                    }
+                const isRetryVisible = combinedActivityObjs.some(obj => obj.type === 'needs_retry');
+                if (isResearchMode && finalReport && !finalPlan) {
+                    contentHtml += `
+                        <div class="research-report-card">
+                            <div class="report-card-icon">
+                                <svg width="24" height="24" viewBox="0 0 24 24" fill="none" stroke="currentColor" stroke-width="2">
+                                    <path d="M14 2H6a2 2 0 0 0-2 2v16a2 2 0 0 0 2 2h12a2 2 0 0 0 2-2V8z"></path>
+                                    <polyline points="14 2 14 8 20 8"></polyline>
+                                    <line x1="16" y1="13" x2="8" y2="13"></line>
+                                    <line x1="16" y1="17" x2="8" y2="17"></line>
+                                    <polyline points="10 9 9 9 8 9"></polyline>
+                                </svg>
+                            </div>
+                            <div class="report-card-text">
+                                <span class="report-card-title">Research Report Generated</span>
+                                <span class="report-card-desc">The agent has finished compiling its findings.</span>
+                            </div>
+                            <button class="btn-primary view-report-btn" data-report-content="${encodeURIComponent(finalReport)}">
+                                Open Canvas
+                            </button>
+                        </div>
+                    `;
+                } else {
+                    contentHtml += `<div class="actual-content-wrapper">${formatMarkdown(combinedCleaned)}</div>`;
+                }
+                contentDiv.innerHTML = contentHtml;
 
-                    if (isJsonActivities) {
-                        const feed = contentDiv.querySelector('.research-activity-feed');
-                        combinedActivityObjs.forEach(obj => renderResearchActivity(feed, obj.type, obj.data));
-                    }
+                if (finalPlan) {
+                    const mainWrapper = contentDiv.querySelector('.actual-content-wrapper');
+                    renderResearchPlan(finalPlan, mainWrapper, planDisabled);
+                }
 
-                    if (plainThoughts) {
-                        const contentBody = contentDiv.querySelector('.thought-body-content');
-                        if (contentBody) {
-                                contentBody.innerHTML = formatMarkdown(plainThoughts);
-                        }
-                    }
+                if (isJsonActivities) {
+                    const feed = contentDiv.querySelector('.research-activity-feed');
+                    combinedActivityObjs.forEach(obj => renderResearchActivity(feed, obj.type, obj.data));
+                }
 
-                    // Fallback Resume Logic (Check last message in group)
-                    const lastMsgInGroup = group.messages[group.messages.length - 1];
-                    const isLastTurnInHistory = lastMsgInGroup._originalIndex === chatHistory.length - 1;
-                    if (isResearchMode && isLastTurnInHistory && !finalReport && !finalPlan && !isRetryVisible && !chat.is_research_running) {
-                        const fallbackResume = document.createElement('div');
-                        fallbackResume.innerHTML = `
-                            <div style="margin-top: 1rem; padding: 1rem; border: 1px solid rgba(255,100,100,0.3); border-radius: 8px; background: rgba(255,50,50,0.05);">
-                                <div style="display: flex; align-items: center; gap: 0.5rem; color: #ff6b6b; font-weight: 600; margin-bottom: 0.75rem;">
-                                    <span>⚠️</span> <span>Research halted unexpectedly mid-process.</span>
-                                </div>
-                                <button class="btn-primary" style="padding: 0.5rem 1rem; font-size: 0.875rem;" onclick="this.textContent = 'Resuming...'; this.disabled = true;">
-                                    Force Resume Research
-                                </button>
-                            </div>
-                        `;
-                        fallbackResume.querySelector('button').addEventListener('click', () => {
-                            sendMessage(null, null, false, 'section_execution');
-                        });
-                        contentDiv.appendChild(fallbackResume);
+                if (plainThoughts) {
+                    const contentBody = contentDiv.querySelector('.thought-body-content');
+                    if (contentBody) {
+                            contentBody.innerHTML = formatMarkdown(plainThoughts);
                     }
                 }
-            });
 
-            if (memoryToggleSwitch) {
-                if (isMemoryMode) {
-                    memoryToggleSwitch.classList.add('active');
-                } else {
-                    memoryToggleSwitch.classList.remove('active');
+                // Fallback Resume Logic (Check last message in group)
+                const lastMsgInGroup = group.messages[group.messages.length - 1];
+                const isLastTurnInHistory = lastMsgInGroup._originalIndex === chatHistory.length - 1;
+                if (isResearchMode && isLastTurnInHistory && !finalReport && !finalPlan && !isRetryVisible && !chat.is_research_running) {
+                    const fallbackResume = document.createElement('div');
+                    fallbackResume.innerHTML = `
+                        <div style="margin-top: 1rem; padding: 1rem; border: 1px solid rgba(255,100,100,0.3); border-radius: 8px; background: rgba(255,50,50,0.05);">
+                            <div style="display: flex; align-items: center; gap: 0.5rem; color: #ff6b6b; font-weight: 600; margin-bottom: 0.75rem;">
+                                <span>⚠️</span> <span>Research halted unexpectedly mid-process.</span>
+                            </div>
+                            <button class="btn-primary" style="padding: 0.5rem 1rem; font-size: 0.875rem;" onclick="this.textContent = 'Resuming...'; this.disabled = true;">
+                                Force Resume Research
+                            </button>
+                        </div>
+                    `;
+                    fallbackResume.querySelector('button').addEventListener('click', () => {
+                        sendMessage(null, null, false, 'section_execution');
+                    });
+                    contentDiv.appendChild(fallbackResume);
                 }
             }
+        });
+    }
 
-            renderChatList();
-
-            // Auto-Resume Logic
-            if (chat.is_research_running) {
-                // If running, we resume stream.
-                // We pass 'true' to indicate resume, preventing duplication of user message.
-                // We also pass 'section_execution' as resumeState to ensure the backend 
-                // preserves the WAL history if a restart occurred.
-                sendMessage(null, null, true, 'section_execution');
-            }
+    // Fetch the pages before the one loadChat rendered, then re-render the full
+    // history. chatHistory indices (edit/delete targets) are only final after this.
+    // Rejects if any page fails: chatHistory is then still partial.
+    async function backfillHistory(id, chat) {
+        let beforeId = chat.messages_before_id;
+        const older = [];
+        while (beforeId) {
+            const response = await fetch(`/api/chats/${id}/messages?before_id=${beforeId}&limit=${MESSAGE_PAGE_MAX}`);
+            if (!response.ok) throw new Error(`HTTP ${response.status}`);
+            const page = await response.json();
+            older.unshift(...page.messages);
+            beforeId = page.before_id;
+        }
+        // Stale if the user switched, reloaded or cleared the chat meanwhile
+        if (id !== currentChatId || chat !== currentChatData || !historyBackfill) return;
+
+        chatHistory = older.map(parseStoredMessage).concat(chatHistory);
+        // Keep the viewport anchored to the bottom while the rows above are inserted
+        const fromBottom = messagesContainer.scrollHeight - messagesContainer.scrollTop;
+        messagesContainer.innerHTML = '';
+        renderMessageGroups(chat);
+        messagesContainer.scrollTop = messagesContainer.scrollHeight - fromBottom;
+    }
 
-            if (pushState && window.location.pathname !== `/chat/${id}`) {
-                history.pushState({ chatId: id }, '', `/chat/${id}`);
-            }
+    function startHistoryBackfill(id, chat) {
+        const pending = backfillHistory(id, chat);
+        // Log here but keep `pending` rejected so awaitFullHistory() sees the failure
+        pending.catch(e => console.error("Failed to load older messages:", e));
+        return pending;
+    }
 
-            // Mobile sidebar auto-close
-            if (window.innerWidth <= 768) {
-                sidebar.classList.remove('sidebar-expanded');
-                sidebar.classList.add('sidebar-collapsed');
-                toggleIconPath.setAttribute('d', 'M9 6l6 6-6 6');
-            }
+    // Resolves true once chatHistory holds the whole conversation. The backend
+    // persists the history it is sent (and drops rows past the first difference),
+    // so callers must not send, save, edit or delete when this returns false.
+    async function awaitFullHistory() {
+        const pending = historyBackfill;
+        if (!pending) return true;
+        try {
+            await pending;
+            return true;
         } catch (e) {
-            console.error("Error loading chat:", e);
+            // Chat switched or cleared while waiting: the caller's action is stale
+            if (!historyBackfill) return false;
+            // Retry once (shared with concurrent callers) before giving up
+            if (historyBackfill === pending) historyBackfill = startHistoryBackfill(currentChatId, currentChatData);
+            const retry = historyBackfill;
+            try {
+                await retry;
+                return true;
+            } catch (err) {
+                if (historyBackfill === retry) {
+                    await showAlert('History Not Loaded', 'Older messages in this chat could not be loaded, so nothing was changed. Check your connection and try again.');
+                }
+                return false;
+            }
         }
     }
 
@@ -2057,8 +2132,10 @@ document.addEventListener('DOMContentLoaded', () => {
             startNewChat(true);
         }
     });
-    if (saveTempChatBtn) saveTempChatBtn.addEventListener('click', () => {
+    if (saveTempChatBtn) saveTempChatBtn.addEventListener('click', async () => {
         if (isTemporaryChat) {
+            // The saved chat is written from chatHistory, which must be complete
+            if (!(await awaitFullHistory()) || !isTemporaryChat) return;
             isTemporaryChat = false;
             // We now maintain the originally generated currentChatId
             if (tempChatBanner) tempChatBanner.classList.add('hidden');
@@ -3161,6 +3238,7 @@ document.addEventListener('DOMContentLoaded', () => {
     clearChatBtn?.addEventListener('click', async () => {
         if (await showConfirm('Clear Chat', 'Are you sure you want to clear the current conversation?')) {
             chatHistory = [];
+            historyBackfill = null;
             messagesContainer.innerHTML = '';
 
             if (welcomeHero) {
@@ -3503,8 +3581,9 @@ document.addEventListener('DOMContentLoaded', () => {
             xhr.onload = () => {
                 try {
                     const contentType = xhr.getResponseHeader('content-type');
+                    const isJson = Boolean(contentType && contentType.includes('application/json'));
                     let result;
-                    if (contentType && contentType.includes('application/json')) {
+                    if (isJson) {
                         result = JSON.parse(xhr.responseText);
                     } else {
                         result = { success: false, error: `Server returned ${xhr.status}` };
@@ -3514,8 +3593,9 @@ document.addEventListener('DOMContentLoaded', () => {
                         resolve(result);
                     } else {
                         let errorMsg = result.error || `Upload failed with status ${xhr.status}`;
-                        if (xhr.status === 413) {
-                            errorMsg = 'File too large. Maximum size is 100MB.';
+                        if (xhr.status === 413 && !isJson) {
+                            // Rejected before reaching the app (e.g. a proxy body limit)
+                            errorMsg = 'File too large.';
                         }
                         reject(new Error(errorMsg));
                     }
@@ -3639,6 +3719,7 @@ document.addEventListener('DOMContentLoaded', () => {
     // 5. Chat Interaction Core (Backend API with RAG)
     async function sendMessage(authOverride = null, approvedPlanPayload = null, isResume = false, resumeState = null) {
         if (isGenerating || (!selectedModel && !isResume)) return;
+        if (!(await awaitFullHistory())) return;
 
         // If approvedPlanPayload is present, we are approving. Content might be empty or "Plan Approved".
         const content = textArea.value.trim();
@@ -4039,6 +4120,22 @@ document.addEventListener('DOMContentLoaded', () => {
                             continue;
                         }
 
+                        // Handle task queue status (server is busy; task waits for a worker)
+                        if (json.__queue_status__) {
+                            const position = json.__queue_status__.position;
+                            if (mainWrapper && !accumulatedContent) {
+                                if (position > 0) {
+                                    mainWrapper.innerHTML = `<div class="queue-status" style="display: flex; align-items: center; gap: 0.75rem; padding: 1rem; color: var(--content-secondary); font-style: italic;">
+                                        <span class="processing-spinner"></span>
+                                        <span>Queued (position ${position})...</span>
+                                    </div>`;
+                                } else {
+                                    mainWrapper.innerHTML = '';
+                                }
+                            }
+                            continue;
+                        }
+
                         // Handle redaction (validation detected formatting issues, or transaction failure)
                         if (json.__redact__) {
                             // Clear current content and show fixing indicator
@@ -4406,6 +4503,10 @@ document.addEventListener('DOMContentLoaded', () => {
             await showAlert('Generation in Progress', 'Please wait for the current response to finish before deleting messages.');
             return;
         }
+        if (historyBackfill) {
+            // The rows are re-rendered with final indices once older pages arrive
+            if (!(await awaitFullHistory()) || !btn.isConnected) return;
+        }
         const row = btn.closest('.message-row');
 
         // Fix C: Read the true DB/chatHistory index stamped at render time instead of counting
@@ -4446,6 +4547,10 @@ document.addEventListener('DOMContentLoaded', () => {
             await showAlert('Generation in Progress', 'Please wait for the current response to finish before editing messages.');
             return;
         }
+        if (historyBackfill) {
+            // The rows are re-rendered with final indices once older pages arrive
+            if (!(await awaitFullHistory()) || !btn.isConnected) return;
+        }
         const row = btn.closest('.message-row');
 
         // Fix D: Same data-history-index approach as delete — immune to DOM collapsing.
@@ -4503,6 +4608,7 @@ document.addEventListener('DOMContentLoaded', () => {
             await showAlert('Generation in Progress', 'Please wait for the current response to finish before retrying messages.');
             return;
         }
+        if (!(await awaitFullHistory())) return;
         const retryConfirmed = await showRetryModelDialog();
         if (!retryConfirmed) return;
 
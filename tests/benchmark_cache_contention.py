@@ -0,0 +1,125 @@
+"""Read-latency benchmark for one hot chat under cache contention.
+
+Many reader threads read the same chat's messages while a writer appends to
+it every few milliseconds: each write flushes the WAL for the row and then
+invalidates it, as db_wrapper does. Reports p50/p99 read latency and the
+number of database fetches for the previous behaviour (every miss fetches;
+direct DB reads poll for the WAL flush with time.sleep(0.1)) versus the
+event-driven cache (misses share one in-flight fetch; waiters are woken by
+the fill or the flush).
+
+Run with: python tests/benchmark_cache_contention.py
+"""
+import sys
+import os
+import time
+import threading
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("EMBEDDING_URL", "http://localhost:9999")
+
+from backend.cache_layer import CachedDatabase
+
+TABLE, ROW = "messages", "chat:hot"
+READERS = 32
+DURATION = 2.0         # Seconds per run
+WRITE_EVERY = 0.02     # Seconds between writes to the hot chat
+FLUSH_COST = 0.002     # WAL checkpoint duration
+FETCH_COST = 0.005     # Reading the chat's messages from SQLite
+DB_READ_COST = 0.001   # A direct row read (row_read_lock body)
+THINK_TIME = 0.002     # Request handling between a reader's reads
+
+
+class Counter:
+    def __init__(self):
+        self.n = 0
+        self.lock = threading.Lock()
+
+    def fetch(self):
+        with self.lock:
+            self.n += 1
+        time.sleep(FETCH_COST)
+        return [{"id": i, "content": "x" * 200} for i in range(50)]
+
+
+def legacy_get(cache, fetch_fn):
+    """CachedDatabase.get as it was: 0.1 s condition waits and no fill sharing."""
+    with cache._using_row(TABLE, ROW) as (state, row):
+        with row.write_condition:
+            while row.wal_pending > 0:
+                row.write_condition.wait(timeout=0.1)
+        with state.lock:
+            entry = state.cache.get(ROW)
+            if entry is not None and entry['data'] is not None:
+                return entry['data']
+        data = fetch_fn()
+        with state.lock:
+            cache._store(state, ROW, data, None, 1)
+        return data
+
+
+def legacy_db_read(cache):
+    """db_layer.row_read_lock as it was: poll the WAL flag every 100 ms."""
+    while cache._is_row_wal_pending(TABLE, ROW):
+        time.sleep(0.1)
+    time.sleep(DB_READ_COST)
+
+
+def event_db_read(cache):
+    cache.wait_for_row_wal(TABLE, ROW, 30.0)
+    time.sleep(DB_READ_COST)
+
+
+def writer(cache, stop, writes):
+    cache.register_flush_callback(TABLE, lambda: time.sleep(FLUSH_COST))
+    while not stop.is_set():
+        time.sleep(WRITE_EVERY)
+        with cache._using_row(TABLE, ROW) as (_, row):
+            cache._flush_row_wal(TABLE, row, ROW)
+        cache.invalidate(TABLE, ROW)
+        writes[0] += 1
+
+
+def run(label, read_fn):
+    cache = CachedDatabase()
+    counter = Counter()
+    stop = threading.Event()
+    samples = [[] for _ in range(READERS)]
+    writes = [0]
+
+    def reader(out):
+        while not stop.is_set():
+            start = time.perf_counter()
+            read_fn(cache, counter.fetch)
+            out.append((time.perf_counter() - start) * 1000)
+            time.sleep(THINK_TIME)
+
+    threads = [threading.Thread(target=writer, args=(cache, stop, writes))]
+    threads += [threading.Thread(target=reader, args=(samples[i],)) for i in range(READERS)]
+    for t in threads:
+        t.start()
+    time.sleep(DURATION)
+    stop.set()
+    for t in threads:
+        t.join()
+    latencies = sorted(ms for out in samples for ms in out)
+    p50 = latencies[len(latencies) // 2]
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    print(f"{label:<24} p50={p50:>7.2f} ms  p99={p99:>7.2f} ms  reads={len(latencies):>8,}  "
+          f"writes={writes[0]:>4}  fetches={counter.n:>5}")
+
+
+def benchmark():
+    print(f"Hot chat: {READERS} reader threads, a write every {WRITE_EVERY * 1000:.0f} ms, {DURATION:.0f}s per run")
+    print("-" * 90)
+    run("legacy cache.get", legacy_get)
+    run("event cache.get", lambda cache, fetch: cache.get(TABLE, ROW, fetch))
+    run("legacy row_read_lock", lambda cache, fetch: legacy_db_read(cache))
+    run("event row_read_lock", lambda cache, fetch: event_db_read(cache))
+
+
+if __name__ == "__main__":
+    import logging
+    logging.disable(logging.WARNING)
+    benchmark()
@@ -0,0 +1,94 @@
+"""Throughput benchmark for RAGManager.chunk_text on tests/test_rag_data.
+
+Compares the previous chunker (count every paragraph, then every sentence
+and word of oversized pieces, then re-count every chunk) with the current
+one (encode the document once with offsets, cut on paragraph/sentence/word
+breaks, validate the chunks in one batch). The token count cache is cleared
+before every pass so neither side reuses the other's counts.
+
+Uses the embedding tokenizer from backend/model_config.json when it can be
+loaded; otherwise (e.g. offline) a byte-level BPE trained on the repo
+sources, which is slower per byte but exercises the same code paths.
+
+Run with: python tests/benchmark_chunk_text.py
+"""
+import sys
+import os
+import time
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("EMBEDDING_URL", "http://localhost:9999")
+
+import backend.token_counter as token_counter
+from backend.rag import RAGManager
+from backend.token_counter import clear_token_cache, count_tokens_batch
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.path.join(REPO_ROOT, "tests", "test_rag_data")
+MAX_TOKENS = (512, 2048)
+ROUNDS = 3
+
+
+def load_tokenizer():
+    try:
+        return token_counter.get_tokenizer(), "embedding tokenizer"
+    except Exception:
+        from tokenizers import Tokenizer, decoders, models, pre_tokenizers, trainers
+        from transformers import PreTrainedTokenizerFast
+        corpus = []
+        for name in ("chunking.py", "rag.py", "db_wrapper.py"):
+            with open(os.path.join(REPO_ROOT, "backend", name), encoding="utf-8") as f:
+                corpus.extend(f.read().split("\n"))
+        tok = Tokenizer(models.BPE(unk_token="[UNK]"))
+        tok.pre_tokenizer = pre_tokenizers.ByteLevel(add_prefix_space=False)
+        tok.decoder = decoders.ByteLevel()
+        tok.train_from_iterator(corpus, trainers.BpeTrainer(
+            vocab_size=8000, special_tokens=["[UNK]"],
+            initial_alphabet=pre_tokenizers.ByteLevel.alphabet()))
+        token_counter._tokenizer = PreTrainedTokenizerFast(tokenizer_object=tok)
+        return token_counter._tokenizer, "local BPE (embedding tokenizer unavailable)"
+
+
+def load_corpus():
+    docs = []
+    for name in sorted(os.listdir(DATA_DIR)):
+        path = os.path.join(DATA_DIR, name)
+        if os.path.isfile(path):
+            with open(path, encoding="utf-8", errors="replace") as f:
+                docs.append(f.read())
+    return docs
+
+
+def run(label, chunk_fn, docs, max_tokens):
+    size_mb = sum(len(d.encode("utf-8")) for d in docs) / 1e6
+    best = float("inf")
+    for _ in range(ROUNDS):
+        clear_token_cache()
+        start = time.perf_counter()
+        chunks = [c for d in docs for c in chunk_fn(d, max_tokens)]
+        best = min(best, time.perf_counter() - start)
+    clear_token_cache()
+    counts = count_tokens_batch(chunks)
+    over = sum(1 for n in counts if n > max_tokens)
+    print(f"{label:<12} {size_mb / best:>7.2f} MB/s  {best * 1000:>8.1f} ms  chunks={len(chunks):>5}  "
+          f"avg_tokens={sum(counts) / len(counts):>7.1f}  over_limit={over}")
+
+
+def benchmark():
+    _, tokenizer_label = load_tokenizer()
+    docs = load_corpus()
+    manager = object.__new__(RAGManager)
+    size_mb = sum(len(d.encode("utf-8")) for d in docs) / 1e6
+    print(f"Corpus: {len(docs)} files, {size_mb:.2f} MB from tests/test_rag_data; tokenizer: {tokenizer_label}")
+    for max_tokens in MAX_TOKENS:
+        print(f"\nmax_tokens={max_tokens} (best of {ROUNDS})")
+        print("-" * 100)
+        run("legacy", lambda d, m: manager._chunk_by_token_counts(d, m) if d.strip() else [], docs, max_tokens)
+        run("single-pass", lambda d, m: manager.chunk_text(d, max_tokens=m), docs, max_tokens)
+
+
+if __name__ == "__main__":
+    import logging
+    logging.disable(logging.WARNING)
+    benchmark()
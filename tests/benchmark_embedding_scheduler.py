@@ -0,0 +1,153 @@
+"""Throughput benchmark for embedding requests against a local fake /v1/embeddings server.
+
+The fake server charges a fixed per-request overhead plus a per-item cost and
+runs at most SERVER_PARALLELISM requests at once, like a GPU inference server.
+Two workloads are run through the previous path (each caller posts its own
+EMBEDDING_BATCH_SIZE slices sequentially with a bare requests.post) and
+through the shared EmbeddingScheduler:
+
+- many small callers: CALLERS threads each embedding one chunk at a time, as
+  ResearchRAG.store_chunk does from concurrent research stages
+- bulk: one caller embedding a whole file's chunks
+
+Run with: python tests/benchmark_embedding_scheduler.py
+"""
+import sys
+import os
+import json
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("EMBEDDING_URL", "http://localhost:9999")
+
+import requests
+
+from backend.embedding_scheduler import EmbeddingScheduler
+
+REQUEST_OVERHEAD_MS = 8.0   # Per request: parsing, tokenizer setup, kernel launch
+PER_ITEM_MS = 0.25          # Per input text
+SERVER_PARALLELISM = 4      # Requests the server processes at once
+CALLERS = 32
+CHUNKS_PER_CALLER = 20
+BULK_CHUNKS = 4000
+LEGACY_BATCH_SIZE = 1024    # EMBEDDING_BATCH_SIZE default
+TEXT = "title: none | text: " + "lorem ipsum dolor sit amet " * 40
+
+
+class _FakeEmbeddingsHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        inputs = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))["input"]
+        with self.server.slots:
+            time.sleep((REQUEST_OVERHEAD_MS + PER_ITEM_MS * len(inputs)) / 1000.0)
+        with self.server.lock:
+            self.server.requests += 1
+        body = json.dumps({"data": [{"index": i, "embedding": [0.1] * 8} for i in range(len(inputs))]}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class _FakeServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256  # Legacy callers open a connection per request
+
+
+def start_server():
+    server = _FakeServer(("127.0.0.1", 0), _FakeEmbeddingsHandler)
+    server.lock = threading.Lock()
+    server.slots = threading.Semaphore(SERVER_PARALLELISM)
+    server.requests = server.connections = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def legacy_embed(url, texts):
+    """AIEmbeddingFunction._embed_with_task as it was: sequential slices, no session."""
+    out = []
+    for i in range(0, len(texts), LEGACY_BATCH_SIZE):
+        response = requests.post(url, json={"model": "fake", "input": texts[i:i + LEGACY_BATCH_SIZE]}, timeout=120)
+        response.raise_for_status()
+        out.extend(row["embedding"] for row in response.json()["data"])
+    return out
+
+
+def _percentile(samples, q):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * q))]
+
+
+def run(label, workload, embed_fn):
+    server = start_server()
+    url = f"http://127.0.0.1:{server.server_port}/v1/embeddings"
+    embed, close = embed_fn(url)
+    latencies = []
+    lock = threading.Lock()
+
+    def caller(n, size):
+        for _ in range(n):
+            start = time.perf_counter()
+            embed([TEXT] * size)
+            with lock:
+                latencies.append((time.perf_counter() - start) * 1000)
+
+    if workload == "small":
+        threads = [threading.Thread(target=caller, args=(CHUNKS_PER_CALLER, 1)) for _ in range(CALLERS)]
+        items = CALLERS * CHUNKS_PER_CALLER
+    else:
+        threads = [threading.Thread(target=caller, args=(1, BULK_CHUNKS))]
+        items = BULK_CHUNKS
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    close()
+    server.shutdown()
+    server.server_close()
+    print(f"{label:<12} {items / elapsed:>9,.0f} items/s  call p50={_percentile(latencies, 0.5):>8.1f} ms  "
+          f"p99={_percentile(latencies, 0.99):>8.1f} ms  requests={server.requests:>5}  connections={server.connections:>4}")
+
+
+def _legacy(url):
+    return (lambda texts: legacy_embed(url, texts)), (lambda: None)
+
+
+def _scheduled(url):
+    scheduler = EmbeddingScheduler(url, "fake", max_batch_size=LEGACY_BATCH_SIZE)
+    return scheduler.embed, scheduler.close
+
+
+def benchmark():
+    print(f"Fake server: {REQUEST_OVERHEAD_MS:.0f} ms/request + {PER_ITEM_MS} ms/item, "
+          f"{SERVER_PARALLELISM} requests in parallel")
+    print(f"\nMany small callers: {CALLERS} threads x {CHUNKS_PER_CALLER} single-chunk calls")
+    print("-" * 100)
+    run("legacy", "small", _legacy)
+    run("scheduler", "small", _scheduled)
+    print(f"\nBulk: one call with {BULK_CHUNKS} chunks")
+    print("-" * 100)
+    run("legacy", "bulk", _legacy)
+    run("scheduler", "bulk", _scheduled)
+
+
+if __name__ == "__main__":
+    import logging
+    logging.disable(logging.WARNING)
+    benchmark()
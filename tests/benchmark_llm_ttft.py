@@ -0,0 +1,120 @@
+"""Time-to-first-token benchmark for LLM streaming against a local stub server.
+
+Issues sequential streamed completions (like consecutive agent rounds and
+tool loops) and reports TTFT p50/p99 for the previous new-AsyncClient-per-call
+pattern versus the shared per-loop client from backend.http_clients.
+
+The stub server can add a per-connection setup delay to stand in for a
+remote endpoint (TLS, proxy, cross-host RTT); localhost TCP alone is cheap.
+
+Run with: python tests/benchmark_llm_ttft.py
+"""
+import sys
+import os
+import json
+import time
+import asyncio
+import logging
+import threading
+import statistics
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+
+from backend import http_clients
+from backend.llm import stream_chat_completion
+
+logging.disable(logging.INFO)
+
+REQUESTS = 200
+TOKENS = 20
+CONNECT_DELAYS_MS = (0, 20)
+PAYLOAD = {"model": "stub", "stream": True, "messages": [{"role": "user", "content": "hi"}]}
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True  # Headers and body are separate writes
+
+    def setup(self):
+        time.sleep(self.server.connect_delay)
+        super().setup()
+        self.server.connections += 1
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        chunk = f"data: {json.dumps({'choices': [{'delta': {'content': 'tok'}}]})}\n\n"
+        body = (chunk * TOKENS + "data: [DONE]\n\n").encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def start_server(connect_delay_ms):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StubHandler)
+    server.daemon_threads = True
+    server.connect_delay = connect_delay_ms / 1000.0
+    server.connections = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+async def legacy_ttft(url):
+    """Previous behavior: a new AsyncClient (and TCP connection) per call."""
+    start = time.perf_counter()
+    ttft = None
+    async with httpx.AsyncClient(timeout=httpx.Timeout(5.0, read=None)) as client:
+        async with client.stream("POST", f"{url}/v1/chat/completions", json=PAYLOAD) as response:
+            async for line in response.aiter_lines():
+                if line.startswith("data: ") and ttft is None:
+                    ttft = time.perf_counter() - start
+    return ttft
+
+
+async def pooled_ttft(url):
+    start = time.perf_counter()
+    ttft = None
+    async for line in stream_chat_completion(url, dict(PAYLOAD)):
+        if ttft is None:
+            ttft = time.perf_counter() - start
+    return ttft
+
+
+def run(label, fn, connect_delay_ms):
+    server = start_server(connect_delay_ms)
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+    loop = asyncio.new_event_loop()
+    try:
+        samples = [loop.run_until_complete(fn(url)) * 1000 for _ in range(REQUESTS)]
+    finally:
+        http_clients.close_loop_client(loop)
+        loop.close()
+        server.shutdown()
+        server.server_close()
+    samples.sort()
+    p50 = statistics.median(samples)
+    p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+    print(f"{label:<22} p50={p50:>7.2f} ms  p99={p99:>7.2f} ms  connections={server.connections}")
+    return p50
+
+
+def benchmark():
+    print(f"LLM stream TTFT: {REQUESTS} sequential requests x {TOKENS} tokens")
+    for delay in CONNECT_DELAYS_MS:
+        print("-" * 72)
+        print(f"connection setup delay: {delay} ms")
+        legacy = run("client per call", legacy_ttft, delay)
+        pooled = run("shared loop client", pooled_ttft, delay)
+        print(f"{'':<22} {legacy / pooled:.1f}x faster p50")
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,108 @@
+"""Per-turn write cost of add_messages_batch at different chat lengths.
+
+For chats with 10, 1k and 10k persisted messages, persists one more turn
+(user + assistant) the way the task manager does - by passing the whole
+history - and reports latency, rows written and WAL growth for the previous
+delete-and-reinsert write versus the delta-append write.
+
+Uses a throwaway DATA_DIR. Run with: python tests/benchmark_message_persistence.py
+"""
+import sys
+import os
+import time
+import logging
+import tempfile
+import statistics
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["DATA_DIR"] = tempfile.mkdtemp(prefix="bench_messages_")
+
+logging.disable(logging.INFO)
+
+from backend.db_layer import DB_PATH, make_connection
+from backend.db_wrapper import db, _serialize_message, _MESSAGE_COLUMNS
+from backend.cache_layer import cache_layer
+from backend.storage import init_db
+
+SIZES = (10, 1000, 10000)
+TURNS = 20
+
+
+def _history(n):
+    return [{"role": "user" if i % 2 == 0 else "assistant",
+             "content": f"message {i} " + "lorem ipsum dolor sit amet " * 20,
+             "model": "bench"} for i in range(n)]
+
+
+def legacy_batch(chat_id, messages):
+    """The previous add_messages_batch write: delete everything, reinsert everything."""
+    conn = make_connection()
+    try:
+        c = conn.cursor()
+        c.execute("BEGIN")
+        c.execute("DELETE FROM messages WHERE chat_id = ?", (chat_id,))
+        for msg in messages:
+            row = _serialize_message(msg)
+            c.execute('''
+                INSERT INTO messages (chat_id, role, content, timestamp, model,
+                                      tool_calls, tool_call_id, name)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (chat_id, *(row[col] for col in _MESSAGE_COLUMNS)))
+        c.execute("COMMIT")
+    finally:
+        conn.close()
+    cache_layer.invalidate("messages", f"chat:{chat_id}")
+    cache_layer.invalidate("chats_full", chat_id)
+    return True
+
+
+def _wal_size():
+    try:
+        return os.path.getsize(DB_PATH + "-wal")
+    except OSError:
+        return 0
+
+
+def _checkpoint():
+    conn = make_connection()
+    try:
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    finally:
+        conn.close()
+
+
+def run(label, write_fn, n):
+    chat_id = f"bench-{label}-{n}"
+    db.ensure_chat_exists(chat_id)
+    history = _history(n)
+    legacy_batch(chat_id, history)  # Seed the chat
+    db.get_messages(chat_id)        # Warm the cache as a live chat would have it
+
+    latencies, wal_growth = [], []
+    for turn in range(TURNS):
+        history = history + [{"role": "user", "content": f"turn {turn}"},
+                             {"role": "assistant", "content": f"reply {turn}", "model": "bench"}]
+        _checkpoint()
+        start = time.perf_counter()
+        assert write_fn(chat_id, history)
+        latencies.append((time.perf_counter() - start) * 1000)
+        wal_growth.append(_wal_size() / 1024)
+        if label == "legacy":
+            db.get_messages(chat_id)  # Refill the invalidated cache, as the next request would
+    db.delete_chat(chat_id)
+    return statistics.median(latencies), statistics.median(wal_growth)
+
+
+def benchmark():
+    init_db()
+    print(f"{TURNS} turns per size; median per turn\n")
+    print(f"{'messages':>9} {'legacy ms':>10} {'delta ms':>9} {'legacy WAL KB':>14} {'delta WAL KB':>13}")
+    for n in SIZES:
+        legacy_ms, legacy_wal = run("legacy", legacy_batch, n)
+        delta_ms, delta_wal = run("delta", db.add_messages_batch, n)
+        print(f"{n:>9} {legacy_ms:>10.2f} {delta_ms:>9.2f} {legacy_wal:>14.1f} {delta_wal:>13.1f}")
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,147 @@
+"""Micro-benchmark for RAGStore result post-processing.
+
+Times the join -> RRF fusion -> dedup pipeline that runs on every hybrid
+query, for 100, 500 and 2000 candidates per leg, against the previous
+pure-Python implementation (text-scan embedding join, text-hash fusion,
+pairwise cosine dedup).
+
+Run with: python tests/benchmark_rag_postprocessing.py
+"""
+import sys
+import os
+import time
+import random
+import hashlib
+
+import numpy as np
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.rag import RAGStore, _cosine_similarity
+from backend import config
+
+DIM = 768
+SIZES = [100, 500, 2000]
+N_RESULTS = 50
+REPEATS = 3
+
+
+def make_results(n, dim=DIM, seed=0, with_embeddings=True):
+    """Build a ChromaDB-shaped query result with n candidates."""
+    rng = random.Random(seed)
+    now = time.time()
+    ids = [f"file_{i // 20}_chunk_{i % 20}" for i in range(n)]
+    rng.shuffle(ids)
+    result = {
+        "ids": [ids],
+        "documents": [[f"chunk text for {doc_id} " * 8 for doc_id in ids]],
+        "metadatas": [[{"file_id": doc_id.split("_chunk_")[0],
+                        "timestamp": now - rng.random() * 30 * 86400} for doc_id in ids]],
+        "distances": [sorted(rng.random() * 1.2 for _ in ids)],
+    }
+    if with_embeddings:
+        # ChromaDB returns embeddings as a float32 ndarray per query
+        result["embeddings"] = [np.random.default_rng(seed).standard_normal((n, dim)).astype(np.float32)]
+    return result
+
+
+# -----------------------------------------------------------------------------
+# Previous implementation (for comparison)
+# -----------------------------------------------------------------------------
+
+def legacy_results_to_docs(results, source):
+    docs = []
+    for doc_id, doc, meta, dist in zip(results['ids'][0], results['documents'][0],
+                                       results['metadatas'][0], results['distances'][0]):
+        score = 1.0 / (1.0 + dist) if source == "bm25" else max(0.0, 1.0 - (dist * dist) / 2.0)
+        d = {"id": doc_id, "file_id": meta.get("file_id", ""), "text": doc,
+             "metadata": meta, "score": score, "source": source}
+        if source == "vector" and results.get('embeddings') is not None:
+            embeddings_list = results['embeddings'][0]
+            emb_idx = 0
+            for i, other in enumerate(results['documents'][0]):
+                if other == doc:  # text scan per result
+                    emb_idx = i
+                    break
+            d["embedding"] = embeddings_list[emb_idx]
+        docs.append(d)
+    return docs
+
+
+def legacy_rrf(vector_docs, bm25_docs, n_results):
+    import math
+    all_docs = {}
+    for field, ranked in (("vector", vector_docs), ("bm25", bm25_docs)):
+        for i, doc in enumerate(ranked):
+            h = int(hashlib.sha256(doc['text'].encode('utf-8')[:1000]).hexdigest(), 16)
+            entry = all_docs.setdefault(h, {"doc": doc, "vector_rank": None, "bm25_rank": None})
+            entry[f"{field}_rank"] = i + 1
+    fused = []
+    for entry in all_docs.values():
+        rrf = 1.0 / (60 + (entry["vector_rank"] or float('inf'))) + \
+            1.0 / (60 + (entry["bm25_rank"] or float('inf')))
+        ts = entry["doc"]["metadata"].get("timestamp", 0)
+        if ts > 0:
+            rrf *= math.exp(-config.RAG_DECAY_RATE * (time.time() - ts) / 86400.0)
+        fused.append({**entry["doc"], "score": rrf})
+    fused.sort(key=lambda x: x['score'], reverse=True)
+    return fused[:n_results]
+
+
+def legacy_dedup(docs, n_results):
+    kept, kept_embs = [], []
+    for doc in docs:
+        emb = doc.get("embedding")
+        if emb is not None:
+            if any(_cosine_similarity(emb, k) >= config.RAG_DEDUP_THRESHOLD for k in kept_embs):
+                continue
+            kept_embs.append(emb)
+        kept.append(doc)
+        if len(kept) >= n_results:
+            break
+    return kept
+
+
+# -----------------------------------------------------------------------------
+# Benchmark
+# -----------------------------------------------------------------------------
+
+def _time(fn):
+    best = float('inf')
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def run_pipeline(store, vector_results, bm25_results, fetch_k):
+    vector_docs = store._results_to_docs(vector_results, source="vector")
+    bm25_docs = store._results_to_docs(bm25_results, source="bm25")
+    fused = store._rrf_fuse_results(vector_docs, bm25_docs, fetch_k)
+    return store._dedup_results(fused, N_RESULTS)
+
+
+def run_legacy_pipeline(vector_results, bm25_results, fetch_k):
+    vector_docs = legacy_results_to_docs(vector_results, "vector")
+    bm25_docs = legacy_results_to_docs(bm25_results, "bm25")
+    fused = legacy_rrf(vector_docs, bm25_docs, fetch_k)
+    return legacy_dedup(fused, N_RESULTS)
+
+
+def benchmark():
+    store = RAGStore.__new__(RAGStore)
+    print(f"RAGStore post-processing (dim={DIM}, n_results={N_RESULTS}, best of {REPEATS})")
+    print(f"{'candidates':>10} | {'legacy ms':>10} | {'numpy ms':>10} | {'speedup':>8}")
+    print("-" * 48)
+    for n in SIZES:
+        vector_results = make_results(n, seed=n)
+        bm25_results = make_results(n, seed=n + 1, with_embeddings=False)
+        legacy_ms = _time(lambda: run_legacy_pipeline(vector_results, bm25_results, n))
+        new_ms = _time(lambda: run_pipeline(store, vector_results, bm25_results, n))
+        print(f"{n:>10} | {legacy_ms:>10.2f} | {new_ms:>10.2f} | {legacy_ms / new_ms:>7.1f}x")
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,128 @@
+"""Wall-clock benchmark for the research fetch pipeline against local stub servers.
+
+Starts two local HTTP servers standing in for the Tavily and Playwright MCP
+servers (fixed per-call latency, like a remote search/extract round-trip) and
+runs one research section - several queries, their selected URLs and, in deep
+mode, mapped sub-pages - through ResearchPipeline at increasing stage
+concurrency. Concurrency 1 is the previous one-after-another behaviour.
+
+Run with: python tests/benchmark_research_pipeline.py
+"""
+import sys
+import os
+import json
+import time
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+
+import backend.agents.research_pipeline as research_pipeline
+from backend.agents.research_pipeline import ResearchPipeline
+
+LATENCY_S = 0.05
+QUERIES = 4
+URLS_PER_QUERY = 4
+MAPPED_PER_URL = 3
+PAGE = "Lorem ipsum dolor sit amet, consectetur adipiscing elit. " * 40
+
+
+class _StubToolHandler(BaseHTTPRequestHandler):
+    """GET /search?q=, /extract?url=, /map?url= with a fixed response delay."""
+
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        params = {k: v[0] for k, v in parse_qs(parsed.query).items()}
+        time.sleep(LATENCY_S)
+        if parsed.path == "/search":
+            q = params["q"]
+            body = {"results": [{"url": f"https://{q}.example/{i}", "title": f"{q} {i}", "content": "snippet"}
+                                for i in range(URLS_PER_QUERY)]}
+        elif parsed.path == "/map":
+            body = {"results": [f"{params['url']}/sub{i}" for i in range(MAPPED_PER_URL)]}
+        else:
+            body = {"content": f"{params['url']}\n{PAGE}"}
+        data = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class _StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128  # Default backlog of 5 drops connection bursts
+
+
+def _start_server():
+    server = _StubServer(("127.0.0.1", 0), _StubToolHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+async def _run_section(tavily_url, playwright_url, concurrency, deep):
+    async with httpx.AsyncClient(limits=httpx.Limits(max_connections=64)) as client:
+        async def search(query_info):
+            r = await client.get(f"{tavily_url}/search", params={"q": query_info["search"]})
+            return r.json()["results"], []
+
+        async def map_site(url, heading):
+            r = await client.get(f"{tavily_url}/map", params={"url": url})
+            return r.json()["results"]
+
+        async def extract(url, step_id, raw_content=None):
+            r = await client.get(f"{playwright_url}/extract", params={"url": url})
+            yield {"type": "result", "data": (url, r.json()["content"])}
+
+        pipeline = ResearchPipeline(
+            search=search, select=lambda results: results, extract=extract, map_site=map_site,
+            activity=lambda kind, data: kind, content_budget=10 ** 9, deep=deep,
+            search_concurrency=concurrency, extract_concurrency=concurrency, map_concurrency=concurrency)
+        items = None
+        async for packet in pipeline.run_section(0, "Benchmark", [{"search": f"q{i}"} for i in range(QUERIES)]):
+            if packet["type"] == "result":
+                items = packet["data"][0]
+        return items
+
+
+def benchmark():
+    # Budgets are irrelevant here; avoid loading a tokenizer
+    research_pipeline.count_tokens = lambda text: len(text) // 4
+
+    tavily, tavily_url = _start_server()
+    playwright, playwright_url = _start_server()
+    try:
+        for deep in (False, True):
+            calls = QUERIES * (1 + URLS_PER_QUERY) + (QUERIES * URLS_PER_QUERY * (1 + MAPPED_PER_URL) if deep else 0)
+            print(f"\n{'Deep' if deep else 'Regular'} mode: {calls} stub calls at {LATENCY_S * 1000:.0f} ms each")
+            print(f"{'concurrency':>12} {'wall (s)':>10} {'speedup':>8} {'items':>6}")
+            baseline = None
+            reference = None
+            for concurrency in (1, 2, 4, 8, 16):
+                start = time.perf_counter()
+                items = asyncio.run(_run_section(tavily_url, playwright_url, concurrency, deep))
+                elapsed = time.perf_counter() - start
+                baseline = baseline or elapsed
+                reference = reference or items
+                assert items == reference, "store order must not depend on concurrency"
+                print(f"{concurrency:>12} {elapsed:>10.2f} {baseline / elapsed:>7.1f}x {len(items):>6}")
+    finally:
+        for server in (tavily, playwright):
+            server.shutdown()
+            server.server_close()
+
+
+if __name__ == "__main__":
+    benchmark()
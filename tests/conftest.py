@@ -0,0 +1,27 @@
+"""Shared pytest fixtures."""
+
+import pytest
+
+from backend import db_layer, storage
+from backend.cache_layer import cache_layer
+from backend.db_pool import ConnectionPool
+
+
+@pytest.fixture
+def temp_db(tmp_path_factory, monkeypatch):
+    """Point the database layer at a fresh, migrated chats.db in its own temp directory.
+
+    Swaps the path and connection pool used by db_layer/storage and empties the
+    cache before and after the test, so the developer's DATA_DIR database is
+    never opened.
+    """
+    path = str(tmp_path_factory.mktemp("db") / "chats.db")
+    pool = ConnectionPool(path)
+    monkeypatch.setattr(storage, "DB_PATH", path)
+    monkeypatch.setattr(db_layer, "DB_PATH", path)
+    monkeypatch.setattr(db_layer, "connection_pool", pool)
+    cache_layer.clear_cache()
+    storage.init_db()
+    yield path
+    cache_layer.clear_cache()
+    pool.close_all()
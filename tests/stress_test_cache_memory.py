@@ -0,0 +1,58 @@
+"""Resident-memory soak for the bounded cache layer.
+
+Churns a CachedDatabase through many distinct chats - each read caches a
+message list, as get_messages does - and prints the process RSS after every
+round, once with the default LRU byte budget and once unbounded (the previous
+behaviour). Each mode runs in its own process so the RSS figures are separate.
+
+Run with: python tests/stress_test_cache_memory.py
+"""
+import sys
+import os
+import subprocess
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("EMBEDDING_URL", "http://localhost:9999")
+
+ROUNDS = 10
+CHATS_PER_ROUND = 5000
+MESSAGES_PER_CHAT = 10
+BUDGET_MB = 64
+
+
+def _rss_mb():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+
+
+def soak(mode):
+    from backend.cache_eviction import LRUSizePolicy, UnboundedPolicy
+    from backend.cache_layer import CachedDatabase
+
+    policy = UnboundedPolicy() if mode == "unbounded" else LRUSizePolicy(max_bytes=BUDGET_MB * 1024 * 1024)
+    cache = CachedDatabase(policy=policy)
+    print(f"\n{mode}: {CHATS_PER_ROUND} new chats x {MESSAGES_PER_CHAT} messages per round")
+    print(f"{'round':>6} {'rss MB':>8} {'cached rows':>12} {'row locks':>10} {'evictions':>10}")
+    for r in range(ROUNDS):
+        for i in range(CHATS_PER_ROUND):
+            cache.get("messages", f"chat:{r}-{i}", lambda: [
+                {"id": j, "role": "user", "content": f"message {j} " + "lorem ipsum " * 20}
+                for j in range(MESSAGES_PER_CHAT)])
+        stats = cache.get_stats()
+        print(f"{r + 1:>6} {_rss_mb():>8.0f} {stats['total_rows']:>12} "
+              f"{stats['row_locks']:>10} {stats['evictions']:>10}")
+
+
+def benchmark():
+    for mode in ("bounded", "unbounded"):
+        subprocess.run([sys.executable, os.path.abspath(__file__), mode], check=True)
+
+
+if __name__ == "__main__":
+    import logging
+    logging.disable(logging.WARNING)
+    if len(sys.argv) > 1:
+        soak(sys.argv[1])
+    else:
+        benchmark()
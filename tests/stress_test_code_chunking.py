@@ -0,0 +1,159 @@
+"""Stress test for code chunking on 1-20 MB generated source files.
+
+Generates Python and JavaScript modules of increasing size and chunks them
+with chunk_code_text(). For each size it reports the time spent in the
+structural scan alone and in full chunking (scan + per-line token counts +
+hard-limit validation), the resulting throughput and whether every chunk
+is within the limit. The previous regex + brace-matching chunker is run
+once per language on a LEGACY_SAMPLE_MB sample for comparison; its
+quadratic scan takes minutes at 0.1 MB and does not finish on the full
+sizes.
+
+Uses the embedding tokenizer when it can be loaded, otherwise a local BPE
+(see tests/benchmark_chunk_text.py).
+
+Run with: python tests/stress_test_code_chunking.py
+"""
+import sys
+import os
+import re
+import time
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("EMBEDDING_URL", "http://localhost:9999")
+
+from benchmark_chunk_text import load_tokenizer
+from backend.chunking import _scan_code_lines, _ensure_hard_limit, chunk_code_text
+from backend.token_counter import IncrementalTokenCounter, clear_token_cache, count_tokens_batch
+
+SIZES_MB = (1, 5, 10, 20)
+LEGACY_SAMPLE_MB = 0.05
+MAX_TOKENS = 1024
+
+
+def python_source(size_bytes):
+    parts, total, i = [], 0, 0
+    while total < size_bytes:
+        block = (
+            f"@register('handler_{i}')\n"
+            f"def handler_{i}(request, *args, **kwargs):\n"
+            f"    '''Handle request {i}; braces {{ in docs }} are ignored.'''\n"
+            f"    payload = {{'id': {i}, 'items': [x * {i} for x in range(10)]}}\n"
+            f"    if request.get('debug'):  # {{ not a block\n"
+            f"        return {{'debug': True, **payload}}\n"
+            f"    return payload\n\n\n"
+        )
+        if i % 25 == 0:
+            block = f"class Service{i}:\n" + "".join(
+                f"    def method_{j}(self, value):\n        return value + {j}\n\n" for j in range(12)
+            ) + "\n"
+        parts.append(block)
+        total += len(block)
+        i += 1
+    return "".join(parts)
+
+
+def javascript_source(size_bytes):
+    parts, total, i = [], 0, 0
+    while total < size_bytes:
+        block = (
+            f"export async function load{i}(id) {{\n"
+            f"  const url = `/api/items/${{id}}?page={i}`;  // {{ in comment\n"
+            f"  const res = await fetch(url, {{ method: 'GET' }});\n"
+            f"  if (!res.ok) {{\n    throw new Error(\"failed {{\" + id);\n  }}\n"
+            f"  /* multi-line {{\n     comment */\n"
+            f"  return res.json();\n}}\n\n"
+        )
+        parts.append(block)
+        total += len(block)
+        i += 1
+    return "".join(parts)
+
+
+def _legacy_find_function_end(text, start):
+    brace_start = text.find('{', start)
+    if brace_start == -1:
+        return text.find('\n', start)
+    depth, pos = 1, brace_start + 1
+    while pos < len(text) and depth > 0:
+        if text[pos] == '{':
+            depth += 1
+        elif text[pos] == '}':
+            depth -= 1
+        pos += 1
+    return pos
+
+
+def legacy_chunk_by_code_structure(text, max_tokens):
+    """_chunk_by_code_structure as it was: regex headers + brace matching per match."""
+    patterns = [
+        r'\b(def|class|function|pub fn|fun|func)\s+(\w+)',
+        r'(?:^|\n)(?:static\s+)?(?:inline\s+)?(?:const\s+)?[a-zA-Z_][a-zA-Z0-9_::*<>,\s]*\s+(\w+)\s*\([^)]*\)\s*(?:const)?\s*\{',
+        r'\w*\s*=\s*(?:async\s+)?\([^)]*\)\s*=>',
+        r'\b(interface|type|namespace|module)\s+(\w+)',
+    ]
+    boundaries = [(0, 'start')]
+    for pattern in patterns:
+        for match in re.finditer(pattern, text):
+            start = match.start()
+            end = _legacy_find_function_end(text, start)
+            boundaries.append((start, 'function_start'))
+            boundaries.append((end, 'function_end'))
+    boundaries.sort()
+    chunks, current_chunk = [], ""
+    counter = IncrementalTokenCounter()
+    for pos, marker in boundaries:
+        segment = text[len(current_chunk):pos]
+        if current_chunk and counter.count > max_tokens:
+            if current_chunk.strip():
+                chunks.append(current_chunk.strip())
+            current_chunk = segment
+            counter.reset(segment)
+        else:
+            current_chunk += segment
+            counter.append(segment)
+        if marker == 'function_start':
+            func_text = text[pos:_legacy_find_function_end(text, pos)]
+            current_chunk += func_text
+            counter.append(func_text)
+    if current_chunk.strip():
+        chunks.append(current_chunk.strip())
+    return _ensure_hard_limit(chunks, max_tokens)
+
+
+def _timed(fn, *args):
+    clear_token_cache()
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def stress_code_chunking():
+    _, tokenizer_label = load_tokenizer()
+    print(f"Code chunking stress test (max_tokens={MAX_TOKENS}, tokenizer: {tokenizer_label})")
+    all_ok = True
+    for language, generate in (("python", python_source), ("javascript", javascript_source)):
+        print(f"\n{language}")
+        print("-" * 110)
+        sample = generate(int(LEGACY_SAMPLE_MB * 1_000_000))
+        _, legacy_s = _timed(legacy_chunk_by_code_structure, sample, MAX_TOKENS)
+        _, sample_s = _timed(chunk_code_text, sample, MAX_TOKENS)
+        print(f"{LEGACY_SAMPLE_MB} MB sample: legacy={legacy_s:.2f} s  single-pass={sample_s:.2f} s")
+        for size_mb in SIZES_MB:
+            text = generate(size_mb * 1_000_000)
+            (starts, _), scan_s = _timed(_scan_code_lines, text)
+            chunks, total_s = _timed(chunk_code_text, text, MAX_TOKENS)
+            over = sum(1 for n in count_tokens_batch(chunks) if n > MAX_TOKENS)
+            all_ok = all_ok and over == 0
+            print(f"{size_mb:>3} MB  lines={len(starts):>8,}  scan={scan_s:>6.2f} s "
+                  f"({size_mb / scan_s:>6.1f} MB/s)  chunk={total_s:>7.2f} s ({size_mb / total_s:>5.2f} MB/s)  "
+                  f"chunks={len(chunks):>6}  over_limit={over}")
+    print("\nSUCCESS: All chunks are within the hard limit." if all_ok
+          else "\nFAILED: One or more chunks exceeded the limit.")
+
+
+if __name__ == "__main__":
+    import logging
+    logging.disable(logging.WARNING)
+    stress_code_chunking()
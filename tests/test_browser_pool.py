@@ -0,0 +1,234 @@
+"""Tests for playwright_mcp.browser_pool - persistent browser and context pool.
+
+Runs Chromium against a local http.server fixture site; skipped when
+Playwright or its browser is not installed.
+"""
+
+import asyncio
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+pytest.importorskip("playwright.async_api")
+
+from playwright_mcp.browser_pool import BrowserPool, wait_for_settle
+
+PAGES = {
+    "/": "<html><body><h1>Static page</h1></body></html>",
+    "/late": """<html><body><div id="root">loading</div><script>
+        setTimeout(() => { document.getElementById('root').textContent = 'LATE CONTENT'; }, 300);
+    </script></body></html>""",
+    "/set-storage": """<html><body><script>
+        localStorage.setItem('token', 'secret');
+        const req = indexedDB.open('pooldb', 1);
+        req.onupgradeneeded = () => req.result.createObjectStore('kv');
+        req.onsuccess = () => {
+            const tx = req.result.transaction('kv', 'readwrite');
+            tx.objectStore('kv').put('secret', 'token');
+            tx.oncomplete = () => { document.title = 'stored'; };
+        };
+    </script></body></html>""",
+    "/echo-storage": """<html><body><script>
+        const local = localStorage.getItem('token');
+        indexedDB.databases().then(dbs => {
+            document.title = 'local=' + local + ' idb=' + dbs.map(d => d.name).join(',');
+        });
+    </script></body></html>""",
+    "/xhr": """<html><body><div id="root">loading</div><script>
+        fetch('/data').then(r => r.text()).then(t => { document.getElementById('root').textContent = t; });
+    </script></body></html>""",
+}
+
+
+class _FixtureSiteHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.active += 1
+            server.peak = max(server.peak, server.active)
+        try:
+            if self.path == "/data":
+                time.sleep(0.3)
+                self._send("XHR CONTENT", "text/plain")
+            elif self.path == "/slow":
+                time.sleep(0.3)
+                self._send(PAGES["/"])
+            elif self.path == "/set-cookie":
+                self._send(PAGES["/"], headers={"Set-Cookie": "session=abc; Path=/"})
+            elif self.path == "/echo-cookie":
+                self._send(f"<html><body>cookie={self.headers.get('Cookie', '')}</body></html>")
+            else:
+                self._send(PAGES.get(self.path, PAGES["/"]))
+        finally:
+            with server.lock:
+                server.active -= 1
+
+    def _send(self, body, content_type="text/html", headers=None):
+        data = body.encode()
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+
+@pytest.fixture(scope="module")
+def site():
+    """Local fixture site; tracks concurrent requests."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _FixtureSiteHandler)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.active = server.peak = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture(scope="module", autouse=True)
+def chromium_available():
+    """Skip the module when Chromium cannot be launched (browsers not installed)."""
+    async def _probe():
+        pool = BrowserPool(max_concurrent=1)
+        try:
+            async with pool.page():
+                pass
+        finally:
+            await pool.close()
+    try:
+        asyncio.run(_probe())
+    except Exception as e:
+        pytest.skip(f"Chromium not available: {e}")
+
+
+def _url(site, path):
+    return f"http://127.0.0.1:{site.server_address[1]}{path}"
+
+
+async def _visit(pool, url, detail_level="standard"):
+    async with pool.page() as page:
+        await page.goto(url, wait_until="domcontentloaded")
+        await wait_for_settle(page, detail_level)
+        return await page.content()
+
+
+def _with_pool(coro_fn, **kwargs):
+    async def _run():
+        pool = BrowserPool(**kwargs)
+        try:
+            return await coro_fn(pool), pool.get_stats()
+        finally:
+            await pool.close()
+    return asyncio.run(_run())
+
+
+class TestReuse:
+    """One browser serves many visits."""
+
+    def test_browser_launched_once(self, site):
+        async def _run(pool):
+            for _ in range(5):
+                assert "Static page" in await _visit(pool, _url(site, "/"), "basic")
+        _, stats = _with_pool(_run, max_concurrent=2)
+        assert stats["launches"] == 1
+        assert stats["contexts_created"] == 1
+        assert stats["pages"] == 5
+
+    def test_contexts_isolated_between_visits(self, site):
+        """Cookies set during one visit are gone on the next, even in a reused context."""
+        async def _run(pool):
+            await _visit(pool, _url(site, "/set-cookie"), "basic")
+            return await _visit(pool, _url(site, "/echo-cookie"), "basic")
+        html, stats = _with_pool(_run, max_concurrent=1)
+        assert "session=abc" not in html
+        assert stats["contexts_created"] == 1
+
+    def test_origin_storage_cleared_between_visits(self, site):
+        """localStorage and IndexedDB written by one visit are gone on the next in the same context."""
+        async def _run(pool):
+            async with pool.page() as page:
+                await page.goto(_url(site, "/set-storage"))
+                await page.wait_for_function("document.title === 'stored'")
+            async with pool.page() as page:
+                await page.goto(_url(site, "/echo-storage"))
+                await page.wait_for_function("document.title.startsWith('local=')")
+                return await page.title()
+        title, stats = _with_pool(_run, max_concurrent=1)
+        assert title == "local=null idb="
+        assert stats["contexts_created"] == 1
+        assert stats["storage_clears"] == 2
+
+
+class TestLimits:
+    """Concurrency cap and recycling."""
+
+    def test_concurrency_cap(self, site):
+        site.peak = 0
+
+        async def _run(pool):
+            await asyncio.gather(*(_visit(pool, _url(site, "/slow"), "basic") for _ in range(6)))
+        _, stats = _with_pool(_run, max_concurrent=2)
+        assert stats["peak_in_flight"] == 2
+        assert site.peak <= 2
+
+    def test_context_recycled_after_n_pages(self, site):
+        async def _run(pool):
+            for _ in range(5):
+                await _visit(pool, _url(site, "/"), "basic")
+        _, stats = _with_pool(_run, max_concurrent=1, context_max_pages=2)
+        assert stats["contexts_created"] == 3
+        assert stats["launches"] == 1
+
+    def test_browser_recycled_after_n_pages(self, site):
+        async def _run(pool):
+            await asyncio.gather(*(_visit(pool, _url(site, "/"), "basic") for _ in range(7)))
+        _, stats = _with_pool(_run, max_concurrent=3, browser_max_pages=3)
+        assert stats["recycles"] == 2
+        assert stats["launches"] == 3
+        assert stats["pages"] == 7
+
+    def test_memory_threshold_triggers_recycle(self, site):
+        async def _run(pool):
+            for _ in range(2):
+                await _visit(pool, _url(site, "/"), "basic")
+        _, stats = _with_pool(_run, max_concurrent=1, memory_limit_mb=1)
+        assert stats["recycles"] == 1
+
+    def test_memory_scan_is_throttled(self, site):
+        """The /proc scan runs on the first release, then every memory_check_every releases."""
+        async def _run(pool):
+            for _ in range(7):
+                await _visit(pool, _url(site, "/"), "basic")
+        _, stats = _with_pool(_run, max_concurrent=1, memory_limit_mb=10 ** 6,
+                              memory_check_every=3, memory_check_seconds=3600)
+        assert stats["memory_checks"] == 3
+
+
+class TestSettle:
+    """Network-idle/DOM-stability waits instead of fixed sleeps."""
+
+    @pytest.mark.parametrize("path,expected", [("/late", "LATE CONTENT"), ("/xhr", "XHR CONTENT")])
+    def test_waits_for_dynamic_content(self, site, path, expected):
+        async def _run(pool):
+            start = time.perf_counter()
+            html = await _visit(pool, _url(site, path), "standard")
+            return html, time.perf_counter() - start
+        (html, elapsed), _ = _with_pool(_run)
+        assert expected in html
+        assert elapsed < 2.0  # Old fixed settle sleep for standard pages
+
+    def test_static_page_settles_quickly(self, site):
+        async def _run(pool):
+            await _visit(pool, _url(site, "/"), "basic")  # Warm the browser
+            start = time.perf_counter()
+            await _visit(pool, _url(site, "/"), "deep")
+            return time.perf_counter() - start
+        elapsed, _ = _with_pool(_run)
+        assert elapsed < 5.0 / 2  # Old fixed settle sleep for deep pages was 5 s
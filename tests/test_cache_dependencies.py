@@ -0,0 +1,158 @@
+"""Tests for keyed, dependency-aware cache invalidation (cache_layer depends_on, db.update_message_content)."""
+
+import threading
+import uuid
+
+import pytest
+
+from backend.cache_layer import CachedDatabase, cache_layer
+from backend.db_wrapper import db
+
+
+def _cached(cache, table):
+    return set(cache._get_table(table).cache)
+
+
+class TestDependencyGraph:
+    """Invalidating a base row drops what was derived from it, and nothing else."""
+
+    def _full(self, cache, chat_id):
+        return cache.get("chats_full", chat_id, lambda: {"id": chat_id},
+                         depends_on=[("chats", chat_id), ("messages", f"chat:{chat_id}")])
+
+    def test_base_invalidation_cascades(self):
+        cache = CachedDatabase()
+        for cid in ("a", "b"):
+            self._full(cache, cid)
+        cache.invalidate("messages", "chat:a")
+        assert _cached(cache, "chats_full") == {"b"}
+        cache.invalidate("chats", "b")
+        assert _cached(cache, "chats_full") == set()
+        assert cache.get_stats()["cascaded_invalidations"] == 2
+
+    def test_uncached_base_still_cascades(self):
+        """Edges are keyed, so a base that was never cached still invalidates."""
+        cache = CachedDatabase()
+        self._full(cache, "a")
+        assert _cached(cache, "messages") == set()
+        cache.invalidate("messages", "chat:a")
+        assert _cached(cache, "chats_full") == set()
+
+    def test_transitive(self):
+        cache = CachedDatabase()
+        cache.get("mid", "m", lambda: 1, depends_on=[("base", "b")])
+        cache.get("top", "t", lambda: 2, depends_on=[("mid", "m")])
+        cache.invalidate("base", "b")
+        assert _cached(cache, "mid") == _cached(cache, "top") == set()
+
+    def test_cycles_terminate(self):
+        cache = CachedDatabase()
+        cache.get("t", "x", lambda: 1, depends_on=[("t", "y")])
+        cache.get("t", "y", lambda: 2, depends_on=[("t", "x")])
+        cache.invalidate("t", "x")
+        assert _cached(cache, "t") == set()
+
+    def test_table_and_predicate_invalidation_cascade(self):
+        cache = CachedDatabase()
+        self._full(cache, "a")
+        self._full(cache, "b")
+        cache.invalidate_where("messages", lambda rid: rid == "chat:a")
+        assert _cached(cache, "chats_full") == {"b"}
+        cache.invalidate("chats")
+        assert _cached(cache, "chats_full") == set()
+
+    def test_dependent_invalidation_leaves_base(self):
+        cache = CachedDatabase()
+        cache.get("chats", "a", lambda: "row")
+        self._full(cache, "a")
+        cache.invalidate("chats_full", "a")
+        assert _cached(cache, "chats") == {"a"}
+
+    def test_edges_dropped_with_row_state(self):
+        cache = CachedDatabase()
+        for i in range(50):
+            self._full(cache, f"c{i}")
+        assert cache.get_stats()["dependency_edges"] == 100
+        cache.invalidate("chats_full")
+        assert cache.get_stats()["dependency_edges"] == 0
+        cache.get("chats_full", "gone", lambda: None, depends_on=[("chats", "gone")])
+        assert cache.get_stats()["dependency_edges"] == 0
+
+    def test_base_write_during_derived_fetch(self):
+        """A derived fill in flight when its base changes is not cached."""
+        cache = CachedDatabase()
+        started, release = threading.Event(), threading.Event()
+
+        def slow():
+            started.set()
+            release.wait(5)
+            return "old"
+
+        reader = threading.Thread(target=cache.get, args=("chats_full", "a", slow),
+                                  kwargs={"depends_on": [("messages", "chat:a")]})
+        reader.start()
+        started.wait(5)
+        cache.invalidate("messages", "chat:a")
+        release.set()
+        reader.join(5)
+        assert _cached(cache, "chats_full") == set()
+
+
+class TestMessageUpdate:
+    """update_message_content only touches the edited chat."""
+
+    @pytest.fixture
+    def chats(self, temp_db):
+        ids = [f"test-{uuid.uuid4()}" for _ in range(3)]
+        for cid in ids:
+            db.ensure_chat_exists(cid)
+            db.add_messages_batch(cid, [{"role": "user", "content": f"{cid}-{i}"} for i in range(5)])
+        yield ids
+        for cid in ids:
+            db.delete_chat(cid)
+
+    def _warm(self, ids):
+        for cid in ids:
+            db.get_messages(cid)
+            db.get_chat_full(cid)
+            db.get_messages_page(cid, limit=2)
+
+    def test_other_chats_stay_cached(self, chats):
+        edited, *others = chats
+        self._warm(chats)
+        target = db.get_messages(edited)[3]
+        oldest_page = db.get_messages_page(edited, before_id=target["id"], limit=2)
+
+        db.update_message_content(target["id"], "reconciled")
+
+        messages = _cached(cache_layer, "messages")
+        full = _cached(cache_layer, "chats_full")
+        for cid in others:
+            assert f"chat:{cid}" in messages
+            assert f"page:{cid}:tail:2" in messages
+            assert cid in full
+        assert f"chat:{edited}" not in messages
+        assert edited not in full
+        assert f"page:{edited}:tail:2" not in messages
+        # Windows below the edited id are unaffected
+        assert f"page:{edited}:{target['id']}:2" in messages
+        assert db.get_messages_page(edited, before_id=target["id"], limit=2) == oldest_page
+
+    def test_reads_see_new_content(self, chats):
+        self._warm(chats)
+        target = db.get_messages(chats[0])[1]
+        db.update_message_content(target["id"], "reconciled")
+        assert db.get_messages(chats[0])[1]["content"] == "reconciled"
+        assert db.get_chat_full(chats[0])["messages"][1]["content"] == "reconciled"
+
+    def test_unknown_message_is_a_no_op(self, chats):
+        self._warm(chats)
+        before = _cached(cache_layer, "messages")
+        db.update_message_content(10 ** 12, "nothing")
+        assert _cached(cache_layer, "messages") == before
+
+    def test_message_write_drops_chat_full_via_dependency(self, chats):
+        self._warm(chats)
+        db.add_message(chats[0], "user", "new")
+        assert chats[0] not in _cached(cache_layer, "chats_full")
+        assert db.get_chat_full(chats[0])["messages"][-1]["content"] == "new"
@@ -0,0 +1,194 @@
+"""Tests for cache eviction - backend.cache_eviction policies and bounded CachedDatabase."""
+
+import threading
+import time
+import tracemalloc
+
+from backend.cache_eviction import LRUSizePolicy, UnboundedPolicy, approx_size
+from backend.cache_layer import CachedDatabase
+
+
+def _payload(i, size=1000):
+    return {"id": i, "content": "x" * size}
+
+
+class TestApproxSize:
+    """Sampled deep size estimate."""
+
+    def test_grows_with_content(self):
+        assert approx_size({"a": "x" * 10000}) > approx_size({"a": "x"}) + 9000
+
+    def test_sampled_list_close_to_full(self):
+        rows = [_payload(i, 100 + i % 50) for i in range(5000)]
+        exact = sum(approx_size(r) for r in rows) + approx_size([])
+        estimate = approx_size(rows)
+        assert abs(estimate - exact) / exact < 0.1
+
+    def test_nested_cycles_terminate(self):
+        a = []
+        a.append(a)
+        assert approx_size(a) > 0
+
+
+class TestLRUSizePolicy:
+    """Order and budget of victims."""
+
+    def test_least_recently_used_first(self):
+        policy = LRUSizePolicy(max_entries=2)
+        policy.insert("a", 1)
+        policy.insert("b", 1)
+        policy.access("a")
+        policy.insert("c", 1)
+        assert policy.pop_victim() == ("b", 1)
+        assert policy.pop_victim() is None
+
+    def test_byte_budget(self):
+        policy = LRUSizePolicy(max_bytes=100)
+        for key in "abcd":
+            policy.insert(key, 40)
+        victims = []
+        while (victim := policy.pop_victim()) is not None:
+            victims.append(victim[0])
+        assert victims == ["a", "b"]
+        assert policy.bytes == 80
+
+    def test_replace_updates_size(self):
+        policy = LRUSizePolicy()
+        policy.insert("a", 10)
+        policy.insert("a", 30)
+        assert policy.bytes == 30
+
+    def test_unbounded_never_evicts(self):
+        policy = UnboundedPolicy()
+        for i in range(1000):
+            policy.insert(i, 10 ** 6)
+        assert policy.pop_victim() is None
+
+
+class TestBoundedCache:
+    """CachedDatabase evicts to its policy's budget and reclaims row states."""
+
+    def test_entry_limit(self):
+        cache = CachedDatabase(policy=LRUSizePolicy(max_entries=3))
+        for i in range(5):
+            cache.get("chats", f"c{i}", lambda i=i: _payload(i))
+        assert set(cache._get_table("chats").cache) == {"c2", "c3", "c4"}
+        stats = cache.get_stats()
+        assert stats["evictions"] == 2
+        assert stats["total_rows"] == 3
+
+    def test_hit_refreshes_recency(self):
+        cache = CachedDatabase(policy=LRUSizePolicy(max_entries=2))
+        cache.get("chats", "a", lambda: 1)
+        cache.get("chats", "b", lambda: 2)
+        cache.get("chats", "a", lambda: 1)
+        cache.get("chats", "c", lambda: 3)
+        assert set(cache._get_table("chats").cache) == {"a", "c"}
+
+    def test_byte_budget_across_tables(self):
+        budget = 20 * approx_size(_payload(0))
+        cache = CachedDatabase(policy=LRUSizePolicy(max_bytes=budget))
+        for i in range(100):
+            cache.get("chats" if i % 2 else "messages", f"r{i}", lambda i=i: _payload(i))
+        stats = cache.get_stats()
+        assert stats["eviction"]["bytes"] <= budget
+        assert stats["total_rows"] == stats["eviction"]["entries"] == 20
+        assert stats["evicted_bytes"] > 0
+
+    def test_evicted_row_is_refetched(self):
+        cache = CachedDatabase(policy=LRUSizePolicy(max_entries=1))
+        calls = []
+        fetch = lambda: calls.append(1) or "data"
+        cache.get("chats", "a", fetch)
+        cache.get("chats", "b", lambda: "other")
+        assert cache.get("chats", "a", fetch) == "data"
+        assert len(calls) == 2
+
+    def test_set_and_update_are_accounted(self):
+        cache = CachedDatabase(policy=LRUSizePolicy(max_entries=2))
+        cache.set("messages", "a", [1])
+        cache.set("messages", "b", [2])
+        assert cache.update("messages", "a", lambda v: v + [3])  # a becomes most recent
+        cache.set("messages", "c", [4])
+        assert set(cache._get_table("messages").cache) == {"a", "c"}
+
+    def test_row_locks_reclaimed(self):
+        cache = CachedDatabase(policy=LRUSizePolicy(max_entries=10))
+        for i in range(500):
+            cache.get("chats", f"r{i}", lambda i=i: i if i % 2 else None)  # Misses leave no entry
+        stats = cache.get_stats()
+        assert stats["row_locks"] <= 10
+        assert stats["row_locks_reclaimed"] >= 490
+
+    def test_invalidate_reclaims(self):
+        cache = CachedDatabase(policy=LRUSizePolicy())
+        cache.get("chats", "a", lambda: 1)
+        cache.invalidate("chats", "a")
+        cache.get("messages", "b", lambda: 2)
+        cache.invalidate("messages")
+        stats = cache.get_stats()
+        assert stats["row_locks"] == 0
+        assert stats["eviction"]["entries"] == 0
+
+    def test_expired_entry_dropped_on_read(self):
+        cache = CachedDatabase()
+        cache.get("chats", "a", lambda: "old", ttl=60)
+        cache._get_table("chats").cache["a"]["ttl"] = time.time() - 1
+        assert cache.get("chats", "a", lambda: "new", ttl=60) == "new"
+        assert cache.get_stats()["expired"] == 1
+
+    def test_pinned_row_state_survives_invalidation(self):
+        """A row in use by a slow fetch keeps one RowState for every thread."""
+        cache = CachedDatabase()
+        started, release = threading.Event(), threading.Event()
+
+        def slow_fetch():
+            started.set()
+            release.wait(5)
+            return "data"
+
+        reader = threading.Thread(target=cache.get, args=("chats", "a", slow_fetch))
+        reader.start()
+        started.wait(5)
+        state = cache._peek_row("chats", "a")
+        cache.invalidate("chats", "a")
+        assert cache._peek_row("chats", "a") is state
+        release.set()
+        reader.join(5)
+        # The fetch was invalidated mid-flight, so nothing was cached and the state is freed
+        assert cache._peek_row("chats", "a") is None
+        cache.get("chats", "a", lambda: "fresh")
+        state = cache._peek_row("chats", "a")
+        assert state is not None  # Cached now, so still held
+        cache.invalidate("chats", "a")
+        assert cache._peek_row("chats", "a") is None
+
+
+class TestSoak:
+    """Traced memory plateaus under churn through many distinct rows."""
+
+    def _churn(self, cache, rounds=5, per_round=1000):
+        traced = []
+        tracemalloc.start()
+        try:
+            for r in range(rounds):
+                for i in range(per_round):
+                    key = f"chat-{r}-{i}"
+                    cache.get("messages", key, lambda: [_payload(j, 400) for j in range(5)])
+                traced.append(tracemalloc.get_traced_memory()[0])
+        finally:
+            tracemalloc.stop()
+        return traced
+
+    def test_bounded_cache_plateaus(self):
+        budget_mb = 1
+        cache = CachedDatabase(policy=LRUSizePolicy(max_bytes=budget_mb * 1024 * 1024))
+        traced = self._churn(cache)
+        # Full after round one; later rounds only replace entries
+        assert max(traced[1:]) < traced[0] * 1.15
+        assert cache.get_stats()["row_locks"] == cache.get_stats()["total_rows"]
+
+    def test_unbounded_cache_grows(self):
+        """Control: without a budget every round adds its rows."""
+        traced = self._churn(CachedDatabase(policy=UnboundedPolicy()))
+        assert traced[-1] > traced[0] * 4
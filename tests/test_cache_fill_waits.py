@@ -0,0 +1,234 @@
+"""Tests for event-driven waits in backend.cache_layer - single-flight fills and WAL flush wake-ups."""
+
+import threading
+import time
+
+import pytest
+
+from backend.cache_layer import CachedDatabase
+
+
+def _start_blocked_fetch(cache, row_id="a", result="data"):
+    """Start a reader whose fetch blocks until release is set."""
+    started, release = threading.Event(), threading.Event()
+    results = []
+
+    def fetch():
+        started.set()
+        release.wait(5)
+        return result
+
+    reader = threading.Thread(target=lambda: results.append(cache.get("chats", row_id, fetch)))
+    reader.start()
+    assert started.wait(5)
+    return reader, release, results
+
+
+class TestSingleFlight:
+    """Concurrent misses on one row share a single fetch."""
+
+    def test_concurrent_misses_fetch_once(self):
+        cache = CachedDatabase()
+        calls = []
+        gate = threading.Event()
+
+        def fetch():
+            calls.append(1)
+            gate.wait(5)
+            return "data"
+
+        results = []
+        readers = [threading.Thread(target=lambda: results.append(cache.get("chats", "hot", fetch)))
+                   for _ in range(20)]
+        for t in readers:
+            t.start()
+        time.sleep(0.05)
+        gate.set()
+        for t in readers:
+            t.join(5)
+        assert results == ["data"] * 20
+        assert len(calls) == 1
+        assert cache.get_stats()["coalesced_reads"] >= 1
+
+    def test_waiters_wake_on_fill_not_on_interval(self):
+        cache = CachedDatabase()
+        reader, release, _ = _start_blocked_fetch(cache)
+        returned_at = []
+
+        def waiter():
+            cache.get("chats", "a", lambda: "unused")
+            returned_at.append(time.perf_counter())
+
+        t = threading.Thread(target=waiter)
+        t.start()
+        time.sleep(0.02)
+        released_at = time.perf_counter()
+        release.set()
+        t.join(5)
+        reader.join(5)
+        # Woken by the fill itself, well inside one 100 ms polling interval
+        assert returned_at[0] - released_at < 0.05
+
+    def test_none_result_is_shared_and_not_cached(self):
+        cache = CachedDatabase()
+        reader, release, results = _start_blocked_fetch(cache, result=None)
+        calls = []
+        t = threading.Thread(target=lambda: results.append(
+            cache.get("chats", "a", lambda: calls.append(1))))
+        t.start()
+        time.sleep(0.02)
+        release.set()
+        reader.join(5)
+        t.join(5)
+        assert results == [None, None]
+        assert calls == []
+        assert "a" not in cache._get_table("chats").cache
+
+    def test_failed_fill_lets_waiter_fetch(self):
+        cache = CachedDatabase()
+        started, release = threading.Event(), threading.Event()
+
+        def failing():
+            started.set()
+            release.wait(5)
+            raise RuntimeError("db down")
+
+        errors = []
+
+        def first():
+            try:
+                cache.get("chats", "a", failing)
+            except RuntimeError as e:
+                errors.append(e)
+
+        t1 = threading.Thread(target=first)
+        t1.start()
+        started.wait(5)
+        results = []
+        t2 = threading.Thread(target=lambda: results.append(cache.get("chats", "a", lambda: "fresh")))
+        t2.start()
+        time.sleep(0.02)
+        release.set()
+        t1.join(5)
+        t2.join(5)
+        assert len(errors) == 1
+        assert results == ["fresh"]
+        assert cache._get_table("chats").cache["a"]["data"] == "fresh"
+
+
+class TestInvalidationDuringFill:
+    """A write during a fetch keeps the stale result out of the cache."""
+
+    @pytest.mark.parametrize("invalidate", [
+        lambda c: c.invalidate("chats", "a"),
+        lambda c: c.invalidate("chats"),
+        lambda c: c.invalidate_where("chats", lambda rid: rid == "a"),
+        lambda c: c.invalidate_with_ttl("chats", "a"),
+    ])
+    def test_stale_fill_not_cached(self, invalidate):
+        cache = CachedDatabase()
+        reader, release, results = _start_blocked_fetch(cache, result="old")
+        invalidate(cache)
+        release.set()
+        reader.join(5)
+        assert results == ["old"]
+        assert "a" not in cache._get_table("chats").cache
+        assert cache.get("chats", "a", lambda: "new") == "new"
+
+    def test_reader_after_invalidation_does_not_join_stale_fill(self):
+        cache = CachedDatabase()
+        reader, release, _ = _start_blocked_fetch(cache, result="old")
+        cache.invalidate("chats", "a")
+        assert cache.get("chats", "a", lambda: "new") == "new"
+        release.set()
+        reader.join(5)
+        assert cache.get("chats", "a", lambda: "unused") == "new"
+
+    def test_timed_out_reader_fill_invalidated_is_not_cached(self):
+        """A reader that stopped waiting and fetched itself is detached by invalidation too."""
+        cache = CachedDatabase()
+        slow, release_slow, _ = _start_blocked_fetch(cache, result="slow")
+        started, release = threading.Event(), threading.Event()
+
+        def fetch():
+            started.set()
+            release.wait(5)
+            return "old"
+
+        results = []
+        reader = threading.Thread(target=lambda: results.append(cache.get("chats", "a", fetch, max_wait=0.05)))
+        reader.start()
+        assert started.wait(5)
+        cache.invalidate("chats", "a")
+        release.set()
+        reader.join(5)
+        release_slow.set()
+        slow.join(5)
+        assert results == ["old"]
+        assert "a" not in cache._get_table("chats").cache
+
+    def test_set_during_fill_wins(self):
+        """A write-through set() detaches the fill that read before it."""
+        cache = CachedDatabase()
+        reader, release, results = _start_blocked_fetch(cache, result="old")
+        cache.set("chats", "a", "new")
+        release.set()
+        reader.join(5)
+        assert results == ["old"]
+        assert cache.get("chats", "a", lambda: "unused") == "new"
+
+    def test_slow_fill_does_not_overwrite_takeover(self):
+        """Once a timed-out reader took over, the slow fill's late result is not cached."""
+        cache = CachedDatabase()
+        slow, release_slow, _ = _start_blocked_fetch(cache, result="slow")
+        assert cache.get("chats", "a", lambda: "fresh", max_wait=0.05) == "fresh"
+        release_slow.set()
+        slow.join(5)
+        assert cache._get_table("chats").cache["a"]["data"] == "fresh"
+
+
+class TestWalWaits:
+    """Readers blocked on a WAL flush wake when it completes."""
+
+    def _slow_flush(self, cache, table, row_id=None, duration=0.03):
+        cache.register_flush_callback(table, lambda: time.sleep(duration))
+        if row_id is None:
+            target = lambda: cache._flush_table_wal(table, cache._get_table(table))
+        else:
+            def target():
+                with cache._using_row(table, row_id) as (_, row):
+                    cache._flush_row_wal(table, row, row_id)
+        flusher = threading.Thread(target=target)
+        flusher.start()
+        return flusher
+
+    def test_row_wal_wait_returns_promptly(self):
+        cache = CachedDatabase()
+        flusher = self._slow_flush(cache, "messages", "chat:1")
+        time.sleep(0.005)
+        start = time.perf_counter()
+        assert cache.wait_for_row_wal("messages", "chat:1", timeout=5)
+        waited = time.perf_counter() - start
+        flusher.join(5)
+        assert waited < 0.09  # 30 ms flush; a 100 ms poll would overshoot
+
+    def test_table_wal_wait_returns_promptly(self):
+        cache = CachedDatabase()
+        flusher = self._slow_flush(cache, "messages")
+        time.sleep(0.005)
+        start = time.perf_counter()
+        assert cache.wait_for_table_wal("messages", timeout=5)
+        assert time.perf_counter() - start < 0.09
+        flusher.join(5)
+
+    def test_wait_times_out(self):
+        cache = CachedDatabase()
+        with cache._using_row("messages", "chat:1") as (_, row):
+            row.wal_pending += 1
+            assert not cache.wait_for_row_wal("messages", "chat:1", timeout=0.05)
+            row.wal_pending -= 1
+
+    def test_unknown_row_does_not_wait(self):
+        cache = CachedDatabase()
+        assert cache.wait_for_row_wal("messages", "nope", timeout=5)
+        assert cache._peek_row("messages", "nope") is None
@@ -0,0 +1,167 @@
+"""Tests for RAGManager.chunk_text - single-encode, boundary-aware token chunking."""
+
+import os
+
+import pytest
+from tokenizers import Tokenizer, decoders, models, pre_tokenizers, trainers
+from transformers import PreTrainedTokenizerFast
+
+import backend.rag as rag_module
+import backend.token_counter as token_counter
+from backend.rag import RAGManager
+from backend.token_counter import clear_token_cache
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.path.join(REPO_ROOT, "tests", "test_rag_data")
+
+
+class _CountingTokenizer:
+    """Wraps a fast tokenizer and counts the characters it is asked to encode."""
+
+    def __init__(self, tokenizer):
+        self._tokenizer = tokenizer
+        self.chars = 0
+
+    def __call__(self, text, **kwargs):
+        self.chars += len(text) if isinstance(text, str) else sum(len(t) for t in text)
+        return self._tokenizer(text, **kwargs)
+
+    def encode(self, text, **kwargs):
+        self.chars += len(text)
+        return self._tokenizer.encode(text, **kwargs)
+
+    @property
+    def backend_tokenizer(self):
+        return _CountingBackend(self, self._tokenizer.backend_tokenizer)
+
+    def __getattr__(self, name):
+        return getattr(self._tokenizer, name)
+
+
+class _CountingBackend:
+    def __init__(self, owner, backend):
+        self._owner = owner
+        self._backend = backend
+
+    def encode_batch(self, texts, **kwargs):
+        self._owner.chars += sum(len(t) for t in texts)
+        return self._backend.encode_batch(texts, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._backend, name)
+
+
+@pytest.fixture(scope="module")
+def local_tokenizer():
+    """A small byte-level BPE trained on repo sources (no network needed)."""
+    with open(os.path.join(REPO_ROOT, "backend", "chunking.py"), encoding="utf-8") as f:
+        corpus = f.read().split("\n")
+    tok = Tokenizer(models.BPE(unk_token="[UNK]"))
+    tok.pre_tokenizer = pre_tokenizers.ByteLevel(add_prefix_space=False)
+    tok.decoder = decoders.ByteLevel()
+    tok.train_from_iterator(corpus, trainers.BpeTrainer(
+        vocab_size=2000, special_tokens=["[UNK]"],
+        initial_alphabet=pre_tokenizers.ByteLevel.alphabet()))
+    return PreTrainedTokenizerFast(tokenizer_object=tok)
+
+
+@pytest.fixture(autouse=True)
+def tokenizer(local_tokenizer, monkeypatch):
+    """Route token_counter through a counting wrapper with an empty cache."""
+    wrapper = _CountingTokenizer(local_tokenizer)
+    monkeypatch.setattr(token_counter, "_tokenizer", wrapper)
+    clear_token_cache()
+    yield wrapper
+    clear_token_cache()
+
+
+@pytest.fixture
+def manager():
+    return object.__new__(RAGManager)
+
+
+def _tokens(tokenizer, text):
+    return len(tokenizer._tokenizer.encode(text, add_special_tokens=False))
+
+
+def _squash(text):
+    return "".join(text.split())
+
+
+def _corpus(prefix, limit=4):
+    names = sorted(n for n in os.listdir(DATA_DIR) if n.startswith(prefix))[:limit]
+    out = []
+    for name in names:
+        with open(os.path.join(DATA_DIR, name), encoding="utf-8", errors="replace") as f:
+            out.append(f.read())
+    return out
+
+
+class TestHardLimit:
+    """No chunk exceeds max_tokens and no content is dropped."""
+
+    @pytest.mark.parametrize("prefix", ["pdf", "code", "mixed"])
+    @pytest.mark.parametrize("max_tokens", [64, 512])
+    def test_rag_data_within_limit(self, manager, tokenizer, prefix, max_tokens):
+        for text in _corpus(prefix):
+            chunks = manager.chunk_text(text, max_tokens=max_tokens)
+            assert all(_tokens(tokenizer, c) <= max_tokens for c in chunks)
+            assert _squash("".join(chunks)) == _squash(text)
+
+    def test_monolithic_word(self, manager, tokenizer):
+        text = "A" * 26000
+        chunks = manager.chunk_text(text, max_tokens=100)
+        assert len(chunks) > 1
+        assert all(_tokens(tokenizer, c) <= 100 for c in chunks)
+        assert "".join(chunks) == text
+
+    def test_unicode(self, manager, tokenizer):
+        text = " ".join(["naïve café 東京 🚀 résumé"] * 400)
+        chunks = manager.chunk_text(text, max_tokens=50)
+        assert all(_tokens(tokenizer, c) <= 50 for c in chunks)
+        assert _squash("".join(chunks)) == _squash(text)
+
+    def test_small_and_empty(self, manager):
+        assert manager.chunk_text("short text", max_tokens=100) == ["short text"]
+        assert manager.chunk_text("", max_tokens=100) == []
+        assert manager.chunk_text("   ", max_tokens=100) == ["   "]
+
+
+class TestBoundaries:
+    """Cuts land on paragraph, then sentence, then word breaks."""
+
+    def test_paragraphs_kept_whole(self, manager, tokenizer):
+        paragraphs = [f"Paragraph {i} talks about topic {i} in a few words." for i in range(60)]
+        chunks = manager.chunk_text("\n\n".join(paragraphs), max_tokens=80)
+        assert len(chunks) > 1
+        for chunk in chunks:
+            assert all(part in paragraphs for part in chunk.split("\n\n"))
+
+    def test_sentences_kept_whole(self, manager):
+        sentences = [f"Sentence number {i} is here." for i in range(80)]
+        chunks = manager.chunk_text(" ".join(sentences), max_tokens=40)
+        assert len(chunks) > 1
+        for chunk in chunks:
+            assert chunk.endswith(".")
+
+    def test_words_kept_whole(self, manager):
+        words = [f"word{i}" for i in range(500)]
+        chunks = manager.chunk_text(" ".join(words), max_tokens=30)
+        for chunk in chunks:
+            assert all(w in words for w in chunk.split())
+
+
+class TestSinglePass:
+    """The document is encoded once; chunks are validated in one batch."""
+
+    def test_tokenizer_sees_each_byte_about_twice(self, manager, tokenizer):
+        text = "\n\n".join(_corpus("pdf"))
+        tokenizer.chars = 0
+        manager.chunk_text(text, max_tokens=256)
+        assert tokenizer.chars <= 2.05 * len(text)
+
+    def test_slow_tokenizer_fallback(self, manager, tokenizer, monkeypatch):
+        monkeypatch.setattr(rag_module, "encode_offsets", lambda text: None)
+        text = "\n\n".join(_corpus("mixed", limit=1))
+        chunks = manager.chunk_text(text, max_tokens=128)
+        assert all(_tokens(tokenizer, c) <= 128 for c in chunks)
@@ -0,0 +1,152 @@
+"""Tests for the single-pass classifier engine behind chunking.detect_file_type."""
+
+import os
+import random
+import re
+import time
+
+import pytest
+
+from backend import config
+from backend.chunking import (
+    _analyze_code_content,
+    _analyze_document_content,
+    _classifier_windows,
+    _is_spreadsheet_pattern,
+    detect_file_type,
+)
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "test_rag_data")
+
+# The per-pattern regex scoring the engine replaced, kept as the reference
+LEGACY_CODE_PATTERNS = {
+    'function_def': (r'\b(def|func|function|pub fn|sub|private|public)\s+\w+', 3.0),
+    'type_annotation': (r':\s*(?:[A-Z][a-zA-Z_]*|int|str|bool|float|void|string|double|long|List|Dict|Set|Tuple)\b', 2.0),
+    'import_stmt': (r'\b(import|include|using|require|from)\b', 2.0),
+    'control_flow': (r'\b(if|else|elif|for|while|switch|case|when)\b', 1.5),
+    'syntax_markers': (r'[{}()\[\];:=><>]', 1.0),
+    'class_def': (r'\b(class|struct|interface|trait|enum)\s+\w+', 2.5),
+    'decorator': (r'@\w+\s*\(', 2.0),
+    'arrow_func': (r'=>', 2.0),
+    'typed_assignment': (r'(var|let|const|val|var)\s+\w+\s*[:=]', 1.5),
+    'return_stmt': (r'\b(return)\b', 1.0),
+}
+LEGACY_COMMON_WORDS = [
+    'the', 'a', 'an', 'is', 'are', 'was', 'were', 'be', 'been', 'have', 'has', 'had', 'do', 'does',
+    'did', 'will', 'would', 'could', 'should', 'may', 'might', 'must', 'shall', 'can', 'this', 'that',
+    'these', 'those', 'i', 'you', 'he', 'she', 'it', 'we', 'they', 'what', 'which', 'who', 'whom',
+    'whose', 'where', 'when', 'why', 'how', 'all', 'each', 'every', 'both', 'few', 'more', 'most',
+    'other', 'some', 'such', 'no', 'nor', 'not', 'only', 'own', 'same', 'so', 'than', 'too', 'very',
+    'can', 'just', 'now', 'about', 'after', 'before', 'between', 'into', 'through', 'during', 'before',
+    'after', 'above', 'below', 'up', 'down', 'out', 'off', 'over', 'under', 'again', 'further', 'then',
+    'once', 'here', 'there', 'any', 'while',
+]
+
+
+def legacy_code_score(content):
+    matches = {name: len(re.findall(p, content, re.IGNORECASE)) for name, (p, _) in LEGACY_CODE_PATTERNS.items()}
+    score = sum(matches[name] * w for name, (_, w) in LEGACY_CODE_PATTERNS.items())
+    return score / max(len(re.findall(r'\b\w+\b', content)), 10) * 100, matches
+
+
+def legacy_document_score(content):
+    words = re.findall(r'\b\w+\b', content.lower())
+    common = sum(1 for w in words if w in LEGACY_COMMON_WORDS)
+    avg_sentence_len = len(words) / max(len(re.split(r'[.!?]+', content)), 1)
+    avg_paragraph_len = len(content) / max(len(content.split('\n\n')), 1)
+    return (min(common / max(len(words), 1), 1.0) * 0.4
+            + min(max(10, min(25, avg_sentence_len)) / 25, 1.0) * 0.3
+            + min(max(50, min(500, avg_paragraph_len)) / 500, 1.0) * 0.3)
+
+
+def legacy_label(content):
+    code, _ = legacy_code_score(content)
+    doc = legacy_document_score(content)
+    if code >= config.CLASSIFIER_CODE_THRESHOLD and doc >= config.CLASSIFIER_DOC_THRESHOLD:
+        return 'mixed'
+    return 'code' if code >= config.CLASSIFIER_CODE_THRESHOLD else 'document'
+
+
+@pytest.fixture(scope="module")
+def corpus():
+    docs = {}
+    for name in sorted(os.listdir(DATA_DIR)):
+        path = os.path.join(DATA_DIR, name)
+        if os.path.isfile(path) and name.endswith(".txt"):
+            with open(path) as f:
+                docs[name] = f.read()
+    return docs
+
+
+@pytest.fixture(scope="module")
+def legacy_labels(corpus):
+    return {name: legacy_label(text) for name, text in corpus.items()}
+
+
+class TestLegacyParity:
+    """Single-pass counts equal the per-pattern regex counts."""
+
+    def test_corpus_labels_and_scores(self, corpus, legacy_labels):
+        for name, text in corpus.items():
+            assert detect_file_type(name, text)[0] == legacy_labels[name], name
+            score, matches = _analyze_code_content(text)
+            legacy_score, legacy_matches = legacy_code_score(text)
+            assert matches == legacy_matches, name
+            assert score == pytest.approx(legacy_score)
+            assert _analyze_document_content(text) == pytest.approx(legacy_document_score(text))
+
+    def test_random_token_soup(self):
+        # Exercises overlaps: "private function f" counts once, "xval y =" matches,
+        # "@a (" is a decorator, "=>" is also two syntax markers, runs of "?!" end one sentence
+        pieces = ['def', 'pub fn', 'pub', 'fn', 'private', 'function', 'class', 'struct', 'let', 'xval',
+                  'const', ':', '::', '=', '=>', '>', '(', '@', '.', '!?', '\n', '\n\n', ' ', '\t', 'int',
+                  'Foo', 'foo_1', 'é', 'Return', 'IMPORT', 'the', 'a', '{', ';', '_A', 'A_']
+        rng = random.Random(7)
+        for _ in range(2000):
+            text = "".join(rng.choice(pieces) + rng.choice(["", " ", "\n"]) for _ in range(rng.randint(1, 25)))
+            assert _analyze_code_content(text)[1] == legacy_code_score(text)[1], repr(text)
+            assert _analyze_document_content(text) == pytest.approx(legacy_document_score(text)), repr(text)
+
+    @pytest.mark.parametrize("budget", [16384, 65536])
+    def test_sampled_corpus_labels_unchanged(self, corpus, legacy_labels, monkeypatch, budget):
+        monkeypatch.setattr(config, "CLASSIFIER_SAMPLE_CHARS", budget)
+        for name, text in corpus.items():
+            assert detect_file_type(name, text)[0] == legacy_labels[name], name
+
+
+class TestBoundedCost:
+    """Large uploads are classified from a fixed budget of line-aligned windows."""
+
+    def test_small_content_read_whole(self):
+        assert _classifier_windows("short text\n") == [(0, 11)]
+
+    def test_windows_within_budget_and_line_aligned(self, monkeypatch):
+        monkeypatch.setattr(config, "CLASSIFIER_SAMPLE_CHARS", 4096)
+        text = "".join(f"line {i} of the upload\n" for i in range(50000))
+        spans = _classifier_windows(text)
+        assert len(spans) == config.CLASSIFIER_SAMPLE_WINDOWS
+        assert spans[0][0] == 0 and spans[-1][1] == len(text)
+        assert sum(end - start for start, end in spans) <= 4096
+        for start, end in spans:
+            assert start == 0 or text[start - 1] == "\n"
+            assert end == len(text) or text[end] == "\n"
+
+    def test_cost_independent_of_upload_size(self):
+        unit = "def handler(x: int) -> int:\n    return x + 1  # the value is returned\n\n"
+        small, large = unit * 2000, unit * 200000  # ~150 KB and ~15 MB
+
+        def _time(text):
+            start = time.perf_counter()
+            label, _ = detect_file_type("big.py", text)
+            return time.perf_counter() - start, label
+
+        small_s, small_label = _time(small)
+        large_s, large_label = _time(large)
+        assert large_label == small_label
+        assert large_s < 10 * max(small_s, 0.01)
+
+    def test_spreadsheet_check_reads_head_only(self):
+        csv = "id,name,score\n" + "".join(f"{i},user{i},{i % 100}\n" for i in range(200000))
+        assert _is_spreadsheet_pattern(csv)
+        assert not _is_spreadsheet_pattern("  \n\n  ")
+        assert not _is_spreadsheet_pattern("a,b,c\n\n")
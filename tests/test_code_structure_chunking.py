@@ -0,0 +1,188 @@
+"""Tests for chunking._chunk_by_code_structure - single-pass structural scanner for code."""
+
+import os
+import time
+
+import pytest
+from tokenizers import Tokenizer, decoders, models, pre_tokenizers, trainers
+from transformers import PreTrainedTokenizerFast
+
+import backend.token_counter as token_counter
+from backend.chunking import _chunk_by_code_structure, _scan_code_lines, chunk_code_text
+from backend.token_counter import clear_token_cache, count_tokens
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture(scope="module")
+def local_tokenizer():
+    """A small byte-level BPE trained on repo sources (no network needed)."""
+    with open(os.path.join(REPO_ROOT, "backend", "chunking.py"), encoding="utf-8") as f:
+        corpus = f.read().split("\n")
+    tok = Tokenizer(models.BPE(unk_token="[UNK]"))
+    tok.pre_tokenizer = pre_tokenizers.ByteLevel(add_prefix_space=False)
+    tok.decoder = decoders.ByteLevel()
+    tok.train_from_iterator(corpus, trainers.BpeTrainer(
+        vocab_size=2000, special_tokens=["[UNK]"],
+        initial_alphabet=pre_tokenizers.ByteLevel.alphabet()))
+    return PreTrainedTokenizerFast(tokenizer_object=tok)
+
+
+@pytest.fixture(autouse=True)
+def use_local_tokenizer(local_tokenizer, monkeypatch):
+    monkeypatch.setattr(token_counter, "_tokenizer", local_tokenizer)
+    clear_token_cache()
+    yield
+    clear_token_cache()
+
+
+def _levels(code, language=None):
+    starts, levels = _scan_code_lines(code, language)
+    return {code[s:code.find("\n", s) if code.find("\n", s) >= 0 else len(code)].strip(): lv
+            for s, lv in zip(starts, levels)}
+
+
+def _squash(text):
+    return "".join(text.split())
+
+
+def _python_module(functions):
+    return "\n\n".join(
+        f"def func_{i}(a, b):\n    '''Docstring {i} with {{ brace.'''\n"
+        f"    total = a + b * {i}\n    return {{'value': total, 'index': {i}}}\n"
+        for i in range(functions)
+    )
+
+
+def _js_module(functions):
+    return "\n\n".join(
+        f"function handler{i}(req, res) {{\n  const s = \"}} not a brace {i}\";\n"
+        f"  // comment with {{\n  if (req.ok) {{\n    res.send(s);\n  }}\n}}"
+        for i in range(functions)
+    )
+
+
+class TestScanner:
+    """One pass tracks brackets, strings, comments and indentation."""
+
+    def test_brackets_in_strings_and_comments_ignored(self):
+        code = 'x = "{"\n# {\n/* { */\ny = 1\n'
+        assert _levels(code)["y = 1"] == 0
+
+    def test_multiline_string_and_comment_lines_are_not_cut_points(self):
+        levels = _levels('a = 1\ns = """\ninside\n"""\n/*\nstill\n*/\nb = 2\n')
+        assert levels["inside"] is None
+        assert levels["still"] is None
+        assert levels["b = 2"] == 0
+
+    def test_nesting_levels(self):
+        levels = _levels("class A:\n    def m(self):\n        return [\n            1,\n        ]\n")
+        assert levels["class A:"] == 0
+        assert levels["def m(self):"] == 1
+        assert levels["return ["] == 2
+        assert levels["1,"] == 3
+        assert levels["]"] == -1
+
+    def test_brace_depth(self):
+        levels = _levels("int f() {\nif (x) {\ny();\n}\n}\nint g();\n")
+        assert levels["if (x) {"] == 1
+        assert levels["y();"] == 2
+        assert levels["int g();"] == 0
+
+    def test_decorator_stays_with_definition(self):
+        levels = _levels("@app.route('/')\ndef index():\n    pass\n")
+        assert levels["@app.route('/')"] == 0
+        assert levels["def index():"] == -1
+
+    def test_escaped_quotes(self):
+        code = 's = "a \\" { b"\nt = 1\n'
+        assert _levels(code)["t = 1"] == 0
+
+
+class TestCommentSyntax:
+    """Comment markers follow the language, so operators are not read as comments."""
+
+    FLOOR_DIVISION = "def a(x):\n    return (x // 2)\n\n\ndef b():\n    pass\n\n\nclass C:\n    pass\n"
+
+    @pytest.mark.parametrize("language", [None, "python", "module.py"])
+    def test_python_floor_division_is_not_a_comment(self, language):
+        levels = _levels(self.FLOOR_DIVISION, language)
+        assert levels["def b():"] == 0
+        assert levels["class C:"] == 0
+
+    @pytest.mark.parametrize("language", ["javascript", "widget.ts"])
+    def test_js_private_field_is_not_a_comment(self, language):
+        code = "class A {\n  #count = (0);\n  #items = [\n  ];\n}\nfunction b() {\n}\n"
+        levels = _levels(code, language)
+        assert levels["function b() {"] == 0
+
+    @pytest.mark.parametrize("language", ["rust", "lib.rs"])
+    def test_rust_lifetimes_and_labels_are_not_strings(self, language):
+        code = ("fn first<'a>(v: &'a [u8]) -> u8 { v[0] }\n"
+                "fn run() {\n'outer: loop { break 'outer; }\nlet c = '{';\nlet q = '\\'';\n}\n"
+                "fn last() {\n}\n")
+        levels = _levels(code, language)
+        assert levels["fn run() {"] == 0
+        assert levels["let c = '{';"] == 1
+        assert levels["fn last() {"] == 0
+
+    def test_scala_symbol_is_not_a_string(self):
+        levels = _levels("val s = f('sym, (1))\nobject B {\n}\n", "scala")
+        assert levels["object B {"] == 0
+
+    def test_unknown_language_hash_before_name_is_code(self):
+        levels = _levels("#include <x.h>\n#define F(x) (x\nint g();\n# a { comment\nint h();\n")
+        assert levels["int g();"] == 1
+        assert levels["int h();"] == 1
+
+
+class TestChunking:
+    """Chunks end at the shallowest boundary and never exceed max_tokens."""
+
+    @pytest.mark.parametrize("module,prefix", [(_python_module, "def func_"), (_js_module, "function handler")])
+    def test_chunks_start_at_definitions(self, module, prefix):
+        code = module(60)
+        chunks = _chunk_by_code_structure(code, max_tokens=200)
+        assert len(chunks) > 1
+        assert all(c.startswith(prefix) for c in chunks)
+        assert all(count_tokens(c) <= 200 for c in chunks)
+        assert _squash("".join(chunks)) == _squash(code)
+
+    def test_large_definition_split_at_members(self):
+        methods = "\n".join(f"    def method_{i}(self):\n        return {i} * {i}\n" for i in range(80))
+        code = f"class Big:\n{methods}"
+        chunks = _chunk_by_code_structure(code, max_tokens=150)
+        assert len(chunks) > 1
+        assert all(c.startswith(("class Big:", "def method_")) for c in chunks)
+        assert _squash("".join(chunks)) == _squash(code)
+
+    def test_oversized_line_hard_split(self):
+        code = "x = 1\n" + "y = '" + "a" * 5000 + "'\nz = 2\n"
+        chunks = chunk_code_text(code, max_tokens=100)
+        assert all(count_tokens(c) <= 100 for c in chunks)
+        assert _squash("".join(chunks)) == _squash(code)
+
+    def test_repo_source(self):
+        with open(os.path.join(REPO_ROOT, "backend", "rag.py"), encoding="utf-8") as f:
+            code = f.read()
+        chunks = chunk_code_text(code, max_tokens=400)
+        assert all(count_tokens(c) <= 400 for c in chunks)
+        assert _squash("".join(chunks)) == _squash(code)
+
+
+class TestLinearTime:
+    """Scanning cost grows linearly with file size."""
+
+    def test_unbalanced_braces_stay_linear(self):
+        # Every header opens a brace that never closes: the old brace matcher
+        # rescanned to the end of the file for each one
+        small = "function f() {\n  x();\n" * 2000
+        large = small * 8
+
+        def _time(code):
+            start = time.perf_counter()
+            _scan_code_lines(code)
+            return time.perf_counter() - start
+
+        _time(small)
+        assert _time(large) < 20 * max(_time(small), 1e-3)
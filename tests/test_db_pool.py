@@ -0,0 +1,169 @@
+"""Tests for backend.db_pool - pooled, thread-affine SQLite connections."""
+
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from backend.db_pool import ConnectionPool, PooledConnection
+
+
+@pytest.fixture
+def pool(tmp_path):
+    """A small pool backed by a temporary database file."""
+    p = ConnectionPool(str(tmp_path / "pool.db"), pool_size=2, max_overflow=1,
+                       timeout=0.5, recycle_seconds=3600, ping_after_seconds=0)
+    yield p
+    p.close_all()
+
+
+class TestConnectionReuse:
+    """Connections are returned on close() and handed out again."""
+
+    def test_close_returns_connection_to_pool(self, pool):
+        """Closing a pooled connection keeps the physical handle open."""
+        conn = pool.acquire()
+        assert isinstance(conn, PooledConnection)
+        conn.close()
+        stats = pool.get_stats()
+        assert stats['idle'] == 1
+        assert stats['in_use'] == 0
+        assert stats['created'] == 1
+
+    def test_same_thread_gets_same_connection(self, pool):
+        """A thread re-acquiring gets its own idle connection back."""
+        first = pool.acquire()
+        first.close()
+        second = pool.acquire()
+        second.close()
+        assert first is second
+        assert pool.get_stats()['affinity_hits'] >= 1
+
+    def test_pragmas_applied_once(self, pool):
+        """WAL and foreign keys are configured on the pooled connection."""
+        with pool.connection() as conn:
+            assert conn.execute("PRAGMA journal_mode").fetchone()[0] == 'wal'
+            assert conn.execute("PRAGMA foreign_keys").fetchone()[0] == 1
+
+    def test_double_close_is_harmless(self, pool):
+        """Closing twice does not corrupt the in-use counter."""
+        conn = pool.acquire()
+        conn.close()
+        conn.close()
+        assert pool.get_stats()['in_use'] == 0
+
+
+class TestSessionReset:
+    """Per-session state does not leak between borrowers."""
+
+    def test_row_factory_and_foreign_keys_reset(self, pool):
+        """row_factory is cleared and foreign_keys re-enabled on release."""
+        conn = pool.acquire()
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA foreign_keys = OFF")
+        conn.close()
+
+        conn = pool.acquire()
+        try:
+            assert conn.row_factory is None
+            assert conn.execute("PRAGMA foreign_keys").fetchone()[0] == 1
+        finally:
+            conn.close()
+
+    def test_open_transaction_rolled_back(self, pool):
+        """Uncommitted writes are rolled back when a connection is released."""
+        with pool.connection() as conn:
+            conn.execute("CREATE TABLE t (v INTEGER)")
+            conn.commit()
+        conn = pool.acquire()
+        conn.execute("BEGIN")
+        conn.execute("INSERT INTO t VALUES (1)")
+        conn.close()
+        with pool.connection() as conn:
+            assert conn.execute("SELECT COUNT(*) FROM t").fetchone()[0] == 0
+
+
+class TestBounds:
+    """Pool size, overflow and timeout behavior."""
+
+    def test_overflow_connections_are_closed_on_release(self, pool):
+        """Connections beyond pool_size are not retained."""
+        conns = [pool.acquire() for _ in range(3)]
+        assert pool.get_stats()['overflow_created'] == 1
+        for c in conns:
+            c.close()
+        stats = pool.get_stats()
+        assert stats['idle'] == 2
+        assert stats['closed'] == 1
+
+    def test_exhausted_pool_times_out(self, pool):
+        """Waiting past the timeout raises OperationalError."""
+        conns = [pool.acquire() for _ in range(3)]
+        try:
+            with pytest.raises(sqlite3.OperationalError):
+                pool.acquire()
+            assert pool.get_stats()['timeouts'] == 1
+        finally:
+            for c in conns:
+                c.close()
+
+    def test_waiter_wakes_when_connection_released(self, pool):
+        """A blocked caller proceeds as soon as another thread releases."""
+        conns = [pool.acquire() for _ in range(3)]
+        result = {}
+
+        def _borrow():
+            c = pool.acquire()
+            result['ok'] = True
+            c.close()
+
+        t = threading.Thread(target=_borrow)
+        t.start()
+        conns[0].close()
+        t.join(timeout=2)
+        for c in conns[1:]:
+            c.close()
+        assert result.get('ok') is True
+        assert pool.get_stats()['waits'] == 1
+
+    def test_concurrent_threads_stay_within_bounds(self, pool):
+        """Peak usage never exceeds pool_size + max_overflow."""
+        errors = []
+
+        def _worker():
+            try:
+                for _ in range(50):
+                    with pool.connection() as conn:
+                        conn.execute("SELECT 1").fetchone()
+            except Exception as e:  # pragma: no cover - surfaced via assert
+                errors.append(e)
+
+        threads = [threading.Thread(target=_worker) for _ in range(6)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        stats = pool.get_stats()
+        assert not errors
+        assert stats['peak_in_use'] <= 3
+        assert stats['in_use'] == 0
+
+
+class TestHealthChecks:
+    """Stale or broken idle connections are replaced."""
+
+    def test_recycled_after_max_age(self, tmp_path):
+        """Connections older than recycle_seconds are replaced."""
+        p = ConnectionPool(str(tmp_path / "recycle.db"), pool_size=1, max_overflow=0,
+                           timeout=0.5, recycle_seconds=0.0001, ping_after_seconds=None)
+        try:
+            first = p.acquire()
+            first.close()
+            time.sleep(0.01)
+            second = p.acquire()
+            second.close()
+            assert first is not second
+            assert p.get_stats()['recycled'] == 1
+        finally:
+            p.close_all()
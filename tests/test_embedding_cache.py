@@ -0,0 +1,136 @@
+"""Tests for backend.embedding_cache - persistent content-addressed embeddings."""
+
+from collections import OrderedDict
+
+import pytest
+
+from backend.embedding_cache import EmbeddingCache
+from backend.rag import RAGManager
+
+MODEL = "embeddinggemma-300m"
+DOC = "title: none | text: "
+QUERY = "task: search result | query: "
+
+
+def _vec(text, dim=8):
+    """Deterministic fake embedding derived from the text."""
+    return [float((hash(text) >> i) % 7) for i in range(dim)]
+
+
+@pytest.fixture
+def cache(tmp_path):
+    c = EmbeddingCache(str(tmp_path / "emb.db"), max_bytes=10_000, evict_to_ratio=0.5)
+    yield c
+    c.close()
+
+
+class TestLookupAndStore:
+    """get_many/put_many round-trips and keying."""
+
+    def test_round_trip(self, cache):
+        """Stored vectors come back (float32 precision) on lookup."""
+        cache.put_many(MODEL, DOC, ["alpha", "beta"], [[0.5, 1.0], [2.0, -1.5]])
+        assert cache.get_many(MODEL, DOC, ["beta", "gamma", "alpha"]) == [[2.0, -1.5], None, [0.5, 1.0]]
+
+    def test_key_includes_model_and_prefix(self, cache):
+        """Same text under another model or task prefix is a miss."""
+        cache.put_many(MODEL, DOC, ["alpha"], [[1.0]])
+        assert cache.get_many("other-model", DOC, ["alpha"]) == [None]
+        assert cache.get_many(MODEL, QUERY, ["alpha"]) == [None]
+
+    def test_empty_vectors_not_cached(self, cache):
+        """Failed (empty) embeddings are never stored."""
+        cache.put_many(MODEL, DOC, ["alpha"], [[]])
+        assert cache.get_stats()['entries'] == 0
+
+    def test_hit_rate(self, cache):
+        """hit_rate reflects lookups since creation."""
+        cache.put_many(MODEL, DOC, ["a"], [[1.0]])
+        cache.get_many(MODEL, DOC, ["a", "b", "a", "c"])
+        stats = cache.get_stats()
+        assert stats['hits'] == 2
+        assert stats['misses'] == 2
+        assert stats['hit_rate'] == 0.5
+
+    def test_persists_across_instances(self, tmp_path):
+        """A new cache on the same file sees earlier entries."""
+        path = str(tmp_path / "persist.db")
+        first = EmbeddingCache(path)
+        first.put_many(MODEL, DOC, ["alpha"], [[3.0, 4.0]])
+        first.close()
+        second = EmbeddingCache(path)
+        try:
+            assert second.get_many(MODEL, DOC, ["alpha"]) == [[3.0, 4.0]]
+            assert second.get_stats()['entries'] == 1
+        finally:
+            second.close()
+
+
+class TestEviction:
+    """Size-bounded LRU eviction."""
+
+    def test_evicts_least_recently_used(self, cache):
+        """Going over max_bytes evicts the oldest entries down to the ratio."""
+        # 8 floats * 4 bytes = 32 bytes per entry; 10_000 bytes holds ~312
+        texts = [f"text-{i}" for i in range(400)]
+        cache.put_many(MODEL, DOC, texts[:1], [_vec(texts[0])])
+        cache.get_many(MODEL, DOC, texts[:1])  # keep the first one hot
+        for t in texts[1:]:
+            cache.put_many(MODEL, DOC, [t], [_vec(t)])
+        stats = cache.get_stats()
+        assert stats['evictions'] > 0
+        assert stats['bytes'] <= cache.max_bytes
+        # Most recent writes survive, early cold ones do not
+        assert cache.get_many(MODEL, DOC, [texts[-1]])[0] is not None
+        assert cache.get_many(MODEL, DOC, [texts[1]])[0] is None
+
+
+class _CountingEmbeddingFn:
+    """Embedding function double that records what reaches the server."""
+
+    def __init__(self):
+        self.calls = []
+
+    def task_prefix(self, task=None):
+        return QUERY if task == "query" else DOC
+
+    def _embed_with_task(self, input, task=None):
+        self.calls.append(list(input))
+        return [_vec(t) for t in input]
+
+
+@pytest.fixture
+def manager(tmp_path):
+    """A RAGManager shell wired to a temp cache, without ChromaDB."""
+    m = object.__new__(RAGManager)
+    m.embedding_model = MODEL
+    m.embedding_fn = _CountingEmbeddingFn()
+    m._query_embedding_cache = OrderedDict()
+    m.embedding_cache = EmbeddingCache(str(tmp_path / "mgr.db"))
+    yield m
+    m.embedding_cache.close()
+
+
+class TestEmbedTexts:
+    """RAGManager.embed_texts sends only cache misses to the embedding function."""
+
+    def test_only_misses_are_embedded(self, manager):
+        """Second call with overlapping texts embeds only the new one."""
+        first = manager.embed_texts(["a", "b"], task="document")
+        second = manager.embed_texts(["b", "c", "a"], task="document")
+        assert manager.embedding_fn.calls == [["a", "b"], ["c"]]
+        assert second == [first[1], _vec("c"), first[0]]
+        assert manager.get_embedding_cache_stats()['hits'] == 2
+
+    def test_duplicates_embedded_once(self, manager):
+        """Identical texts in one call hit the server once."""
+        result = manager.embed_texts(["x", "x", ""], task="document")
+        assert manager.embedding_fn.calls == [["x", ""]]
+        assert result[0] == result[1]
+
+    def test_query_lru_bypasses_disk(self, manager):
+        """Repeated queries are served from the in-memory LRU."""
+        manager.embed_texts(["what is rag"], task="query")
+        manager.embed_texts(["what is rag"], task="query")
+        assert len(manager.embedding_fn.calls) == 1
+        assert manager.get_embedding_cache_stats()['hits'] == 0
@@ -0,0 +1,179 @@
+"""Tests for backend.embedding_scheduler - coalesced, concurrent, adaptive embedding batches."""
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from backend.embedding_scheduler import EmbeddingScheduler
+
+
+class _FakeEmbeddingsHandler(BaseHTTPRequestHandler):
+    """/v1/embeddings stub: the embedding of a text is [len(text), batch number]."""
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        inputs = body["input"]
+        with self.server.lock:
+            self.server.batches.append(list(inputs))
+            batch_no = len(self.server.batches)
+            self.server.in_flight += 1
+            self.server.peak_in_flight = max(self.server.peak_in_flight, self.server.in_flight)
+        try:
+            time.sleep(self.server.latency(len(inputs)))
+            if self.server.fail:
+                self.send_response(500)
+                payload = b"boom"
+            else:
+                self.send_response(200)
+                rows = [{"index": i, "embedding": [float(len(t)), float(batch_no)]} for i, t in enumerate(inputs)]
+                payload = json.dumps({"data": rows[::-1]}).encode()  # Out of order on purpose
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+        finally:
+            with self.server.lock:
+                self.server.in_flight -= 1
+
+
+@pytest.fixture
+def server():
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), _FakeEmbeddingsHandler)
+    srv.daemon_threads = True
+    srv.lock = threading.Lock()
+    srv.batches, srv.connections, srv.in_flight, srv.peak_in_flight = [], 0, 0, 0
+    srv.latency = lambda n: 0.0
+    srv.fail = False
+    threading.Thread(target=srv.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True).start()
+    yield srv
+    srv.shutdown()
+    srv.server_close()
+
+
+@pytest.fixture
+def make_scheduler(server):
+    created = []
+
+    def _make(**kwargs):
+        kwargs.setdefault("max_delay_ms", 5)
+        kwargs.setdefault("target_latency_ms", 0)
+        scheduler = EmbeddingScheduler(f"http://127.0.0.1:{server.server_port}/v1/embeddings", "fake", **kwargs)
+        created.append(scheduler)
+        return scheduler
+
+    yield _make
+    for scheduler in created:
+        scheduler.close()
+
+
+class TestBatching:
+    """Results keep input order while batches respect count and token limits."""
+
+    def test_order_preserved_across_batches(self, server, make_scheduler):
+        scheduler = make_scheduler(max_batch_size=4)
+        texts = ["x" * n for n in range(1, 11)]
+        assert [e[0] for e in scheduler.embed(texts)] == [float(n) for n in range(1, 11)]
+        assert sorted(len(b) for b in server.batches) == [2, 4, 4]  # Concurrent, so any arrival order
+
+    def test_token_budget_splits_batches(self, server, make_scheduler):
+        scheduler = make_scheduler(max_batch_size=100, max_batch_tokens=10)
+        scheduler.embed(["a"] * 6, token_counts=[4] * 6)
+        assert [len(b) for b in server.batches] == [2, 2, 2]
+
+    def test_oversized_item_still_sent(self, server, make_scheduler):
+        scheduler = make_scheduler(max_batch_tokens=10)
+        assert len(scheduler.embed(["big", "small"], token_counts=[50, 1])) == 2
+        assert sorted(len(b) for b in server.batches) == [1, 1]
+
+    def test_empty_input(self, server, make_scheduler):
+        assert make_scheduler().embed([]) == []
+        assert server.batches == []
+
+
+class TestCoalescing:
+    """Requests from concurrent threads share batches and connections."""
+
+    def test_threads_share_a_batch(self, server, make_scheduler):
+        scheduler = make_scheduler(max_batch_size=64, max_delay_ms=50, max_in_flight=1)
+        results = {}
+        barrier = threading.Barrier(8)
+
+        def caller(i):
+            barrier.wait()
+            results[i] = scheduler.embed(["y" * (i + 1)])[0][0]
+
+        threads = [threading.Thread(target=caller, args=(i,)) for i in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join(5)
+        assert results == {i: float(i + 1) for i in range(8)}
+        assert len(server.batches) < 8
+        assert scheduler.get_stats()["avg_batch_items"] > 1
+
+    def test_requests_overlap_up_to_limit(self, server, make_scheduler):
+        server.latency = lambda n: 0.05
+        scheduler = make_scheduler(max_batch_size=2, max_in_flight=3)
+        start = time.perf_counter()
+        scheduler.embed(["z"] * 12)
+        elapsed = time.perf_counter() - start
+        assert server.peak_in_flight == 3
+        assert elapsed < 6 * 0.05  # Sequential would take 6 round trips
+
+    def test_connections_are_reused(self, server, make_scheduler):
+        scheduler = make_scheduler(max_batch_size=1, max_in_flight=2)
+        for _ in range(5):
+            scheduler.embed(["a", "b", "c", "d"])
+        assert len(server.batches) == 20
+        assert server.connections <= 2
+
+
+class TestAdaptiveBatchSize:
+    """Batch size follows observed latency."""
+
+    def test_slow_batches_shrink(self, server, make_scheduler):
+        server.latency = lambda n: 0.002 * n
+        scheduler = make_scheduler(max_batch_size=64, min_batch_size=4, max_in_flight=1, target_latency_ms=40)
+        scheduler.embed(["w"] * 400)
+        assert scheduler.batch_size < 64
+        assert scheduler.get_stats()["batch_size_shrunk"] > 0
+
+    def test_fast_batches_grow_back(self, server, make_scheduler):
+        scheduler = make_scheduler(max_batch_size=64, min_batch_size=4, max_in_flight=1, target_latency_ms=1000)
+        scheduler.batch_size = 4
+        scheduler.embed(["w"] * 600)
+        assert scheduler.batch_size == 64
+
+    def test_failure_halves_and_raises(self, server, make_scheduler):
+        server.fail = True
+        scheduler = make_scheduler(max_batch_size=32, min_batch_size=4, target_latency_ms=1000)
+        with pytest.raises(Exception):
+            scheduler.embed(["v"] * 10)
+        assert scheduler.batch_size == 16
+        assert scheduler.get_stats()["errors"] == 1
+
+
+class TestLifecycle:
+    """close() drains the queue; later submissions are refused."""
+
+    def test_close_drains(self, server, make_scheduler):
+        server.latency = lambda n: 0.02
+        scheduler = make_scheduler(max_batch_size=2, max_in_flight=1)
+        futures = scheduler.submit(["q"] * 6)
+        scheduler.close()
+        assert all(f.done() and f.result()[0] == 1.0 for f in futures)
+        with pytest.raises(RuntimeError):
+            scheduler.submit(["late"])
@@ -0,0 +1,65 @@
+"""Tests for FileRAG.copy_file_chunks - reusing stored chunks and embeddings for identical uploads."""
+
+import uuid
+
+import chromadb
+import numpy as np
+import pytest
+
+from backend.rag import FileRAG
+
+
+class _NoEmbedManager:
+    def embed_texts(self, texts, task="document"):
+        raise AssertionError("copy_file_chunks must not embed")
+
+
+@pytest.fixture
+def file_rag():
+    client = chromadb.EphemeralClient()
+    rag = object.__new__(FileRAG)
+    rag.rag_manager = _NoEmbedManager()
+    rag.collection_name = "file_store"
+    rag._initialized = True
+    suffix = uuid.uuid4().hex
+    rag.vector_collection = client.get_or_create_collection(f"files_vector_{suffix}", embedding_function=None)
+    rag.bm25_collection = client.get_or_create_collection(f"files_bm25_{suffix}", embedding_function=None)
+
+    rng = np.random.default_rng(0)
+    ids = [f"file_src_chunk_{i}" for i in range(3)]
+    documents = [f"def f{i}():\n    return {i}" for i in range(3)]
+    metadatas = [{"file_id": "file_src", "chat_id": "chat_a", "chunk_index": i, "timestamp": 1.0,
+                  "file_type": "code", "chunk_strategy": "syntax-aware", "function_names": f'["f{i}"]'}
+                 for i in range(3)]
+    rag.vector_collection.add(ids=ids, documents=documents, metadatas=metadatas,
+                              embeddings=rng.standard_normal((3, 16)).tolist())
+    rag.bm25_collection.add(ids=ids, documents=documents, metadatas=metadatas,
+                            embeddings=rng.standard_normal((3, 8)).tolist())
+    return rag
+
+
+class TestCopyFileChunks:
+    """Copies keep texts, type metadata and both vectors; only ownership fields change."""
+
+    def test_copies_chunks_under_new_file(self, file_rag):
+        ids = file_rag.copy_file_chunks("file_src", "file_dup", "chat_b", timestamp=5.0)
+        assert ids == [f"file_dup_chunk_{i}" for i in range(3)]
+
+        for collection in (file_rag.vector_collection, file_rag.bm25_collection):
+            src = collection.get(ids=[f"file_src_chunk_{i}" for i in range(3)],
+                                 include=["documents", "metadatas", "embeddings"])
+            dup = collection.get(ids=ids, include=["documents", "metadatas", "embeddings"])
+            assert dup["documents"] == src["documents"]
+            np.testing.assert_allclose(dup["embeddings"], src["embeddings"])
+            for src_meta, dup_meta in zip(src["metadatas"], dup["metadatas"]):
+                assert src_meta["chat_id"] == "chat_a"
+                assert (dup_meta["file_id"], dup_meta["chat_id"], dup_meta["timestamp"]) == ("file_dup", "chat_b", 5.0)
+                assert {k: v for k, v in dup_meta.items() if k not in ("file_id", "chat_id", "timestamp")} == \
+                    {k: v for k, v in src_meta.items() if k not in ("file_id", "chat_id", "timestamp")}
+
+        assert len(file_rag.get_file_chunks("file_dup")) == 3
+        assert len(file_rag.get_file_chunks("file_src")) == 3
+
+    def test_unknown_source_copies_nothing(self, file_rag):
+        assert file_rag.copy_file_chunks("file_missing", "file_dup", "chat_b") == []
+        assert file_rag.get_file_chunks("file_dup") == []
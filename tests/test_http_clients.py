@@ -0,0 +1,148 @@
+"""Tests for backend.http_clients - shared keep-alive clients for LLM calls."""
+
+import asyncio
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from backend import http_clients
+from backend.llm import stream_chat_completion, chat_completion
+
+
+class _StubLLMHandler(BaseHTTPRequestHandler):
+    """Minimal OpenAI-compatible /v1/chat/completions (streaming and blocking)."""
+
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        payload = json.loads(self.rfile.read(length) or b"{}")
+        if payload.get("stream"):
+            lines = [f"data: {json.dumps({'choices': [{'delta': {'content': t}}]})}\n\n" for t in ("Hel", "lo")]
+            lines.append("data: [DONE]\n\n")
+            body = "".join(lines).encode()
+            content_type = "text/event-stream"
+        else:
+            body = json.dumps({"choices": [{"message": {"content": "Hello"}}]}).encode()
+            content_type = "application/json"
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def stub_server():
+    """Stub LLM server on an ephemeral port; counts accepted TCP connections."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StubLLMHandler)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.connections = 0
+    t = threading.Thread(target=server.serve_forever, daemon=True)
+    t.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _url(server):
+    return f"http://127.0.0.1:{server.server_address[1]}"
+
+
+class TestAsyncClientRegistry:
+    """One AsyncClient per event loop, released with the loop."""
+
+    def test_same_loop_reuses_client(self):
+        """Repeated lookups on one loop return the same client."""
+        loop = asyncio.new_event_loop()
+        try:
+            first = loop.run_until_complete(self._get())
+            second = loop.run_until_complete(self._get())
+            assert first is second
+        finally:
+            http_clients.close_loop_client(loop)
+            loop.close()
+
+    def test_loops_get_distinct_clients(self):
+        """Clients are never shared across event loops."""
+        loop_a, loop_b = asyncio.new_event_loop(), asyncio.new_event_loop()
+        try:
+            a = loop_a.run_until_complete(self._get())
+            b = loop_b.run_until_complete(self._get())
+            assert a is not b
+        finally:
+            for loop in (loop_a, loop_b):
+                http_clients.close_loop_client(loop)
+                loop.close()
+
+    def test_close_loop_client(self):
+        """Closing a loop's client releases it; the next lookup builds a new one."""
+        loop = asyncio.new_event_loop()
+        try:
+            first = loop.run_until_complete(self._get())
+            http_clients.close_loop_client(loop)
+            assert first.is_closed
+            second = loop.run_until_complete(self._get())
+            assert second is not first
+        finally:
+            http_clients.close_loop_client(loop)
+            loop.close()
+
+    @staticmethod
+    async def _get():
+        return http_clients.get_async_client()
+
+
+class TestSyncSessions:
+    """requests.Session instances are reused per thread."""
+
+    def test_session_reused_within_thread(self):
+        assert http_clients.get_sync_session() is http_clients.get_sync_session()
+
+    def test_sessions_differ_across_threads(self):
+        result = {}
+        t = threading.Thread(target=lambda: result.setdefault('s', http_clients.get_sync_session()))
+        t.start()
+        t.join()
+        assert result['s'] is not http_clients.get_sync_session()
+
+
+class TestConnectionReuse:
+    """LLM helpers keep connections alive between calls."""
+
+    def test_stream_reuses_connection(self, stub_server):
+        """Two streamed completions on one loop use a single TCP connection."""
+        async def _run():
+            outputs = []
+            for _ in range(2):
+                lines = [line async for line in stream_chat_completion(
+                    _url(stub_server), {"model": "m", "stream": True, "messages": []})]
+                outputs.append(lines)
+            return outputs
+
+        loop = asyncio.new_event_loop()
+        try:
+            outputs = loop.run_until_complete(_run())
+        finally:
+            http_clients.close_loop_client(loop)
+            loop.close()
+        assert all(len(lines) == 2 for lines in outputs)
+        assert stub_server.connections == 1
+
+    def test_blocking_reuses_connection(self, stub_server):
+        """Two blocking completions on one thread use a single TCP connection."""
+        for _ in range(2):
+            assert chat_completion(_url(stub_server), {"model": "m", "messages": []}) == "Hello"
+        assert stub_server.connections == 1
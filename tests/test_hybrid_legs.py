@@ -0,0 +1,183 @@
+"""Tests for concurrent vector/BM25 legs in RAGStore.retrieve_by_query and its async variant."""
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+from backend import config
+from backend import rag as rag_module
+from backend.rag import RAGStore
+
+DIM = 16
+
+
+class _FakeCollection:
+    """Returns a fixed ranking after an optional delay; can be told to fail."""
+
+    def __init__(self, prefix, delay=0.0, fail=False):
+        self.prefix = prefix
+        self.delay = delay
+        self.fail = fail
+        self.calls = 0
+        self.threads = set()
+
+    def query(self, n_results=10, where=None, include=None, query_embeddings=None, query_texts=None):
+        self.calls += 1
+        self.threads.add(threading.get_ident())
+        time.sleep(self.delay)
+        if self.fail:
+            raise ValueError(f"{self.prefix} collection unavailable")
+        n = min(n_results, 5)
+        ids = [f"doc{i}" for i in range(n)]
+        result = {
+            "ids": [ids],
+            "documents": [[f"{self.prefix} text {i}" for i in range(n)]],
+            "metadatas": [[{"file_id": "f", "chunk_index": i} for i in range(n)]],
+            "distances": [[0.1 * (i + 1) for i in range(n)]],
+        }
+        if query_embeddings is not None:
+            result["embeddings"] = [[[1.0 if d == i else 0.0 for d in range(DIM)] for i in range(n)]]
+        return result
+
+
+class _FakeManager:
+    def embed_texts(self, texts, task="document"):
+        return [[1.0] + [0.0] * (DIM - 1) for _ in texts]
+
+
+@pytest.fixture(autouse=True)
+def fresh_stats():
+    rag_module.reset_retrieval_stats()
+    yield
+    rag_module.reset_retrieval_stats()
+
+
+@pytest.fixture
+def make_store():
+    def _make(vector_delay=0.0, bm25_delay=0.0, vector_fail=False, bm25_fail=False):
+        store = object.__new__(RAGStore)
+        store.rag_manager = _FakeManager()
+        store.collection_name = "file_store"
+        store.vector_collection = _FakeCollection("vector", vector_delay, vector_fail)
+        store.bm25_collection = _FakeCollection("bm25", bm25_delay, bm25_fail)
+        return store
+    return _make
+
+
+def _texts(results):
+    return [r["text"] for r in results]
+
+
+class TestConcurrentLegs:
+    """Hybrid latency is the slower leg, not the sum of both."""
+
+    def test_legs_overlap(self, make_store):
+        store = make_store(vector_delay=0.2, bm25_delay=0.2)
+        start = time.perf_counter()
+        results = store.retrieve_by_query("q", n_results=3)
+        elapsed = time.perf_counter() - start
+        assert results
+        assert elapsed < 0.35
+        assert store.vector_collection.threads.isdisjoint(store.bm25_collection.threads)
+
+    def test_fused_results_unchanged(self, make_store):
+        store = make_store()
+        results = store.retrieve_by_query("q", n_results=3)
+        assert [r["rank_fusion"]["vector_rank"] for r in results][:1] == [1]
+        assert all(r["rank_fusion"]["bm25_rank"] is not None for r in results)
+
+    def test_non_hybrid_skips_bm25(self, make_store):
+        store = make_store()
+        store.retrieve_by_query("q", n_results=3, hybrid=False)
+        assert store.bm25_collection.calls == 0
+        assert rag_module.get_retrieval_stats()["bm25"]["count"] == 0
+
+
+class TestDegradation:
+    """A slow or failing leg is dropped; the other leg still answers."""
+
+    def test_bm25_timeout_returns_vector_results(self, make_store, monkeypatch):
+        monkeypatch.setattr(config, "RAG_LEG_TIMEOUT_MS", 100)
+        store = make_store(bm25_delay=0.5)
+        start = time.perf_counter()
+        results = store.retrieve_by_query("q", n_results=3)
+        assert time.perf_counter() - start < 0.4
+        assert results and all(t.startswith("vector") for t in _texts(results))
+        assert rag_module.get_retrieval_stats()["bm25"]["timeouts"] == 1
+
+    def test_vector_error_returns_bm25_results(self, make_store):
+        store = make_store(vector_fail=True)
+        results = store.retrieve_by_query("q", n_results=3)
+        assert results and all(t.startswith("bm25") for t in _texts(results))
+        assert rag_module.get_retrieval_stats()["vector"]["errors"] == 1
+
+    def test_both_legs_failing_raises_vector_error(self, make_store):
+        store = make_store(vector_fail=True, bm25_fail=True)
+        with pytest.raises(ValueError, match="vector"):
+            store.retrieve_by_query("q", n_results=3)
+
+    def test_retrieve_for_file_falls_back_to_empty(self, make_store):
+        from backend.rag import FileRAG
+        store = make_store(vector_fail=True, bm25_fail=True)
+        store.__class__ = FileRAG
+        assert store.retrieve_for_file("f", "q") == []
+
+
+class TestAsyncVariant:
+    """aretrieve_by_query matches the sync path without blocking the loop."""
+
+    def test_same_results_as_sync(self, make_store):
+        store = make_store()
+        assert asyncio.run(store.aretrieve_by_query("q", n_results=3)) == store.retrieve_by_query("q", n_results=3)
+
+    def test_loop_stays_responsive(self, make_store):
+        store = make_store(vector_delay=0.2, bm25_delay=0.2)
+
+        async def main():
+            ticks = 0
+
+            async def ticker():
+                nonlocal ticks
+                while True:
+                    await asyncio.sleep(0.01)
+                    ticks += 1
+
+            task = asyncio.create_task(ticker())
+            results = await store.aretrieve_by_query("q", n_results=3)
+            task.cancel()
+            return results, ticks
+
+        results, ticks = asyncio.run(main())
+        assert results
+        assert ticks >= 10
+
+    def test_async_timeout_degrades(self, make_store, monkeypatch):
+        monkeypatch.setattr(config, "RAG_LEG_TIMEOUT_MS", 100)
+        store = make_store(vector_delay=0.5)
+        results = asyncio.run(store.aretrieve_by_query("q", n_results=3))
+        assert results and all(t.startswith("bm25") for t in _texts(results))
+        assert rag_module.get_retrieval_stats()["vector"]["timeouts"] == 1
+
+
+class TestLatencyHistogram:
+    """Per-leg histograms expose counts, buckets and percentiles."""
+
+    def test_both_legs_recorded(self, make_store):
+        store = make_store(vector_delay=0.03)
+        for _ in range(4):
+            store.retrieve_by_query("q", n_results=3)
+        stats = rag_module.get_retrieval_stats()
+        assert stats["vector"]["count"] == 4 and stats["bm25"]["count"] == 4
+        assert stats["vector"]["p50_ms"] == 50  # 30 ms lands in the <=50 bucket
+        assert sum(stats["vector"]["buckets"].values()) == 4
+
+    def test_percentiles(self):
+        hist = rag_module._LatencyHistogram()
+        for ms in [1] * 90 + [300] * 9 + [60000]:
+            hist.observe(ms)
+        assert hist.percentile(0.5) == 1
+        assert hist.percentile(0.95) == 500
+        assert hist.percentile(1.0) == 60000
+        assert hist.snapshot()["buckets"][">30000"] == 1
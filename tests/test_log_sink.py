@@ -0,0 +1,153 @@
+"""Tests for backend.log_sink - background batched LLM/tool call logging."""
+
+import json
+import os
+
+import pytest
+
+from backend.log_sink import LogSink, read_record, INDEX_FILENAME
+
+
+def _sink(tmp_path, **kwargs):
+    opts = dict(enabled=True, queue_max=100, batch_size=50, flush_interval_ms=20,
+                max_field_chars=0, compress=False, overload_policy="drop",
+                sample_watermark=0.5, sample_rate=4, segment_max_bytes=1024 * 1024)
+    opts.update(kwargs)
+    return LogSink(str(tmp_path), **opts)
+
+
+def _index(tmp_path):
+    with open(os.path.join(tmp_path, INDEX_FILENAME), encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def _submit(sink, i, category="llm_calls", prefix=""):
+    entry = {"n": i, "request": {"messages": [{"role": "user", "content": f"hello {i}"}]}}
+    return sink.submit(category, prefix, entry, {"category": "llm", "model_tool": "m"})
+
+
+@pytest.fixture
+def sink(tmp_path):
+    s = _sink(tmp_path)
+    yield s
+    s.shutdown()
+
+
+class TestBatchedWrites:
+    """Records are written in batches and can be read back by index path."""
+
+    def test_roundtrip_through_index(self, sink, tmp_path):
+        """Every index line resolves to its own record."""
+        for i in range(30):
+            assert _submit(sink, i)
+        assert sink.flush()
+        index = _index(tmp_path)
+        assert len(index) == 30
+        for i, line in enumerate(index):
+            assert "#" in line["log_file"]
+            assert read_record(str(tmp_path), line["log_file"])["n"] == i
+        stats = sink.get_stats()
+        assert stats['written'] == 30
+        assert stats['batches'] < 30
+
+    def test_payload_snapshot_at_submit(self, sink, tmp_path):
+        """Mutating the payload after logging does not change the record."""
+        payload = {"messages": ["a"]}
+        sink.submit("llm_calls", "", {"request": payload}, {"category": "llm"})
+        payload["messages"].append("b")
+        sink.flush()
+        record = read_record(str(tmp_path), _index(tmp_path)[0]["log_file"])
+        assert record["request"]["messages"] == ["a"]
+
+    def test_segments_rotate(self, tmp_path):
+        """Segments are rotated once they exceed the size bound."""
+        s = _sink(tmp_path, segment_max_bytes=200)
+        try:
+            for i in range(20):
+                _submit(s, i)
+            s.flush()
+            files = {line["log_file"].split("#")[0] for line in _index(tmp_path)}
+            assert len(files) > 1
+            for i, line in enumerate(_index(tmp_path)):
+                assert read_record(str(tmp_path), line["log_file"])["n"] == i
+        finally:
+            s.shutdown()
+
+    def test_legacy_json_files_still_readable(self, tmp_path):
+        """Index paths without an offset load a whole JSON file."""
+        os.makedirs(tmp_path / "llm_calls")
+        (tmp_path / "llm_calls" / "old.json").write_text(json.dumps({"n": 7}, indent=2))
+        assert read_record(str(tmp_path), "llm_calls/old.json") == {"n": 7}
+
+
+class TestSizeControls:
+    """Optional truncation and compression."""
+
+    def test_truncation(self, tmp_path):
+        s = _sink(tmp_path, max_field_chars=10)
+        try:
+            s.submit("llm_calls", "", {"response": "x" * 100}, {"category": "llm"})
+            s.flush()
+            record = read_record(str(tmp_path), _index(tmp_path)[0]["log_file"])
+            assert record["response"].startswith("x" * 10)
+            assert "truncated 90 chars" in record["response"]
+        finally:
+            s.shutdown()
+
+    def test_compression(self, tmp_path):
+        s = _sink(tmp_path, compress=True)
+        try:
+            s.submit("llm_calls", "", {"response": "y" * 5000}, {"category": "llm"})
+            s.flush()
+            log_file = _index(tmp_path)[0]["log_file"]
+            assert os.path.getsize(tmp_path / log_file.split("#")[0]) < 1000
+            assert read_record(str(tmp_path), log_file)["response"] == "y" * 5000
+        finally:
+            s.shutdown()
+
+
+class TestOverload:
+    """A stalled writer never blocks producers."""
+
+    def test_drops_counted_when_full(self, tmp_path):
+        s = _sink(tmp_path, queue_max=10)
+        try:
+            with s._write_lock:  # Stall the writer thread
+                results = [_submit(s, i) for i in range(50)]
+                assert results.count(False) > 0
+                assert s.get_stats()['dropped'] == results.count(False)
+        finally:
+            s.shutdown()
+
+    def test_sampling_above_watermark(self, tmp_path):
+        s = _sink(tmp_path, queue_max=1000, overload_policy="sample", sample_watermark=0.01)
+        try:
+            with s._write_lock:
+                results = [_submit(s, i) for i in range(200)]
+            stats = s.get_stats()
+            assert stats['sampled_out'] > 0
+            assert stats['dropped'] == 0
+            assert results.count(False) == stats['sampled_out']
+        finally:
+            s.shutdown()
+
+
+class TestLifecycle:
+    """Shutdown drains; disabled mode writes synchronously."""
+
+    def test_shutdown_drains_queue(self, tmp_path):
+        s = _sink(tmp_path, flush_interval_ms=10_000, batch_size=1000)
+        for i in range(25):
+            _submit(s, i)
+        s.shutdown()
+        assert len(_index(tmp_path)) == 25
+
+    def test_disabled_writes_synchronously(self, tmp_path):
+        s = _sink(tmp_path, enabled=False)
+        try:
+            _submit(s, 1, category="tool_calls", prefix="search_")
+            index = _index(tmp_path)
+            assert index[0]["log_file"].startswith("tool_calls/search_")
+            assert s._thread is None
+        finally:
+            s.shutdown()
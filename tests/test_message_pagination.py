@@ -0,0 +1,98 @@
+"""Tests for DatabaseWrapper.get_messages_page - keyset-paginated message history."""
+
+import uuid
+
+import pytest
+
+from backend.cache_layer import cache_layer
+from backend.db_wrapper import db
+
+
+@pytest.fixture
+def chat_id(temp_db):
+    cid = f"test-{uuid.uuid4()}"
+    db.ensure_chat_exists(cid)
+    db.add_messages_batch(cid, [{"role": "user" if i % 2 == 0 else "assistant", "content": f"m{i}"}
+                                for i in range(25)])
+    yield cid
+    db.delete_chat(cid)
+
+
+def _contents(page):
+    return [m["content"] for m in page["messages"]]
+
+
+def _page_keys(chat_id):
+    return {k for k in cache_layer._get_table("messages").cache if k.startswith(f"page:{chat_id}:")}
+
+
+class TestKeysetPages:
+    """before_id/limit walk the history backwards, oldest first within a page."""
+
+    def test_latest_page(self, chat_id):
+        page = db.get_messages_page(chat_id, limit=10)
+        assert _contents(page) == [f"m{i}" for i in range(15, 25)]
+        assert page["has_more"]
+        assert page["before_id"] == page["messages"][0]["id"]
+
+    def test_walk_to_first_page(self, chat_id):
+        collected, before_id = [], None
+        while True:
+            page = db.get_messages_page(chat_id, before_id, limit=10)
+            collected = page["messages"] + collected
+            before_id = page["before_id"]
+            if not page["has_more"]:
+                break
+        assert before_id is None
+        assert collected == db.get_messages(chat_id)
+
+    def test_exact_fit_has_no_more(self, chat_id):
+        page = db.get_messages_page(chat_id, limit=25)
+        assert len(page["messages"]) == 25
+        assert not page["has_more"]
+        assert page["before_id"] is None
+
+    def test_empty_chat(self, temp_db):
+        cid = f"test-{uuid.uuid4()}"
+        db.ensure_chat_exists(cid)
+        try:
+            assert db.get_messages_page(cid) == {"messages": [], "has_more": False, "before_id": None}
+        finally:
+            db.delete_chat(cid)
+
+
+class TestPageCache:
+    """Page windows are cached per window and invalidated only when they can change."""
+
+    def test_append_keeps_older_windows(self, chat_id):
+        latest = db.get_messages_page(chat_id, limit=10)
+        older = db.get_messages_page(chat_id, latest["before_id"], limit=10)
+        history = db.get_messages(chat_id) + [{"role": "user", "content": "new"}]
+        db.add_messages_batch(chat_id, history)
+
+        assert _page_keys(chat_id) == {f"page:{chat_id}:{latest['before_id']}:10"}
+        assert db.get_messages_page(chat_id, latest["before_id"], limit=10) is older
+        assert _contents(db.get_messages_page(chat_id, limit=10))[-1] == "new"
+
+    def test_add_message_refreshes_latest_page(self, chat_id):
+        db.get_messages_page(chat_id, limit=5)
+        db.add_message(chat_id, "user", "appended")
+        assert _contents(db.get_messages_page(chat_id, limit=5))[-1] == "appended"
+
+    def test_rewrite_drops_windows_above_change(self, chat_id):
+        latest = db.get_messages_page(chat_id, limit=10)
+        middle = db.get_messages_page(chat_id, latest["before_id"], limit=10)
+        history = list(db.get_messages(chat_id))  # Don't mutate the cached list
+        history[12] = {**history[12], "content": "edited"}  # Inside the middle window
+        db.add_messages_batch(chat_id, history)
+
+        # Rows from the change onwards were rewritten with new ids
+        assert _page_keys(chat_id) == set()
+        assert _contents(db.get_messages_page(chat_id, limit=13))[0] == "edited"
+        assert db.get_messages_page(chat_id, latest["before_id"], limit=10) is not middle
+
+    def test_truncate_drops_all_windows(self, chat_id):
+        db.get_messages_page(chat_id, limit=10)
+        db.truncate_messages(chat_id, 4)
+        assert _page_keys(chat_id) == set()
+        assert len(db.get_messages_page(chat_id, limit=10)["messages"]) == 4
@@ -0,0 +1,169 @@
+"""Tests for DatabaseWrapper.add_messages_batch - delta-append message persistence."""
+
+import sqlite3
+import threading
+import uuid
+
+import pytest
+
+from backend import db_layer, db_wrapper
+from backend.cache_layer import cache_layer
+from backend.db_wrapper import db
+
+
+@pytest.fixture
+def chat_id(temp_db):
+    cid = f"test-{uuid.uuid4()}"
+    db.ensure_chat_exists(cid)
+    yield cid
+    db.delete_chat(cid)
+
+
+def _turn(i):
+    return [{"role": "user", "content": f"question {i}"},
+            {"role": "assistant", "content": f"answer {i}", "tool_calls": [], "model": "m"}]
+
+
+def _db_rows(chat_id):
+    """Rows straight from SQLite, bypassing the cache."""
+    conn = sqlite3.connect(db_layer.DB_PATH)
+    try:
+        conn.row_factory = sqlite3.Row
+        return [dict(r) for r in conn.execute(
+            "SELECT * FROM messages WHERE chat_id = ? ORDER BY id ASC", (chat_id,))]
+    finally:
+        conn.close()
+
+
+class TestDeltaAppend:
+    """Only the new tail of the history is written."""
+
+    def test_existing_rows_untouched_on_new_turn(self, chat_id):
+        history = _turn(0)
+        assert db.add_messages_batch(chat_id, history)
+        first_ids = [r["id"] for r in _db_rows(chat_id)]
+
+        history += _turn(1)
+        assert db.add_messages_batch(chat_id, history)
+        rows = _db_rows(chat_id)
+        assert [r["id"] for r in rows[:2]] == first_ids
+        assert [r["content"] for r in rows] == ["question 0", "answer 0", "question 1", "answer 1"]
+
+    def test_resubmitting_same_history_writes_nothing(self, chat_id):
+        history = _turn(0) + _turn(1)
+        db.add_messages_batch(chat_id, history)
+        before = _db_rows(chat_id)
+        db.add_messages_batch(chat_id, history)
+        assert _db_rows(chat_id) == before
+
+    def test_user_message_persisted_before_batch(self, chat_id):
+        """The early-persisted user message is matched, not duplicated."""
+        history = _turn(0)
+        db.add_messages_batch(chat_id, history)
+        db.add_message(chat_id, "user", "question 1")
+        db.add_messages_batch(chat_id, history + _turn(1))
+        assert [r["content"] for r in _db_rows(chat_id)] == ["question 0", "answer 0", "question 1", "answer 1"]
+
+    def test_changed_message_rewrites_from_first_difference(self, chat_id):
+        history = _turn(0) + _turn(1)
+        db.add_messages_batch(chat_id, history)
+        before = _db_rows(chat_id)
+        history[2]["content"] = "question 1 (edited)"
+        db.add_messages_batch(chat_id, history)
+        after = _db_rows(chat_id)
+        assert after[:2] == before[:2]
+        assert [r["content"] for r in after[2:]] == ["question 1 (edited)", "answer 1"]
+
+    def test_shorter_history_truncates(self, chat_id):
+        db.add_messages_batch(chat_id, _turn(0) + _turn(1))
+        db.add_messages_batch(chat_id, _turn(0))
+        assert [r["content"] for r in _db_rows(chat_id)] == ["question 0", "answer 0"]
+
+    def test_tool_calls_formatting_does_not_force_rewrite(self, chat_id):
+        """Stored tool_calls JSON and re-sent lists compare by value."""
+        calls = [{"id": "c1", "type": "function", "function": {"name": "f", "arguments": "{}"}}]
+        history = [{"role": "user", "content": "q"}, {"role": "assistant", "content": "", "tool_calls": calls}]
+        db.add_messages_batch(chat_id, history)
+        before = _db_rows(chat_id)
+        history[1]["tool_calls"] = before[1]["tool_calls"]  # As re-read from the database
+        db.add_messages_batch(chat_id, history + [{"role": "tool", "content": "r", "tool_call_id": "c1", "name": "f"}])
+        assert _db_rows(chat_id)[:2] == before
+
+
+class TestCacheUpdates:
+    """The chat's cache rows are updated in place, not invalidated."""
+
+    def test_messages_cache_matches_database(self, chat_id):
+        db.add_messages_batch(chat_id, _turn(0))
+        db.get_chat_full(chat_id)  # Populate chats_full
+        db.add_messages_batch(chat_id, _turn(0) + _turn(1))
+        assert db.get_messages(chat_id) == _db_rows(chat_id)
+        assert db.get_chat_full(chat_id)["messages"] == _db_rows(chat_id)
+
+    def test_stale_cache_falls_back_to_database(self, chat_id):
+        """A write that bypassed the cached list is detected by the last-id check."""
+        db.add_messages_batch(chat_id, _turn(0))
+        db.get_messages(chat_id)
+        conn = sqlite3.connect(db_layer.DB_PATH)
+        conn.execute("INSERT INTO messages (chat_id, role, content, name) VALUES (?, 'user', 'question 1', '')", (chat_id,))
+        conn.commit()
+        conn.close()
+        db.add_messages_batch(chat_id, _turn(0) + _turn(1))
+        assert [r["content"] for r in _db_rows(chat_id)] == ["question 0", "answer 0", "question 1", "answer 1"]
+        assert db.get_messages(chat_id) == _db_rows(chat_id)
+
+    def test_other_chats_stay_cached(self, chat_id):
+        other = f"test-{uuid.uuid4()}"
+        db.ensure_chat_exists(other)
+        try:
+            db.add_messages_batch(other, _turn(0))
+            cached = db.get_messages(other)
+            db.add_messages_batch(chat_id, _turn(0))
+            state = cache_layer._get_table("messages")
+            assert state.cache[f"chat:{other}"]["data"] is cached
+        finally:
+            db.delete_chat(other)
+
+
+class TestConcurrentReads:
+    """A read that fetched before a batch write cannot put the old history back."""
+
+    def test_slow_fetch_racing_batch_write(self, chat_id, monkeypatch):
+        db.add_messages_batch(chat_id, _turn(0))
+        armed, fetched, release = threading.Event(), threading.Semaphore(0), threading.Event()
+
+        def slow(fetch):
+            def _fetch(cid):
+                result = fetch(cid)
+                if armed.is_set():
+                    fetched.release()
+                    release.wait(5)
+                return result
+            return _fetch
+
+        monkeypatch.setattr(db, "_get_messages_fetch", slow(db._get_messages_fetch))
+        monkeypatch.setattr(db, "_get_chat_full_fetch", slow(db._get_chat_full_fetch))
+        readers = [threading.Thread(target=db.get_messages, args=(chat_id,)),
+                   threading.Thread(target=db.get_chat_full, args=(chat_id,))]
+        diff = db_wrapper._common_prefix_length
+
+        def diff_then_race(persisted, rows):
+            # Inside the write transaction: both reads miss and fetch the pre-write rows
+            cache_layer.invalidate("messages", f"chat:{chat_id}")
+            armed.set()
+            for reader in readers:
+                reader.start()
+            for _ in readers:
+                assert fetched.acquire(timeout=5)
+            return diff(persisted, rows)
+
+        monkeypatch.setattr(db_wrapper, "_common_prefix_length", diff_then_race)
+        assert db.add_messages_batch(chat_id, _turn(0) + _turn(1))
+        release.set()
+        for reader in readers:
+            reader.join(5)
+        armed.clear()
+
+        assert len(_db_rows(chat_id)) == 4
+        assert db.get_messages(chat_id) == _db_rows(chat_id)
+        assert db.get_chat_full(chat_id)["messages"] == _db_rows(chat_id)
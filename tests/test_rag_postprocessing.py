@@ -0,0 +1,96 @@
+"""Tests for RAGStore result post-processing (embedding join, RRF, dedup)."""
+
+import time
+
+import numpy as np
+import pytest
+
+from backend import config
+from backend.rag import RAGStore, _cosine_similarity
+
+
+@pytest.fixture
+def store():
+    """A RAGStore shell; post-processing does not touch ChromaDB."""
+    return RAGStore.__new__(RAGStore)
+
+
+def _results(ids, texts, distances, embeddings=None, timestamps=None):
+    metas = [{"file_id": f"f{i}", "timestamp": (timestamps[i] if timestamps else 0)}
+             for i in range(len(ids))]
+    result = {"ids": [ids], "documents": [texts], "metadatas": [metas], "distances": [distances]}
+    if embeddings is not None:
+        result["embeddings"] = [np.asarray(embeddings, dtype=np.float32)]
+    return result
+
+
+class TestResultsToDocs:
+    """Embeddings are joined to documents by index."""
+
+    def test_duplicate_texts_keep_their_own_embedding(self, store):
+        """Two results with identical text get their own row, not the first match."""
+        res = _results(["a", "b"], ["same", "same"], [0.1, 0.2], embeddings=[[1, 0], [0, 1]])
+        docs = store._results_to_docs(res, source="vector")
+        assert list(docs[0]["embedding"]) == [1, 0]
+        assert list(docs[1]["embedding"]) == [0, 1]
+
+    def test_scores_per_source(self, store):
+        """Vector scores use 1 - L2^2/2, BM25 scores use 1/(1+d)."""
+        res = _results(["a"], ["t"], [0.5])
+        assert store._results_to_docs(res, "vector")[0]["score"] == pytest.approx(1 - 0.125)
+        assert store._results_to_docs(res, "bm25")[0]["score"] == pytest.approx(1 / 1.5)
+        assert "embedding" not in store._results_to_docs(res, "bm25")[0]
+
+
+class TestRRFFusion:
+    """Fusion is keyed by ChromaDB id."""
+
+    def test_same_id_is_fused(self, store):
+        """A chunk ranked by both legs gets both ranks and a combined score."""
+        vector_docs = [{"id": "x", "text": "x", "metadata": {}, "score": 0.9},
+                       {"id": "y", "text": "y", "metadata": {}, "score": 0.8}]
+        bm25_docs = [{"id": "y", "text": "y", "metadata": {}, "score": 0.7}]
+        fused = store._rrf_fuse_results(vector_docs, bm25_docs, n_results=10)
+        assert [d["id"] for d in fused] == ["y", "x"]
+        assert fused[0]["rank_fusion"]["vector_rank"] == 2
+        assert fused[0]["rank_fusion"]["bm25_rank"] == 1
+        assert fused[0]["score"] == pytest.approx(1 / 62 + 1 / 61)
+
+    def test_time_decay_applied(self, store):
+        """Older documents are decayed per day by RAG_DECAY_RATE."""
+        ts = time.time() - 2 * 86400
+        vector_docs = [{"id": "old", "text": "old", "metadata": {"timestamp": ts}, "score": 0.9}]
+        fused = store._rrf_fuse_results(vector_docs, [], n_results=10)
+        expected = (1 / 61) * np.exp(-config.RAG_DECAY_RATE * 2)
+        assert fused[0]["score"] == pytest.approx(expected, rel=1e-3)
+
+
+class TestDedup:
+    """Matrix dedup matches pairwise cosine dedup."""
+
+    def test_matches_pairwise_reference(self, store):
+        """Kept set equals the greedy pairwise-cosine reference."""
+        rng = np.random.default_rng(0)
+        base = rng.standard_normal((20, 16))
+        # Every other doc is a near-copy of its predecessor
+        embs = np.repeat(base, 2, axis=0) + rng.standard_normal((40, 16)) * 0.01
+        docs = [{"id": str(i), "text": f"doc {i}", "embedding": embs[i]} for i in range(40)]
+
+        kept_ref, kept_embs = [], []
+        for d in docs:
+            if any(_cosine_similarity(d["embedding"], k) >= config.RAG_DEDUP_THRESHOLD for k in kept_embs):
+                continue
+            kept_ref.append(d["id"])
+            kept_embs.append(d["embedding"])
+            if len(kept_ref) >= 15:
+                break
+
+        kept = store._dedup_results(docs, n_results=15)
+        assert [d["id"] for d in kept] == kept_ref
+
+    def test_bm25_only_docs_use_text_fingerprint(self, store):
+        """Docs without embeddings are deduplicated by text prefix."""
+        docs = [{"id": "a", "text": "same text", "embedding": [1.0, 0.0]},
+                {"id": "b", "text": "same text", "embedding": None},
+                {"id": "c", "text": "other", "embedding": None}]
+        assert [d["id"] for d in store._dedup_results(docs, n_results=5)] == ["a", "c"]
@@ -0,0 +1,196 @@
+"""Tests for backend.agents.research_pipeline - concurrent research fetch pipeline."""
+
+import asyncio
+import time
+
+import pytest
+
+import backend.agents.research_pipeline as research_pipeline
+from backend.agents.research_pipeline import ResearchPipeline
+
+PAGE = "Lorem ipsum dolor sit amet, consectetur adipiscing elit. " * 20
+
+
+@pytest.fixture(autouse=True)
+def char_token_counter(monkeypatch):
+    """Count ~4 chars per token so budgets do not depend on a downloaded tokenizer."""
+    monkeypatch.setattr(research_pipeline, "count_tokens", lambda text: len(text) // 4)
+
+
+class StubWeb:
+    """In-process stand-in for the Tavily/Playwright MCP servers with fixed latency."""
+
+    def __init__(self, latency=0.02, urls_per_query=4, delays=None, mapped=None, fail_query=None):
+        self.latency = latency
+        self.urls_per_query = urls_per_query
+        self.delays = delays or {}
+        self.mapped = mapped or {}
+        self.fail_query = fail_query
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.started = []
+        self.finished = []
+
+    async def search(self, query_info):
+        await asyncio.sleep(self.latency)
+        query = query_info["search"]
+        if query == self.fail_query:
+            raise ConnectionError("search failed")
+        results = [{"url": f"https://{query}.example/{i}", "title": f"{query} {i}",
+                    "content": "snippet", "score": 1.0 - i / 100} for i in range(self.urls_per_query)]
+        return results, []
+
+    async def extract(self, url, step_id, raw_content=None):
+        self.started.append(url)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            yield {"type": "activity", "data": f"reading {url}"}
+            await asyncio.sleep(self.delays.get(url, self.latency))
+        finally:
+            self.in_flight -= 1
+        self.finished.append(url)
+        yield {"type": "result", "data": (url, f"{url}\n{PAGE}")}
+
+    async def map_site(self, url, heading):
+        await asyncio.sleep(self.latency)
+        return self.mapped.get(url, [])
+
+
+def _pipeline(web, deep=False, budget=100000, concurrency=4, should_stop=None):
+    return ResearchPipeline(
+        search=web.search, select=lambda results: results, extract=web.extract,
+        map_site=web.map_site, activity=lambda kind, data: (kind, data),
+        content_budget=budget, deep=deep, should_stop=should_stop,
+        search_concurrency=concurrency, extract_concurrency=concurrency, map_concurrency=concurrency)
+
+
+def _queries(*names):
+    return [{"search": name} for name in names]
+
+
+def _run_section(pipeline, queries, heading="Heading"):
+    async def _collect():
+        activities, result = [], None
+        async for packet in pipeline.run_section(0, heading, queries):
+            if packet["type"] == "activity":
+                activities.append(packet["data"])
+            else:
+                result = packet["data"]
+        return activities, result
+    return asyncio.run(_collect())
+
+
+class TestOrdering:
+    """Stored content follows plan order regardless of completion order."""
+
+    def test_plan_order_when_later_urls_finish_first(self):
+        """Reversed latencies still store query-then-selection order."""
+        delays = {f"https://{q}.example/{i}": 0.05 - i * 0.01 for q in ("a", "b") for i in range(4)}
+        web = StubWeb(delays=delays)
+        _, (items, _) = _run_section(_pipeline(web), _queries("a", "b"))
+        assert [item["url"] for item in items] == [f"https://{q}.example/{i}" for q in ("a", "b") for i in range(4)]
+        assert web.finished != web.started  # Completion order really differed
+
+    def test_same_result_as_sequential(self):
+        """Concurrency 1 and concurrency 8 store identical content."""
+        _, (sequential, _) = _run_section(_pipeline(StubWeb(), concurrency=1), _queries("a", "b", "c"))
+        _, (concurrent, _) = _run_section(_pipeline(StubWeb(), concurrency=8), _queries("a", "b", "c"))
+        assert sequential == concurrent
+
+    def test_budget_applied_in_plan_order(self):
+        """Once the budget is spent, later pages are discarded even if they finished first."""
+        delays = {"https://a.example/0": 0.05}
+        pipeline = _pipeline(StubWeb(delays=delays), budget=300)
+        _, (items, _) = _run_section(pipeline, _queries("a"))
+        assert items[0]["url"] == "https://a.example/0"
+        assert len(items) < 4
+        assert pipeline.stats["discarded"] > 0
+
+
+class TestConcurrency:
+    """Stages run in parallel under their semaphores."""
+
+    def test_extract_semaphore_bounds_in_flight(self):
+        web = StubWeb(urls_per_query=6)
+        _run_section(_pipeline(web, concurrency=3), _queries("a", "b", "c"))
+        assert web.max_in_flight == 3
+
+    def test_wall_clock_scales_with_parallelism(self):
+        """Four-way parallelism is well over twice as fast as one-way."""
+        timings = {}
+        for concurrency in (1, 4):
+            start = time.perf_counter()
+            _run_section(_pipeline(StubWeb(latency=0.02), concurrency=concurrency), _queries("a", "b", "c", "d"))
+            timings[concurrency] = time.perf_counter() - start
+        assert timings[4] < timings[1] / 2
+
+    def test_deep_mode_maps_and_dedupes(self):
+        """Mapped sub-pages are stored after the selected pages, without duplicates."""
+        mapped = {"https://a.example/0": ["https://a.example/1", "https://sub.example/x", {"url": "https://sub.example/y"}],
+                  "https://a.example/1": ["https://sub.example/x", "https://sub.example/z"]}
+        web = StubWeb(urls_per_query=2, mapped=mapped)
+        pipeline = _pipeline(web, deep=True)
+        _, (items, _) = _run_section(pipeline, _queries("a"))
+        assert [item["url"] for item in items] == [
+            "https://a.example/0", "https://a.example/1",
+            "https://sub.example/x", "https://sub.example/y", "https://sub.example/z"]
+        assert pipeline.stats["maps"] == 2
+
+    def test_deep_mode_stops_fetching_at_budget(self):
+        """Once the budget is spent no further maps or sub-page extractions are launched."""
+        mapped = {f"https://a.example/{i}": [f"https://sub{i}.example/{j}" for j in range(5)] for i in range(4)}
+        web = StubWeb(mapped=mapped)
+        # Room for the four selected pages plus part of one sub-page
+        pipeline = _pipeline(web, deep=True, budget=1300, concurrency=2)
+        _, (items, _) = _run_section(pipeline, _queries("a"))
+        assert [item["url"] for item in items][-1] == "https://sub0.example/0"
+        assert pipeline.stats["maps"] == 2
+        assert len([url for url in web.started if "sub" in url]) <= 2
+
+
+class TestCancellation:
+    """Stopping a task cancels every in-flight fetch."""
+
+    def test_should_stop_interrupts(self):
+        stop = {"flag": False}
+        web = StubWeb(latency=0.05)
+        pipeline = _pipeline(web, should_stop=lambda: stop["flag"])
+
+        async def _run():
+            async for packet in pipeline.run_section(0, "H", _queries("a", "b")):
+                if packet["data"][0] == "visit":
+                    stop["flag"] = True
+
+        with pytest.raises(InterruptedError):
+            asyncio.run(_run())
+        assert web.in_flight == 0
+        assert not web.finished
+
+    def test_task_cancel_cancels_children(self):
+        """Cancelling the consuming task (as stop_task does) stops all fetches."""
+        web = StubWeb(latency=0.5)
+
+        async def _consume():
+            async for _ in _pipeline(web).run_section(0, "H", _queries("a", "b")):
+                pass
+
+        async def _run():
+            task = asyncio.ensure_future(_consume())
+            await asyncio.sleep(0.6)  # Searches done, extractions in flight
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+            return web.in_flight
+
+        assert asyncio.run(_run()) == 0
+        assert web.started and not web.finished
+
+    def test_failed_search_aborts_section(self):
+        """A failing query propagates its error and cancels its siblings."""
+        web = StubWeb(fail_query="b", delays={f"https://a.example/{i}": 1.0 for i in range(4)})
+        start = time.perf_counter()
+        with pytest.raises(ConnectionError):
+            _run_section(_pipeline(web), _queries("a", "b"))
+        assert time.perf_counter() - start < 0.5
+        assert web.in_flight == 0
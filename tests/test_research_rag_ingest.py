@@ -0,0 +1,133 @@
+"""Tests for ResearchRAG.store_chunks - one existence check, one embed, one upsert per batch."""
+
+import hashlib
+
+import pytest
+
+from backend import rag as rag_module
+from backend.rag import ResearchRAG
+
+
+class _FakeCollection:
+    """Records get/upsert calls and keeps upserted ids."""
+
+    def __init__(self):
+        self.docs = {}
+        self.get_calls = []
+        self.upserts = []
+
+    def get(self, ids=None, include=None):
+        self.get_calls.append(list(ids))
+        return {"ids": [i for i in ids if i in self.docs]}
+
+    def upsert(self, documents, metadatas, ids, embeddings=None):
+        self.upserts.append(list(ids))
+        for doc_id, doc in zip(ids, documents):
+            self.docs[doc_id] = doc
+
+
+class _FakeManager:
+    """chunk_text splits on blank lines; embed_texts records each call."""
+
+    def __init__(self):
+        self.embed_calls = []
+
+    def chunk_text(self, text, max_tokens=None):
+        return [part for part in text.split("\n\n") if part]
+
+    def embed_texts(self, texts, task="document"):
+        self.embed_calls.append(list(texts))
+        return [[float(len(t))] for t in texts]
+
+
+@pytest.fixture
+def research_rag(monkeypatch):
+    monkeypatch.setattr(rag_module, "count_tokens_batch", lambda texts: [len(t) // 4 for t in texts])
+    rag = object.__new__(ResearchRAG)
+    rag.rag_manager = _FakeManager()
+    rag.collection_name = "research_store"
+    rag.vector_collection = _FakeCollection()
+    rag.bm25_collection = _FakeCollection()
+    return rag
+
+
+def _legacy_id(chat_id, url, clean_text):
+    return hashlib.sha256((chat_id + url + clean_text).encode("utf-8")).hexdigest()
+
+
+SOURCES = [
+    ("https://a.example", "First paragraph of source A.\n\nSecond paragraph of source A."),
+    ("https://b.example", "Only paragraph of [source B](https://b.example/x) here https://b.example/y"),
+]
+
+
+class TestBulkStore:
+    """A batch of sources costs one get, one embed call and one upsert per collection."""
+
+    def test_single_round_trip_per_batch(self, research_rag):
+        result = research_rag.store_chunks("chat", 0, SOURCES)
+        assert result["stored"] == 3
+        assert result["tokens"] > 0
+        assert len(research_rag.vector_collection.get_calls) == 1
+        assert len(research_rag.rag_manager.embed_calls) == 1
+        assert len(research_rag.vector_collection.upserts) == 1
+        assert len(research_rag.bm25_collection.upserts) == 1
+
+    def test_ids_match_per_chunk_scheme(self, research_rag):
+        result = research_rag.store_chunks("chat", 0, SOURCES)
+        assert result["ids"] == [
+            _legacy_id("chat", "https://a.example", "First paragraph of source A."),
+            _legacy_id("chat", "https://a.example", "Second paragraph of source A."),
+            _legacy_id("chat", "https://b.example", "Only paragraph of source B here"),
+        ]
+
+    def test_metadata_carries_source(self, research_rag):
+        research_rag.store = lambda docs, metas, ids: captured.extend(metas)
+        captured = []
+        research_rag.store_chunks("chat", 2, [("https://a.example", "Some long enough text.", "2024-01-01")])
+        assert captured[0]["url"] == "https://a.example"
+        assert captured[0]["step_index"] == 2
+        assert captured[0]["published_date"] == "2024-01-01"
+
+
+class TestDeduplication:
+    """Known chunks are neither embedded nor upserted again, but keep their ids."""
+
+    def test_reingest_skips_existing(self, research_rag):
+        first = research_rag.store_chunks("chat", 0, SOURCES)
+        second = research_rag.store_chunks("chat", 1, SOURCES)
+        assert second["ids"] == first["ids"]
+        assert second["stored"] == 0 and second["tokens"] == 0
+        assert len(research_rag.rag_manager.embed_calls) == 1
+
+    def test_partial_overlap_embeds_only_new(self, research_rag):
+        research_rag.store_chunks("chat", 0, SOURCES[:1])
+        result = research_rag.store_chunks("chat", 1, SOURCES)
+        assert result["stored"] == 1
+        assert research_rag.rag_manager.embed_calls[-1] == ["Only paragraph of source B here"]
+
+    def test_duplicates_within_batch(self, research_rag):
+        result = research_rag.store_chunks("chat", 0, [SOURCES[0], SOURCES[0]])
+        assert result["stored"] == 2
+        assert len(result["ids"]) == 2
+
+    def test_short_and_empty_sources_skipped(self, research_rag):
+        result = research_rag.store_chunks("chat", 0, [("u", ""), ("u", "tiny"), ("u", "[x](https://y.z)  ok")])
+        assert result == {"ids": [], "stored": 0, "tokens": 0}
+        assert research_rag.vector_collection.get_calls == []
+
+
+class TestStoreChunkWrapper:
+    """store_chunk keeps its (success, tokens) contract."""
+
+    def test_store_chunk_delegates(self, research_rag):
+        ok, tokens = research_rag.store_chunk("chat", 0, *SOURCES[0])
+        assert ok and tokens > 0
+        assert research_rag.store_chunk("chat", 0, *SOURCES[0]) == (False, 0)
+
+    def test_store_error_is_logged_not_raised(self, research_rag):
+        def _boom(*args, **kwargs):
+            raise RuntimeError("embedding server down")
+        research_rag.rag_manager.embed_texts = _boom
+        ok, tokens = research_rag.store_chunk("chat", 0, *SOURCES[0])
+        assert (ok, tokens) == (False, 0)
@@ -0,0 +1,205 @@
+"""Tests for ResearchRAG.retrieve_for_report - batched multi-query retrieval over a synthetic corpus."""
+
+import hashlib
+import time
+import uuid
+
+import chromadb
+import numpy as np
+import pytest
+
+from backend import rag as rag_module
+from backend.rag import ResearchRAG
+
+DIM = 32
+STEPS = 4
+SOURCES_PER_STEP = 25
+PARAGRAPHS_PER_SOURCE = 20
+QUERIES = 12
+
+
+def _vector(text):
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:4], "little")
+    return np.random.default_rng(seed).standard_normal(DIM).tolist()
+
+
+class _FakeManager:
+    """Deterministic pseudo-random embeddings; counts embed calls."""
+
+    def __init__(self):
+        self.embed_calls = 0
+
+    def chunk_text(self, text, max_tokens=None):
+        return text.split("\n\n")
+
+    def embed_texts(self, texts, task="document"):
+        self.embed_calls += 1
+        return [_vector(t) for t in texts]
+
+
+class _CountingCollection:
+    """Wraps a ChromaDB collection and counts query() calls."""
+
+    def __init__(self, collection):
+        self._collection = collection
+        self.query_calls = 0
+
+    def query(self, **kwargs):
+        self.query_calls += 1
+        return self._collection.query(**kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._collection, name)
+
+
+class _NullCollection:
+    def upsert(self, **kwargs):
+        pass
+
+
+def _count_tokens(texts):
+    return [len(t) // 4 for t in texts]
+
+
+@pytest.fixture(scope="module")
+def corpus():
+    """Research store with STEPS x SOURCES_PER_STEP x PARAGRAPHS_PER_SOURCE chunks, built once."""
+    rag = object.__new__(ResearchRAG)
+    rag.rag_manager = _FakeManager()
+    rag.collection_name = "research_store"
+    rag.vector_collection = chromadb.EphemeralClient().get_or_create_collection(
+        f"report_{uuid.uuid4().hex}", embedding_function=None, metadata={"hnsw:space": "l2"}
+    )
+    rag.bm25_collection = _NullCollection()
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(rag_module, "count_tokens_batch", _count_tokens)
+        for step in range(STEPS):
+            sources = []
+            for s in range(SOURCES_PER_STEP):
+                paragraphs = [f"Step {step} source {s} paragraph {p}: " + "finding " * (20 + (p * 7) % 60)
+                              for p in range(PARAGRAPHS_PER_SOURCE)]
+                sources.append((f"https://example.com/{step}/{s}", "\n\n".join(paragraphs)))
+            rag.store_chunks("chat", step, sources)
+    return rag.vector_collection
+
+
+@pytest.fixture
+def token_counter(monkeypatch):
+    calls = []
+
+    def _count(texts):
+        calls.append(len(texts))
+        return _count_tokens(texts)
+
+    monkeypatch.setattr(rag_module, "count_tokens_batch", _count)
+    return calls
+
+
+@pytest.fixture
+def research_rag(corpus, token_counter):
+    rag = object.__new__(ResearchRAG)
+    rag.rag_manager = _FakeManager()
+    rag.collection_name = "research_store"
+    rag.vector_collection = _CountingCollection(corpus)
+    rag.bm25_collection = _NullCollection()
+    return rag
+
+
+def _queries():
+    return [{"query": f"question {i}", "step_filter": (i % STEPS) if i % 3 else None} for i in range(QUERIES)]
+
+
+def _legacy_retrieve_for_report(rag, chat_id, queries, max_tokens):
+    """retrieve_for_report as it was: one embedding and one ANN search per query."""
+    per_query_budget = max_tokens // len(queries)
+    all_chunks, seen_doc_ids, total_tokens = [], set(), 0
+    for q_info in queries:
+        query_emb = rag.rag_manager.embed_texts([q_info["query"]], task="query")[0]
+        step_filter = q_info.get("step_filter")
+        where = {"chat_id": chat_id} if step_filter is None else {"$and": [{"chat_id": chat_id}, {"step_index": step_filter}]}
+        results = rag.vector_collection.query(query_embeddings=[query_emb], n_results=200, where=where,
+                                              include=["documents", "metadatas", "embeddings", "distances"])
+        docs, metas, dists = results["documents"][0], results["metadatas"][0], results["distances"][0]
+        query_tokens = 0
+        for doc, meta, dist, chunk_tokens in zip(docs, metas, dists, rag_module.count_tokens_batch(list(docs))):
+            doc_content = doc[:200] + doc[-200:] if len(doc) > 400 else doc
+            doc_hash = hashlib.sha256(doc_content.encode("utf-8")).hexdigest()
+            if doc_hash in seen_doc_ids:
+                continue
+            if query_tokens + chunk_tokens > per_query_budget:
+                break
+            if total_tokens + chunk_tokens > max_tokens:
+                return all_chunks
+            all_chunks.append({"text": doc, "url": meta.get("url", ""), "step_index": meta.get("step_index", 0),
+                               "relevance": 1.0 / (1.0 + dist), "timestamp": meta.get("timestamp", 0),
+                               "published_date": meta.get("published_date", "")})
+            seen_doc_ids.add(doc_hash)
+            query_tokens += chunk_tokens
+            total_tokens += chunk_tokens
+    all_chunks.sort(key=lambda x: x.get("relevance", 0), reverse=True)
+    return all_chunks
+
+
+class TestBatchedRetrieval:
+    """One embed call and one ChromaDB request per distinct step filter."""
+
+    def test_matches_per_query_results(self, research_rag):
+        expected = _legacy_retrieve_for_report(research_rag, "chat", _queries(), 20000)
+        assert research_rag.retrieve_for_report("chat", _queries(), max_tokens=20000) == expected
+
+    def test_request_counts(self, research_rag):
+        research_rag.retrieve_for_report("chat", _queries(), max_tokens=20000)
+        assert research_rag.rag_manager.embed_calls == 1
+        assert research_rag.vector_collection.query_calls == STEPS + 1  # None plus each step
+
+    def test_cached_token_counts_skip_tokenizer(self, research_rag, token_counter):
+        research_rag.retrieve_for_report("chat", _queries(), max_tokens=20000)
+        assert token_counter == []
+
+    def test_uncached_token_counts_counted_once(self, research_rag, token_counter):
+        vector = _vector("legacy chunk")
+        research_rag.vector_collection.upsert(
+            ids=["legacy"], documents=["legacy chunk " * 20], embeddings=[vector],
+            metadatas=[{"chat_id": "old", "step_index": 0, "url": "u", "timestamp": 0.0}]
+        )
+        chunks = research_rag.retrieve_for_report("old", [{"query": "a"}, {"query": "b"}], max_tokens=20000)
+        assert [c["text"] for c in chunks] == ["legacy chunk " * 20]
+        assert token_counter == [1]
+
+    def test_store_records_token_count(self, research_rag):
+        meta = research_rag.vector_collection.get(limit=1, include=["metadatas", "documents"])
+        assert meta["metadatas"][0]["token_count"] == len(meta["documents"][0]) // 4
+
+    def test_query_failure_skips_group(self, research_rag):
+        class _FailFiltered:
+            def __init__(self, collection):
+                self.collection = collection
+
+            def query(self, **kwargs):
+                if "$and" in kwargs["where"]:
+                    raise RuntimeError("query failed")
+                return self.collection.query(**kwargs)
+
+        research_rag.vector_collection._collection = _FailFiltered(research_rag.vector_collection._collection)
+        chunks = research_rag.retrieve_for_report("chat", _queries(), max_tokens=20000)
+        assert chunks  # Unfiltered queries still contribute
+
+
+class TestReportLatency:
+    """Report assembly on a synthetic corpus is faster than one search per query."""
+
+    def test_latency_vs_per_query(self, research_rag):
+        def _best_of(fn, rounds=3):
+            best = float("inf")
+            for _ in range(rounds):
+                start = time.perf_counter()
+                fn()
+                best = min(best, time.perf_counter() - start)
+            return best
+
+        queries = _queries()
+        legacy = _best_of(lambda: _legacy_retrieve_for_report(research_rag, "chat", queries, 20000))
+        batched = _best_of(lambda: research_rag.retrieve_for_report("chat", queries, max_tokens=20000))
+        print(f"\nreport assembly ({STEPS * SOURCES_PER_STEP * PARAGRAPHS_PER_SOURCE} chunks, {QUERIES} queries): "
+              f"per-query {legacy * 1000:.1f} ms, batched {batched * 1000:.1f} ms")
+        assert batched < legacy
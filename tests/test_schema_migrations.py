@@ -0,0 +1,136 @@
+"""Tests for backend.migrations - versioned schema migrations and the hot-query indexes."""
+
+import sqlite3
+
+import pytest
+
+from backend.migrations import (
+    MIGRATIONS, Migration, apply_migrations, applied_versions, current_version, plan_migrations,
+)
+
+# Per-chat queries run on every chat load/turn (db_wrapper)
+HOT_QUERIES = {
+    "get_messages": ("SELECT * FROM messages WHERE chat_id = ? ORDER BY id ASC", "idx_messages_chat_id"),
+    "get_messages_page": ("SELECT * FROM messages WHERE chat_id = ? AND id < ? ORDER BY id DESC LIMIT ?",
+                          "idx_messages_chat_id"),
+    "delete_last_turn": ("SELECT id FROM messages WHERE chat_id = ? ORDER BY id DESC LIMIT 1", "idx_messages_chat_id"),
+    "add_messages_batch": ("SELECT COUNT(*), MAX(id) FROM messages WHERE chat_id = ?", "idx_messages_chat_id"),
+    "get_chat_files": ("SELECT * FROM files WHERE chat_id = ? ORDER BY created_at DESC", "idx_files_chat_id_created_at"),
+}
+
+
+@pytest.fixture
+def conn(tmp_path):
+    """Fresh database with the pre-migration messages/files tables."""
+    conn = sqlite3.connect(str(tmp_path / "test.db"))
+    conn.execute("CREATE TABLE messages (id INTEGER PRIMARY KEY AUTOINCREMENT, chat_id TEXT, "
+                 "role TEXT, content TEXT, timestamp REAL)")
+    conn.execute("CREATE TABLE files (id TEXT PRIMARY KEY, chat_id TEXT, created_at REAL)")
+    conn.commit()
+    yield conn
+    conn.close()
+
+
+def _plan(conn, sql):
+    params = ("chat",) + (1,) * (sql.count("?") - 1)
+    return " | ".join(row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params))
+
+
+class TestApply:
+    """Ordered, recorded, run-once application."""
+
+    def test_fresh_database_gets_all_migrations(self, conn):
+        applied = apply_migrations(conn)
+        assert [m.version for m in applied] == [m.version for m in MIGRATIONS]
+        assert current_version(conn) == MIGRATIONS[-1].version
+
+    def test_second_run_is_a_no_op(self, conn):
+        apply_migrations(conn)
+        assert apply_migrations(conn) == []
+        assert conn.execute("SELECT COUNT(*) FROM schema_version").fetchone()[0] == len(MIGRATIONS)
+
+    def test_existing_index_is_tolerated(self, conn):
+        """Statements are idempotent when the object already exists unrecorded."""
+        conn.execute("CREATE INDEX idx_messages_chat_id ON messages(chat_id)")
+        conn.commit()
+        apply_migrations(conn)
+        assert applied_versions(conn) == {m.version for m in MIGRATIONS}
+
+    def test_only_pending_migrations_run(self, conn):
+        apply_migrations(conn, MIGRATIONS[:1])
+        applied = apply_migrations(conn)
+        assert [m.version for m in applied] == [m.version for m in MIGRATIONS[1:]]
+
+    def test_failed_migration_rolls_back(self, conn):
+        broken = MIGRATIONS + [Migration(99, "broken", [
+            "CREATE TABLE half_done (id INTEGER)",
+            "CREATE INDEX idx_missing ON no_such_table(x)",
+        ])]
+        with pytest.raises(sqlite3.OperationalError):
+            apply_migrations(conn, broken)
+        assert 99 not in applied_versions(conn)
+        assert conn.execute("SELECT name FROM sqlite_master WHERE name = 'half_done'").fetchone() is None
+        # Earlier migrations stay applied
+        assert current_version(conn) == MIGRATIONS[-1].version
+
+    def test_content_addressing_schema(self, conn):
+        conn.execute("INSERT INTO files (id, chat_id, created_at) VALUES ('old', 'chat', 1)")
+        conn.commit()
+        apply_migrations(conn)
+        assert conn.execute("SELECT content_sha256 FROM files WHERE id = 'old'").fetchone() == (None,)
+        blob_columns = [row[1] for row in conn.execute("PRAGMA table_info(file_blobs)")]
+        assert blob_columns == ["sha256", "stored_filename", "file_size", "ref_count", "created_at"]
+        plan = _plan(conn, "SELECT * FROM files WHERE content_sha256 = ?")
+        assert "idx_files_content_sha256" in plan
+
+    def test_unordered_versions_rejected(self, conn):
+        with pytest.raises(ValueError):
+            apply_migrations(conn, [Migration(2, "b", []), Migration(1, "a", [])])
+        with pytest.raises(ValueError):
+            plan_migrations(conn, [Migration(1, "a", []), Migration(1, "b", [])])
+
+
+class TestDryRun:
+    """The planner reports without writing."""
+
+    def test_plan_lists_pending_without_writing(self, conn):
+        assert plan_migrations(conn) == MIGRATIONS
+        assert apply_migrations(conn, dry_run=True) == MIGRATIONS
+        tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master")}
+        assert "schema_version" not in tables
+        assert "idx_messages_chat_id" not in tables
+
+    def test_plan_empty_when_up_to_date(self, conn):
+        apply_migrations(conn)
+        assert plan_migrations(conn) == []
+
+
+class TestHotQueryPlans:
+    """EXPLAIN QUERY PLAN shows the per-chat queries searching an index, not scanning."""
+
+    @pytest.mark.parametrize("name", sorted(HOT_QUERIES))
+    def test_no_index_before_migration(self, conn, name):
+        sql, index = HOT_QUERIES[name]
+        assert index not in _plan(conn, sql)
+
+    @pytest.mark.parametrize("name", sorted(HOT_QUERIES))
+    def test_index_search_after_migration(self, conn, name):
+        apply_migrations(conn)
+        sql, index = HOT_QUERIES[name]
+        plan = _plan(conn, sql)
+        assert f"SEARCH {sql.split(' FROM ')[1].split()[0]} USING" in plan
+        assert index in plan
+        assert "TEMP B-TREE" not in plan
+
+    @pytest.mark.parametrize("name", sorted(HOT_QUERIES))
+    def test_application_schema_uses_indexes(self, temp_db, name):
+        """init_db() applies the migrations to the real schema."""
+        conn = sqlite3.connect(temp_db)
+        try:
+            assert plan_migrations(conn) == []
+            sql, index = HOT_QUERIES[name]
+            plan = _plan(conn, sql)
+            assert index in plan
+            assert "TEMP B-TREE" not in plan
+        finally:
+            conn.close()
@@ -0,0 +1,217 @@
+"""Tests for backend.task_scheduler - bounded worker pool with a priority queue."""
+
+import threading
+import time
+
+import pytest
+
+from backend.task_scheduler import TaskScheduler, TaskQueueFullError
+
+
+class _Gate:
+    """Job factory whose jobs block until released, recording start order."""
+
+    def __init__(self):
+        self.started = []
+        self.loops = []
+        self.release = threading.Event()
+        self._lock = threading.Lock()
+
+    def job(self, name):
+        def _run(loop):
+            with self._lock:
+                self.started.append(name)
+                self.loops.append(loop)
+            self.release.wait(timeout=5)
+        return _run
+
+    def wait_started(self, count, timeout=2.0):
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            with self._lock:
+                if len(self.started) >= count:
+                    return True
+            time.sleep(0.005)
+        return False
+
+
+@pytest.fixture
+def positions():
+    """Collects (job_id, position, kind) callbacks."""
+    return []
+
+
+def _make(positions, workers=1, limits=None, queue_max=10):
+    return TaskScheduler(workers=workers, limits=limits or {"chat": workers, "research": workers},
+                         queue_max=queue_max,
+                         on_position=lambda j, p, k: positions.append((j, p, k)))
+
+
+class TestDispatch:
+    """Jobs run on long-lived workers in priority order."""
+
+    def test_chat_dispatched_before_research(self, positions):
+        """Queued chat jobs overtake research jobs submitted earlier."""
+        sched = _make(positions, workers=1)
+        gate = _Gate()
+        try:
+            sched.submit("blocker", "chat", gate.job("blocker"))
+            assert gate.wait_started(1)
+            sched.submit("r1", "research", gate.job("r1"))
+            sched.submit("c1", "chat", gate.job("c1"))
+            sched.submit("c2", "chat", gate.job("c2"))
+            gate.release.set()
+            assert gate.wait_started(4)
+            assert gate.started == ["blocker", "c1", "c2", "r1"]
+        finally:
+            gate.release.set()
+            sched.shutdown()
+
+    def test_worker_loop_is_reused(self, positions):
+        """Consecutive jobs on one worker share the same open event loop."""
+        sched = _make(positions, workers=1)
+        gate = _Gate()
+        gate.release.set()
+        try:
+            sched.submit("a", "chat", gate.job("a"))
+            assert gate.wait_started(1)
+            sched.submit("b", "chat", gate.job("b"))
+            assert gate.wait_started(2)
+            assert gate.loops[0] is gate.loops[1]
+            assert not gate.loops[0].is_closed()
+        finally:
+            sched.shutdown()
+
+    def test_failing_job_does_not_kill_worker(self, positions):
+        """An exception in a job is contained and the worker keeps serving."""
+        sched = _make(positions, workers=1)
+        gate = _Gate()
+        gate.release.set()
+
+        def _boom(loop):
+            raise RuntimeError("boom")
+
+        try:
+            sched.submit("bad", "chat", _boom)
+            sched.submit("good", "chat", gate.job("good"))
+            assert gate.wait_started(1)
+            assert gate.started == ["good"]
+        finally:
+            sched.shutdown()
+
+
+class TestLimits:
+    """Per-kind concurrency limits and admission control."""
+
+    def test_research_limit_leaves_workers_for_chat(self, positions):
+        """Research beyond its limit waits while chat still starts immediately."""
+        sched = _make(positions, workers=3, limits={"chat": 3, "research": 1})
+        gate = _Gate()
+        try:
+            sched.submit("r1", "research", gate.job("r1"))
+            assert gate.wait_started(1)
+            assert sched.submit("r2", "research", gate.job("r2")) == 1
+            sched.submit("c1", "chat", gate.job("c1"))
+            assert gate.wait_started(2)
+            time.sleep(0.05)
+            assert gate.started == ["r1", "c1"]
+            stats = sched.get_stats()
+            assert stats['running'] == {"research": 1, "chat": 1}
+            assert stats['queued'] == {"research": 1}
+        finally:
+            gate.release.set()
+            sched.shutdown()
+
+    def test_full_queue_rejects(self, positions):
+        """Submitting beyond queue_max raises TaskQueueFullError."""
+        sched = _make(positions, workers=1, queue_max=1)
+        gate = _Gate()
+        try:
+            sched.submit("a", "chat", gate.job("a"))
+            assert gate.wait_started(1)
+            sched.submit("b", "chat", gate.job("b"))
+            assert not sched.can_accept()
+            with pytest.raises(TaskQueueFullError) as exc:
+                sched.submit("c", "chat", gate.job("c"))
+            assert exc.value.retry_after > 0
+            assert sched.get_stats()['rejected'] == 1
+        finally:
+            gate.release.set()
+            sched.shutdown()
+
+    def test_reservation_holds_slot_until_submit(self, positions):
+        """A reserved slot cannot be taken by another caller; its own submit always succeeds."""
+        sched = _make(positions, workers=1, queue_max=1)
+        gate = _Gate()
+        try:
+            sched.submit("a", "chat", gate.job("a"))
+            assert gate.wait_started(1)
+            slot = sched.reserve("chat")
+            assert not sched.can_accept()
+            with pytest.raises(TaskQueueFullError):
+                sched.reserve("chat")
+            with pytest.raises(TaskQueueFullError):
+                sched.submit("b", "chat", gate.job("b"))
+            sched.submit("c", "chat", gate.job("c"), reservation=slot)
+            slot.release()  # already consumed: no-op
+            assert sched.get_stats()['reserved'] == 0
+            assert sched.get_stats()['queue_length'] == 1
+        finally:
+            gate.release.set()
+            sched.shutdown()
+
+    def test_released_reservation_frees_slot(self, positions):
+        sched = _make(positions, workers=1, queue_max=1)
+        try:
+            slot = sched.reserve("research")
+            assert not sched.can_accept()
+            slot.release()
+            slot.release()
+            assert sched.can_accept()
+            assert sched.get_stats()['reserved'] == 0
+        finally:
+            sched.shutdown()
+
+
+class TestQueuePositions:
+    """Position reporting and cancellation of queued jobs."""
+
+    def test_positions_reported_and_updated(self, positions):
+        """Waiting jobs get 1-based positions that advance as jobs start."""
+        sched = _make(positions, workers=1)
+        gate = _Gate()
+        try:
+            sched.submit("a", "chat", gate.job("a"))
+            assert gate.wait_started(1)
+            assert sched.submit("b", "chat", gate.job("b")) == 1
+            assert sched.submit("c", "chat", gate.job("c")) == 2
+            assert ("c", 2, "chat") in positions
+            assert sched.queue_position("c") == 2
+            gate.release.set()
+            assert gate.wait_started(3)
+            assert ("c", 1, "chat") in positions
+            assert ("c", 0, "chat") in positions
+        finally:
+            gate.release.set()
+            sched.shutdown()
+
+    def test_cancel_queued_job(self, positions):
+        """A cancelled job never runs and later jobs move up."""
+        sched = _make(positions, workers=1)
+        gate = _Gate()
+        try:
+            sched.submit("a", "chat", gate.job("a"))
+            assert gate.wait_started(1)
+            sched.submit("b", "chat", gate.job("b"))
+            sched.submit("c", "chat", gate.job("c"))
+            assert sched.cancel("b") is True
+            assert sched.cancel("a") is False  # already running
+            assert sched.queue_position("c") == 1
+            gate.release.set()
+            assert gate.wait_started(2)
+            time.sleep(0.05)
+            assert gate.started == ["a", "c"]
+            assert sched.get_stats()['cancelled'] == 1
+        finally:
+            gate.release.set()
+            sched.shutdown()
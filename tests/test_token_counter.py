@@ -0,0 +1,130 @@
+"""Tests for backend.token_counter - memoized, batched and incremental counting."""
+
+import os
+
+import pytest
+from tokenizers import Tokenizer, decoders, models, pre_tokenizers, trainers
+from transformers import PreTrainedTokenizerFast
+
+import backend.token_counter as token_counter
+from backend.token_counter import (
+    IncrementalTokenCounter,
+    clear_token_cache,
+    count_tokens,
+    count_tokens_batch,
+    get_token_cache_stats,
+)
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture(scope="module")
+def local_tokenizer():
+    """A small byte-level BPE trained on repo sources (no network needed)."""
+    with open(os.path.join(REPO_ROOT, "backend", "chunking.py"), encoding="utf-8") as f:
+        corpus = f.read().split("\n")
+    tok = Tokenizer(models.BPE(unk_token="[UNK]"))
+    tok.pre_tokenizer = pre_tokenizers.ByteLevel(add_prefix_space=False)
+    tok.decoder = decoders.ByteLevel()
+    tok.train_from_iterator(corpus, trainers.BpeTrainer(
+        vocab_size=2000, special_tokens=["[UNK]"],
+        initial_alphabet=pre_tokenizers.ByteLevel.alphabet()))
+    return PreTrainedTokenizerFast(tokenizer_object=tok)
+
+
+@pytest.fixture(autouse=True)
+def use_local_tokenizer(local_tokenizer, monkeypatch):
+    """Route token_counter through the local tokenizer with an empty cache."""
+    monkeypatch.setattr(token_counter, "_tokenizer", local_tokenizer)
+    clear_token_cache()
+    yield
+    clear_token_cache()
+
+
+def _reference_count(tokenizer, text):
+    return len(tokenizer.encode(text, add_special_tokens=False))
+
+
+@pytest.fixture(scope="module")
+def sample_text():
+    with open(os.path.join(REPO_ROOT, "backend", "rag.py"), encoding="utf-8") as f:
+        return f.read()
+
+
+class TestCountCache:
+    """count_tokens() memoizes by content hash."""
+
+    def test_repeated_count_hits_cache(self, local_tokenizer, sample_text):
+        """Counting the same text twice encodes it once."""
+        text = sample_text[:2000]
+        first = count_tokens(text)
+        second = count_tokens(text)
+        assert first == second == _reference_count(local_tokenizer, text)
+        stats = get_token_cache_stats()
+        assert stats["hits"] == 1
+        assert stats["misses"] == 1
+        assert stats["entries"] == 1
+
+    def test_empty_text_is_zero(self):
+        """Empty text counts as zero tokens without touching the cache."""
+        assert count_tokens("") == 0
+        assert get_token_cache_stats()["misses"] == 0
+
+    def test_cache_is_bounded(self, monkeypatch, sample_text):
+        """Least recently used entries are evicted past max_entries."""
+        monkeypatch.setattr(token_counter._count_cache, "max_entries", 3)
+        lines = [line for line in sample_text.split("\n") if len(line) > 20][:10]
+        for line in lines:
+            count_tokens(line)
+        assert get_token_cache_stats()["entries"] == 3
+
+
+class TestCountBatch:
+    """count_tokens_batch() matches count_tokens() and reuses the cache."""
+
+    def test_batch_matches_individual_counts(self, local_tokenizer, sample_text):
+        """Batch counts equal per-text reference counts, in order."""
+        texts = sample_text.split("\n\n")[:50] + ["", "x"]
+        counts = count_tokens_batch(texts)
+        assert counts == [_reference_count(local_tokenizer, t) if t else 0 for t in texts]
+
+    def test_batch_reuses_cached_counts(self, sample_text):
+        """Texts already counted are served from the cache."""
+        paragraphs = [p for p in sample_text.split("\n\n") if len(p) > 40][:20]
+        count_tokens_batch(paragraphs)
+        before = get_token_cache_stats()
+        count_tokens_batch(paragraphs)
+        after = get_token_cache_stats()
+        assert after["hits"] - before["hits"] == len(set(paragraphs))
+        assert after["misses"] == before["misses"]
+
+    def test_duplicates_in_one_batch(self, local_tokenizer):
+        """Duplicate texts in a batch are encoded once and all filled in."""
+        text = "def hello_world(name):  # greets"
+        counts = count_tokens_batch([text, text, text])
+        assert counts == [_reference_count(local_tokenizer, text)] * 3
+        assert get_token_cache_stats()["entries"] == 1
+
+
+class TestIncrementalCounter:
+    """IncrementalTokenCounter tracks a growing buffer's full count."""
+
+    def test_matches_full_encode_after_each_append(self, local_tokenizer, sample_text):
+        """Running count equals a full encode of the buffer at every step."""
+        counter = IncrementalTokenCounter()
+        pos = 0
+        step = 0
+        while pos < len(sample_text) and step < 200:
+            size = 37 + (step * 131) % 1500
+            counter.append(sample_text[pos:pos + size])
+            pos += size
+            step += 1
+            assert counter.count == _reference_count(local_tokenizer, sample_text[:pos])
+        assert counter.text == sample_text[:pos]
+
+    def test_reset_starts_new_buffer(self, local_tokenizer):
+        """reset() discards previous contents."""
+        counter = IncrementalTokenCounter("class A:\n    pass\n")
+        counter.reset("x = 1\n")
+        assert counter.text == "x = 1\n"
+        assert counter.count == _reference_count(local_tokenizer, "x = 1\n")
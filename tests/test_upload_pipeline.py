@@ -0,0 +1,397 @@
+"""Tests for backend.upload_pipeline - streamed upload receive and background ingestion."""
+
+import hashlib
+import io
+import os
+import threading
+import time
+import uuid
+
+import pytest
+from flask import Flask, jsonify, request
+from werkzeug.exceptions import RequestEntityTooLarge
+
+from backend.db_wrapper import db
+from backend.file_manager import FileManager
+from backend.upload_pipeline import (
+    IngestJob,
+    IngestionQueue,
+    UploadSink,
+    cleanup_partial_uploads,
+    install_upload_streaming,
+)
+
+
+def _parts(directory):
+    return [n for n in os.listdir(directory) if n.endswith(".part")]
+
+
+def _wait(predicate, timeout=3.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.005)
+    return False
+
+
+class TestUploadSink:
+    """The body is hashed and size-checked while it is written to a part file."""
+
+    def test_hash_size_and_atomic_commit(self, tmp_path):
+        data = os.urandom(300_000)
+        sink = UploadSink(str(tmp_path))
+        for i in range(0, len(data), 65536):
+            sink.write(data[i:i + 65536])
+        assert sink.size == len(data)
+        assert sink.sha256 == hashlib.sha256(data).hexdigest()
+        assert len(_parts(tmp_path)) == 1
+
+        path = sink.commit("stored.bin")
+        assert _parts(tmp_path) == []
+        with open(path, "rb") as f:
+            assert f.read() == data
+        sink.discard()  # no-op once committed
+        assert os.path.exists(path)
+
+    def test_over_limit_aborts_and_removes_part(self, tmp_path):
+        sink = UploadSink(str(tmp_path), max_size=100)
+        sink.write(b"x" * 60)
+        with pytest.raises(RequestEntityTooLarge):
+            sink.write(b"x" * 60)
+        assert _parts(tmp_path) == []
+
+    def test_head_does_not_move_position(self, tmp_path):
+        sink = UploadSink(str(tmp_path))
+        sink.write(b"%PDF-1.7 rest")
+        assert sink.head(5) == b"%PDF-"
+        assert sink.tell() == 13
+        sink.discard()
+        assert _parts(tmp_path) == []
+
+    def test_cleanup_only_removes_stale_parts(self, tmp_path):
+        stale, fresh = UploadSink(str(tmp_path)), UploadSink(str(tmp_path))
+        old = time.time() - 7200
+        os.utime(stale.part_path, (old, old))
+        (tmp_path / "keep.pdf").write_bytes(b"data")
+        assert cleanup_partial_uploads(str(tmp_path)) == 1
+        assert sorted(os.listdir(tmp_path)) == sorted([os.path.basename(fresh.part_path), "keep.pdf"])
+
+
+class TestStreamingRequest:
+    """Multipart file parts on upload routes are written straight into sinks."""
+
+    @pytest.fixture
+    def client(self, tmp_path):
+        app = Flask(__name__)
+        install_upload_streaming(app, ["/upload"], lambda: UploadSink(str(tmp_path), max_size=1_000_000))
+
+        @app.route("/upload", methods=["POST"])
+        def upload():
+            file = request.files["file"]
+            if request.form.get("reject"):
+                return jsonify({"error": "rejected"}), 400
+            sink = file.stream
+            sink.commit("final.bin")
+            return jsonify({"stream": type(sink).__name__, "sha256": sink.sha256, "size": sink.size})
+
+        @app.route("/other", methods=["POST"])
+        def other():
+            return jsonify({"stream": type(request.files["file"].stream).__name__})
+
+        return app.test_client()
+
+    def test_body_streamed_into_sink(self, client, tmp_path):
+        data = os.urandom(700_000)
+        resp = client.post("/upload", data={"file": (io.BytesIO(data), "a.bin")})
+        body = resp.get_json()
+        assert body == {"stream": "UploadSink", "sha256": hashlib.sha256(data).hexdigest(), "size": len(data)}
+        assert (tmp_path / "final.bin").read_bytes() == data
+        assert _parts(tmp_path) == []
+
+    def test_rejected_upload_leaves_no_part(self, client, tmp_path):
+        resp = client.post("/upload", data={"reject": "1", "file": (io.BytesIO(b"abc"), "a.txt")})
+        assert resp.status_code == 400
+        assert os.listdir(tmp_path) == []
+
+    def test_oversized_upload_is_413(self, client, tmp_path):
+        resp = client.post("/upload", data={"file": (io.BytesIO(b"x" * 1_200_000), "big.bin")})
+        assert resp.status_code == 413
+        assert resp.get_json() == {"error": "File too large. Maximum size is 1000000 bytes"}
+        assert os.listdir(tmp_path) == []
+
+    def test_body_over_max_content_length_is_json_413(self, client):
+        client.application.config["MAX_CONTENT_LENGTH"] = 500_000
+        resp = client.post("/upload", data={"file": (io.BytesIO(b"x" * 600_000), "big.bin")})
+        assert resp.status_code == 413
+        assert resp.get_json() == {"error": "File too large. Maximum size is 500000 bytes"}
+
+    def test_other_routes_use_default_stream(self, client):
+        resp = client.post("/other", data={"file": (io.BytesIO(b"abc"), "a.txt")})
+        assert resp.get_json()["stream"] != "UploadSink"
+
+
+class _Recorder:
+    """extract/embed/set_status callables that record calls and can block."""
+
+    def __init__(self, text="extracted text", fail_on=None):
+        self.text = text
+        self.fail_on = fail_on
+        self.statuses = []
+        self.embedded = []
+        self.active = {"extract": 0, "embed": 0}
+        self.peak = {"extract": 0, "embed": 0}
+        self.gate = threading.Event()
+        self.gate.set()
+        self._lock = threading.Lock()
+
+    def _enter(self, stage):
+        with self._lock:
+            self.active[stage] += 1
+            self.peak[stage] = max(self.peak[stage], self.active[stage])
+
+    def _leave(self, stage):
+        with self._lock:
+            self.active[stage] -= 1
+
+    def extract(self, job):
+        self._enter("extract")
+        try:
+            self.gate.wait(timeout=3)
+            if self.fail_on == ("extract", job.file_id):
+                raise ValueError("corrupt file")
+            return self.text
+        finally:
+            self._leave("extract")
+
+    def embed(self, job, text):
+        self._enter("embed")
+        try:
+            time.sleep(0.02)
+            self.embedded.append((job.file_id, text))
+        finally:
+            self._leave("embed")
+
+    def set_status(self, file_id, status):
+        with self._lock:
+            self.statuses.append((file_id, status))
+
+    def status_of(self, file_id):
+        with self._lock:
+            return [s for f, s in self.statuses if f == file_id]
+
+
+def _job(file_id):
+    return IngestJob(file_id, "chat", f"/tmp/{file_id}", "text/plain", f"{file_id}.txt", size=10, sha256="ab")
+
+
+class TestIngestionQueue:
+    """Extraction and embedding run as separate bounded stages driving processing_status."""
+
+    def _queue(self, rec, extract_workers=1, embed_workers=1, history=256):
+        return IngestionQueue(rec.extract, rec.embed, rec.set_status,
+                              extract_workers=extract_workers, embed_workers=embed_workers, history=history)
+
+    def test_status_sequence_and_handoff(self):
+        rec = _Recorder()
+        queue = self._queue(rec)
+        try:
+            queue.submit(_job("f1"))
+            assert _wait(lambda: rec.status_of("f1")[-1:] == ["completed"])
+            assert rec.status_of("f1") == ["processing", "completed"]
+            assert rec.embedded == [("f1", "extracted text")]
+            progress = queue.progress("f1")
+            assert progress["stage"] == "completed" and progress["sha256"] == "ab"
+            assert progress["error"] is None
+        finally:
+            queue.shutdown()
+
+    def test_nothing_to_embed_completes_after_extraction(self):
+        rec = _Recorder(text=None)
+        queue = self._queue(rec)
+        try:
+            queue.submit(_job("f1"))
+            assert _wait(lambda: queue.progress("f1")["stage"] == "completed")
+            assert rec.embedded == []
+        finally:
+            queue.shutdown()
+
+    def test_extraction_failure_marks_failed(self):
+        rec = _Recorder(fail_on=("extract", "bad"))
+        queue = self._queue(rec)
+        try:
+            queue.submit(_job("bad"))
+            queue.submit(_job("good"))
+            assert _wait(lambda: rec.status_of("good")[-1:] == ["completed"])
+            assert rec.status_of("bad") == ["processing", "failed"]
+            assert queue.progress("bad")["error"] == "corrupt file"
+            assert queue.get_stats()["failed"] == 1
+        finally:
+            queue.shutdown()
+
+    def test_queue_positions_and_worker_limits(self):
+        rec = _Recorder()
+        rec.gate.clear()
+        queue = self._queue(rec, extract_workers=2, embed_workers=1)
+        try:
+            positions = [queue.submit(_job(f"f{i}")) for i in range(5)]
+            assert positions == [0, 0, 1, 2, 3]
+            assert _wait(lambda: rec.active["extract"] == 2)
+            assert queue.progress("f0")["stage"] == "extracting"
+            assert queue.progress("f4")["queue_position"] == 3
+            rec.gate.set()
+            assert _wait(lambda: len(rec.embedded) == 5)
+            assert rec.peak == {"extract": 2, "embed": 1}
+        finally:
+            queue.shutdown()
+
+    def test_history_is_bounded(self):
+        rec = _Recorder(text=None)
+        queue = self._queue(rec, history=2)
+        try:
+            for i in range(4):
+                queue.submit(_job(f"f{i}"))
+            assert _wait(lambda: queue.get_stats()["completed"] == 4)
+            assert queue.progress("f0") is None
+            assert queue.progress("f3")["stage"] == "completed"
+        finally:
+            queue.shutdown()
+
+
+class _FakeFileRAG:
+    def __init__(self):
+        self.stored = []
+        self.copied = []
+
+    def store_file(self, file_id, chat_id, content_text, filename=None):
+        self.stored.append((file_id, chat_id, filename, len(content_text)))
+        return [f"{file_id}_chunk_0"]
+
+    def copy_file_chunks(self, source_file_id, file_id, chat_id):
+        self.copied.append((source_file_id, file_id, chat_id))
+        return [f"{file_id}_chunk_0"]
+
+
+@pytest.fixture
+def file_manager(temp_db, tmp_path):
+    fm = object.__new__(FileManager)
+    fm.storage_path = str(tmp_path)
+    fm.file_rag = _FakeFileRAG()
+    fm.pdf_extractor = None
+    fm.ingest_queue = IngestionQueue(fm._ingest_extract, fm._ingest_embed, fm.update_file_processing_status,
+                                     extract_workers=1, embed_workers=1)
+    fm._blob_lock = threading.Lock()
+    yield fm
+    fm.ingest_queue.shutdown()
+
+
+@pytest.fixture
+def chat_id(temp_db):
+    cid = f"test-{uuid.uuid4()}"
+    db.ensure_chat_exists(cid)
+    yield cid
+    db.delete_chat(cid)
+
+
+class TestFileManagerIngestion:
+    """accept_upload stores the file, returns at once and finishes in the background."""
+
+    def test_accept_upload_end_to_end(self, file_manager, chat_id, tmp_path):
+        text = "A plain text upload with enough words to be chunked and embedded. " * 20
+        sink = file_manager.new_upload_sink()
+        sink.write(text.encode())
+        mime = file_manager.resolve_upload_mime_type(sink, "notes.txt", "application/octet-stream")
+        assert mime == "text/plain"
+
+        meta = file_manager.accept_upload(sink, chat_id, "notes.txt", mime)
+        assert meta.file_size == len(text) and meta.content_text is None
+        assert _parts(tmp_path) == []
+        assert _wait(lambda: db.get_file(meta.file_id)["processing_status"] == "completed")
+        row = db.get_file(meta.file_id)
+        assert row["content_text"] == text
+        assert file_manager.file_rag.stored == [(meta.file_id, chat_id, "notes.txt", len(text))]
+        assert file_manager.get_ingest_progress(meta.file_id)["sha256"] == hashlib.sha256(text.encode()).hexdigest()
+        db.delete_file(meta.file_id)
+
+    def test_mime_resolution(self, file_manager):
+        sink = file_manager.new_upload_sink()
+        sink.write(b"%PDF-1.4 ...")
+        assert file_manager.resolve_upload_mime_type(sink, "scan", "application/octet-stream") == "application/pdf"
+        assert file_manager.resolve_upload_mime_type(sink, "x.exe", "application/x-msdownload") is None
+        sink.discard()
+
+    def test_recover_requeues_interrupted_uploads(self, file_manager, chat_id, tmp_path):
+        (tmp_path / "a.txt").write_text("recovered upload body " * 10)
+        file_manager.save_file_metadata("file_recover_a", chat_id, "a.txt", "a.txt", "text/plain", 220)
+        file_manager.update_file_processing_status("file_recover_a", "processing")
+        file_manager.save_file_metadata("file_recover_b", chat_id, "b.txt", "missing.txt", "text/plain", 5)
+        try:
+            assert file_manager.recover_ingestion() == 1
+            assert _wait(lambda: db.get_file("file_recover_a")["processing_status"] == "completed")
+            assert db.get_file("file_recover_b")["processing_status"] == "failed"
+        finally:
+            db.delete_file("file_recover_a")
+            db.delete_file("file_recover_b")
+
+
+class TestContentDeduplication:
+    """Identical bytes are stored once, ref-counted, and ingested once."""
+
+    def _upload(self, fm, chat_id, data, name="report.txt"):
+        sink = fm.new_upload_sink()
+        sink.write(data)
+        return fm.accept_upload(sink, chat_id, name, "text/plain")
+
+    def test_blob_ref_counts_follow_save_and_delete(self, chat_id):
+        sha = hashlib.sha256(uuid.uuid4().bytes).hexdigest()
+        ids = [f"file_blob_{uuid.uuid4().hex[:8]}" for _ in range(2)]
+        for file_id in ids:
+            db.save_file(file_id, chat_id, "a.txt", f"{sha}.txt", "text/plain", 3, content_sha256=sha)
+        assert db.get_file_blob(sha)["ref_count"] == 2
+        assert db.delete_file(ids[0]) == 1
+        assert db.delete_file(ids[1]) == 0
+        assert db.get_file_blob(sha) is None
+
+        db.save_file("file_blob_legacy", chat_id, "b.txt", "b.txt", "text/plain", 3)
+        assert db.delete_file("file_blob_legacy") is None
+
+    def test_reupload_reuses_blob_text_and_embeddings(self, file_manager, chat_id, tmp_path):
+        text = f"Quarterly report {uuid.uuid4()} with enough prose to be worth embedding. " * 30
+        extractions = []
+        extract = file_manager.extract_file_content
+        file_manager.extract_file_content = lambda path, mime: extractions.append(path) or extract(path, mime)
+
+        first = self._upload(file_manager, chat_id, text.encode())
+        assert _wait(lambda: db.get_file(first.file_id)["processing_status"] == "completed")
+        other_chat = f"test-{uuid.uuid4()}"
+        db.ensure_chat_exists(other_chat)
+        try:
+            second = self._upload(file_manager, other_chat, text.encode(), name="copy.txt")
+            assert _wait(lambda: db.get_file(second.file_id)["processing_status"] == "completed")
+
+            assert second.stored_filename == first.stored_filename
+            assert os.listdir(tmp_path) == [first.stored_filename]
+            assert db.get_file_blob(hashlib.sha256(text.encode()).hexdigest())["ref_count"] == 2
+            assert len(extractions) == 1
+            assert db.get_file(second.file_id)["content_text"] == text
+            assert file_manager.file_rag.copied == [(first.file_id, second.file_id, other_chat)]
+            assert len(file_manager.file_rag.stored) == 1
+            assert file_manager.get_ingest_progress(second.file_id)["reused_from"] == first.file_id
+
+            assert file_manager.delete_file(first.file_id)
+            assert os.path.exists(tmp_path / second.stored_filename)
+            assert file_manager.delete_file(second.file_id)
+            assert os.listdir(tmp_path) == []
+        finally:
+            db.delete_chat(other_chat)
+
+    def test_missing_blob_copy_is_restored(self, file_manager, chat_id, tmp_path):
+        data = f"restore {uuid.uuid4()}".encode()
+        first = self._upload(file_manager, chat_id, data)
+        os.remove(tmp_path / first.stored_filename)
+        second = self._upload(file_manager, chat_id, data)
+        assert (tmp_path / second.stored_filename).read_bytes() == data
+        assert _parts(tmp_path) == []
+        file_manager.delete_file(first.file_id)
+        file_manager.delete_file(second.file_id)
+        assert os.listdir(tmp_path) == []
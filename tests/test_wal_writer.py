@@ -0,0 +1,150 @@
+"""Tests for backend.wal_writer - group-commit WAL writes and tail repair."""
+
+import json
+import os
+import time
+
+import pytest
+
+from backend.wal_writer import WALWriter
+
+
+@pytest.fixture
+def writer():
+    w = WALWriter(flush_interval_ms=20, flush_bytes=1024, fsync_policy="none",
+                  idle_close_seconds=60)
+    yield w
+    w.shutdown()
+
+
+def _lines(path):
+    with open(path, "rb") as f:
+        return f.read().decode("utf-8").splitlines()
+
+
+class TestGroupCommit:
+    """Lines are buffered and committed in groups."""
+
+    def test_small_appends_are_grouped(self, writer, tmp_path):
+        """Many small appends result in few write() calls."""
+        path = str(tmp_path / "a.wal")
+        for i in range(100):
+            writer.append("a", path, json.dumps({"i": i}))
+        writer.flush("a")
+        stats = writer.get_stats()
+        assert stats['appends'] == 100
+        assert stats['commits'] < 100
+        assert [json.loads(l)["i"] for l in _lines(path)] == list(range(100))
+
+    def test_size_threshold_commits_immediately(self, writer, tmp_path):
+        """Buffering flush_bytes forces a commit without waiting."""
+        path = str(tmp_path / "b.wal")
+        writer.append("b", path, "x" * 2000)
+        assert len(_lines(path)) == 1
+
+    def test_forced_flush(self, writer, tmp_path):
+        """flush=True commits the stream's buffer at once."""
+        path = str(tmp_path / "c.wal")
+        writer.append("c", path, '"one"')
+        writer.append("c", path, '"[[DONE]]"', flush=True)
+        assert _lines(path) == ['"one"', '"[[DONE]]"']
+
+    def test_background_flush_after_interval(self, writer, tmp_path):
+        """Buffered lines reach disk within the flush interval."""
+        path = str(tmp_path / "d.wal")
+        writer.append("d", path, '"late"')
+        deadline = time.time() + 2
+        while time.time() < deadline and not os.path.exists(path):
+            time.sleep(0.01)
+        assert _lines(path) == ['"late"']
+
+    def test_one_handle_per_stream(self, writer, tmp_path):
+        """A stream keeps a single open handle across commits."""
+        path = str(tmp_path / "e.wal")
+        for _ in range(5):
+            writer.append("e", path, '"t"', flush=True)
+        assert writer.get_stats()['handles_opened'] == 1
+        writer.close("e")
+        assert writer.get_stats()['handles_closed'] == 1
+
+    def test_discard_drops_pending(self, writer, tmp_path):
+        """discard() closes without writing buffered lines."""
+        path = str(tmp_path / "f.wal")
+        writer.append("f", path, '"never"')
+        writer.discard("f")
+        assert not os.path.exists(path)
+
+    def test_fsync_always(self, tmp_path):
+        """The "always" policy fsyncs each group commit."""
+        w = WALWriter(flush_interval_ms=20, flush_bytes=1024, fsync_policy="always")
+        try:
+            w.append("g", str(tmp_path / "g.wal"), '"t"', flush=True)
+            assert w.get_stats()['fsyncs'] == 1
+        finally:
+            w.shutdown()
+
+    def test_idle_streams_leave_the_registry(self, tmp_path):
+        """Closing an idle stream drops its entry; a later append starts a fresh one."""
+        w = WALWriter(flush_interval_ms=10, flush_bytes=1024, fsync_policy="none", idle_close_seconds=0.05)
+        try:
+            path = str(tmp_path / "h.wal")
+            for i in range(20):
+                w.append(f"task-{i}", str(tmp_path / f"t{i}.wal"), '"t"', flush=True)
+            w.append("h", path, '"first"')
+            deadline = time.time() + 2
+            while time.time() < deadline and w.get_stats()['streams']:
+                time.sleep(0.01)
+            stats = w.get_stats()
+            assert stats['streams'] == 0 and stats['open_handles'] == 0
+            w.append("h", path, '"second"', flush=True)
+            assert _lines(path) == ['"first"', '"second"']
+        finally:
+            w.shutdown()
+
+    def test_unknown_policy_rejected(self):
+        with pytest.raises(ValueError):
+            WALWriter(fsync_policy="sometimes")
+
+
+class TestRepairTail:
+    """Crash-truncated tails are trimmed before replay."""
+
+    def test_partial_last_line_removed(self, tmp_path):
+        path = tmp_path / "t.wal"
+        path.write_bytes(b'{"a": 1}\n{"b": 2}\n{"c": ')
+        assert WALWriter.repair_tail(str(path)) == len(b'{"c": ')
+        assert path.read_bytes() == b'{"a": 1}\n{"b": 2}\n'
+
+    def test_clean_file_untouched(self, tmp_path):
+        path = tmp_path / "t.wal"
+        path.write_bytes(b'{"a": 1}\n')
+        assert WALWriter.repair_tail(str(path)) == 0
+        assert path.read_bytes() == b'{"a": 1}\n'
+
+    def test_single_partial_line(self, tmp_path):
+        path = tmp_path / "t.wal"
+        path.write_bytes(b'{"a"')
+        WALWriter.repair_tail(str(path))
+        assert path.read_bytes() == b""
+
+
+class TestResponseCacheRecovery:
+    """ResponseCache replays a WAL with a truncated tail."""
+
+    def test_recover_skips_truncated_entry(self, monkeypatch, tmp_path):
+        import backend.cache_system as cs
+        monkeypatch.setattr(cs, "CACHE_DIR", str(tmp_path))
+        cache = cs.ResponseCache()
+        cache.initialize_chat("chat-1")
+        for token in ["Hel", "lo"]:
+            cache.append_chunk("chat-1", token)
+        cs.wal_writer.close("chat-1")
+        with open(tmp_path / "chat-1.wal", "ab") as f:
+            f.write(b'{"timestamp": 1.0, "da')  # crash mid-write
+
+        restarted = cs.ResponseCache()
+        restarted.recover_from_wal("chat-1")
+        assert [e["data"] for e in restarted._cache["chat-1"]["chunks"]] == ["Hel", "lo"]
+        with open(tmp_path / "chat-1.wal", "rb") as f:
+            assert f.read().endswith(b"\n")
+        restarted.cleanup_chat("chat-1")